@@ -2,6 +2,7 @@ import { NextRequest, NextResponse } from 'next/server'
 import { getServerSession } from 'next-auth'
 import { authOptions } from '@/pages/api/auth/[...nextauth]'
 import { prisma } from '@/lib/prisma'
+import { checkRateLimit, recordRateLimit } from '@/lib/rate-limit'
 
 // GET /api/admin/promos - получить список промокодов
 export async function GET(request: NextRequest) {
@@ -156,8 +157,15 @@ export async function POST(request: NextRequest) {
       count = 1
     } = promoData
 
-    // For staff - check weekly limit
+    // For staff - check weekly limit (in memory first, then the database)
     if (user.role === 'staff') {
+      const limit = await checkRateLimit('promo_create', { userId: user.id })
+      if (!limit.allowed) {
+        return NextResponse.json({ 
+          error: 'Недельный лимит создания промокодов исчерпан' 
+        }, { status: 403 })
+      }
+
       const weekStart = new Date()
       weekStart.setDate(weekStart.getDate() - 7)
       
@@ -217,6 +225,10 @@ export async function POST(request: NextRequest) {
       promos.push(newPromo)
     }
 
+    if (user.role === 'staff') {
+      await recordRateLimit('promo_create', { userId: user.id }, promos.length)
+    }
+
     // Log admin action
     await prisma.adminLog.create({
       data: {
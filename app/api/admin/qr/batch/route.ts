@@ -0,0 +1,101 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { getServerSession } from 'next-auth'
+import { authOptions } from '@/lib/auth-system'
+import { prisma } from '@/lib/prisma'
+import { logger } from '@/lib/logger'
+import { MAX_TTL_MINUTES, QRSystem } from '@/lib/qr-system'
+import { renderQRImages } from '@/lib/qr-images'
+import { requestIp } from '@/lib/rate-limit'
+
+const BATCH_TYPES = ['visit', 'referral', 'promo'] as const
+const MAX_GUESTS = 2000
+
+/**
+ * POST /api/admin/qr/batch
+ * Issue QR codes for a whole guest list at once (staff and admins)
+ * Images are rendered in parallel by the backend and cached until the
+ * codes expire; see lib/qr-images.ts.
+ *
+ * Body:
+ * - type: 'visit' | 'referral' | 'promo'
+ * - userIds: string[] (up to 2000 guests)
+ * - ttlMinutes?: number (optional, defaults to env or 60; at most 30 days)
+ *
+ * Returns:
+ * - issued: [{ userId, token, qrCodeDataUrl, expiresAt }]
+ * - unknownUserIds: ids that matched no user
+ */
+export async function POST(req: NextRequest) {
+  try {
+    const session = await getServerSession(authOptions)
+    if (!session?.user) {
+      return NextResponse.json({ error: 'Unauthorized' }, { status: 401 })
+    }
+    if (!['admin', 'staff'].includes(session.user.role)) {
+      return NextResponse.json({ error: 'Access denied' }, { status: 403 })
+    }
+
+    const { type, userIds, ttlMinutes } = await req.json()
+    if (!BATCH_TYPES.includes(type)) {
+      return NextResponse.json(
+        { error: `Invalid QR type. Must be one of: ${BATCH_TYPES.join(', ')}` },
+        { status: 400 }
+      )
+    }
+    if (!Array.isArray(userIds) || userIds.length === 0 || !userIds.every(id => typeof id === 'string')) {
+      return NextResponse.json({ error: 'userIds must be a non-empty list' }, { status: 400 })
+    }
+    if (userIds.length > MAX_GUESTS) {
+      return NextResponse.json({ error: `At most ${MAX_GUESTS} guests per batch` }, { status: 413 })
+    }
+    if (!QRSystem.isValidTTL(ttlMinutes)) {
+      return NextResponse.json({ error: `ttlMinutes must be a number of minutes within ±${MAX_TTL_MINUTES}` }, { status: 400 })
+    }
+
+    const guestIds = Array.from(new Set<string>(userIds))
+    const users = await prisma.user.findMany({
+      where: { id: { in: guestIds } },
+      select: { id: true }
+    })
+    const known = new Set(users.map(user => user.id))
+    const issuedIds = guestIds.filter(id => known.has(id))
+
+    const tokens = await Promise.all(issuedIds.map(userId => QRSystem.generateQR({
+      subject: `${type} QR code`,
+      type,
+      userId,
+      ttlMinutes
+    })))
+    const images = await renderQRImages(tokens)
+
+    const issued = issuedIds.map((userId, i) => ({
+      userId,
+      token: tokens[i],
+      qrCodeDataUrl: images[i],
+      expiresAt: new Date(QRSystem.decodeToken(tokens[i]).payload!.exp * 1000).toISOString()
+    }))
+
+    await logger.auditLog(prisma, {
+      userId: session.user.id,
+      action: 'qr_batch_issue',
+      entityType: 'QRCode',
+      ip: requestIp(req) || 'unknown',
+      userAgent: req.headers.get('user-agent') || 'unknown',
+      details: { type, issued: issued.length, unknown: guestIds.length - issued.length }
+    })
+
+    return NextResponse.json({
+      success: true,
+      type,
+      issued,
+      unknownUserIds: guestIds.filter(id => !known.has(id))
+    })
+
+  } catch (error: any) {
+    console.error('[QR Batch] Error:', error)
+    return NextResponse.json(
+      { error: error.message || 'Failed to issue QR codes' },
+      { status: 500 }
+    )
+  }
+}
@@ -2,6 +2,7 @@ import { NextRequest, NextResponse } from 'next/server'
 import { getServerSession } from 'next-auth'
 import { authOptions } from '@/pages/api/auth/[...nextauth]'
 import { prisma } from '@/lib/prisma'
+import { rollupDashboard, type Dashboard } from '@/lib/admin-stats'
 
 export async function GET(request: NextRequest) {
   try {
@@ -21,78 +22,7 @@ export async function GET(request: NextRequest) {
       return NextResponse.json({ error: 'Access denied' }, { status: 403 })
     }
 
-    const now = new Date()
-    const todayStart = new Date(now.getFullYear(), now.getMonth(), now.getDate())
-    const weekStart = new Date(now.getTime() - 7 * 24 * 60 * 60 * 1000)
-    const monthStart = new Date(now.getFullYear(), now.getMonth(), 1)
-
-    // Get basic stats
-    const stats = await Promise.all([
-      // Today's visits
-      prisma.visit.count({
-        where: {
-          created_at: { gte: todayStart },
-          status: 'confirmed'
-        }
-      }),
-      
-      // Week's visits
-      prisma.visit.count({
-        where: {
-          created_at: { gte: weekStart },
-          status: 'confirmed'
-        }
-      }),
-      
-      // Month's revenue (sum of bill amounts)
-      prisma.visit.aggregate({
-        where: {
-          created_at: { gte: monthStart },
-          status: 'confirmed',
-          bill_amount: { not: null }
-        },
-        _sum: {
-          bill_amount: true
-        }
-      }),
-      
-      // Active users (logged in last 30 days)
-      prisma.user.count({
-        where: {
-          last_login: { gte: new Date(now.getTime() - 30 * 24 * 60 * 60 * 1000) }
-        }
-      }),
-      
-      // Pending music orders
-      prisma.musicOrder.count({
-        where: { status: 'pending' }
-      }),
-      
-      // Today's wheel spins
-      prisma.wheelSpin.count({
-        where: {
-          spun_at: { gte: todayStart }
-        }
-      }),
-      
-      // Active coupons
-      prisma.coupon.count({
-        where: {
-          expires_at: { gte: now },
-          redeemed_at: null
-        }
-      }),
-
-      // Total users
-      prisma.user.count(),
-
-      // High risk users
-      prisma.user.count({
-        where: {
-          risk_score: { gte: 10 }
-        }
-      })
-    ])
+    const dashboard = (await rollupDashboard()) ?? (await dashboardFromDatabase())
 
     // Get recent activity
     const recentActivity = await Promise.all([
@@ -152,57 +82,10 @@ export async function GET(request: NextRequest) {
       }))
     ].sort((a, b) => new Date(b.time).getTime() - new Date(a.time).getTime()).slice(0, 10)
 
-    // Get chart data for the last 7 days
-    const chartData = []
-    for (let i = 6; i >= 0; i--) {
-      const date = new Date(now.getTime() - i * 24 * 60 * 60 * 1000)
-      const dayStart = new Date(date.getFullYear(), date.getMonth(), date.getDate())
-      const dayEnd = new Date(dayStart.getTime() + 24 * 60 * 60 * 1000)
-      
-      const [visits, spins, revenue] = await Promise.all([
-        prisma.visit.count({
-          where: {
-            created_at: { gte: dayStart, lt: dayEnd },
-            status: 'confirmed'
-          }
-        }),
-        prisma.wheelSpin.count({
-          where: {
-            spun_at: { gte: dayStart, lt: dayEnd }
-          }
-        }),
-        prisma.visit.aggregate({
-          where: {
-            created_at: { gte: dayStart, lt: dayEnd },
-            status: 'confirmed',
-            bill_amount: { not: null }
-          },
-          _sum: { bill_amount: true }
-        })
-      ])
-      
-      chartData.push({
-        date: date.toISOString().split('T')[0],
-        visits,
-        spins,
-        revenue: revenue._sum.bill_amount || 0
-      })
-    }
-
     return NextResponse.json({
-      stats: {
-        todayVisits: stats[0],
-        weekVisits: stats[1],
-        monthRevenue: stats[2]._sum.bill_amount || 0,
-        activeUsers: stats[3],
-        pendingMusicOrders: stats[4],
-        todayWheelSpins: stats[5],
-        activeCoupons: stats[6],
-        totalUsers: stats[7],
-        highRiskUsers: stats[8]
-      },
+      stats: dashboard.stats,
       recentActivity: formattedActivity,
-      chartData
+      chartData: dashboard.chartData
     })
 
   } catch (error) {
@@ -211,6 +94,141 @@ export async function GET(request: NextRequest) {
   }
 }
 
+/**
+ * Stats and chart data straight from the database (no backend rollups)
+ */
+async function dashboardFromDatabase(): Promise<Dashboard> {
+  const now = new Date()
+  const todayStart = new Date(now.getFullYear(), now.getMonth(), now.getDate())
+  const weekStart = new Date(now.getTime() - 7 * 24 * 60 * 60 * 1000)
+  const monthStart = new Date(now.getFullYear(), now.getMonth(), 1)
+
+  // Get basic stats
+  const stats = await Promise.all([
+    // Today's visits
+    prisma.visit.count({
+      where: {
+        created_at: { gte: todayStart },
+        status: 'confirmed'
+      }
+    }),
+    
+    // Week's visits
+    prisma.visit.count({
+      where: {
+        created_at: { gte: weekStart },
+        status: 'confirmed'
+      }
+    }),
+    
+    // Month's revenue (sum of bill amounts)
+    prisma.visit.aggregate({
+      where: {
+        created_at: { gte: monthStart },
+        status: 'confirmed',
+        bill_amount: { not: null }
+      },
+      _sum: {
+        bill_amount: true
+      }
+    }),
+    
+    // Active users (logged in last 30 days)
+    prisma.user.count({
+      where: {
+        last_login: { gte: new Date(now.getTime() - 30 * 24 * 60 * 60 * 1000) }
+      }
+    }),
+    
+    // Pending music orders
+    prisma.musicOrder.count({
+      where: { status: 'pending' }
+    }),
+    
+    // Today's wheel spins
+    prisma.wheelSpin.count({
+      where: {
+        spun_at: { gte: todayStart }
+      }
+    }),
+    
+    // Active coupons
+    prisma.coupon.count({
+      where: {
+        expires_at: { gte: now },
+        redeemed_at: null
+      }
+    }),
+
+    // Total users
+    prisma.user.count(),
+
+    // High risk users
+    prisma.user.count({
+      where: {
+        risk_score: { gte: 10 }
+      }
+    })
+  ])
+
+  // Get chart data for the last 7 days
+  const chartData = []
+  for (let i = 6; i >= 0; i--) {
+    const date = new Date(now.getTime() - i * 24 * 60 * 60 * 1000)
+    const dayStart = new Date(date.getFullYear(), date.getMonth(), date.getDate())
+    const dayEnd = new Date(dayStart.getTime() + 24 * 60 * 60 * 1000)
+    
+    const [visits, spins, revenue] = await Promise.all([
+      prisma.visit.count({
+        where: {
+          created_at: { gte: dayStart, lt: dayEnd },
+          status: 'confirmed'
+        }
+      }),
+      prisma.wheelSpin.count({
+        where: {
+          spun_at: { gte: dayStart, lt: dayEnd }
+        }
+      }),
+      prisma.visit.aggregate({
+        where: {
+          created_at: { gte: dayStart, lt: dayEnd },
+          status: 'confirmed',
+          bill_amount: { not: null }
+        },
+        _sum: { bill_amount: true }
+      })
+    ])
+    
+    chartData.push({
+      // The local day the counts cover, as the backend rollups label it
+      date: [
+        dayStart.getFullYear(),
+        String(dayStart.getMonth() + 1).padStart(2, '0'),
+        String(dayStart.getDate()).padStart(2, '0')
+      ].join('-'),
+      visits,
+      spins,
+      revenue: revenue._sum.bill_amount || 0
+    })
+  }
+
+  return {
+    stats: {
+      todayVisits: stats[0],
+      weekVisits: stats[1],
+      monthRevenue: stats[2]._sum.bill_amount || 0,
+      activeUsers: stats[3],
+      pendingMusicOrders: stats[4],
+      todayWheelSpins: stats[5],
+      activeCoupons: stats[6],
+      totalUsers: stats[7],
+      highRiskUsers: stats[8]
+    },
+    chartData
+  }
+}
+
 function formatTimeAgo(date: Date): string {
   const now = new Date()
   const diffMs = now.getTime() - date.getTime()
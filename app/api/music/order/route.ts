@@ -2,6 +2,7 @@ import { NextRequest, NextResponse } from 'next/server'
 import { getServerSession } from 'next-auth'
 import { authOptions } from '@/pages/api/auth/[...nextauth]'
 import { prisma } from '@/lib/prisma'
+import { checkRateLimit, rateLimitResponse, recordRateLimit, requestIp } from '@/lib/rate-limit'
 import { v4 as uuidv4 } from 'uuid'
 
 export async function POST(request: NextRequest) {
@@ -12,6 +13,15 @@ export async function POST(request: NextRequest) {
       return NextResponse.json({ error: 'Authentication required' }, { status: 401 })
     }
 
+    // Limit floods before the user lookup; the order interval is re-checked in the database below
+    const limiterSubject = { userId: session.user.id, ip: requestIp(request) }
+    const limit = await checkRateLimit('music_order', limiterSubject)
+    if (!limit.allowed) {
+      return rateLimitResponse(limit, limit.retryAfter
+        ? `You can order another track in ${Math.ceil(limit.retryAfter / 60)} minutes`
+        : 'Too many requests')
+    }
+
     const user = await prisma.user.findUnique({
       where: { email: session.user.email }
     })
@@ -65,6 +75,8 @@ export async function POST(request: NextRequest) {
       }
     })
 
+    await recordRateLimit('music_order', limiterSubject)
+
     // Log admin action for tracking
     await prisma.adminLog.create({
       data: {
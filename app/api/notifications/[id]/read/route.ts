@@ -1,21 +1,28 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { getServerSession } from 'next-auth'
+import { authOptions } from '@/lib/auth-system'
+import { markNotificationRead } from '@/lib/notifications'
 
 export async function POST(
   req: NextRequest,
   { params }: { params: { id: string } }
 ) {
   try {
-    const session = await getServerSession()
+    const session = await getServerSession(authOptions)
     
-    if (!session) {
+    if (!session?.user?.id) {
       return NextResponse.json({ error: 'Unauthorized' }, { status: 401 })
     }
 
-    const notificationId = params.id
+    const notificationId = parseInt(params.id, 10)
+    if (!Number.isSafeInteger(notificationId)) {
+      return NextResponse.json({ error: 'Invalid notification id' }, { status: 400 })
+    }
 
-    // Mock implementation - replace with real database update
-    console.log(`Marking notification ${notificationId} as read`)
+    const updated = await markNotificationRead(session.user.id, session.user.role, notificationId)
+    if (!updated) {
+      return NextResponse.json({ error: 'Notification not found' }, { status: 404 })
+    }
 
     return NextResponse.json({ 
       success: true,
@@ -25,4 +32,4 @@ export async function POST(
     console.error('Error marking notification as read:', error)
     return NextResponse.json({ error: 'Internal server error' }, { status: 500 })
   }
-}
\ No newline at end of file
+}
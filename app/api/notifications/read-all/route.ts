@@ -1,23 +1,25 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { getServerSession } from 'next-auth'
+import { authOptions } from '@/lib/auth-system'
+import { markAllNotificationsRead } from '@/lib/notifications'
 
 export async function POST(req: NextRequest) {
   try {
-    const session = await getServerSession()
+    const session = await getServerSession(authOptions)
     
-    if (!session) {
+    if (!session?.user?.id) {
       return NextResponse.json({ error: 'Unauthorized' }, { status: 401 })
     }
 
-    // Mock implementation - replace with real database update
-    console.log('Marking all notifications as read')
+    const updated = await markAllNotificationsRead(session.user.id, session.user.role)
 
     return NextResponse.json({ 
       success: true,
+      updated,
       message: 'All notifications marked as read'
     })
   } catch (error) {
     console.error('Error marking all notifications as read:', error)
     return NextResponse.json({ error: 'Internal server error' }, { status: 500 })
   }
-}
\ No newline at end of file
+}
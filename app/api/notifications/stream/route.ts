@@ -0,0 +1,34 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { getServerSession } from 'next-auth'
+import { authOptions } from '@/lib/auth-system'
+import { openNotificationStream } from '@/lib/notifications'
+
+export const dynamic = 'force-dynamic'
+
+/**
+ * GET /api/notifications/stream
+ * Server-Sent Events relayed from the backend: `snapshot` on connect, then
+ * `notification`, `read` and `read_all`, each carrying the current unreadCount.
+ * 503 without a backend; clients fall back to polling /api/notifications.
+ */
+export async function GET(req: NextRequest) {
+  const session = await getServerSession(authOptions)
+
+  if (!session?.user?.id) {
+    return NextResponse.json({ error: 'Unauthorized' }, { status: 401 })
+  }
+
+  // Aborted when the browser disconnects, which closes the backend connection too
+  const upstream = await openNotificationStream(session.user.id, session.user.role, req.signal)
+  if (!upstream) {
+    return NextResponse.json({ error: 'Notification stream unavailable' }, { status: 503 })
+  }
+
+  return new Response(upstream.body, {
+    headers: {
+      'Content-Type': 'text/event-stream; charset=utf-8',
+      'Cache-Control': 'no-cache, no-transform',
+      'X-Accel-Buffering': 'no'
+    }
+  })
+}
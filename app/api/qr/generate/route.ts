@@ -1,17 +1,19 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { getServerSession } from 'next-auth'
 import { authOptions } from '@/lib/auth-system'
-import { QRSystem } from '@/lib/qr-system'
-import QRCode from 'qrcode'
+import { MAX_TTL_MINUTES, QRSystem } from '@/lib/qr-system'
+import { checkRateLimit, rateLimitResponse, requestIp } from '@/lib/rate-limit'
+import { renderQRImage } from '@/lib/qr-images'
 
 /**
  * POST /api/qr/generate
  * Generate a signed QR code for authenticated user
+ * Rate limited per user and per IP (qr_generate_per_minute, rate_limit_ip_per_minute)
  * 
  * Body:
  * - type: 'visit' | 'promo' | 'referral' | 'staff_check'
  * - subject?: string (optional custom description)
- * - ttlMinutes?: number (optional, defaults to env or 60)
+ * - ttlMinutes?: number (optional, defaults to env or 60; at most 30 days)
  * 
  * Returns:
  * - token: signed QR payload
@@ -30,6 +32,12 @@ export async function POST(req: NextRequest) {
     }
 
     const userId = session.user.id
+
+    const limit = await checkRateLimit('qr_generate', { userId, ip: requestIp(req) })
+    if (!limit.allowed) {
+      return rateLimitResponse(limit, 'Too many QR codes requested, try again later')
+    }
+
     const body = await req.json()
     const { type, subject, ttlMinutes } = body
 
@@ -42,6 +50,13 @@ export async function POST(req: NextRequest) {
       )
     }
 
+    if (!QRSystem.isValidTTL(ttlMinutes)) {
+      return NextResponse.json(
+        { error: `ttlMinutes must be a number of minutes within ±${MAX_TTL_MINUTES}` },
+        { status: 400 }
+      )
+    }
+
     // Check permissions (only admins can generate staff_check QRs)
     if (type === 'staff_check' && session.user.role !== 'admin') {
       return NextResponse.json(
@@ -59,21 +74,11 @@ export async function POST(req: NextRequest) {
     })
 
     // Parse expiration from token
-    const [payloadBase64] = token.split('.')
-    const payload = JSON.parse(Buffer.from(payloadBase64, 'base64url').toString())
-    const expiresAt = new Date(payload.exp * 1000).toISOString()
+    const { payload } = QRSystem.decodeToken(token)
+    const expiresAt = new Date(payload!.exp * 1000).toISOString()
 
     // Generate QR code image
-    const qrCodeDataUrl = await QRCode.toDataURL(token, {
-      errorCorrectionLevel: 'H',
-      type: 'image/png',
-      width: 400,
-      margin: 2,
-      color: {
-        dark: '#10B981',  // PANDA green
-        light: '#1F2937'  // Dark background
-      }
-    })
+    const qrCodeDataUrl = await renderQRImage(token)
 
     return NextResponse.json({
       success: true,
@@ -3,6 +3,7 @@ import { getServerSession } from 'next-auth'
 import { authOptions } from '@/lib/auth-system'
 import { QRSystem } from '@/lib/qr-system'
 import { prisma } from '@/lib/prisma'
+import { backendValidateQR } from '@/lib/qr-validation'
 
 /**
  * POST /api/qr/validate
@@ -50,8 +51,9 @@ export async function POST(req: NextRequest) {
       )
     }
 
-    // Validate QR code
-    const result = await QRSystem.validateQR(token, validatorId, validatorRole)
+    // Validate QR code (backend nonce cache when available)
+    const result = (await backendValidateQR(token, validatorId))
+      ?? (await QRSystem.validateQR(token, validatorId, validatorRole))
 
     if (!result.valid) {
       // Return validation error
@@ -1,11 +1,14 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { getServerSession } from 'next-auth'
+import { authOptions } from '@/lib/auth-system'
+import { prisma } from '@/lib/prisma'
+import { staffRatingRecorded } from '@/lib/staff-stats'
 
 export async function POST(req: NextRequest) {
   try {
-    const session = await getServerSession()
+    const session = await getServerSession(authOptions)
     
-    if (!session) {
+    if (!session?.user) {
       return NextResponse.json({ error: 'Unauthorized' }, { status: 401 })
     }
 
@@ -19,16 +22,36 @@ export async function POST(req: NextRequest) {
     }
 
     // Validate ratings
-    if (serviceRating < 1 || serviceRating > 5 || friendlinessRating < 1 || friendlinessRating > 5) {
+    if (![serviceRating, friendlinessRating].every(rating => Number.isInteger(rating) && rating >= 1 && rating <= 5)) {
       return NextResponse.json({ 
-        error: 'Ratings must be between 1 and 5' 
+        error: 'Ratings must be whole numbers between 1 and 5' 
       }, { status: 400 })
     }
 
     const avgRating = (serviceRating + friendlinessRating) / 2
 
-    // Mock implementation - replace with real database update
-    console.log(`Rating staff ${staffId}: service=${serviceRating}, friendliness=${friendlinessRating}, tip=${tipAmount || 0}`)
+    const staff = Number.isInteger(Number(staffId))
+      ? await prisma.staff.findUnique({ where: { id: Number(staffId) } })
+      : null
+    if (!staff) {
+      return NextResponse.json({ error: 'Staff member not found' }, { status: 404 })
+    }
+
+    // The rated visit's date when it is one of the user's visits, otherwise now
+    const visit = Number.isInteger(Number(visitId))
+      ? await prisma.visit.findFirst({ where: { id: Number(visitId), user_id: session.user.id } })
+      : null
+
+    await prisma.staffRating.create({
+      data: {
+        user_id: session.user.id,
+        staff_id: staff.id,
+        service_rating: serviceRating,
+        personality_rating: friendlinessRating,
+        visit_date: visit?.created_at ?? new Date()
+      }
+    })
+    await staffRatingRecorded(staff.id)
 
     // If high rating and tip, add bonus from establishment
     let establishmentBonus = 0
@@ -3,6 +3,7 @@ import { getServerSession } from 'next-auth'
 import { authOptions } from '@/pages/api/auth/[...nextauth]'
 import { prisma } from '@/lib/prisma'
 import { TipsManager } from '@/lib/tips'
+import { staffTipRecorded } from '@/lib/staff-stats'
 
 // POST /api/tips/send - записать чаевые в систему (не обрабатывать платеж)
 export async function POST(request: NextRequest) {
@@ -46,14 +47,7 @@ export async function POST(request: NextRequest) {
     })
 
     // Update staff tips total
-    await prisma.staff.update({
-      where: { id: staff_id },
-      data: {
-        tips_total: {
-          increment: amount
-        }
-      }
-    })
+    await staffTipRecorded(staff_id, amount)
 
     // Generate response with copy text and thank you message
     const copyText = TipsManager.generateCopyText(staff, amount)
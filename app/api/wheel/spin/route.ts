@@ -1,8 +1,11 @@
-import { NextRequest, NextResponse } from 'next/server'
+import { NextRequest } from 'next/server'
 import { getServerSession } from 'next-auth'
 import { authOptions } from '@/lib/auth-system'
 import { prisma } from '@/lib/prisma'
 import { logger } from '@/lib/logger'
+import { ServerTiming } from '@/lib/server-timing'
+import { checkRateLimit, rateLimitResponse, recordRateLimit, requestIp } from '@/lib/rate-limit'
+import { wheelSpinRecorded } from '@/lib/wheel-cooldown'
 
 /**
  * POST /api/wheel/spin
@@ -11,13 +14,15 @@ import { logger } from '@/lib/logger'
  * 
  * FSM States: LOCKED -> READY -> SPINNING -> RESULT -> COOLDOWN
  * Cooldown: 7 days between spins
- * Anti-abuse: IP tracking, audit logging
+ * Anti-abuse: in-memory rate limit (spins per day, attempts per user / IP), IP tracking, audit logging
+ * Timing: per-phase Server-Timing header, requestId in X-Request-Id
  */
 export async function POST(req: NextRequest) {
-  const requestId = Math.random().toString(36).substring(7)
+  const timing = new ServerTiming()
+  const requestId = timing.requestId
   
   try {
-    const session = await getServerSession(authOptions)
+    const session = await timing.time('session', () => getServerSession(authOptions))
     
     if (!session?.user?.id) {
       logger.warn({
@@ -25,7 +30,7 @@ export async function POST(req: NextRequest) {
         details: { requestId }
       })
       
-      return NextResponse.json(
+      return timing.json(
         { success: false, error: 'Unauthorized', message: 'Потрібна авторизація' },
         { status: 401 }
       )
@@ -42,11 +47,26 @@ export async function POST(req: NextRequest) {
       details: { requestId }
     })
 
+    // ANTI-ABUSE: Rate limit before any database work
+    const limiterSubject = { userId, ip: requestIp(req) }
+    const limit = await timing.time('ratelimit', () => checkRateLimit('wheel_spin', limiterSubject))
+
+    if (!limit.allowed) {
+      logger.warn({
+        userId,
+        action: 'wheel_spin_rate_limited',
+        ip: clientIp,
+        details: { rule: limit.rule, retryAfter: limit.retryAfter, requestId }
+      })
+
+      return timing.apply(rateLimitResponse(limit, 'Забагато спроб. Спробуйте пізніше', { success: false }))
+    }
+
     // ANTI-ABUSE: Check last spin
-    const lastSpin = await prisma.wheelSpin.findFirst({
+    const lastSpin = await timing.time('cooldown', () => prisma.wheelSpin.findFirst({
       where: { user_id: userId },
       orderBy: { spun_at: 'desc' }
-    })
+    }))
 
     const now = new Date()
 
@@ -59,7 +79,7 @@ export async function POST(req: NextRequest) {
         const hoursLeft = Math.floor((timeLeft % (1000 * 60 * 60 * 24)) / (1000 * 60 * 60))
         
         // Log abuse attempt with structured logging
-        await logger.auditLog(prisma, {
+        await timing.time('audit', () => logger.auditLog(prisma, {
           userId,
           action: 'wheel_spin_blocked',
           entityType: 'WheelSpin',
@@ -72,7 +92,7 @@ export async function POST(req: NextRequest) {
             lastSpinId: lastSpin.id,
             requestId
           }
-        })
+        }))
         
         logger.warn({
           userId,
@@ -85,7 +105,7 @@ export async function POST(req: NextRequest) {
           }
         })
 
-        return NextResponse.json(
+        return timing.json(
           {
             success: false,
             error: 'COOLDOWN_ACTIVE',
@@ -102,9 +122,9 @@ export async function POST(req: NextRequest) {
     }
 
     // Get active prizes
-    const activePrizes = await prisma.wheelPrize.findMany({
+    const activePrizes = await timing.time('prizes', () => prisma.wheelPrize.findMany({
       where: { is_active: true }
-    })
+    }))
 
     if (activePrizes.length === 0) {
       logger.error({
@@ -113,7 +133,7 @@ export async function POST(req: NextRequest) {
         details: { requestId }
       })
       
-      return NextResponse.json(
+      return timing.json(
         {
           success: false,
           error: 'NO_PRIZES',
@@ -136,7 +156,7 @@ export async function POST(req: NextRequest) {
         }
       })
       
-      return NextResponse.json(
+      return timing.json(
         {
           success: false,
           error: 'INVALID_PRIZE_CONFIG',
@@ -178,9 +198,9 @@ export async function POST(req: NextRequest) {
     const nextAllowedAt = new Date(now.getTime() + 7 * 24 * 60 * 60 * 1000)
 
     // TRANSACTION: Create spin record + update prize counter + create coupon
-    const result = await prisma.$transaction(async (tx) => {
+    const result = await timing.time('tx', () => prisma.$transaction(async (tx) => {
       // 1. Record the spin
-      const spin = await tx.wheelSpin.create({
+      const spin = await timing.time('tx.spin', () => tx.wheelSpin.create({
         data: {
           user_id: userId,
           prize_id: selectedPrize.id,
@@ -189,14 +209,14 @@ export async function POST(req: NextRequest) {
           next_allowed_at: nextAllowedAt,
           ip: clientIp
         }
-      })
+      }))
 
       // 2. Update prize counter if has limit
       if (selectedPrize.max_per_period) {
-        await tx.wheelPrize.update({
+        await timing.time('tx.prize', () => tx.wheelPrize.update({
           where: { id: selectedPrize.id },
           data: { current_count: { increment: 1 } }
-        })
+        }))
       }
 
       // 3. Create coupon/promo for the user (7 days validity)
@@ -205,7 +225,7 @@ export async function POST(req: NextRequest) {
         const couponCode = `WHEEL${Date.now().toString(36).toUpperCase()}`
         const expiresAt = new Date(now.getTime() + 7 * 24 * 60 * 60 * 1000) // 7 days
 
-        coupon = await tx.coupon.create({
+        coupon = await timing.time('tx.coupon', () => tx.coupon.create({
           data: {
             user_id: userId,
             type: selectedPrize.type,
@@ -214,11 +234,11 @@ export async function POST(req: NextRequest) {
             code: couponCode,
             expires_at: expiresAt
           }
-        })
+        }))
       }
 
       // 4. Log the action to audit trail
-      await tx.auditLog.create({
+      await timing.time('tx.audit', () => tx.auditLog.create({
         data: {
           user_id: userId,
           action: 'wheel_spin_success',
@@ -237,10 +257,13 @@ export async function POST(req: NextRequest) {
           ip_address: clientIp,
           user_agent: userAgent
         }
-      })
+      }))
 
       return { spin, coupon }
-    })
+    }))
+
+    await timing.time('ratelimit.record', () => recordRateLimit('wheel_spin', limiterSubject))
+    await timing.time('cooldown.notify', () => wheelSpinRecorded(userId, nextAllowedAt, selectedPrize.name))
     
     // Structured logging for successful spin
     logger.info({
@@ -257,7 +280,7 @@ export async function POST(req: NextRequest) {
       }
     })
 
-    return NextResponse.json({
+    return timing.json({
       success: true,
       prize: {
         id: selectedPrize.id,
@@ -313,7 +336,7 @@ export async function POST(req: NextRequest) {
       })
     }
 
-    return NextResponse.json(
+    return timing.json(
       { 
         success: false,
         error: 'INTERNAL_ERROR',
@@ -3,12 +3,14 @@ import { getServerSession } from 'next-auth'
 import { authOptions } from '@/lib/auth-system'
 import { prisma } from '@/lib/prisma'
 import { logger } from '@/lib/logger'
+import { cachedWheelStatus } from '@/lib/wheel-cooldown'
 
 /**
  * GET /api/wheel/status
  * Check if user can spin the wheel
  * FSM States: LOCKED (not authenticated) | READY (can spin) | COOLDOWN (must wait)
  * Returns: { canSpin: boolean, state: string, nextSpinDate?: Date, lastPrize?: string, timeLeft?: object }
+ * Answered from the backend's cooldown cache when available (lib/wheel-cooldown.ts)
  */
 export async function GET(req: NextRequest) {
   try {
@@ -32,6 +34,11 @@ export async function GET(req: NextRequest) {
 
     const userId = session.user.id
 
+    const cached = await cachedWheelStatus(userId)
+    if (cached) {
+      return NextResponse.json(cached)
+    }
+
     // Get user's last spin
     const lastSpin = await prisma.wheelSpin.findFirst({
       where: { user_id: userId },
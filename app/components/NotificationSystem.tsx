@@ -10,6 +10,7 @@ interface Notification {
   timestamp: string
   read: boolean
   priority: string
+  actionUrl?: string
 }
 
 interface NotificationContextType {
@@ -42,28 +43,66 @@ export function NotificationProvider({ children }: NotificationProviderProps) {
   const [unreadCount, setUnreadCount] = useState(0)
 
   useEffect(() => {
-    if (session) {
+    if (!session) {
+      return
+    }
+
+    // Pushed updates from the backend; polling when the stream is unavailable
+    let interval: ReturnType<typeof setInterval> | undefined
+    const startPolling = () => {
       fetchNotifications()
-      
-      // Set up real-time updates with WebSocket or polling
-      const interval = setInterval(() => {
+      interval = interval || setInterval(() => {
         fetchNotifications()
       }, 30000) // Poll every 30 seconds
+    }
 
+    if (typeof EventSource === 'undefined') {
+      startPolling()
       return () => clearInterval(interval)
     }
-  }, [session])
 
-  useEffect(() => {
-    setUnreadCount(notifications.filter(n => !n.read).length)
-  }, [notifications])
+    const source = new EventSource('/api/notifications/stream')
+    const listen = (event: string, handler: (data: any) => void) => {
+      source.addEventListener(event, (e) => handler(JSON.parse((e as MessageEvent).data)))
+    }
+
+    listen('snapshot', (data) => {
+      setNotifications(data.notifications)
+      setUnreadCount(data.unreadCount)
+    })
+    listen('notification', ({ unreadCount, ...notification }) => {
+      setNotifications(prev => prev.some(n => n.id === notification.id) ? prev : [notification, ...prev])
+      setUnreadCount(unreadCount)
+    })
+    listen('read', ({ id, unreadCount }) => {
+      setNotifications(prev => prev.map(n => n.id === id ? { ...n, read: true } : n))
+      setUnreadCount(unreadCount)
+    })
+    listen('read_all', ({ unreadCount }) => {
+      setNotifications(prev => prev.map(n => ({ ...n, read: true })))
+      setUnreadCount(unreadCount)
+    })
+    // EventSource reconnects by itself; CLOSED means the route refused the stream (e.g. 503)
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) {
+        startPolling()
+      }
+    }
+
+    return () => {
+      source.close()
+      clearInterval(interval)
+    }
+  }, [session])
 
   const fetchNotifications = async () => {
     try {
       const response = await fetch('/api/notifications')
       if (response.ok) {
         const data = await response.json()
-        setNotifications(data.notifications || [])
+        const list: Notification[] = data.notifications || []
+        setNotifications(list)
+        setUnreadCount(data.unreadCount ?? list.filter(n => !n.read).length)
       }
     } catch (error) {
       console.error('Error fetching notifications:', error)
@@ -79,6 +118,7 @@ export function NotificationProvider({ children }: NotificationProviderProps) {
     }
     
     setNotifications(prev => [newNotification, ...prev])
+    setUnreadCount(count => count + 1)
     
     // Show browser notification if permitted
     if ('Notification' in window && Notification.permission === 'granted') {
@@ -101,9 +141,13 @@ export function NotificationProvider({ children }: NotificationProviderProps) {
       })
       
       if (response.ok) {
+        const wasUnread = notifications.some(n => n.id === id && !n.read)
         setNotifications(prev =>
           prev.map(n => n.id === id ? { ...n, read: true } : n)
         )
+        if (wasUnread) {
+          setUnreadCount(count => Math.max(0, count - 1))
+        }
       }
     } catch (error) {
       console.error('Error marking notification as read:', error)
@@ -118,6 +162,7 @@ export function NotificationProvider({ children }: NotificationProviderProps) {
       
       if (response.ok) {
         setNotifications(prev => prev.map(n => ({ ...n, read: true })))
+        setUnreadCount(0)
       }
     } catch (error) {
       console.error('Error marking all as read:', error)
@@ -131,6 +176,9 @@ export function NotificationProvider({ children }: NotificationProviderProps) {
       })
       
       if (response.ok) {
+        if (notifications.some(n => n.id === id && !n.read)) {
+          setUnreadCount(count => Math.max(0, count - 1))
+        }
         setNotifications(prev => prev.filter(n => n.id !== id))
       }
     } catch (error) {
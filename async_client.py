@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Asyncio HTTP client for the PANDA Lounge test harnesses
+A small HTTP/1.1 client on asyncio streams, so one process can keep
+thousands of requests in flight instead of one thread per request:
+- keep-alive connections pooled per origin and shared between sessions
+- a bounded semaphore caps the requests in flight across all sessions
+- requests.Session-like surface (cookies, default headers, json=/data=/
+  params=, status_code/json()/text on the response)
+- AsyncAPIClient keeps the harnesses' authenticate_user/make_api_request
+  semantics; logins still go through SessionPool, so cached NextAuth
+  cookies are shared with the blocking testers
+
+Redirects are not followed (the harnesses never rely on them for API calls).
+"""
+
+import asyncio
+import json as jsonlib
+import ssl
+import time
+from collections import deque
+from urllib.parse import urlencode, urlsplit
+
+from event_recorder import get_recorder
+from server_timing import timing_fields
+
+# Configuration
+MAX_IN_FLIGHT = 256
+POOL_MAXSIZE = 256
+KEEP_ALIVE_TIMEOUT = 30
+REQUEST_TIMEOUT = 30
+MAX_HEADER_LINES = 200
+
+
+class AsyncResponse:
+    __slots__ = ("status_code", "reason", "headers", "content", "url", "elapsed")
+
+    def __init__(self, status_code, reason, headers, content, url, elapsed):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.url = url
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+
+class _Connection:
+    __slots__ = ("origin", "reader", "writer", "idle_since", "reused")
+
+    def __init__(self, origin, reader, writer):
+        self.origin = origin
+        self.reader = reader
+        self.writer = writer
+        self.idle_since = time.monotonic()
+        self.reused = False
+
+    def usable(self):
+        return (
+            not self.reader.at_eof()
+            and not self.writer.is_closing()
+            and time.monotonic() - self.idle_since < KEEP_ALIVE_TIMEOUT
+        )
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool:
+    """Idle keep-alive connections per (scheme, host, port)"""
+
+    def __init__(self, maxsize=POOL_MAXSIZE):
+        self.maxsize = maxsize
+        self.opened = 0
+        self.reused = 0
+        self._idle = {}
+
+    async def acquire(self, origin):
+        idle = self._idle.get(origin)
+        while idle:
+            conn = idle.pop()
+            if conn.usable():
+                conn.reused = True
+                self.reused += 1
+                return conn
+            conn.close()
+
+        scheme, host, port = origin
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=ssl.create_default_context() if scheme == "https" else None
+        )
+        self.opened += 1
+        return _Connection(origin, reader, writer)
+
+    def release(self, conn, reusable):
+        idle = self._idle.setdefault(conn.origin, deque())
+        if not reusable or len(idle) >= self.maxsize:
+            conn.close()
+            return
+        conn.idle_since = time.monotonic()
+        conn.reused = False
+        idle.append(conn)
+
+    def close(self):
+        for idle in self._idle.values():
+            while idle:
+                idle.pop().close()
+
+
+class AsyncHTTPClient:
+    """Cookie-keeping HTTP/1.1 session on a shared pool and in-flight limit"""
+
+    def __init__(self, headers=None, pool=None, limiter=None, max_in_flight=MAX_IN_FLIGHT, timeout=REQUEST_TIMEOUT):
+        self.headers = dict(headers or {})
+        self.cookies = {}
+        self.pool = pool or ConnectionPool()
+        self.limiter = limiter or asyncio.BoundedSemaphore(max_in_flight)
+        self.timeout = timeout
+        self._owns_pool = pool is None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def child(self, headers=None):
+        """New session (own cookies) sharing this one's pool and limiter"""
+        return AsyncHTTPClient({**self.headers, **(headers or {})}, self.pool, self.limiter, timeout=self.timeout)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def request(self, method, url, json=None, data=None, params=None, headers=None):
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        origin = (scheme, parts.hostname, parts.port or (443 if scheme == "https" else 80))
+        target = parts.path or "/"
+        query = "&".join(q for q in (parts.query, urlencode(params) if params else "") if q)
+        if query:
+            target += f"?{query}"
+
+        body = b""
+        request_headers = {**self.headers, **(headers or {})}
+        if json is not None:
+            body = jsonlib.dumps(json).encode()
+            request_headers["Content-Type"] = "application/json"
+        elif isinstance(data, dict):
+            body = urlencode(data).encode()
+            request_headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif data is not None:
+            body = data if isinstance(data, bytes) else str(data).encode()
+
+        request_headers["Host"] = parts.netloc
+        request_headers["Content-Length"] = str(len(body))
+        request_headers.setdefault("Connection", "keep-alive")
+        if self.cookies:
+            request_headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        head = f"{method.upper()} {target} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in request_headers.items())
+        payload = (head + "\r\n").encode("latin-1") + body
+
+        async with self.limiter:
+            started = time.perf_counter()
+            response = await asyncio.wait_for(self._exchange(origin, payload, method.upper()), self.timeout)
+            response.url = url
+            response.elapsed = time.perf_counter() - started
+        self._store_cookies(response.headers.get("set-cookie", []))
+        return response
+
+    async def close(self):
+        if self._owns_pool:
+            self.pool.close()
+
+    async def _exchange(self, origin, payload, method):
+        # A pooled connection the server already closed fails before any response
+        # bytes arrive; that is safe to retry once on a fresh connection
+        for attempt in range(2):
+            conn = await self.pool.acquire(origin)
+            try:
+                conn.writer.write(payload)
+                await conn.writer.drain()
+                response, reusable = await self._read_response(conn.reader, method)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                conn.close()
+                if conn.reused and attempt == 0 and not getattr(e, "partial", b""):
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            self.pool.release(conn, reusable)
+            return response
+
+    async def _read_response(self, reader, method):
+        status_line = (await reader.readuntil(b"\r\n")).decode("latin-1").rstrip()
+        _, status, *reason = status_line.split(" ", 2)
+        headers = {"set-cookie": []}
+        for _ in range(MAX_HEADER_LINES):
+            line = (await reader.readuntil(b"\r\n")).decode("latin-1").rstrip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            name, value = name.strip().lower(), value.strip()
+            if name == "set-cookie":
+                headers["set-cookie"].append(value)
+            else:
+                headers[name] = value
+
+        status = int(status)
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            content = b""
+        elif "chunked" in headers.get("transfer-encoding", "").lower():
+            content = await self._read_chunked(reader)
+        elif "content-length" in headers:
+            content = await reader.readexactly(int(headers["content-length"]))
+        else:
+            content = await reader.read()
+            keep_alive = False
+        return AsyncResponse(status, reason[0] if reason else "", headers, content, None, 0.0), keep_alive
+
+    async def _read_chunked(self, reader):
+        chunks = []
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if size == 0:
+                # Skip trailers up to the final empty line
+                while (await reader.readuntil(b"\r\n")) != b"\r\n":
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    def _store_cookies(self, set_cookies):
+        for header in set_cookies:
+            pair, *attributes = header.split(";")
+            name, _, value = pair.strip().partition("=")
+            expired = any(a.strip().lower() in ("max-age=0", "max-age=-1") for a in attributes)
+            if expired or not value:
+                self.cookies.pop(name, None)
+            else:
+                self.cookies[name] = value
+
+
+class AsyncAPIClient:
+    """The harnesses' authenticate_user/make_api_request, awaitable.
+
+    One instance acts as one user at a time, like a tester's session;
+    session() hands out independent per-user clients on the same pool.
+    """
+
+    def __init__(self, pool, base_url, source="async", headers=None, max_in_flight=MAX_IN_FLIGHT):
+        self.pool = pool
+        self.base_url = base_url
+        self.source = source
+        self.http = AsyncHTTPClient(headers or pool.headers, max_in_flight=max_in_flight)
+        self.recorder = get_recorder()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def log(self, message, level="INFO", **fields):
+        self.recorder.record(level, message, source=self.source, **fields)
+
+    async def cookies(self, user_key):
+        """SessionPool's cached login for user_key as a plain dict (None if login fails)"""
+        jar = await asyncio.to_thread(self.pool.cookies, user_key)
+        return None if jar is None else {cookie.name: cookie.value for cookie in jar}
+
+    async def authenticate_user(self, user_key):
+        """Switch this client to user_key using the pool's cached login"""
+        cookies = await self.cookies(user_key)
+        if cookies is None:
+            self.log(f"Authentication failed for {self.pool.users[user_key]['email']}", "ERROR")
+            return False
+        self.http.cookies = cookies
+        return True
+
+    async def session(self, user_key=None):
+        """Independent client for user_key sharing this client's connections and limit"""
+        client = self.http.child()
+        if user_key is not None:
+            cookies = await self.cookies(user_key)
+            if cookies is None:
+                return None
+            client.cookies = cookies
+        return client
+
+    async def make_api_request(self, method, endpoint, data=None, http=None):
+        """Make authenticated API request"""
+        url = f"{self.base_url}{endpoint}"
+        http = http or self.http
+        try:
+            if method.upper() == "POST":
+                response = await http.post(url, json=data)
+            elif method.upper() == "GET":
+                response = await http.get(url)
+            else:
+                raise ValueError(f"Unsupported method: {method}")
+
+            self.log(f"{method} {endpoint} -> {response.status_code}",
+                     method=method, endpoint=endpoint, status=response.status_code, **timing_fields(response))
+            if response.status_code >= 400:
+                self.log(f"Error response: {response.text}", "ERROR", endpoint=endpoint, status=response.status_code)
+            return response
+
+        except Exception as e:
+            self.log(f"API request error: {e!r}", "ERROR")
+            return None
+
+    async def fan_out(self, count, request):
+        """Run request(i) for i in range(count) concurrently; results in order (exceptions included)"""
+        return await asyncio.gather(*(request(i) for i in range(count)), return_exceptions=True)
+
+    async def close(self):
+        await self.http.close()
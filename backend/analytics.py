@@ -0,0 +1,365 @@
+"""
+Analytics for the PANDA Lounge admin dashboard.
+
+Replaces the mock data of /api/analytics with figures computed from Visit,
+Tip, PromoUsage, StaffRating and MenuItem:
+- event tables are streamed out of SQLite into NumPy column arrays once and
+  then extended past a rowid watermark, so refreshes only read new rows
+- arrays are kept sorted by time, so a range is a searchsorted slice and
+  day buckets are cumulative-sum differences; the remaining group-bys
+  (hour, user, staff, promo source) are single bincount passes
+- reports are cached per range and invalidated when a watermark moves or
+  the local day changes
+
+The schema has no visit durations, so overview.avgVisitDuration stays 0.
+MenuItem order/like counters are lifetime totals and are not range-bound.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import db
+
+logger = logging.getLogger("panda.analytics")
+
+# Configuration
+ANALYTICS_REFRESH_INTERVAL = float(os.environ.get("ANALYTICS_REFRESH_MS", "5000")) / 1000
+STREAM_CHUNK = 50000
+
+HOUR_MS = 60 * 60 * 1000
+
+RANGES = {"7d": 7, "30d": 30, "3m": 90, "1y": 365}
+DEFAULT_RANGE = "7d"
+
+CATEGORY_NAMES = {
+    "hookah": "Кальяни",
+    "cocktails": "Коктейлі",
+    "drinks": "Напої",
+    "kitchen": "Кухня",
+    "tea": "Чай",
+}
+
+# Event tables: rowid, integer columns..., optional string column to dictionary-encode
+EVENT_TABLES = {
+    "visits": (
+        'SELECT rowid, created_at, status = \'confirmed\', COALESCE(bill_amount, -1), user_id '
+        'FROM "Visit" WHERE rowid > ? ORDER BY rowid LIMIT ?',
+        ("created_at", "confirmed", "bill"),
+        "user",
+    ),
+    "tips": (
+        'SELECT rowid, created_at, amount, staff_id FROM "Tip" WHERE rowid > ? ORDER BY rowid LIMIT ?',
+        ("created_at", "amount", "staff_id"),
+        None,
+    ),
+    "promo": (
+        'SELECT u.rowid, u.used_at, COALESCE(u.order_amount, 0), COALESCE(u.discount_amount, 0), c.source '
+        'FROM "PromoUsage" u JOIN "PromoCode" c ON c.id = u.code_id WHERE u.rowid > ? ORDER BY u.rowid LIMIT ?',
+        ("used_at", "order_amount", "discount"),
+        "source",
+    ),
+    "ratings": (
+        'SELECT rowid, created_at, staff_id, service_rating, personality_rating '
+        'FROM "StaffRating" WHERE rowid > ? ORDER BY rowid LIMIT ?',
+        ("created_at", "staff_id", "service", "personality"),
+        None,
+    ),
+}
+
+
+class ColumnTable:
+    """Integer columns of one append-only table, held as NumPy arrays.
+
+    The first column is the row's timestamp; all arrays are kept ordered by
+    it (rows normally arrive in time order, so re-sorting is rare).
+    """
+
+    def __init__(self, name, sql, columns, encoded=None):
+        self.name = name
+        self.sql = sql
+        self.columns = columns
+        self.encoded = encoded
+        self.arrays = {column: np.empty(0, dtype=np.int64) for column in columns}
+        if encoded:
+            self.arrays[encoded] = np.empty(0, dtype=np.int64)
+        self.labels = []
+        self.codes = {}
+        self.last_rowid = 0
+
+    def __len__(self):
+        return len(self.arrays[self.columns[0]])
+
+    def stream(self, conn, chunk=STREAM_CHUNK):
+        """Append rows past last_rowid; returns how many were read"""
+        pieces = {column: [] for column in self.arrays}
+        read = 0
+        while True:
+            rows = conn.execute(self.sql, (self.last_rowid, chunk)).fetchall()
+            if not rows:
+                break
+            transposed = list(zip(*rows))
+            for i, column in enumerate(self.columns, start=1):
+                pieces[column].append(np.fromiter(transposed[i], dtype=np.int64, count=len(rows)))
+            if self.encoded:
+                codes, labels = self.codes, self.labels
+                encoded = np.empty(len(rows), dtype=np.int64)
+                for j, value in enumerate(transposed[-1]):
+                    code = codes.get(value)
+                    if code is None:
+                        code = codes[value] = len(labels)
+                        labels.append(value)
+                    encoded[j] = code
+                pieces[self.encoded].append(encoded)
+            self.last_rowid = rows[-1][0]
+            read += len(rows)
+            if len(rows) < chunk:
+                break
+
+        if read:
+            for column, chunks in pieces.items():
+                self.arrays[column] = np.concatenate([self.arrays[column], *chunks])
+            times = self.arrays[self.columns[0]]
+            if (np.diff(times) < 0).any():
+                order = np.argsort(times, kind="stable")
+                for column in self.arrays:
+                    self.arrays[column] = self.arrays[column][order]
+        return read
+
+    def window(self, start_ms, end_ms):
+        """Views of every column for rows with start_ms <= time < end_ms"""
+        lo, hi = np.searchsorted(self.arrays[self.columns[0]], (start_ms, end_ms))
+        return {column: values[lo:hi] for column, values in self.arrays.items()}
+
+
+def local_day_starts(first_day, days):
+    """Local-midnight timestamps (ms) for `days` days from `first_day`, plus the end"""
+    return np.array([
+        int(datetime.combine(first_day + timedelta(days=i), datetime.min.time()).timestamp() * 1000)
+        for i in range(days + 1)
+    ], dtype=np.int64)
+
+
+def percentages(amounts):
+    total = sum(amounts)
+    return [round(a / total * 100, 1) if total else 0.0 for a in amounts]
+
+
+class AnalyticsEngine:
+    """Column store plus per-range report cache behind GET /api/analytics.
+
+    Reading SQLite and computing reports both run on one dedicated thread,
+    so the arrays are never replaced while a report is being computed.
+    """
+
+    def __init__(self, db_path=None, chunk=STREAM_CHUNK):
+        self.db_path = db_path
+        self.chunk = chunk
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analytics")
+        self.tables = {name: ColumnTable(name, *spec) for name, spec in EVENT_TABLES.items()}
+        self.menu = []
+        self.staff = {}
+        self.version = 0
+        self.stats = {"refreshes": 0, "rows_streamed": 0, "reports_computed": 0, "cache_hits": 0}
+        self._cache = {}
+        self._conn = None
+
+    async def start(self):
+        rows = await self.refresh()
+        logger.info(f"Analytics loaded {rows} rows ({', '.join(f'{n}: {len(t)}' for n, t in self.tables.items())})")
+
+    async def close(self):
+        self.executor.submit(self._close_connection).result()
+        self.executor.shutdown(wait=True)
+
+    async def refresh(self):
+        """Stream new rows and reload the reference tables; returns rows read"""
+        loop = asyncio.get_running_loop()
+        rows, changed = await loop.run_in_executor(self.executor, self._refresh)
+        if changed:
+            self.version += 1
+        self.stats["refreshes"] += 1
+        self.stats["rows_streamed"] += rows
+        return rows
+
+    async def report(self, range_key=DEFAULT_RANGE, now_ms=None):
+        """Analytics payload for one range, cached until the data or the day changes"""
+        if range_key not in RANGES:
+            raise ValueError(f"Unknown range {range_key!r}, expected one of {', '.join(RANGES)}")
+        now_ms = db.now_ms() if now_ms is None else now_ms
+        today = datetime.fromtimestamp(now_ms / 1000).date()
+        key = (self.version, today)
+
+        cached = self._cache.get(range_key)
+        if cached is not None and cached[0] == key:
+            self.stats["cache_hits"] += 1
+            return cached[1]
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.executor, self.compute, range_key, today)
+        self._cache[range_key] = (key, result)
+        self.stats["reports_computed"] += 1
+        return result
+
+    def compute(self, range_key, today):
+        """Build the full report for the `range_key` days ending today (inclusive)"""
+        days = RANGES[range_key]
+        first_day = today - timedelta(days=days - 1)
+        starts = local_day_starts(first_day, days)
+        dates = [(first_day + timedelta(days=i)).isoformat() for i in range(days)]
+
+        visits = self.tables["visits"].window(starts[0], starts[-1])
+        confirmed = visits["confirmed"].astype(bool)
+        visit_times = visits["created_at"][confirmed]
+        bills = visits["bill"][confirmed]
+        users = visits["user"][confirmed]
+
+        # Sorted timestamps: per-day counts and sums are differences at the day boundaries
+        bounds = np.searchsorted(visit_times, starts)
+        visits_by_day = np.diff(bounds)
+        paid = bills.clip(min=0)
+        revenue_by_day = np.diff(np.concatenate(([0], np.cumsum(paid)))[bounds])
+        day_start = np.repeat(starts[:-1], visits_by_day)
+        visits_by_hour = np.bincount(np.minimum((visit_times - day_start) // HOUR_MS, 23), minlength=24)
+
+        total_visits = len(visit_times)
+        total_revenue = int(paid.sum())
+        billed = int((bills >= 0).sum())
+        per_user = np.bincount(users, minlength=len(self.tables["visits"].labels))
+        unique_visitors = int(np.count_nonzero(per_user))
+
+        tips = self.tables["tips"].window(starts[0], starts[-1])
+        tip_total = int(tips["amount"].sum())
+        tip_sums = np.bincount(tips["staff_id"], weights=tips["amount"]) if tip_total else np.zeros(0)
+        tips_by_staff = {int(s): int(a) for s, a in enumerate(tip_sums) if a}
+
+        ratings = self.tables["ratings"].window(starts[0], starts[-1])
+        rating_scores = (ratings["service"] + ratings["personality"]) / 2
+        rating_bounds = np.searchsorted(ratings["created_at"], starts)
+        rating_count_by_day = np.diff(rating_bounds)
+        rating_sum_by_day = np.diff(np.concatenate(([0.0], np.cumsum(rating_scores)))[rating_bounds])
+        rating_counts = np.bincount(ratings["staff_id"])
+        rating_sums = np.bincount(ratings["staff_id"], weights=rating_scores)
+
+        promo = self.tables["promo"]
+        promos = promo.window(starts[0], starts[-1])
+        source_counts = np.bincount(promos["source"], minlength=len(promo.labels))
+        promo_orders_by_day = np.diff(np.searchsorted(promos["used_at"], starts))
+
+        staff_rows = []
+        for staff_id, name in self.staff.items():
+            count = int(rating_counts[staff_id]) if staff_id < len(rating_counts) else 0
+            staff_rows.append({
+                "name": name,
+                "avgRating": round(float(rating_sums[staff_id] / count), 2) if count else 0,
+                "totalRatings": count,
+                "tips": tips_by_staff.get(staff_id, 0),
+            })
+        staff_rows.sort(key=lambda s: (s["avgRating"], s["totalRatings"]), reverse=True)
+        top_tipped = sorted(tips_by_staff.items(), key=lambda item: item[1], reverse=True)
+
+        by_category = {}
+        for item in self.menu:
+            bucket = by_category.setdefault(item["category"], [0, 0])
+            bucket[0] += item["order_count"]
+            bucket[1] += item["order_count"] * item["price"]
+        categories = sorted(by_category.items(), key=lambda c: c[1][1], reverse=True)
+        category_share = percentages([revenue for _, (_, revenue) in categories])
+        items = sorted(self.menu, key=lambda i: i["order_count"], reverse=True)
+        sources = [(promo.labels[i], int(c)) for i, c in enumerate(source_counts) if c]
+        source_share = percentages([c for _, c in sources])
+
+        created_count = len(visits["created_at"])
+        return {
+            "range": range_key,
+            "overview": {
+                "totalVisits": total_visits,
+                "uniqueVisitors": unique_visitors,
+                "avgVisitDuration": 0,
+                "conversionRate": round(total_visits / created_count * 100, 1) if created_count else 0.0,
+                "totalRevenue": total_revenue,
+                # Share of visitors who came only once in the range
+                "bounceRate": round(int((per_user == 1).sum()) / unique_visitors * 100, 1) if unique_visitors else 0.0,
+            },
+            "visits": {
+                "byDay": [{"date": d, "count": int(c)} for d, c in zip(dates, visits_by_day)],
+                "byHour": [{"hour": h, "count": int(c)} for h, c in enumerate(visits_by_hour)],
+                "sources": [
+                    {"source": s, "count": c, "percentage": p} for (s, c), p in zip(sources, source_share)
+                ],
+            },
+            "menu": {
+                "byCategory": [
+                    {"category": CATEGORY_NAMES.get(c, c), "orders": orders, "revenue": revenue}
+                    for c, (orders, revenue) in categories
+                ],
+                "topItems": [
+                    {"name": i["name"], "orders": i["order_count"], "revenue": i["order_count"] * i["price"],
+                     "likes": i["likes_count"]}
+                    for i in items[:5]
+                ],
+                "trends": [{"date": d, "orders": int(c)} for d, c in zip(dates, promo_orders_by_day)],
+            },
+            "staff": {
+                "ratings": staff_rows,
+                "ratingTrends": [
+                    {"date": d, "avgRating": round(float(s / c), 2) if c else 0}
+                    for d, s, c in zip(dates, rating_sum_by_day, rating_count_by_day)
+                ],
+                "tipStats": {
+                    "total": tip_total,
+                    "avgPerVisit": round(tip_total / total_visits, 1) if total_visits else 0,
+                    "topStaff": [{"name": self.staff.get(s, str(s)), "amount": a} for s, a in top_tipped[:3]],
+                },
+            },
+            "revenue": {
+                "avgCheck": round(total_revenue / billed) if billed else 0,
+                "byCategory": [
+                    {"category": CATEGORY_NAMES.get(c, c), "amount": revenue, "percentage": p}
+                    for (c, (_, revenue)), p in zip(categories, category_share)
+                ],
+                "topSales": [
+                    {"item": i["name"], "revenue": i["order_count"] * i["price"], "orders": i["order_count"]}
+                    for i in sorted(self.menu, key=lambda i: i["order_count"] * i["price"], reverse=True)[:3]
+                ],
+                "trends": [{"date": d, "revenue": int(r)} for d, r in zip(dates, revenue_by_day)],
+            },
+        }
+
+    # The methods below run on the analytics thread
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = db.connect(self.db_path, readonly=True)
+        return self._conn
+
+    def _refresh(self):
+        conn = self._connection()
+        rows = 0
+        for table in self.tables.values():
+            try:
+                rows += table.stream(conn, self.chunk)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Skipping {table.name}: {e}")
+
+        menu = [
+            {"category": c, "name": n, "price": p, "order_count": o, "likes_count": l}
+            for c, n, p, o, l in conn.execute(
+                'SELECT category, name, price, order_count, likes_count FROM "MenuItem" ORDER BY id'
+            )
+        ]
+        staff = dict(conn.execute('SELECT id, name FROM "Staff" WHERE is_active = 1 ORDER BY id'))
+
+        changed = rows > 0 or menu != self.menu or staff != self.staff
+        self.menu, self.staff = menu, staff
+        return rows, changed
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,338 @@
+"""
+Audit log ingestion for the PANDA Lounge backend service.
+
+logger.auditLog used to insert one AuditLog row per call inside the request
+that triggered it. The backend takes those events over HTTP instead:
+- events are queued in memory and group-committed in batches by a
+  background writer thread; a batch that fails to commit goes back to the
+  front of the queue and is retried with exponential backoff, and while
+  AUDIT_MAX_PENDING events are waiting new ones are refused, so callers
+  fall back to writing them themselves
+- with AUDIT_RETENTION_DAYS set, rows older than that are moved out of
+  AuditLog into gzip-compressed NDJSON segments, one per day, so the hot
+  table and its created_at/action indexes stay small. Archival is off by
+  default: archived rows are only reachable through /api/audit/archive,
+  not through Prisma
+- a manifest records each segment's time span, actions and users, so
+  archive queries by action/user_id/time only open segments that can match
+
+Archival is at-least-once: a row is deleted only after its segment has been
+written, and queries skip ids they have already returned.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+logger = logging.getLogger("panda.audit")
+
+# Configuration
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_MS", "100")) / 1000
+AUDIT_RETRY_MAX = float(os.environ.get("AUDIT_RETRY_MAX_MS", "30000")) / 1000
+AUDIT_MAX_PENDING = int(os.environ.get("AUDIT_MAX_PENDING", "100000"))
+AUDIT_RETENTION_DAYS = float(os.environ.get("AUDIT_RETENTION_DAYS", "0"))  # 0 = never archive
+AUDIT_ARCHIVE_DIR = os.environ.get("AUDIT_ARCHIVE_DIR", "/app/prisma/audit-archive")
+AUDIT_ARCHIVE_INTERVAL = float(os.environ.get("AUDIT_ARCHIVE_INTERVAL", "3600"))
+ARCHIVE_CHUNK = 10000
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+AUDIT_COLUMNS = (
+    "id", "user_id", "action", "entity_type", "entity_id",
+    "details", "ip_address", "user_agent", "created_at",
+)
+
+
+def normalize_event(event):
+    """AuditLog row tuple for one ingested event (logger.auditLog's context shape).
+
+    Raises ValueError when the event has no action.
+    """
+    if not isinstance(event, dict) or not isinstance(event.get("action"), str) or not event["action"]:
+        raise ValueError("Audit event needs an action")
+    details = event.get("details")
+    if details is not None and not isinstance(details, str):
+        details = json.dumps(details, ensure_ascii=False, separators=(",", ":"))
+    created_at = event.get("created_at")
+    if created_at is not None and (isinstance(created_at, bool) or not isinstance(created_at, (int, float))):
+        raise ValueError("Audit event created_at must be Unix ms")
+    row = (
+        event.get("id") or db.new_cuid(),
+        event.get("userId") or event.get("user_id"),
+        event["action"],
+        event.get("entityType") or event.get("entity_type"),
+        event.get("entityId") or event.get("entity_id"),
+        details,
+        event.get("ip") or event.get("ip_address"),
+        event.get("userAgent") or event.get("user_agent"),
+        int(created_at) if created_at is not None else db.now_ms(),
+    )
+    # A value SQLite cannot bind would fail its whole batch on every retry
+    for column, value in zip(AUDIT_COLUMNS[:-1], row):
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"Audit event {column} must be a string")
+    return row
+
+
+class AuditQueueFull(Exception):
+    """AUDIT_MAX_PENDING events are already waiting for the database"""
+
+
+class AuditArchive:
+    """Day-partitioned, gzip-compressed NDJSON segments of archived AuditLog rows"""
+
+    def __init__(self, root=AUDIT_ARCHIVE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.manifest = {}
+
+    def load(self):
+        os.makedirs(self.root, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    def segment_name(self, created_at):
+        day = time.strftime("%Y-%m-%d", time.gmtime(created_at / 1000))
+        return f"{day[:7]}/audit-{day}.ndjson.gz"
+
+    def append(self, rows):
+        """Append rows (AUDIT_COLUMNS tuples) to their day segments and update the manifest"""
+        by_segment = {}
+        for row in rows:
+            by_segment.setdefault(self.segment_name(row[-1]), []).append(row)
+
+        for name, segment_rows in by_segment.items():
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            lines = "".join(
+                json.dumps(dict(zip(AUDIT_COLUMNS, row)), ensure_ascii=False) + "\n" for row in segment_rows
+            )
+            # Every append is a separate gzip member; readers see one continuous stream
+            with open(path, "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="ab") as f:
+                    f.write(lines.encode("utf-8"))
+                raw.flush()
+                os.fsync(raw.fileno())
+
+            entry = self.manifest.setdefault(name, {
+                "rows": 0, "min_ts": None, "max_ts": None, "actions": [], "users": [],
+            })
+            timestamps = [row[-1] for row in segment_rows]
+            entry["rows"] += len(segment_rows)
+            entry["min_ts"] = min(timestamps + ([entry["min_ts"]] if entry["min_ts"] is not None else []))
+            entry["max_ts"] = max(timestamps + ([entry["max_ts"]] if entry["max_ts"] is not None else []))
+            entry["actions"] = sorted(set(entry["actions"]) | {row[2] for row in segment_rows})
+            entry["users"] = sorted(set(entry["users"]) | {row[1] for row in segment_rows if row[1]})
+
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def segments_for(self, action=None, user_id=None, since=None, until=None):
+        """Segment names whose manifest entry can contain matching rows, oldest first"""
+        names = []
+        for name, entry in sorted(self.manifest.items()):
+            if since is not None and entry["max_ts"] < since:
+                continue
+            if until is not None and entry["min_ts"] >= until:
+                continue
+            if action is not None and action not in entry["actions"]:
+                continue
+            if user_id is not None and user_id not in entry["users"]:
+                continue
+            names.append(name)
+        return names
+
+    def query(self, action=None, user_id=None, since=None, until=None, limit=100):
+        """Archived rows matching every given filter (time range is [since, until))"""
+        results = []
+        seen = set()
+        for name in self.segments_for(action, user_id, since, until):
+            with gzip.open(os.path.join(self.root, name), "rt", encoding="utf-8") as f:
+                for line in f:
+                    row = json.loads(line)
+                    if action is not None and row["action"] != action:
+                        continue
+                    if user_id is not None and row["user_id"] != user_id:
+                        continue
+                    if since is not None and row["created_at"] < since:
+                        continue
+                    if until is not None and row["created_at"] >= until:
+                        continue
+                    if row["id"] in seen:
+                        continue
+                    seen.add(row["id"])
+                    results.append(row)
+                    if len(results) >= limit:
+                        return results
+        return results
+
+
+class AuditWriter:
+    """Queues audit events, group-commits them and archives old rows.
+
+    All SQLite and segment I/O runs on a single dedicated thread.
+    """
+
+    INSERT_SQL = (
+        'INSERT OR IGNORE INTO "AuditLog" '
+        f"({', '.join(AUDIT_COLUMNS)}) VALUES ({', '.join('?' * len(AUDIT_COLUMNS))})"
+    )
+
+    def __init__(self, db_path=None, archive_dir=AUDIT_ARCHIVE_DIR, batch_size=AUDIT_BATCH_SIZE,
+                 flush_interval=AUDIT_FLUSH_INTERVAL, retention_days=AUDIT_RETENTION_DAYS,
+                 max_pending=AUDIT_MAX_PENDING, retry_max=AUDIT_RETRY_MAX):
+        self.db_path = db_path
+        self.archive = AuditArchive(archive_dir)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.max_pending = max_pending
+        self.retry_max = retry_max
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit-writer")
+        self.stats = {
+            "accepted": 0, "refused": 0, "written": 0, "batches": 0,
+            "write_errors": 0, "lost": 0, "archived": 0,
+        }
+        self._conn = None
+        self._pending = []
+        self._retry_delay = 0
+        self._retry_at = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.archive.load)
+        self._task = loop.create_task(self._run())
+
+    def record(self, event):
+        """Queue one event; returns its id. See record_many for the errors."""
+        return self.record_many([event])[0]
+
+    def record_many(self, events):
+        """Queue events all-or-nothing; returns their ids.
+
+        Raises ValueError for a malformed event and AuditQueueFull while the
+        database is too far behind to take them.
+        """
+        rows = [normalize_event(event) for event in events]
+        if len(self._pending) + len(rows) > self.max_pending:
+            self.stats["refused"] += len(rows)
+            raise AuditQueueFull(f"{len(self._pending)} audit events are waiting for the database")
+        self._pending.extend(rows)
+        self.stats["accepted"] += len(rows)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return [row[0] for row in rows]
+
+    async def flush(self, force=False):
+        """Commit everything queued so far in one transaction.
+
+        After a failed commit the events stay queued and later flushes wait
+        out a doubling backoff (up to retry_max) unless `force` is set.
+        """
+        if not self._pending or (not force and time.monotonic() < self._retry_at):
+            return
+        batch, self._pending = self._pending, []
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, self._write_batch, batch)
+        except Exception as e:
+            # Back to the front, ahead of anything queued meanwhile
+            self._pending[:0] = batch
+            self._retry_delay = min(max(self._retry_delay * 2, self.flush_interval), self.retry_max)
+            self._retry_at = time.monotonic() + self._retry_delay
+            self.stats["write_errors"] += 1
+            logger.error(f"Failed to write {len(batch)} audit events, retrying in {self._retry_delay:.1f}s: {e}")
+            return
+        self._retry_delay = self._retry_at = 0
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+
+    async def archive_old(self, now_ms=None):
+        """Move rows older than the retention window into segments; returns how many"""
+        if self.retention_days <= 0:
+            return 0
+        now_ms = db.now_ms() if now_ms is None else now_ms
+        cutoff = now_ms - int(self.retention_days * DAY_MS)
+        loop = asyncio.get_running_loop()
+        moved = await loop.run_in_executor(self.executor, self._archive_before, cutoff)
+        self.stats["archived"] += moved
+        return moved
+
+    async def query_archive(self, **filters):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: self.archive.query(**filters))
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        await self.flush(force=True)
+        if self._pending:
+            self.stats["lost"] += len(self._pending)
+            logger.error(f"Shutting down with {len(self._pending)} audit events that could not be written")
+        self.executor.submit(self._close_connection).result()
+        self.executor.shutdown(wait=True)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    # The methods below run on the writer thread
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = db.connect(self.db_path)
+        return self._conn
+
+    def _write_batch(self, batch):
+        conn = self._connection()
+        with conn:
+            conn.executemany(self.INSERT_SQL, batch)
+
+    def _archive_before(self, cutoff):
+        conn = self._connection()
+        moved = 0
+        while True:
+            rows = conn.execute(
+                f'SELECT {", ".join(AUDIT_COLUMNS)} FROM "AuditLog" '
+                "WHERE created_at < ? ORDER BY created_at LIMIT ?",
+                (cutoff, ARCHIVE_CHUNK),
+            ).fetchall()
+            if not rows:
+                break
+            self.archive.append(rows)
+            with conn:
+                conn.executemany('DELETE FROM "AuditLog" WHERE id = ?', [(row[0],) for row in rows])
+            moved += len(rows)
+            if len(rows) < ARCHIVE_CHUNK:
+                break
+        if moved:
+            logger.info(f"Archived {moved} audit rows older than {time.strftime('%Y-%m-%d', time.gmtime(cutoff / 1000))}")
+        return moved
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
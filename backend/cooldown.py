@@ -0,0 +1,228 @@
+"""
+Wheel cooldown status for the PANDA Lounge backend service.
+
+/api/wheel/status reads the user's latest WheelSpin row on every poll to
+work out canSpin / nextSpinDate / timeLeft. This module keeps each user's
+`next_allowed_at` in an LRU cache with a TTL instead:
+- warmed at startup from the WheelSpin(next_allowed_at) index
+- updated when a spin is written, either through an explicit notification
+  or by tailing new WheelSpin rows by primary key
+- status lookups are answered from memory; only misses read SQLite
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import db
+
+logger = logging.getLogger("panda.cooldown")
+
+# Configuration
+COOLDOWN_CACHE_CAPACITY = int(os.environ.get("COOLDOWN_CACHE_CAPACITY", "50000"))
+COOLDOWN_CACHE_TTL = float(os.environ.get("COOLDOWN_CACHE_TTL", "300"))
+SPIN_POLL_INTERVAL = float(os.environ.get("COOLDOWN_POLL_MS", "1000")) / 1000
+
+DAY_MS = 24 * 60 * 60 * 1000
+HOUR_MS = 60 * 60 * 1000
+MINUTE_MS = 60 * 1000
+
+
+class CooldownEntry:
+    __slots__ = ("next_allowed_at", "last_prize", "cached_at")
+
+    def __init__(self, next_allowed_at, last_prize, cached_at):
+        self.next_allowed_at = next_allowed_at
+        self.last_prize = last_prize
+        self.cached_at = cached_at
+
+
+class CooldownCache:
+    """LRU map of user_id -> CooldownEntry whose entries expire after `ttl`.
+
+    Users who never spun are cached too (next_allowed_at None) so repeated
+    polls from new users do not fall through to the database.
+    """
+
+    def __init__(self, capacity=COOLDOWN_CACHE_CAPACITY, ttl=COOLDOWN_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def get(self, user_id, now=None):
+        """Fresh entry for user_id, or None on a miss"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            now = time.monotonic() if now is None else now
+            if now - entry.cached_at < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            del self._entries[user_id]
+        self.misses += 1
+        return None
+
+    def put(self, user_id, next_allowed_at, last_prize=None, now=None):
+        now = time.monotonic() if now is None else now
+        self._entries[user_id] = CooldownEntry(next_allowed_at, last_prize, now)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id=None):
+        """Drop one user's entry (or all of them)"""
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+
+def iso_ms(timestamp_ms):
+    """JSON form of a JS Date (what NextResponse.json produces)"""
+    moment = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{timestamp_ms % 1000:03d}Z"
+
+
+def build_status(next_allowed_at, last_prize, now_ms=None):
+    """Response body of GET /api/wheel/status for an authenticated user"""
+    if next_allowed_at is None:
+        return {
+            "canSpin": True,
+            "state": "READY",
+            "message": "Безкоштовний спін доступний!",
+        }
+
+    now_ms = db.now_ms() if now_ms is None else now_ms
+    if now_ms < next_allowed_at:
+        time_left = next_allowed_at - now_ms
+        days_left = time_left // DAY_MS
+        hours_left = (time_left % DAY_MS) // HOUR_MS
+        minutes_left = (time_left % HOUR_MS) // MINUTE_MS
+        return {
+            "canSpin": False,
+            "state": "COOLDOWN",
+            "nextSpinDate": iso_ms(next_allowed_at),
+            "lastPrize": last_prize,
+            "message": f"Наступний спін через: {days_left}д {hours_left}г",
+            "timeLeft": {"days": days_left, "hours": hours_left, "minutes": minutes_left},
+        }
+
+    return {
+        "canSpin": True,
+        "state": "READY",
+        "lastPrize": last_prize,
+        "message": "Можна крутити знову!",
+    }
+
+
+class CooldownService:
+    """Answers wheel status lookups from the cooldown cache.
+
+    All SQLite reads run on one dedicated thread with a single read-only
+    connection, so the event loop never blocks on the database.
+    """
+
+    def __init__(self, db_path=None, capacity=COOLDOWN_CACHE_CAPACITY, ttl=COOLDOWN_CACHE_TTL):
+        self.db_path = db_path
+        self.cache = CooldownCache(capacity, ttl)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cooldown-reader")
+        self.last_spin_id = 0
+        self.stats = {"lookups": 0, "db_reads": 0, "spins_seen": 0}
+        self._conn = None
+        self._prize_column = None
+
+    async def start(self):
+        """Warm the cache with every user still in cooldown"""
+        loop = asyncio.get_running_loop()
+        rows, self.last_spin_id = await loop.run_in_executor(self.executor, self._load_active)
+        for user_id, next_allowed_at, prize in rows:
+            self.cache.put(user_id, next_allowed_at, prize)
+        logger.info(f"Warmed cooldown cache with {len(self.cache)} users in cooldown")
+
+    async def close(self):
+        self.executor.submit(self._close_connection).result()
+        self.executor.shutdown(wait=True)
+
+    async def status(self, user_id):
+        """Status body for user_id; reads SQLite only on a cache miss"""
+        self.stats["lookups"] += 1
+        entry = self.cache.get(user_id)
+        if entry is None:
+            loop = asyncio.get_running_loop()
+            row = await loop.run_in_executor(self.executor, self._query_last_spin, user_id)
+            self.stats["db_reads"] += 1
+            next_allowed_at, prize = row if row else (None, None)
+            self.cache.put(user_id, next_allowed_at, prize)
+            return build_status(next_allowed_at, prize)
+        return build_status(entry.next_allowed_at, entry.last_prize)
+
+    def record_spin(self, user_id, next_allowed_at=None, prize=None):
+        """A spin was written: store its cooldown, or drop the entry if unknown"""
+        if next_allowed_at is None:
+            self.cache.invalidate(user_id)
+        else:
+            self.cache.put(user_id, next_allowed_at, prize)
+
+    async def poll_spins(self):
+        """Apply WheelSpin rows written since the last poll; returns how many"""
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(self.executor, self._query_new_spins, self.last_spin_id)
+        for spin_id, user_id, next_allowed_at, prize in rows:
+            self.cache.put(user_id, next_allowed_at, prize)
+            self.last_spin_id = max(self.last_spin_id, spin_id)
+        self.stats["spins_seen"] += len(rows)
+        return len(rows)
+
+    # The methods below run on the reader thread
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = db.connect(self.db_path, readonly=True)
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info("WheelSpin")')}
+            # Databases created before the prize_id/prize_name migration store the text in `prize`
+            self._prize_column = "prize_name" if "prize_name" in columns else "prize"
+        return self._conn
+
+    def _load_active(self):
+        conn = self._connection()
+        # Served by the next_allowed_at index; later rows win for users with several
+        rows = conn.execute(
+            f'SELECT user_id, next_allowed_at, {self._prize_column} FROM "WheelSpin" '
+            "WHERE next_allowed_at > ? ORDER BY next_allowed_at",
+            (db.now_ms(),),
+        ).fetchall()
+        last_spin_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM "WheelSpin"').fetchone()[0]
+        return rows, last_spin_id
+
+    def _query_last_spin(self, user_id):
+        return self._connection().execute(
+            f'SELECT next_allowed_at, {self._prize_column} FROM "WheelSpin" '
+            "WHERE user_id = ? ORDER BY spun_at DESC LIMIT 1",
+            (user_id,),
+        ).fetchone()
+
+    def _query_new_spins(self, after_id):
+        return self._connection().execute(
+            f'SELECT id, user_id, next_allowed_at, {self._prize_column} FROM "WheelSpin" '
+            "WHERE id > ? ORDER BY id",
+            (after_id,),
+        ).fetchall()
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
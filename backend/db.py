@@ -0,0 +1,69 @@
+"""
+SQLite helpers shared by the PANDA Lounge backend services.
+
+The database is the same file Prisma manages for the Next.js app, so every
+helper here follows Prisma's SQLite conventions:
+- DateTime columns are stored as integer milliseconds since the Unix epoch
+- String primary keys declared with @default(cuid()) are generated client-side
+"""
+
+import itertools
+import os
+import secrets
+import sqlite3
+import time
+
+# Configuration
+DB_PATH = os.environ.get("DB_PATH", "/app/prisma/dev.db")
+BUSY_TIMEOUT_MS = 5000
+
+_BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+_cuid_counter = itertools.count()
+_cuid_fingerprint = None
+
+
+def connect(path=None, readonly=False):
+    """Open a connection to the Prisma database.
+
+    Connections are created with check_same_thread=False so they can be
+    handed to a dedicated writer thread; callers must not share one
+    connection between threads concurrently.
+    """
+    path = path or DB_PATH
+    mode = "ro" if readonly else "rw"
+    conn = sqlite3.connect(
+        f"file:{path}?mode={mode}",
+        uri=True,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+    )
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def now_ms():
+    """Current time in Prisma's DateTime storage format"""
+    return int(time.time() * 1000)
+
+
+def to_base36(value, width=0):
+    """Encode a non-negative integer in lowercase base36"""
+    digits = []
+    while value:
+        value, rem = divmod(value, 36)
+        digits.append(_BASE36[rem])
+    return "".join(reversed(digits)).rjust(width, "0") or "0"
+
+
+def new_cuid():
+    """Generate a collision-resistant id in the shape of Prisma's cuid()"""
+    global _cuid_fingerprint
+    if _cuid_fingerprint is None:
+        _cuid_fingerprint = to_base36(os.getpid() % (36 ** 2), 2) + to_base36(
+            secrets.randbelow(36 ** 2), 2
+        )
+
+    timestamp = to_base36(now_ms(), 8)
+    counter = to_base36(next(_cuid_counter) % (36 ** 4), 4)
+    random_block = to_base36(secrets.randbelow(36 ** 8), 8)
+    return f"c{timestamp}{counter}{_cuid_fingerprint}{random_block}"
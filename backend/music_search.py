@@ -0,0 +1,291 @@
+"""
+Spotify jukebox search proxy for the PANDA Lounge backend service.
+
+/api/music/search called SpotifyAPI.searchForJukebox on every keystroke, so a
+room searching for the same hits paid a Spotify round-trip per request.
+This module sits in front of the Spotify search endpoint:
+- queries are normalised (NFKC, case-folded, whitespace collapsed) into keys
+- results are kept in an LRU cache with a TTL, always fetched at the
+  maximum page size so any smaller `limit` is a slice of the same entry
+- a longer query is answered from a cached shorter prefix ("drak" ->
+  "drake") when that prefix's result set was complete, by filtering it
+  locally; incomplete prefixes go upstream
+- identical upstream requests that are in flight at the same time share a
+  single Spotify call
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+logger = logging.getLogger("panda.music")
+
+# Configuration
+SPOTIFY_CLIENT_ID = os.environ.get("SPOTIFY_CLIENT_ID", "")
+SPOTIFY_CLIENT_SECRET = os.environ.get("SPOTIFY_CLIENT_SECRET", "")
+SPOTIFY_API_URL = os.environ.get("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+SPOTIFY_TOKEN_URL = os.environ.get("SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token")
+SPOTIFY_MARKET = "UA"
+SPOTIFY_TIMEOUT = float(os.environ.get("SPOTIFY_TIMEOUT", "5"))
+SPOTIFY_CONCURRENCY = int(os.environ.get("SPOTIFY_CONCURRENCY", "8"))
+SEARCH_CACHE_CAPACITY = int(os.environ.get("MUSIC_CACHE_CAPACITY", "5000"))
+SEARCH_CACHE_TTL = float(os.environ.get("MUSIC_CACHE_TTL", "600"))
+SEARCH_FETCH_LIMIT = 50  # Spotify's maximum page size
+MIN_QUERY_LENGTH = 2
+LATENCY_WINDOW = 2000
+
+
+class SpotifyError(Exception):
+    """Upstream Spotify request failed"""
+
+
+def normalize_query(query):
+    """Cache key for a search query"""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+def format_track(track):
+    """SpotifyAPI.formatTrackForJukebox"""
+    images = track["album"].get("images") or []
+    image = images[1]["url"] if len(images) > 1 else (images[0]["url"] if images else None)
+    return {
+        "id": track["id"],
+        "title": track["name"],
+        "artist": ", ".join(a["name"] for a in track["artists"]),
+        "album": track["album"]["name"],
+        "duration": track["duration_ms"] // 1000,
+        "preview_url": track.get("preview_url"),
+        "image": image,
+        "spotify_url": track["external_urls"]["spotify"],
+        "uri": track["uri"],
+        "popularity": track.get("popularity", 0),
+    }
+
+
+def matches(track, terms):
+    haystack = normalize_query(f"{track['title']} {track['artist']} {track['album']}")
+    return all(term in haystack for term in terms)
+
+
+class SearchEntry:
+    __slots__ = ("tracks", "complete", "cached_at")
+
+    def __init__(self, tracks, complete, cached_at):
+        self.tracks = tracks
+        self.complete = complete
+        self.cached_at = cached_at
+
+
+class SearchCache:
+    """LRU map of normalised query -> SearchEntry whose entries expire after `ttl`"""
+
+    def __init__(self, capacity=SEARCH_CACHE_CAPACITY, ttl=SEARCH_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, now=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = time.monotonic() if now is None else now
+        if now - entry.cached_at >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, tracks, complete, now=None):
+        now = time.monotonic() if now is None else now
+        self._entries[key] = SearchEntry(tracks, complete, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+class LatencyWindow:
+    """Most recent latency samples (ms) with percentile summaries"""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+
+    def add(self, ms):
+        self.samples.append(ms)
+
+    def summary(self):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+        return {"p50": pick(0.50), "p95": pick(0.95), "max": round(ordered[-1], 2)}
+
+
+class MusicSearchProxy:
+    """Caching, coalescing front for Spotify track search.
+
+    Upstream HTTP calls run on a small thread pool; everything else runs on
+    the event loop.
+    """
+
+    def __init__(self, api_url=SPOTIFY_API_URL, token_url=SPOTIFY_TOKEN_URL,
+                 client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET,
+                 capacity=SEARCH_CACHE_CAPACITY, ttl=SEARCH_CACHE_TTL):
+        self.api_url = api_url.rstrip("/")
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.cache = SearchCache(capacity, ttl)
+        self.executor = ThreadPoolExecutor(max_workers=SPOTIFY_CONCURRENCY, thread_name_prefix="spotify")
+        self.stats = {
+            "requests": 0, "hits": 0, "prefix_hits": 0, "misses": 0,
+            "coalesced": 0, "upstream_calls": 0, "upstream_errors": 0,
+        }
+        self.latency = LatencyWindow()
+        self.upstream_latency = LatencyWindow()
+        self._inflight = {}
+        self._token = None
+        self._token_expires_at = 0
+        self._token_lock = asyncio.Lock()
+
+    def metrics(self):
+        requests = self.stats["requests"]
+        served = self.stats["hits"] + self.stats["prefix_hits"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "hit_rate": round(served / requests, 4) if requests else None,
+            "cached_queries": len(self.cache),
+            "evictions": self.cache.evictions,
+            "latency_ms": self.latency.summary(),
+            "upstream_latency_ms": self.upstream_latency.summary(),
+        }
+
+    async def search(self, query, limit=10):
+        """Jukebox tracks (with previews) for `query`, plus how it was served.
+
+        Returns (tracks, source) where source is one of cache, prefix,
+        coalesced or upstream. Raises SpotifyError when Spotify is unreachable.
+        """
+        started = time.perf_counter()
+        self.stats["requests"] += 1
+        key = normalize_query(query)
+        try:
+            tracks, source = await self._lookup(key)
+        finally:
+            self.latency.add((time.perf_counter() - started) * 1000)
+        return [t for t in tracks if t["preview_url"]][:limit], source
+
+    async def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _lookup(self, key):
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry.tracks, "cache"
+
+        tracks = self._from_prefix(key)
+        if tracks is not None:
+            self.stats["prefix_hits"] += 1
+            return tracks, "prefix"
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending), "coalesced"
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            tracks, complete = await self._fetch(key)
+            self.cache.put(key, tracks, complete)
+            future.set_result(tracks)
+            return tracks, "upstream"
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters hold the exception; don't warn about it being unretrieved
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _from_prefix(self, key):
+        """Filter the longest complete cached prefix of `key`, if any"""
+        terms = key.split()
+        for end in range(len(key) - 1, MIN_QUERY_LENGTH - 1, -1):
+            entry = self.cache.get(key[:end].rstrip())
+            if entry is not None and entry.complete:
+                tracks = [t for t in entry.tracks if matches(t, terms)]
+                self.cache.put(key, tracks, True)
+                return tracks
+        return None
+
+    async def _fetch(self, key):
+        token = await self._access_token()
+        params = urlencode({
+            "q": key, "type": "track", "limit": SEARCH_FETCH_LIMIT, "offset": 0, "market": SPOTIFY_MARKET,
+        })
+        request = Request(f"{self.api_url}/search?{params}", headers={"Authorization": f"Bearer {token}"})
+        data = await self._call(request)
+        items = data["tracks"]["items"]
+        return [format_track(t) for t in items], data["tracks"]["total"] <= len(items)
+
+    async def _access_token(self):
+        async with self._token_lock:
+            if self._token and time.time() < self._token_expires_at:
+                return self._token
+            if not self.client_id or not self.client_secret:
+                raise SpotifyError("Spotify credentials are not configured")
+            credentials = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
+            request = Request(
+                self.token_url,
+                data=b"grant_type=client_credentials",
+                headers={
+                    "Authorization": f"Basic {credentials}",
+                    "Content-Type": "application/x-www-form-urlencoded",
+                },
+            )
+            data = await self._call(request)
+            self._token = data["access_token"]
+            # Refresh a minute early, like SpotifyAPI.getAccessToken
+            self._token_expires_at = time.time() + data["expires_in"] - 60
+            return self._token
+
+    async def _call(self, request):
+        started = time.perf_counter()
+        self.stats["upstream_calls"] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, self._request_json, request)
+        except SpotifyError:
+            self.stats["upstream_errors"] += 1
+            raise
+        finally:
+            self.upstream_latency.add((time.perf_counter() - started) * 1000)
+
+    # The method below runs on the Spotify thread pool
+
+    def _request_json(self, request):
+        try:
+            with urlopen(request, timeout=SPOTIFY_TIMEOUT) as response:
+                return json.loads(response.read())
+        except HTTPError as e:
+            if e.code == 401:
+                self._token = None
+            raise SpotifyError(f"Spotify request failed: {e.code} {e.reason}")
+        except (URLError, OSError, ValueError) as e:
+            raise SpotifyError(f"Spotify request failed: {e}")
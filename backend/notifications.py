@@ -0,0 +1,451 @@
+"""
+Notification fan-out for the PANDA Lounge backend service.
+
+The notification bell polls /api/notifications, which costs every client a
+session lookup and a query per poll interval. This module serves it from
+memory and pushes changes instead:
+- new Notification rows are found by tailing the table by primary key, one
+  query per interval for all users
+- each audience keeps a ring buffer of its newest unread items plus the
+  exact unread count, loaded on first use: a user's own rows, and per
+  user and broadcast audience ("@staff:<id>"/"@admin:<id>") the rows
+  without a user_id that this user has no NotificationRead receipt for
+- connected clients get new items, mark-read and read-all over Server-Sent
+  Events; idle connections cost a parked coroutine and one heartbeat write
+- mark-read and read-all update the rings in place and run one statement
+  per audience, without re-querying the list; a broadcast is marked read by
+  writing the reader's receipt, so it stays unread for everyone else
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+from cooldown import iso_ms
+
+logger = logging.getLogger("panda.notifications")
+
+# Configuration
+NOTIFY_RING_SIZE = int(os.environ.get("NOTIFY_RING_SIZE", "50"))
+NOTIFY_AUDIENCE_CAPACITY = int(os.environ.get("NOTIFY_AUDIENCE_CAPACITY", "100000"))
+NOTIFY_POLL_INTERVAL = float(os.environ.get("NOTIFY_POLL_MS", "500")) / 1000
+NOTIFY_TAIL_BATCH = 1000
+SSE_HEARTBEAT_INTERVAL = 15
+SSE_RETRY_MS = 3000
+SSE_MAX_BUFFER = 256 * 1024  # queued bytes before a client that stopped reading is dropped
+
+# Rows without a user_id go to everyone with one of these roles, by Notification.type
+BROADCAST_AUDIENCES = {"staff": ("staff", "admin"), "admin": ("admin",)}
+
+COLUMNS = '"id", "user_id", "type", "title", "message", "data", "is_read", "expires_at", "created_at"'
+VISIBLE = "is_read = 0 AND (expires_at IS NULL OR expires_at > ?)"
+
+
+def audience_keys(user_id, role=None):
+    """Rings a user sees: their own plus their view of the broadcast audiences of their role"""
+    keys = [user_id]
+    keys += [broadcast_key(audience, user_id) for audience, roles in BROADCAST_AUDIENCES.items() if role in roles]
+    return keys
+
+
+def broadcast_key(audience, user_id):
+    return f"@{audience}:{user_id}"
+
+
+def key_audience(key):
+    """Broadcast audience of a ring key, or None for a user's own ring"""
+    return key[1:].split(":", 1)[0] if key.startswith("@") else None
+
+
+def format_notification(row):
+    """Notification row -> the item shape NotificationPanel renders"""
+    notification_id, _user_id, _audience, title, message, data, is_read, _expires_at, created_at = row
+    try:
+        extra = json.loads(data) if data else {}
+    except ValueError:
+        extra = {}
+    if not isinstance(extra, dict):
+        extra = {}
+    item = {
+        "id": str(notification_id),
+        "type": extra.get("kind") or "system",
+        "title": title,
+        "message": message,
+        "timestamp": iso_ms(created_at),
+        "read": bool(is_read),
+        "priority": extra.get("priority") or "medium",
+    }
+    if extra.get("actionUrl"):
+        item["actionUrl"] = extra["actionUrl"]
+    return item
+
+
+def sse_event(event, data, event_id=None):
+    lines = f"id: {event_id}\n" if event_id is not None else ""
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"{lines}event: {event}\ndata: {payload}\n\n".encode()
+
+
+class UnreadRing:
+    """Newest unread items of one audience (oldest first) and its exact unread count.
+
+    `max_id` is the newest row the ring has accounted for, so the tail skips
+    rows the initial load already counted.
+    """
+
+    __slots__ = ("items", "count", "max_id", "subscribers")
+
+    def __init__(self, rows, count, max_id, size=NOTIFY_RING_SIZE):
+        self.items = deque(((row[0], row[7], format_notification(row)) for row in rows), maxlen=size)
+        self.count = count
+        self.max_id = max_id
+        self.subscribers = set()
+
+    @property
+    def complete(self):
+        """Whether every unread item is in memory"""
+        return self.count <= len(self.items)
+
+    def append(self, row):
+        self.items.append((row[0], row[7], format_notification(row)))
+        self.count += 1
+        self.max_id = max(self.max_id, row[0])
+
+    def remove(self, notification_id):
+        for entry in self.items:
+            if entry[0] == notification_id:
+                self.items.remove(entry)
+                return True
+        return False
+
+    def drop_expired(self, now):
+        expired = [entry for entry in self.items if entry[1] is not None and entry[1] <= now]
+        for entry in expired:
+            self.items.remove(entry)
+        self.count = max(0, self.count - len(expired))
+
+
+class Subscriber:
+    __slots__ = ("user_id", "keys", "writer")
+
+    def __init__(self, user_id, keys, writer):
+        self.user_id = user_id
+        self.keys = keys
+        self.writer = writer
+
+
+class NotificationService:
+    """Unread rings, SSE subscribers and the Notification table tail.
+
+    Ring state lives on the event loop; every SQLite statement runs on one
+    dedicated thread with a single read-write connection.
+    """
+
+    def __init__(self, db_path=None, ring_size=NOTIFY_RING_SIZE, capacity=NOTIFY_AUDIENCE_CAPACITY):
+        self.db_path = db_path
+        self.ring_size = ring_size
+        self.capacity = capacity
+        self.rings = OrderedDict()
+        self.broadcast_rings = {audience: set() for audience in BROADCAST_AUDIENCES}
+        self.subscribers = set()
+        self.last_id = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notify-db")
+        self.stats = {"loads": 0, "refills": 0, "tailed": 0, "pushed": 0, "marked_read": 0, "dropped_clients": 0}
+        self._loading = {}
+        self._conn = None
+
+    async def start(self):
+        """Start tailing after the newest existing row"""
+        loop = asyncio.get_running_loop()
+        self.last_id = await loop.run_in_executor(self.executor, self._query_last_id)
+        logger.info(f"Tailing notifications after id {self.last_id}")
+
+    async def close(self):
+        for subscriber in list(self.subscribers):
+            subscriber.writer.close()
+        self.executor.submit(self._close_connection).result()
+        self.executor.shutdown(wait=True)
+
+    @property
+    def connections(self):
+        return len(self.subscribers)
+
+    async def ring(self, key):
+        """Loaded ring for an audience key, reading SQLite on first use"""
+        ring = self.rings.get(key)
+        if ring is not None:
+            self.rings.move_to_end(key)
+            return ring
+        # Concurrent first uses of one key share a single load
+        pending = self._loading.get(key)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = self._loading[key] = loop.run_in_executor(self.executor, self._query_ring, key)
+        try:
+            rows, count, max_id = await pending
+        finally:
+            self._loading.pop(key, None)
+        ring = self.rings.get(key)
+        if ring is None:
+            ring = self.rings[key] = UnreadRing(rows, count, max_id, self.ring_size)
+            audience = key_audience(key)
+            if audience is not None:
+                self.broadcast_rings[audience].add(key)
+            self.stats["loads"] += 1
+            self._evict()
+        return ring
+
+    async def unread(self, user_id, role=None):
+        """{unreadCount, notifications} for a user, newest first"""
+        now = db.now_ms()
+        rings = [await self.ring(key) for key in audience_keys(user_id, role)]
+        items = []
+        for ring in rings:
+            ring.drop_expired(now)
+            items.extend(ring.items)
+        items.sort(key=lambda entry: entry[0], reverse=True)
+        return {
+            "unreadCount": sum(ring.count for ring in rings),
+            "notifications": [item for _, _, item in items[:self.ring_size]],
+        }
+
+    async def mark_read(self, user_id, notification_id, role=None):
+        """Mark one notification read; False if it is not this user's or already read"""
+        keys = audience_keys(user_id, role)
+        loop = asyncio.get_running_loop()
+        key = await loop.run_in_executor(self.executor, self._update_read, notification_id, user_id, keys)
+        if key is None:
+            return False
+        self.stats["marked_read"] += 1
+
+        ring = self.rings.get(key)
+        if ring is not None:
+            ring.remove(notification_id)
+            # Rows newer than the ring were never counted; the tail will skip them as read
+            if notification_id <= ring.max_id:
+                ring.count = max(0, ring.count - 1)
+            if not ring.complete and len(ring.items) < self.ring_size // 2:
+                await self._refill(key, ring)
+            self._push(key, lambda subscriber: sse_event("read", {
+                "id": str(notification_id),
+                "unreadCount": self._count(subscriber),
+            }))
+        return True
+
+    async def read_all(self, user_id, role=None):
+        """Mark everything the user sees as read; returns how many rows changed"""
+        keys = audience_keys(user_id, role)
+        loop = asyncio.get_running_loop()
+        changed = await loop.run_in_executor(self.executor, self._update_read_all, user_id, keys)
+        self.stats["marked_read"] += changed
+        subscribers = set()
+        for key in keys:
+            ring = self.rings.get(key)
+            if ring is None:
+                continue
+            ring.items.clear()
+            ring.count = 0
+            subscribers |= ring.subscribers
+        # One push per client after every ring is cleared
+        self._send_all(subscribers, lambda subscriber: sse_event("read_all", {"unreadCount": self._count(subscriber)}))
+        return changed
+
+    async def poll(self):
+        """Push Notification rows written since the last poll; returns how many"""
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(self.executor, self._query_new, self.last_id)
+        now = db.now_ms()
+        for row in rows:
+            self.last_id = max(self.last_id, row[0])
+            if row[6] or (row[7] is not None and row[7] <= now):
+                continue
+            # A new broadcast is unread for everyone, so it joins every loaded view of its audience
+            keys = [row[1]] if row[1] is not None else list(self.broadcast_rings.get(row[2], ()))
+            for key in keys:
+                ring = self.rings.get(key)
+                if ring is None or row[0] <= ring.max_id:
+                    continue
+                ring.append(row)
+                item = ring.items[-1][2]
+                self._push(key, lambda subscriber: sse_event(
+                    "notification", {**item, "unreadCount": self._count(subscriber)}, row[0]
+                ))
+        self.stats["tailed"] += len(rows)
+        return len(rows)
+
+    async def serve_stream(self, user_id, role, reader, writer):
+        """Own an SSE connection: snapshot first, then pushes until the client leaves"""
+        keys = audience_keys(user_id, role)
+        snapshot = await self.unread(user_id, role)
+        subscriber = Subscriber(user_id, keys, writer)
+        writer.write(f"retry: {SSE_RETRY_MS}\n\n".encode() + sse_event("snapshot", snapshot))
+        self.subscribers.add(subscriber)
+        for key in keys:
+            # Loaded rings return without yielding; one evicted meanwhile is reloaded
+            (await self.ring(key)).subscribers.add(subscriber)
+        try:
+            # EventSource never sends anything; EOF means the client went away
+            while await reader.read(1024):
+                pass
+        finally:
+            self._unsubscribe(subscriber)
+
+    def heartbeat(self):
+        """Comment line to every client so proxies keep idle streams open"""
+        for subscriber in list(self.subscribers):
+            self._send(subscriber, b":\n\n")
+
+    # Fan-out helpers (event loop)
+
+    def _count(self, subscriber):
+        return sum(self.rings[key].count for key in subscriber.keys if key in self.rings)
+
+    def _push(self, key, encode):
+        ring = self.rings.get(key)
+        if ring is not None:
+            self._send_all(ring.subscribers, encode)
+
+    def _send_all(self, subscribers, encode):
+        for subscriber in list(subscribers):
+            self._send(subscriber, encode(subscriber))
+            self.stats["pushed"] += 1
+
+    def _send(self, subscriber, data):
+        transport = subscriber.writer.transport
+        if transport.is_closing() or transport.get_write_buffer_size() > SSE_MAX_BUFFER:
+            self.stats["dropped_clients"] += 1
+            self._unsubscribe(subscriber)
+            subscriber.writer.close()
+            return
+        subscriber.writer.write(data)
+
+    def _unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        for key in subscriber.keys:
+            ring = self.rings.get(key)
+            if ring is not None:
+                ring.subscribers.discard(subscriber)
+
+    def _evict(self):
+        """Drop least recently used rings nobody is connected to"""
+        excess = len(self.rings) - self.capacity
+        if excess <= 0:
+            return
+        for key in [k for k, ring in self.rings.items() if not ring.subscribers][:excess]:
+            del self.rings[key]
+            audience = key_audience(key)
+            if audience is not None:
+                self.broadcast_rings[audience].discard(key)
+
+    async def _refill(self, key, ring):
+        """Top the ring up with older unread rows once marks have drained it"""
+        oldest = ring.items[0][0] if ring.items else ring.max_id + 1
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(
+            self.executor, self._query_older, key, oldest, self.ring_size - len(ring.items)
+        )
+        # The tail may have appended meanwhile; appendleft on a full deque would drop the newest
+        for row in rows[:self.ring_size - len(ring.items)]:
+            ring.items.appendleft((row[0], row[7], format_notification(row)))
+        self.stats["refills"] += 1
+
+    # The methods below run on the notify-db thread
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = db.connect(self.db_path)
+        return self._conn
+
+    @staticmethod
+    def _audience_filter(key):
+        """(WHERE clause, params) for the unread-candidate rows of a ring key"""
+        if key.startswith("@"):
+            audience, user_id = key[1:].split(":", 1)
+            return (
+                'user_id IS NULL AND type = ? AND NOT EXISTS (SELECT 1 FROM "NotificationRead" r '
+                'WHERE r.notification_id = "Notification".id AND r.user_id = ?)'
+            ), (audience, user_id)
+        return "user_id = ?", (key,)
+
+    def _query_last_id(self):
+        return self._connection().execute('SELECT COALESCE(MAX(id), 0) FROM "Notification"').fetchone()[0]
+
+    def _query_ring(self, key):
+        conn = self._connection()
+        where, params = self._audience_filter(key)
+        now = db.now_ms()
+        rows = conn.execute(
+            f'SELECT {COLUMNS} FROM "Notification" WHERE {where} AND {VISIBLE} ORDER BY id DESC LIMIT ?',
+            (*params, now, self.ring_size),
+        ).fetchall()
+        count = conn.execute(
+            f'SELECT COUNT(*) FROM "Notification" WHERE {where} AND {VISIBLE}', (*params, now)
+        ).fetchone()[0]
+        # Rows up to here are part of this load, even if the tail has not reached them yet
+        max_id = max([self.last_id] + [row[0] for row in rows])
+        rows.reverse()
+        return rows, count, max_id
+
+    def _query_older(self, key, before_id, limit):
+        where, params = self._audience_filter(key)
+        return self._connection().execute(
+            f'SELECT {COLUMNS} FROM "Notification" WHERE {where} AND {VISIBLE} AND id < ? ORDER BY id DESC LIMIT ?',
+            (*params, db.now_ms(), before_id, limit),
+        ).fetchall()
+
+    def _query_new(self, after_id):
+        return self._connection().execute(
+            f'SELECT {COLUMNS} FROM "Notification" WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id, NOTIFY_TAIL_BATCH),
+        ).fetchall()
+
+    def _update_read(self, notification_id, user_id, keys):
+        """Ring key of the row marked read, or None if nothing changed"""
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT user_id, type FROM "Notification" WHERE id = ? AND is_read = 0', (notification_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        owner, audience = row
+        key = owner if owner is not None else broadcast_key(audience, user_id)
+        if key not in keys:
+            return None
+        with conn:
+            if owner is not None:
+                conn.execute('UPDATE "Notification" SET is_read = 1 WHERE id = ?', (notification_id,))
+                return key
+            inserted = conn.execute(
+                'INSERT OR IGNORE INTO "NotificationRead" (notification_id, user_id, read_at) VALUES (?, ?, ?)',
+                (notification_id, user_id, db.now_ms()),
+            ).rowcount
+        return key if inserted else None
+
+    def _update_read_all(self, user_id, keys):
+        conn = self._connection()
+        now = db.now_ms()
+        changed = 0
+        with conn:
+            for key in keys:
+                where, params = self._audience_filter(key)
+                if key_audience(key) is None:
+                    changed += conn.execute(
+                        f'UPDATE "Notification" SET is_read = 1 WHERE {where} AND is_read = 0', params
+                    ).rowcount
+                    continue
+                # Receipts only for broadcasts that can still be shown
+                changed += conn.execute(
+                    'INSERT OR IGNORE INTO "NotificationRead" (notification_id, user_id, read_at) '
+                    f'SELECT id, ?, ? FROM "Notification" WHERE {where} AND {VISIBLE}',
+                    (user_id, now, *params, now),
+                ).rowcount
+        return changed
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
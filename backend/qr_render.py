@@ -0,0 +1,228 @@
+"""
+Batch QR image rendering for the PANDA Lounge backend service.
+
+/api/qr/generate renders one PNG per request inside Next.js, which is fine
+for a guest tapping "show my QR" but takes minutes when staff issue visit
+or referral codes for a whole event guest list. This module renders them in
+bulk instead:
+- tokens are verified first (backend/qr_token.py), so only codes this app
+  signed, and that have not expired, are rendered
+- images are rendered with segno in a ProcessPoolExecutor, in chunks, one
+  chunk per task; workers write the files themselves
+- files live in a content-addressed cache, QR_IMAGE_CACHE_DIR/ab/<key>.<fmt>,
+  keyed by the token's SHA-256; re-issuing or re-downloading a code is a
+  file read
+- each file's mtime is set to the token's `exp`, so a sweep deletes exactly
+  the images whose token can no longer be scanned, without any index
+
+segno is optional: without it the service starts with /api/qr/render/batch
+and /api/qr/image disabled.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import segno
+
+import qr_token
+
+logger = logging.getLogger("panda.qrrender")
+
+# Configuration (the style matches /api/qr/generate)
+QR_SECRET = os.environ.get("QR_SECRET", "fallback-secret-key")
+QR_IMAGE_CACHE_DIR = os.environ.get("QR_IMAGE_CACHE_DIR", "/app/data/qr-images")
+QR_RENDER_WORKERS = int(os.environ.get("QR_RENDER_WORKERS", "0")) or os.cpu_count() or 1
+QR_RENDER_CHUNK = int(os.environ.get("QR_RENDER_CHUNK", "32"))
+QR_RENDER_MAX_TOKENS = int(os.environ.get("QR_RENDER_MAX_TOKENS", "2000"))
+QR_IMAGE_SWEEP_INTERVAL = 300
+QR_IMAGE_WIDTH = 400
+QR_IMAGE_BORDER = 2
+QR_IMAGE_DARK = "#10B981"   # PANDA green
+QR_IMAGE_LIGHT = "#1F2937"  # Dark background
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def image_key(token):
+    """Content address of a token's images"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def image_path(cache_dir, key, fmt):
+    return os.path.join(cache_dir, key[:2], f"{key}.{fmt}")
+
+
+def render(token, fmt):
+    """One QR image as bytes, styled like /api/qr/generate (level H, ~400px)"""
+    qr = segno.make(token, error="h", micro=False)
+    width, _ = qr.symbol_size(border=QR_IMAGE_BORDER)
+    out = io.BytesIO()
+    qr.save(out, kind=fmt, scale=max(1, QR_IMAGE_WIDTH // width), border=QR_IMAGE_BORDER,
+            dark=QR_IMAGE_DARK, light=QR_IMAGE_LIGHT)
+    return out.getvalue()
+
+
+def render_chunk(cache_dir, jobs, formats):
+    """Render and store [(key, token, exp)] in a worker process.
+
+    Writes are atomic (temp file + rename) so a reader never sees half an
+    image; returns (images written, bytes written).
+    """
+    images = written = 0
+    for key, token, exp in jobs:
+        os.makedirs(os.path.join(cache_dir, key[:2]), exist_ok=True)
+        for fmt in formats:
+            data = render(token, fmt)
+            path = image_path(cache_dir, key, fmt)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.utime(tmp, (exp, exp))
+            os.replace(tmp, path)
+            images += 1
+            written += len(data)
+    return images, written
+
+
+class QRRenderPipeline:
+    """Verifies tokens, serves cached images and renders the rest in a process pool.
+
+    Cache lookups, reads and sweeps run on one filesystem thread; rendering
+    runs on `workers` processes.
+    """
+
+    def __init__(self, cache_dir=QR_IMAGE_CACHE_DIR, workers=QR_RENDER_WORKERS,
+                 secret=QR_SECRET, chunk_size=QR_RENDER_CHUNK):
+        self.cache_dir = cache_dir
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.keyed = qr_token.keyed_mac(secret)
+        self.pool = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qrrender-fs")
+        self.stats = {"batches": 0, "tokens": 0, "rejected": 0, "hits": 0, "rendered": 0,
+                      "bytes_written": 0, "render_seconds": 0.0, "swept": 0}
+
+    async def start(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # spawn, not fork: the service process already runs threads and an event loop
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"QR images cached in {self.cache_dir}, rendered by {self.workers} processes")
+
+    async def close(self):
+        if self.pool:
+            self.pool.shutdown(wait=True)
+        self.executor.shutdown(wait=True)
+
+    async def render_batch(self, tokens, formats=("png",), now=None):
+        """Images for many tokens; renders only the ones not cached yet.
+
+        Returns one result per token, in order: {key, exp, cached} for a
+        stored image, or {error} (QRSystem's codes, plus EXPIRED) for a token
+        that was not rendered.
+        """
+        formats = tuple(dict.fromkeys(formats))
+        if not formats or any(fmt not in FORMATS for fmt in formats):
+            raise ValueError(f"formats must be a non-empty subset of {sorted(FORMATS)}")
+        now = int(time.time()) if now is None else now
+        self.stats["batches"] += 1
+        self.stats["tokens"] += len(tokens)
+
+        results, jobs = [], {}
+        for token in tokens:
+            payload, error = qr_token.decode(token, self.keyed)
+            if error is None and payload["exp"] <= now:
+                error = "EXPIRED"
+            if error:
+                self.stats["rejected"] += 1
+                results.append({"error": error})
+                continue
+            key = image_key(token)
+            results.append({"key": key, "exp": payload["exp"], "cached": True})
+            jobs[key] = (key, token, payload["exp"])
+
+        loop = asyncio.get_running_loop()
+        missing = await loop.run_in_executor(self.executor, self._missing, list(jobs.values()), formats, now)
+        self.stats["hits"] += len(jobs) - len(missing)
+        if missing:
+            started = time.perf_counter()
+            images, written = await self._render(missing, formats)
+            self.stats["render_seconds"] += time.perf_counter() - started
+            self.stats["rendered"] += images
+            self.stats["bytes_written"] += written
+            rendered = {key for key, _, _ in missing}
+            for result in results:
+                if result.get("key") in rendered:
+                    result["cached"] = False
+        return results
+
+    async def image(self, key, fmt, now=None):
+        """(bytes, exp) of a cached image, or None if it is missing or expired"""
+        if fmt not in FORMATS or len(key) != 64 or not all(c in "0123456789abcdef" for c in key):
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._read, key, fmt, now or time.time())
+
+    async def sweep(self, now=None):
+        """Delete images whose token has expired; returns how many were removed"""
+        loop = asyncio.get_running_loop()
+        removed = await loop.run_in_executor(self.executor, self._sweep, now or time.time())
+        self.stats["swept"] += removed
+        return removed
+
+    async def _render(self, jobs, formats):
+        # Small enough chunks to keep every worker busy, large enough to amortise pickling
+        size = min(self.chunk_size, -(-len(jobs) // self.workers))
+        loop = asyncio.get_running_loop()
+        done = await asyncio.gather(*(
+            loop.run_in_executor(self.pool, render_chunk, self.cache_dir, jobs[i:i + size], formats)
+            for i in range(0, len(jobs), size)
+        ))
+        return sum(images for images, _ in done), sum(written for _, written in done)
+
+    # The methods below run on the qrrender-fs thread
+
+    def _missing(self, jobs, formats, now):
+        missing = []
+        for job in jobs:
+            for fmt in formats:
+                try:
+                    if os.stat(image_path(self.cache_dir, job[0], fmt)).st_mtime > now:
+                        continue
+                except FileNotFoundError:
+                    pass
+                missing.append(job)
+                break
+        return missing
+
+    def _read(self, key, fmt, now):
+        path = image_path(self.cache_dir, key, fmt)
+        try:
+            with open(path, "rb") as f:
+                exp = os.fstat(f.fileno()).st_mtime
+                if exp <= now:
+                    return None
+                return f.read(), int(exp)
+        except FileNotFoundError:
+            return None
+
+    def _sweep(self, now):
+        removed = 0
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                # A .tmp file is still being written (or left by a crashed worker)
+                cutoff = now - QR_IMAGE_SWEEP_INTERVAL if entry.name.endswith(".tmp") else now
+                try:
+                    if entry.stat().st_mtime <= cutoff:
+                        os.unlink(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
@@ -0,0 +1,241 @@
+"""
+QR token formats shared by the PANDA Lounge backend service and harnesses.
+
+Legacy tokens (lib/qr-system.ts before the compact format) are
+`base64url(JSON payload).base64url(HMAC-SHA256)`: about 230 characters in
+QR byte mode, plus a JSON parse per validation.
+
+Compact tokens pack the same payload into a fixed binary layout and encode
+it as unpadded RFC 4648 base32hex (0-9A-V), which QR codes store in the
+denser alphanumeric mode and Python's int(token, 32) decodes in C:
+
+    offset  size  field
+    0       1     version (high nibble) | QR type (low nibble)
+    1       12    nonce
+    13      4     iat, Unix seconds (uint32, big-endian)
+    17      4     exp, Unix seconds (uint32, big-endian)
+    21      1     user reference: 0 = packed cuid, else UTF-8 length
+    22      16|n  user id: a cuid's 24 base36 digits as 8 uint16 triples, or raw UTF-8
+    ...     10    HMAC-SHA256 of everything before it, truncated
+
+A cuid user makes a 48-byte, 77-character token. Both formats decode to the
+same payload dict ({sub, type, userId, nonce, iat, exp}); compact tokens
+carry no free-text subject, so `sub` is derived from the type. A token
+containing "." is legacy; anything else is compact.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import math
+import os
+import re
+import struct
+import time
+
+# Configuration (must match lib/qr-system.ts)
+TOKEN_VERSION = 1
+MAC_BYTES = 10
+NONCE_BYTES = 12
+
+# Wire values of the type nibble; append only
+QR_TYPES = ("visit", "promo", "referral", "staff_check")
+TYPE_CODES = {qr_type: code for code, qr_type in enumerate(QR_TYPES)}
+
+HEADER = struct.Struct(">B12sIIB")
+CUID_PATTERN = re.compile(r"c[0-9a-z]{24}")
+CUID_REF = 0
+CUID_TRIPLES = struct.Struct(">8H")
+BASE36_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE32HEX_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUV"
+BASE32HEX_PATTERN = re.compile(r"[0-9A-Va-v]+")
+
+# Every 3-digit base36 string, indexed by its value (46656 entries)
+_TRIPLES = [a + b + c for a in BASE36_DIGITS for b in BASE36_DIGITS for c in BASE36_DIGITS]
+# Every 2-digit base32hex string, indexed by its 10-bit value
+_PAIRS = [a + b for a in BASE32HEX_DIGITS for b in BASE32HEX_DIGITS]
+PAYLOAD_FIELDS = {"nonce", "exp", "iat", "type", "userId"}
+
+
+def b64url_decode(data):
+    """Decode unpadded base64url (Node's 'base64url' encoding)"""
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def b64url_encode(data):
+    """Encode bytes as unpadded base64url"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def b32hex_encode(data):
+    """Encode bytes as unpadded base32hex"""
+    chars, pad = divmod(len(data) * 8 + 4, 5)
+    value = int.from_bytes(data, "big") << (4 - pad)
+    head = BASE32HEX_DIGITS[value >> 5 * (chars - 1)] if chars % 2 else ""
+    return head + "".join([_PAIRS[value >> shift & 0x3FF] for shift in range(10 * (chars // 2) - 10, -1, -10)])
+
+
+def b32hex_decode(text):
+    """Decode unpadded base32hex; raises ValueError unless it is exactly what b32hex_encode emits"""
+    if not BASE32HEX_PATTERN.fullmatch(text):
+        raise ValueError("not base32hex")
+    size, pad = divmod(len(text) * 5, 8)
+    value = int(text, 32)
+    if pad >= 5 or value & ((1 << pad) - 1):
+        raise ValueError("non-canonical base32hex")
+    return (value >> pad).to_bytes(size, "big")
+
+
+def keyed_mac(secret):
+    """HMAC-SHA256 keyed once; copy() it per token"""
+    return hmac.new(secret.encode(), digestmod=hashlib.sha256)
+
+
+def default_subject(qr_type):
+    """The subject /api/qr/generate uses when none is given"""
+    return f"{qr_type} QR code"
+
+
+def new_payload(qr_type, user_id, ttl_seconds, subject=None, now=None):
+    """Payload dict as QRSystem.generateQR builds it (compact-sized nonce)"""
+    now = int(time.time()) if now is None else int(now)
+    return {
+        "sub": subject or default_subject(qr_type),
+        "type": qr_type,
+        "userId": user_id,
+        "nonce": os.urandom(NONCE_BYTES).hex(),
+        "iat": now,
+        "exp": now + int(ttl_seconds),
+    }
+
+
+def pack_user(user_id):
+    """User id -> reference byte + bytes"""
+    if CUID_PATTERN.fullmatch(user_id):
+        return bytes([CUID_REF]) + CUID_TRIPLES.pack(*(int(user_id[i:i + 3], 36) for i in range(1, 25, 3)))
+    raw = user_id.encode()
+    if not 0 < len(raw) < 256:
+        raise ValueError("userId must be 1-255 bytes")
+    return bytes([len(raw)]) + raw
+
+
+def unpack_user(ref, body):
+    """(user id, bytes consumed) from the reference byte and what follows it"""
+    if ref == CUID_REF:
+        if len(body) < CUID_TRIPLES.size:
+            raise ValueError("truncated user id")
+        try:
+            return "c" + "".join(map(_TRIPLES.__getitem__, CUID_TRIPLES.unpack_from(body))), CUID_TRIPLES.size
+        except IndexError:
+            raise ValueError("user id out of range") from None
+    if len(body) < ref:
+        raise ValueError("truncated user id")
+    return body[:ref].decode(), ref
+
+
+def encode_compact(payload, keyed):
+    """Compact token for a payload dict; `keyed` is keyed_mac(secret)"""
+    nonce = bytes.fromhex(payload["nonce"])
+    if len(nonce) != NONCE_BYTES:
+        raise ValueError(f"compact tokens need a {NONCE_BYTES}-byte nonce")
+    user = pack_user(payload["userId"])
+    header = HEADER.pack(
+        TOKEN_VERSION << 4 | TYPE_CODES[payload["type"]],
+        nonce,
+        payload["iat"],
+        payload["exp"],
+        user[0],
+    )
+    body = header + user[1:]
+    mac = keyed.copy()
+    mac.update(body)
+    return b32hex_encode(body + mac.digest()[:MAC_BYTES])
+
+
+def encode_legacy(payload, keyed):
+    """Legacy `payload.signature` token, byte-compatible with QRSystem's old output"""
+    payload_b64 = b64url_encode(json.dumps(payload, separators=(",", ":")).encode())
+    mac = keyed.copy()
+    mac.update(payload_b64.encode())
+    return f"{payload_b64}.{b64url_encode(mac.digest())}"
+
+
+def decode(token, keyed):
+    """Verify and decode a token of either format.
+
+    Returns (payload, error); exactly one of them is None. Errors are
+    QRSystem's codes (INVALID_FORMAT, INVALID_SIGNATURE).
+    """
+    if not isinstance(token, str):
+        return None, "INVALID_FORMAT"
+    if "." in token:
+        return _decode_legacy(token, keyed)
+    return _decode_compact(token, keyed)
+
+
+def _decode_compact(token, keyed):
+    try:
+        raw = b32hex_decode(token)
+    except ValueError:
+        return None, "INVALID_FORMAT"
+    if len(raw) < HEADER.size + MAC_BYTES:
+        return None, "INVALID_FORMAT"
+
+    body, tag = raw[:-MAC_BYTES], raw[-MAC_BYTES:]
+    mac = keyed.copy()
+    mac.update(body)
+    if not hmac.compare_digest(tag, mac.digest()[:MAC_BYTES]):
+        return None, "INVALID_SIGNATURE"
+
+    header, nonce, iat, exp, ref = HEADER.unpack_from(body)
+    if header >> 4 != TOKEN_VERSION or header & 0x0F >= len(QR_TYPES):
+        return None, "INVALID_FORMAT"
+    try:
+        user_id, used = unpack_user(ref, body[HEADER.size:])
+    except (ValueError, UnicodeDecodeError):
+        return None, "INVALID_FORMAT"
+    if HEADER.size + used != len(body):
+        return None, "INVALID_FORMAT"
+
+    qr_type = QR_TYPES[header & 0x0F]
+    return {
+        "sub": default_subject(qr_type),
+        "type": qr_type,
+        "userId": user_id,
+        "nonce": nonce.hex(),
+        "iat": iat,
+        "exp": exp,
+    }, None
+
+
+def _decode_legacy(token, keyed):
+    parts = token.split(".")
+    if len(parts) != 2:
+        return None, "INVALID_FORMAT"
+
+    payload_b64, signature = parts
+    mac = keyed.copy()
+    mac.update(payload_b64.encode())
+    if not hmac.compare_digest(signature, b64url_encode(mac.digest())):
+        return None, "INVALID_SIGNATURE"
+
+    try:
+        payload = json.loads(b64url_decode(payload_b64))
+    except (ValueError, UnicodeDecodeError):
+        return None, "INVALID_FORMAT"
+
+    if not isinstance(payload, dict) or not PAYLOAD_FIELDS <= payload.keys():
+        return None, "INVALID_FORMAT"
+    if not all(isinstance(payload[field], str) and payload[field] for field in ("nonce", "type", "userId")):
+        return None, "INVALID_FORMAT"
+    if not all(_is_number(payload[field]) for field in ("iat", "exp")):
+        return None, "INVALID_FORMAT"
+    if not isinstance(payload.get("sub", ""), str):
+        return None, "INVALID_FORMAT"
+    return payload, None
+
+
+def _is_number(value):
+    # bool is an int subclass; NaN and infinities compare oddly against time()
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
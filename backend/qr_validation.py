@@ -0,0 +1,499 @@
+"""
+QR token validation for the PANDA Lounge backend service.
+
+Verifies the tokens issued by lib/qr-system.ts (compact binary tokens and
+legacy `payload.signature` ones, see qr_token.py) with at most one indexed
+SQLite read per scan:
+- replays are checked against an in-memory nonce index that forgets each
+  nonce once its token has expired; a nonce is reserved there before any
+  await, so concurrent scans of one token cannot both succeed
+- a nonce the index has not seen is looked up in QRValidationEvent before
+  it is accepted, since the app validates without the backend while it is
+  down and those rows never reach the index
+- validator roles are cached for QR_ROLE_TTL_MS, so a promotion or
+  demotion takes effect without a restart
+- QRValidationEvent rows are queued and written in batches by a background
+  writer thread; replay attempts go to AuditLog (action qr_replay_attempt)
+  in the same transaction, since QRValidationEvent.qr_nonce is unique and
+  already holds the successful scan
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import audit
+import db
+import qr_token
+
+logger = logging.getLogger("panda.qr")
+
+# Configuration (must match lib/qr-system.ts)
+QR_SECRET = os.environ.get("QR_SECRET", "fallback-secret-key")
+NONCE_INDEX_CAPACITY = int(os.environ.get("QR_NONCE_CAPACITY", "200000"))
+EVENT_BATCH_SIZE = int(os.environ.get("QR_EVENT_BATCH_SIZE", "256"))
+EVENT_FLUSH_INTERVAL = float(os.environ.get("QR_EVENT_FLUSH_MS", "50")) / 1000
+BATCH_MAX_TOKENS = int(os.environ.get("QR_BATCH_MAX", "500"))
+ROLE_CACHE_TTL = float(os.environ.get("QR_ROLE_TTL_MS", "60000")) / 1000
+
+# Which QR types each role may validate (QRSystem.canValidateQRType)
+PERMISSIONS = {
+    "admin": ("visit", "promo", "referral", "staff_check"),
+    "staff": ("visit", "promo"),
+    "guest": (),
+}
+
+ERROR_MESSAGES = {
+    "INVALID_FORMAT": "QR код має невірний формат",
+    "INVALID_SIGNATURE": "QR код підроблено або пошкоджено",
+    "EXPIRED": "QR код прострочений",
+    "ALREADY_USED": "QR код вже використано",
+    "REPLAY_ATTACK": "Спроба повторного використання QR коду",
+    "INSUFFICIENT_PERMISSIONS": "Недостатньо прав для валідації цього типу QR коду",
+    "VALIDATION_ERROR": "Помилка валідації QR коду",
+    "USER_NOT_FOUND": "Користувач не знайдений",
+}
+
+SUCCESS_MESSAGES = {
+    "visit": "✅ Візит підтверджено",
+    "promo": "✅ Промокод активовано",
+    "referral": "✅ Реферал підтверджено",
+    "staff_check": "✅ Перевірка персоналу пройдена",
+}
+
+
+def parse_token(token, secret=QR_SECRET):
+    """Verify a token's signature and decode its payload.
+
+    Returns (payload, error); exactly one of them is None.
+    """
+    return qr_token.decode(token, qr_token.keyed_mac(secret))
+
+
+def parse_tokens(tokens, secret=QR_SECRET):
+    """parse_token for many tokens, keying the HMAC once for the whole batch"""
+    keyed = qr_token.keyed_mac(secret)
+    return [qr_token.decode(token, keyed) for token in tokens]
+
+
+def can_validate(role, qr_type):
+    """Check if role can validate the given QR type"""
+    return qr_type in PERMISSIONS.get(role, ())
+
+
+class NonceIndex:
+    """Bounded set of consumed nonces that forgets each one at its token's exp.
+
+    Expired tokens are rejected before the replay check, so a nonce never
+    needs to be remembered past its `exp`. When the index is full the nonce
+    that expires soonest is evicted early. A hit is always a replay; a miss
+    only means this process has not recorded the nonce.
+    """
+
+    def __init__(self, capacity=NONCE_INDEX_CAPACITY):
+        self.capacity = capacity
+        self._expiry = {}
+        self._heap = []
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def __contains__(self, nonce):
+        return nonce in self._expiry
+
+    def add(self, nonce, exp):
+        """Remember a consumed nonce until `exp` (Unix seconds)"""
+        if nonce in self._expiry:
+            return
+        self._expiry[nonce] = exp
+        heapq.heappush(self._heap, (exp, nonce))
+        while len(self._expiry) > self.capacity:
+            _, evicted = heapq.heappop(self._heap)
+            self._expiry.pop(evicted, None)
+
+    def discard(self, nonce):
+        """Forget a nonce reserved by a validation that was then rejected.
+
+        Its heap entry is left behind and skipped when it comes up.
+        """
+        self._expiry.pop(nonce, None)
+
+    def purge(self, now=None):
+        """Drop nonces whose tokens have expired; returns how many"""
+        now = time.time() if now is None else now
+        purged = 0
+        while self._heap and self._heap[0][0] < now:
+            _, nonce = heapq.heappop(self._heap)
+            if self._expiry.pop(nonce, None) is not None:
+                purged += 1
+        return purged
+
+
+class EventWriter:
+    """Queues QRValidationEvent (and replay AuditLog) rows and writes them in batches.
+
+    All SQLite work runs on a single dedicated thread so the event loop never
+    blocks on the database. Rows are flushed when a batch fills up or after
+    EVENT_FLUSH_INTERVAL, whichever comes first. `written` counts the rows
+    actually inserted; `ignored` the ones INSERT OR IGNORE skipped.
+    """
+
+    INSERT_SQL = (
+        'INSERT OR IGNORE INTO "QRValidationEvent" '
+        "(id, qr_type, qr_nonce, qr_subject, qr_issued_at, qr_expires_at, "
+        "user_id, validator_id, validated_at, success, error_message) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
+    def __init__(self, db_path=None, batch_size=EVENT_BATCH_SIZE, flush_interval=EVENT_FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qr-writer")
+        self.written = 0
+        self.ignored = 0
+        self.failed = 0
+        self._conn = None
+        self._pending = []
+        self._replays = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    @property
+    def pending(self):
+        return len(self._pending) + len(self._replays)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def record(self, payload, validator_id, success, error=None):
+        """Queue one validation event; returns the generated event id"""
+        event_id = db.new_cuid()
+        # qr_nonce is UNIQUE, so a second row for a nonce (a scan of a token
+        # the app's fallback already recorded) is ignored, not a batch failure
+        self._pending.append((
+            event_id,
+            payload["type"],
+            payload["nonce"],
+            payload.get("sub", ""),
+            int(payload["iat"]) * 1000,
+            int(payload["exp"]) * 1000,
+            payload["userId"],
+            validator_id,
+            db.now_ms(),
+            1 if success else 0,
+            error,
+        ))
+        if self.pending >= self.batch_size:
+            self._wakeup.set()
+        return event_id
+
+    def record_replay(self, payload, validator_id):
+        """Queue an AuditLog row for a scan of an already-used nonce; returns its id"""
+        row = audit.normalize_event({
+            "userId": validator_id,
+            "action": "qr_replay_attempt",
+            "entityType": "QRValidationEvent",
+            "details": {
+                "nonce": payload["nonce"],
+                "type": payload["type"],
+                "userId": payload["userId"],
+                "exp": payload["exp"],
+            },
+        })
+        self._replays.append(row)
+        if self.pending >= self.batch_size:
+            self._wakeup.set()
+        return row[0]
+
+    async def flush(self):
+        """Write everything queued so far"""
+        if not self._pending and not self._replays:
+            return
+        batch, self._pending = self._pending, []
+        replays, self._replays = self._replays, []
+        loop = asyncio.get_running_loop()
+        try:
+            inserted = await loop.run_in_executor(self.executor, self._write_batch, batch, replays)
+        except Exception as e:
+            self.failed += len(batch) + len(replays)
+            logger.error(f"Failed to write {len(batch) + len(replays)} validation events: {e}")
+            return
+        self.written += inserted
+        self.ignored += len(batch) + len(replays) - inserted
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        await self.flush()
+        self.executor.submit(self._close_connection).result()
+        self.executor.shutdown(wait=True)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def connection(self):
+        """The writer thread's connection, opened on first use"""
+        if self._conn is None:
+            self._conn = db.connect(self.db_path)
+        return self._conn
+
+    def _write_batch(self, batch, replays=()):
+        conn = self.connection()
+        before = conn.total_changes
+        with conn:
+            conn.executemany(self.INSERT_SQL, batch)
+            conn.executemany(audit.AuditWriter.INSERT_SQL, replays)
+        return conn.total_changes - before
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class QRValidator:
+    """Validates QR tokens against the nonce index and records the outcome"""
+
+    def __init__(self, db_path=None, secret=QR_SECRET, nonce_capacity=NONCE_INDEX_CAPACITY):
+        self.db_path = db_path
+        self.secret = secret
+        self.nonces = NonceIndex(nonce_capacity)
+        self.events = EventWriter(db_path)
+        self.roles = {}  # user_id -> (role, loaded_at)
+        self.inflight = set()
+        self.stats = {"validated": 0, "rejected": 0, "db_lookups": 0}
+
+    async def start(self):
+        """Warm the nonce index and role cache, then start the batch writer"""
+        loop = asyncio.get_running_loop()
+        nonces, roles = await loop.run_in_executor(self.events.executor, self._load_state)
+        for nonce, exp in nonces:
+            self.nonces.add(nonce, exp)
+        loaded_at = time.monotonic()
+        self.roles.update((user_id, (role, loaded_at)) for user_id, role in roles.items())
+        self.events.start()
+        logger.info(f"Loaded {len(self.nonces)} live nonces and {len(self.roles)} user roles")
+
+    async def close(self):
+        await self.events.close()
+
+    async def validate(self, token, validator_id):
+        """Validate a token on behalf of `validator_id`.
+
+        Mirrors QRSystem.validateQR: signature, expiry, replay, then role
+        permissions. Returns a dict shaped like the /api/qr/validate response.
+        """
+        payload, error = parse_token(token, self.secret)
+        if error:
+            return self._reject(error)
+
+        if payload["exp"] < time.time():
+            return self._reject("EXPIRED", payload)
+
+        nonce = payload["nonce"]
+        if nonce in self.inflight:
+            # Another scan of this token is being validated right now and
+            # records the outcome
+            return self._reject("ALREADY_USED", payload)
+        if nonce in self.nonces:
+            self.events.record_replay(payload, validator_id)
+            return self._reject("ALREADY_USED", payload)
+
+        # Reserve the nonce before the first await and release it on rejection
+        self.nonces.add(nonce, payload["exp"])
+        self.inflight.add(nonce)
+        try:
+            if await self._seen_in_db(payload):
+                self.events.record_replay(payload, validator_id)
+                return self._reject("ALREADY_USED", payload)
+
+            role = await self._role(validator_id)
+            if not can_validate(role, payload["type"]):
+                self.nonces.discard(nonce)
+                return self._reject("INSUFFICIENT_PERMISSIONS", payload)
+        except BaseException:
+            self.nonces.discard(nonce)
+            raise
+        finally:
+            self.inflight.discard(nonce)
+
+        event_id = self.events.record(payload, validator_id, True)
+        self.stats["validated"] += 1
+        return {
+            "valid": True,
+            "payload": payload,
+            "message": SUCCESS_MESSAGES.get(payload["type"], "✅ QR код валідовано"),
+            "event_id": event_id,
+        }
+
+    async def validate_batch(self, tokens, validator_id):
+        """Validate a group of tokens for one validator; one result per token.
+
+        Signatures are checked in one pass, nonces missing from the index
+        are looked up with a single IN query, and all events are written in
+        one transaction before returning. A nonce repeated within the batch
+        is a replay if its first occurrence was accepted (or already used),
+        and otherwise shares that occurrence's rejection.
+        """
+        now = time.time()
+        results = [None] * len(tokens)
+        live = []
+        replays = []
+        repeats = []
+        reserved = {}  # nonce -> index of its first occurrence
+        for i, (payload, error) in enumerate(parse_tokens(tokens, self.secret)):
+            if error:
+                results[i] = self._reject(error)
+            elif payload["exp"] < now:
+                results[i] = self._reject("EXPIRED", payload)
+            elif payload["nonce"] in reserved:
+                repeats.append((i, payload))
+            elif payload["nonce"] in self.inflight:
+                results[i] = self._reject("ALREADY_USED", payload)
+            elif payload["nonce"] in self.nonces:
+                replays.append((i, payload))
+            else:
+                # Reserved before the first await, as in validate()
+                self.nonces.add(payload["nonce"], payload["exp"])
+                self.inflight.add(payload["nonce"])
+                reserved[payload["nonce"]] = i
+                live.append((i, payload))
+
+        try:
+            seen = await self._seen_in_db_many(reserved) if reserved else set()
+            role = await self._role(validator_id)
+        except BaseException:
+            for nonce in reserved:
+                self.nonces.discard(nonce)
+            raise
+        finally:
+            self.inflight.difference_update(reserved)
+
+        for i, payload in replays:
+            self.events.record_replay(payload, validator_id)
+            results[i] = self._reject("ALREADY_USED", payload)
+
+        accepted = set()
+        for i, payload in live:
+            nonce = payload["nonce"]
+            if nonce in seen:
+                self.events.record_replay(payload, validator_id)
+                results[i] = self._reject("ALREADY_USED", payload)
+            elif not can_validate(role, payload["type"]):
+                self.nonces.discard(nonce)
+                results[i] = self._reject("INSUFFICIENT_PERMISSIONS", payload)
+            else:
+                accepted.add(nonce)
+                self.stats["validated"] += 1
+                results[i] = {
+                    "valid": True,
+                    "payload": payload,
+                    "message": SUCCESS_MESSAGES.get(payload["type"], "✅ QR код валідовано"),
+                    "event_id": self.events.record(payload, validator_id, True),
+                }
+
+        for i, payload in repeats:
+            nonce = payload["nonce"]
+            if nonce in accepted or nonce in seen:
+                self.events.record_replay(payload, validator_id)
+                results[i] = self._reject("ALREADY_USED", payload)
+            else:
+                results[i] = self._reject(results[reserved[nonce]]["error"], payload)
+
+        await self.events.flush()
+        return results
+
+    def purge_expired(self):
+        return self.nonces.purge()
+
+    def _reject(self, error, payload=None):
+        self.stats["rejected"] += 1
+        result = {
+            "valid": False,
+            "error": error,
+            "message": ERROR_MESSAGES.get(error, "Невідома помилка валідації"),
+        }
+        if payload is not None:
+            result["payload"] = payload
+        return result
+
+    async def _seen_in_db(self, payload):
+        """Was the nonce recorded without passing through the index (fallback or eviction)?"""
+        self.stats["db_lookups"] += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.events.executor, self._query_nonce, payload["nonce"])
+
+    async def _seen_in_db_many(self, nonces):
+        self.stats["db_lookups"] += len(nonces)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.events.executor, self._query_nonces, list(nonces))
+
+    async def _role(self, user_id):
+        """A validator's role, from the cache while it is younger than ROLE_CACHE_TTL"""
+        cached = self.roles.get(user_id)
+        if cached is not None and time.monotonic() - cached[1] < ROLE_CACHE_TTL:
+            return cached[0]
+        loop = asyncio.get_running_loop()
+        role = await loop.run_in_executor(self.events.executor, self._query_role, user_id)
+        if role is None:
+            self.roles.pop(user_id, None)
+        else:
+            self.roles[user_id] = (role, time.monotonic())
+        return role
+
+    def forget_role(self, user_id=None):
+        """Drop a cached role (or all of them) after a role change"""
+        if user_id is None:
+            self.roles.clear()
+        else:
+            self.roles.pop(user_id, None)
+
+    # The methods below run on the writer thread
+
+    def _load_state(self):
+        conn = db.connect(self.db_path, readonly=True)
+        try:
+            nonces = [
+                (nonce, expires_at // 1000)
+                for nonce, expires_at in conn.execute(
+                    'SELECT qr_nonce, qr_expires_at FROM "QRValidationEvent" WHERE qr_expires_at > ?',
+                    (db.now_ms(),),
+                )
+            ]
+            roles = dict(conn.execute('SELECT id, role FROM "User" WHERE role IN (\'staff\', \'admin\')'))
+            return nonces, roles
+        finally:
+            conn.close()
+
+    def _query_nonce(self, nonce):
+        row = self.events.connection().execute(
+            'SELECT 1 FROM "QRValidationEvent" WHERE qr_nonce = ?', (nonce,)
+        ).fetchone()
+        return row is not None
+
+    def _query_nonces(self, nonces):
+        placeholders = ", ".join("?" * len(nonces))
+        return {
+            nonce for (nonce,) in self.events.connection().execute(
+                f'SELECT qr_nonce FROM "QRValidationEvent" WHERE qr_nonce IN ({placeholders})',
+                nonces,
+            )
+        }
+
+    def _query_role(self, user_id):
+        conn = db.connect(self.db_path, readonly=True)
+        try:
+            row = conn.execute('SELECT role FROM "User" WHERE id = ?', (user_id,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
@@ -0,0 +1,368 @@
+"""
+Rate limiting for the PANDA Lounge backend service.
+
+Abuse control used to live in each route: /api/wheel/spin reads WheelSpin
+before it can answer 429, /api/music/order reads MusicOrder, and
+/api/qr/generate has no limit at all. This module answers "may this user /
+IP do this now?" from memory, so a rejection never costs a database
+round-trip:
+- policies (wheel_spin, qr_generate, music_order, promo_create) are lists
+  of rules keyed by user id or client IP
+- token buckets absorb bursts of attempts; sliding windows (exact logs of
+  the last few timestamps) cap how often an action may succeed (spins per
+  day, promos per staff member per week)
+- limits come from SystemSettings ('limits' and friends), re-read
+  periodically, so admin changes apply without a restart
+- per-key state is an LRU map; keys whose state has fully recovered are
+  swept, and the map never grows past RATE_LIMIT_CAPACITY
+- test harnesses reset the state and suspend limiting (for everyone or for
+  their own users) for the length of a run, up to RATE_LIMIT_BYPASS_MAX
+
+The limiter sits in front of the routes' own checks, which stay the source
+of truth: state is lost on restart, so windows start empty again.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+logger = logging.getLogger("panda.ratelimit")
+
+# Configuration
+RATE_LIMIT_CAPACITY = int(os.environ.get("RATE_LIMIT_CAPACITY", "200000"))
+RATE_LIMIT_SETTINGS_REFRESH = float(os.environ.get("RATE_LIMIT_SETTINGS_REFRESH", "30"))
+RATE_LIMIT_SWEEP_INTERVAL = 60
+RATE_LIMIT_BYPASS_MAX = 6 * 60 * 60
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# SystemSettings keys the policies read; the defaults match SettingsManager's seeds
+SETTING_DEFAULTS = {
+    "max_wheel_spins_per_day": 1,
+    "max_promos_per_staff_week": 2,
+    "wheel_spin_attempts_per_minute": 6,
+    "qr_generate_per_minute": 10,
+    "music_order_interval_minutes": 10,
+    "rate_limit_ip_per_minute": 120,
+}
+
+
+class TokenBucket:
+    """Up to `burst` at once, refilled at `rate` per second.
+
+    State is [tokens, updated_at]; a new key starts full.
+    """
+
+    __slots__ = ("scope", "name", "burst", "rate", "on")
+
+    def __init__(self, scope, name, burst, rate, on="attempt"):
+        self.scope = scope
+        self.name = name
+        self.burst = max(1, burst)
+        self.rate = rate
+        self.on = on
+
+    def new_state(self, now):
+        return [float(self.burst), now]
+
+    def _refill(self, state, now):
+        state[0] = min(self.burst, state[0] + (now - state[1]) * self.rate)
+        state[1] = now
+
+    def retry_after(self, state, now, cost):
+        """0 if `cost` fits now, else seconds until it will"""
+        self._refill(state, now)
+        missing = cost - state[0]
+        if missing <= 0:
+            return 0.0
+        return math.inf if cost > self.burst or self.rate <= 0 else missing / self.rate
+
+    def remaining(self, state, now):
+        return int(state[0])
+
+    def consume(self, state, now, cost):
+        self._refill(state, now)
+        state[0] -= cost
+
+    def idle(self, state, now):
+        """Whether the key is back to a fresh bucket (safe to forget)"""
+        return self.rate > 0 and state[0] + (now - state[1]) * self.rate >= self.burst
+
+
+class SlidingWindow:
+    """At most `limit` per `window` seconds, measured over any `window`.
+
+    State is the timestamps of the counted actions still inside the window
+    (a sliding log); these limits are small (1/day, 2/week), so a key holds
+    at most `limit` floats.
+    """
+
+    __slots__ = ("scope", "name", "limit", "window", "on")
+
+    def __init__(self, scope, name, limit, window, on="success"):
+        self.scope = scope
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.on = on
+
+    def new_state(self, now):
+        return []
+
+    def _prune(self, state, now):
+        cutoff = now - self.window
+        while state and state[0] <= cutoff:
+            state.pop(0)
+
+    def retry_after(self, state, now, cost):
+        self._prune(state, now)
+        excess = len(state) + cost - self.limit
+        if excess <= 0:
+            return 0.0
+        if cost > self.limit:
+            return math.inf
+        # The oldest `excess` actions have to leave the window first
+        return state[excess - 1] + self.window - now
+
+    def remaining(self, state, now):
+        return max(0, self.limit - len(state))
+
+    def consume(self, state, now, cost):
+        self._prune(state, now)
+        state.extend([now] * cost)
+        del state[:-self.limit]
+
+    def idle(self, state, now):
+        return not state or state[-1] <= now - self.window
+
+
+def build_policies(settings):
+    """Policy name -> rules for the current SystemSettings values.
+
+    A setting of 0 disables its rule.
+    """
+    def per_minute(scope, name, key):
+        rate = settings[key]
+        return TokenBucket(scope, name, rate, rate / MINUTE) if rate > 0 else None
+
+    def window(name, key, length):
+        limit = settings[key]
+        return SlidingWindow("user", name, limit, length) if limit > 0 else None
+
+    music_interval = settings["music_order_interval_minutes"] * MINUTE
+    policies = {
+        "wheel_spin": [
+            window("spins", "max_wheel_spins_per_day", DAY),
+            per_minute("user", "attempts", "wheel_spin_attempts_per_minute"),
+            per_minute("ip", "ip", "rate_limit_ip_per_minute"),
+        ],
+        "qr_generate": [
+            per_minute("user", "generate", "qr_generate_per_minute"),
+            per_minute("ip", "ip", "rate_limit_ip_per_minute"),
+        ],
+        "music_order": [
+            SlidingWindow("user", "orders", 1, music_interval) if music_interval > 0 else None,
+            per_minute("ip", "ip", "rate_limit_ip_per_minute"),
+        ],
+        "promo_create": [
+            window("promos", "max_promos_per_staff_week", 7 * DAY),
+        ],
+    }
+    return {name: [rule for rule in rules if rule is not None] for name, rules in policies.items()}
+
+
+class RateLimiter:
+    """Policy checks against in-memory per-key state.
+
+    check() and record() are plain calls on the event loop; only the
+    SystemSettings refresh touches SQLite, on its own thread.
+    """
+
+    def __init__(self, db_path=None, capacity=RATE_LIMIT_CAPACITY):
+        self.db_path = db_path
+        self.capacity = capacity
+        self.settings = dict(SETTING_DEFAULTS)
+        self.policies = build_policies(self.settings)
+        self.state = OrderedDict()
+        self.bypass_until = 0.0
+        self.bypassed = {}  # (scope, key) -> monotonic deadline
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ratelimit-db")
+        self.stats = {"checks": 0, "allowed": 0, "rejected": 0, "bypassed": 0, "recorded": 0,
+                      "idle_evictions": 0, "lru_evictions": 0, "settings_loads": 0, "resets": 0}
+
+    async def start(self):
+        await self.refresh_settings()
+
+    async def close(self):
+        self.executor.shutdown(wait=True)
+
+    async def refresh_settings(self):
+        """Re-read the limits; existing per-key state carries over"""
+        loop = asyncio.get_running_loop()
+        values = await loop.run_in_executor(self.executor, self._load_settings)
+        settings = {**SETTING_DEFAULTS, **values}
+        if settings != self.settings:
+            changed = {k: v for k, v in settings.items() if self.settings.get(k) != v}
+            logger.info(f"Rate limits updated: {changed}")
+            self.settings = settings
+            self.policies = build_policies(settings)
+        self.stats["settings_loads"] += 1
+
+    def check(self, policy, user_id=None, ip=None, cost=1, now=None):
+        """Whether the action may proceed; consumes the attempt rules when it may.
+
+        Returns {allowed, retryAfter (seconds), remaining, rule}. Success
+        rules are only looked at here; record() counts them once the action
+        actually succeeded.
+        """
+        rules = self._rules(policy)
+        now = time.monotonic() if now is None else now
+        keys = {"user": user_id, "ip": ip}
+        self.stats["checks"] += 1
+        if self._bypassed(keys, now):
+            self.stats["bypassed"] += 1
+            return {"allowed": True, "retryAfter": 0, "remaining": None, "rule": None}
+
+        applicable = [(rule, self._state(policy, rule, keys[rule.scope], now))
+                      for rule in rules if keys[rule.scope]]
+        worst, blocking = 0.0, None
+        for rule, state in applicable:
+            wait = rule.retry_after(state, now, cost)
+            if wait > worst:
+                worst, blocking = wait, rule
+        if blocking is not None:
+            self.stats["rejected"] += 1
+            return {
+                "allowed": False,
+                "retryAfter": None if math.isinf(worst) else math.ceil(worst),
+                "remaining": 0,
+                "rule": f"{blocking.scope}:{blocking.name}",
+            }
+
+        for rule, state in applicable:
+            if rule.on == "attempt":
+                rule.consume(state, now, cost)
+        self.stats["allowed"] += 1
+        return {
+            "allowed": True,
+            "retryAfter": 0,
+            "remaining": min((rule.remaining(state, now) for rule, state in applicable), default=None),
+            "rule": None,
+        }
+
+    def record(self, policy, user_id=None, ip=None, cost=1, now=None):
+        """Count a successful action against the policy's success rules"""
+        rules = self._rules(policy)
+        now = time.monotonic() if now is None else now
+        keys = {"user": user_id, "ip": ip}
+        if self._bypassed(keys, now):
+            return
+        for rule in rules:
+            if rule.on == "success" and keys[rule.scope]:
+                rule.consume(self._state(policy, rule, keys[rule.scope], now), now, cost)
+        self.stats["recorded"] += 1
+
+    def reset(self, user_ids=(), ips=(), bypass_for=0, now=None):
+        """Forget per-key state, for these users / IPs or (with neither) everyone.
+
+        With `bypass_for` seconds the same subjects skip every policy until
+        then; 0 ends an earlier bypass. Returns how many state keys were
+        dropped.
+        """
+        now = time.monotonic() if now is None else now
+        subjects = {("user", key) for key in user_ids} | {("ip", key) for key in ips}
+        bypass_for = min(max(0, bypass_for), RATE_LIMIT_BYPASS_MAX)
+        rules = {(policy, rule.name): rule.scope for policy, rules in self.policies.items() for rule in rules}
+        if subjects:
+            dropped = [k for k in self.state if (rules.get(k[:2]), k[2]) in subjects]
+            for subject in subjects:
+                if bypass_for:
+                    self.bypassed[subject] = now + bypass_for
+                else:
+                    self.bypassed.pop(subject, None)
+        else:
+            dropped = list(self.state)
+            self.bypass_until = now + bypass_for if bypass_for else 0.0
+            if not bypass_for:
+                self.bypassed.clear()
+        for state_key in dropped:
+            del self.state[state_key]
+        self.stats["resets"] += 1
+        logger.info(f"Rate limits reset for {len(subjects) or 'all'} subjects ({len(dropped)} keys)"
+                    + (f", bypassed for {bypass_for:.0f}s" if bypass_for else ""))
+        return len(dropped)
+
+    def sweep(self, now=None):
+        """Forget keys whose state has recovered; returns how many were dropped"""
+        now = time.monotonic() if now is None else now
+        rules = {(policy, rule.name): rule for policy, rules in self.policies.items() for rule in rules}
+        idle = []
+        for state_key, state in self.state.items():
+            rule = rules.get(state_key[:2])
+            if rule is None or rule.idle(state, now):
+                idle.append(state_key)
+        for state_key in idle:
+            del self.state[state_key]
+        for subject in [s for s, until in self.bypassed.items() if until <= now]:
+            del self.bypassed[subject]
+        self.stats["idle_evictions"] += len(idle)
+        return len(idle)
+
+    def _bypassed(self, keys, now):
+        if now < self.bypass_until:
+            return True
+        return any(key and self.bypassed.get((scope, key), 0) > now for scope, key in keys.items())
+
+    def _rules(self, policy):
+        rules = self.policies.get(policy)
+        if rules is None:
+            raise ValueError(f"Unknown rate limit policy: {policy}")
+        return rules
+
+    def _state(self, policy, rule, key, now):
+        state_key = (policy, rule.name, key)
+        state = self.state.get(state_key)
+        if state is not None:
+            self.state.move_to_end(state_key)
+            return state
+        state = self.state[state_key] = rule.new_state(now)
+        if len(self.state) > self.capacity:
+            # Dropping a busy key forgives it; the routes' own checks still apply
+            self.state.popitem(last=False)
+            self.stats["lru_evictions"] += 1
+        return state
+
+    # The methods below run on the ratelimit-db thread
+
+    def _load_settings(self):
+        conn = None
+        try:
+            conn = db.connect(self.db_path, readonly=True)
+            placeholders = ", ".join("?" for _ in SETTING_DEFAULTS)
+            rows = conn.execute(
+                f'SELECT key, value FROM "SystemSettings" WHERE key IN ({placeholders})',
+                tuple(SETTING_DEFAULTS),
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Could not read SystemSettings, keeping current limits: {e}")
+            return {}
+        finally:
+            if conn is not None:
+                conn.close()
+
+        values = {}
+        for key, value in rows:
+            try:
+                values[key] = max(0, int(value))
+            except (TypeError, ValueError):
+                logger.warning(f"Ignoring non-numeric setting {key}={value!r}")
+        return values
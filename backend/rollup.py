@@ -0,0 +1,341 @@
+"""
+Incremental rollups for the PANDA Lounge admin dashboard.
+
+/api/admin/stats counts and sums Visit, WheelSpin and User rows over
+today / this week / this month on every load. The rollup engine keeps those
+numbers in per-hour and per-day buckets instead:
+- append-only sources are read past a rowid high-water mark, so each row is
+  aggregated once no matter how much history the table holds
+- buckets and watermarks are persisted to a separate SQLite file (the Prisma
+  database is never written), so a restart resumes where it stopped
+- state counts with no change timestamp (pending music orders, active
+  coupons, active and high-risk users) are refreshed periodically as gauges
+
+Week windows are hour-aligned: weekVisits covers whole hours since
+now - 7 days.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import db
+
+logger = logging.getLogger("panda.rollup")
+
+# Configuration
+ROLLUP_DB_PATH = os.environ.get("ROLLUP_DB_PATH", "/app/prisma/rollup.db")
+ROLLUP_INTERVAL = float(os.environ.get("ROLLUP_INTERVAL_MS", "5000")) / 1000
+GAUGE_REFRESH_INTERVAL = float(os.environ.get("ROLLUP_GAUGE_REFRESH", "60"))
+CATCH_UP_CHUNK = 50000
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+
+# Append-only sources: (rowid, timestamp, count, total) past a rowid watermark
+SOURCES = {
+    "visits": (
+        'SELECT rowid, created_at, status = \'confirmed\', '
+        "CASE WHEN status = 'confirmed' THEN COALESCE(bill_amount, 0) ELSE 0 END "
+        'FROM "Visit" WHERE rowid > ? ORDER BY rowid LIMIT ?'
+    ),
+    "wheel_spins": 'SELECT rowid, spun_at, 1, 0 FROM "WheelSpin" WHERE rowid > ? ORDER BY rowid LIMIT ?',
+    "users": 'SELECT rowid, created_at, 1, 0 FROM "User" WHERE rowid > ? ORDER BY rowid LIMIT ?',
+}
+
+# Current-state counts, recomputed every GAUGE_REFRESH_INTERVAL
+GAUGES = {
+    "activeUsers": ('SELECT COUNT(*) FROM "User" WHERE last_login >= ?', lambda now: (now - 30 * DAY_MS,)),
+    "pendingMusicOrders": ('SELECT COUNT(*) FROM "MusicOrder" WHERE status = \'pending\'', lambda now: ()),
+    "activeCoupons": (
+        'SELECT COUNT(*) FROM "Coupon" WHERE expires_at >= ? AND redeemed_at IS NULL',
+        lambda now: (now,),
+    ),
+    "highRiskUsers": ('SELECT COUNT(*) FROM "User" WHERE risk_score >= 10', lambda now: ()),
+}
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS "RollupHourly" (
+    metric TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    PRIMARY KEY (metric, hour)
+);
+CREATE TABLE IF NOT EXISTS "RollupDaily" (
+    metric TEXT NOT NULL,
+    day TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    PRIMARY KEY (metric, day)
+);
+CREATE TABLE IF NOT EXISTS "RollupWatermark" (
+    source TEXT PRIMARY KEY,
+    last_rowid INTEGER NOT NULL
+);
+"""
+
+UPSERT_HOURLY = (
+    'INSERT INTO "RollupHourly" (metric, hour, count, total) VALUES (?, ?, ?, ?) '
+    "ON CONFLICT (metric, hour) DO UPDATE SET count = count + excluded.count, total = total + excluded.total"
+)
+UPSERT_DAILY = (
+    'INSERT INTO "RollupDaily" (metric, day, count, total) VALUES (?, ?, ?, ?) '
+    "ON CONFLICT (metric, day) DO UPDATE SET count = count + excluded.count, total = total + excluded.total"
+)
+UPSERT_WATERMARK = (
+    'INSERT INTO "RollupWatermark" (source, last_rowid) VALUES (?, ?) '
+    "ON CONFLICT (source) DO UPDATE SET last_rowid = excluded.last_rowid"
+)
+
+
+def local_day(timestamp_ms):
+    """Local calendar date (YYYY-MM-DD), the day the dashboard's todayStart uses"""
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp_ms / 1000))
+
+
+def local_midnight(timestamp_ms):
+    moment = datetime.fromtimestamp(timestamp_ms / 1000)
+    return int(moment.replace(hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000)
+
+
+def add_bucket(buckets, key, count, total):
+    bucket = buckets.get(key)
+    if bucket is None:
+        buckets[key] = [count, total]
+    else:
+        bucket[0] += count
+        bucket[1] += total
+
+
+class RollupDeltas:
+    """Bucket increments produced by one catch-up pass"""
+
+    __slots__ = ("hourly", "daily", "watermarks", "rows")
+
+    def __init__(self):
+        self.hourly = {}
+        self.daily = {}
+        self.watermarks = {}
+        self.rows = 0
+
+
+class RollupEngine:
+    """Keeps hourly/daily dashboard counters up to date and serves them from memory.
+
+    SQLite work (reading the app database, writing the rollup file) runs on
+    one dedicated thread; the in-memory buckets are only touched from the
+    event loop.
+    """
+
+    def __init__(self, db_path=None, rollup_path=ROLLUP_DB_PATH, chunk=CATCH_UP_CHUNK):
+        self.db_path = db_path
+        self.rollup_path = rollup_path
+        self.chunk = chunk
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rollup")
+        self.hourly = {metric: {} for metric in SOURCES}
+        self.daily = {metric: {} for metric in SOURCES}
+        self.totals = {metric: [0, 0] for metric in SOURCES}
+        self.watermarks = {source: 0 for source in SOURCES}
+        self.gauges = {name: 0 for name in GAUGES}
+        self.gauges_at = None
+        self.stats = {"catch_ups": 0, "rows_rolled_up": 0, "gauge_refreshes": 0}
+        self._source = None
+        self._rollup = None
+        self._day_cache = {}
+
+    async def start(self):
+        """Load persisted buckets, then catch up and read the gauges once"""
+        loop = asyncio.get_running_loop()
+        hourly, daily, watermarks = await loop.run_in_executor(self.executor, self._load_state)
+        for metric, hour, count, total in hourly:
+            if metric in self.hourly:
+                self.hourly[metric][hour] = [count, total]
+                add_bucket(self.totals, metric, count, total)
+        for metric, day, count, total in daily:
+            if metric in self.daily:
+                self.daily[metric][day] = [count, total]
+        self.watermarks.update({s: w for s, w in watermarks if s in self.watermarks})
+
+        rows = await self.catch_up()
+        await self.refresh_gauges()
+        logger.info(f"Rollups ready: {rows} new rows aggregated, watermarks {self.watermarks}")
+
+    async def close(self):
+        self.executor.submit(self._close_connections).result()
+        self.executor.shutdown(wait=True)
+
+    async def catch_up(self):
+        """Aggregate rows past each watermark; returns how many were read"""
+        loop = asyncio.get_running_loop()
+        deltas = await loop.run_in_executor(self.executor, self._collect, dict(self.watermarks))
+        for metric, buckets in deltas.hourly.items():
+            for hour, (count, total) in buckets.items():
+                add_bucket(self.hourly[metric], hour, count, total)
+                add_bucket(self.totals, metric, count, total)
+        for metric, buckets in deltas.daily.items():
+            for day, (count, total) in buckets.items():
+                add_bucket(self.daily[metric], day, count, total)
+        self.watermarks.update(deltas.watermarks)
+        self.stats["catch_ups"] += 1
+        self.stats["rows_rolled_up"] += deltas.rows
+        return deltas.rows
+
+    async def refresh_gauges(self):
+        loop = asyncio.get_running_loop()
+        now = db.now_ms()
+        self.gauges = await loop.run_in_executor(self.executor, self._query_gauges, now)
+        self.gauges_at = now
+        self.stats["gauge_refreshes"] += 1
+
+    def gauges_stale(self, now_ms=None):
+        now_ms = db.now_ms() if now_ms is None else now_ms
+        return self.gauges_at is None or now_ms - self.gauges_at >= GAUGE_REFRESH_INTERVAL * 1000
+
+    # Serving
+
+    def day_bucket(self, metric, timestamp_ms):
+        return self.daily[metric].get(local_day(timestamp_ms), (0, 0))
+
+    def window(self, metric, start_ms, now_ms):
+        """(count, total) over whole hours from start_ms's hour up to now"""
+        buckets = self.hourly[metric]
+        count = total = 0
+        for hour in range(start_ms // HOUR_MS, now_ms // HOUR_MS + 1):
+            bucket = buckets.get(hour)
+            if bucket:
+                count += bucket[0]
+                total += bucket[1]
+        return count, total
+
+    def month(self, metric, now_ms):
+        """(count, total) over the local calendar month containing now"""
+        today = datetime.fromtimestamp(now_ms / 1000)
+        prefix = today.strftime("%Y-%m-")
+        buckets = self.daily[metric]
+        count = total = 0
+        for day in range(1, today.day + 1):
+            bucket = buckets.get(f"{prefix}{day:02d}")
+            if bucket:
+                count += bucket[0]
+                total += bucket[1]
+        return count, total
+
+    def dashboard(self, now_ms=None):
+        """stats and chartData in the shape of GET /api/admin/stats"""
+        now_ms = db.now_ms() if now_ms is None else now_ms
+        stats = {
+            "todayVisits": self.day_bucket("visits", now_ms)[0],
+            "weekVisits": self.window("visits", now_ms - 7 * DAY_MS, now_ms)[0],
+            "monthRevenue": self.month("visits", now_ms)[1],
+            "activeUsers": self.gauges["activeUsers"],
+            "pendingMusicOrders": self.gauges["pendingMusicOrders"],
+            "todayWheelSpins": self.day_bucket("wheel_spins", now_ms)[0],
+            "activeCoupons": self.gauges["activeCoupons"],
+            "totalUsers": self.totals["users"][0],
+            "highRiskUsers": self.gauges["highRiskUsers"],
+        }
+
+        chart = []
+        # Local noons, so a DST change cannot skip or repeat a day
+        noon = local_midnight(now_ms) + DAY_MS // 2
+        for i in range(6, -1, -1):
+            moment = noon - i * DAY_MS
+            visits, revenue = self.day_bucket("visits", moment)
+            chart.append({
+                "date": local_day(moment),
+                "visits": visits,
+                "spins": self.day_bucket("wheel_spins", moment)[0],
+                "revenue": revenue,
+            })
+        return {"stats": stats, "chartData": chart}
+
+    # The methods below run on the rollup thread
+
+    def _source_connection(self):
+        if self._source is None:
+            self._source = db.connect(self.db_path, readonly=True)
+        return self._source
+
+    def _rollup_connection(self):
+        if self._rollup is None:
+            self._rollup = sqlite3.connect(self.rollup_path, check_same_thread=False)
+            self._rollup.execute("PRAGMA journal_mode = WAL")
+            self._rollup.executescript(ROLLUP_SCHEMA)
+        return self._rollup
+
+    def _load_state(self):
+        conn = self._rollup_connection()
+        return (
+            conn.execute('SELECT metric, hour, count, total FROM "RollupHourly"').fetchall(),
+            conn.execute('SELECT metric, day, count, total FROM "RollupDaily"').fetchall(),
+            conn.execute('SELECT source, last_rowid FROM "RollupWatermark"').fetchall(),
+        )
+
+    def _day(self, timestamp_ms):
+        minute = timestamp_ms // MINUTE_MS
+        day = self._day_cache.get(minute)
+        if day is None:
+            if len(self._day_cache) > 100000:
+                self._day_cache.clear()
+            day = self._day_cache[minute] = local_day(timestamp_ms)
+        return day
+
+    def _collect(self, watermarks):
+        source = self._source_connection()
+        deltas = RollupDeltas()
+        for metric, sql in SOURCES.items():
+            hourly = deltas.hourly[metric] = {}
+            daily = deltas.daily[metric] = {}
+            last_rowid = watermarks[metric]
+            while True:
+                try:
+                    rows = source.execute(sql, (last_rowid, self.chunk)).fetchall()
+                except sqlite3.OperationalError as e:
+                    logger.warning(f"Skipping {metric} rollup: {e}")
+                    break
+                for rowid, timestamp, count, total in rows:
+                    if count:
+                        add_bucket(hourly, timestamp // HOUR_MS, count, total)
+                        add_bucket(daily, self._day(timestamp), count, total)
+                if rows:
+                    last_rowid = rows[-1][0]
+                    deltas.rows += len(rows)
+                if len(rows) < self.chunk:
+                    break
+            if last_rowid != watermarks[metric]:
+                deltas.watermarks[metric] = last_rowid
+
+        if deltas.watermarks:
+            with self._rollup_connection() as conn:
+                for metric in deltas.hourly:
+                    conn.executemany(UPSERT_HOURLY, [
+                        (metric, hour, count, total) for hour, (count, total) in deltas.hourly[metric].items()
+                    ])
+                    conn.executemany(UPSERT_DAILY, [
+                        (metric, day, count, total) for day, (count, total) in deltas.daily[metric].items()
+                    ])
+                conn.executemany(UPSERT_WATERMARK, deltas.watermarks.items())
+        return deltas
+
+    def _query_gauges(self, now_ms):
+        source = self._source_connection()
+        gauges = {}
+        for name, (sql, params) in GAUGES.items():
+            try:
+                gauges[name] = source.execute(sql, params(now_ms)).fetchone()[0]
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Skipping gauge {name}: {e}")
+                gauges[name] = 0
+        return gauges
+
+    def _close_connections(self):
+        for conn in (self._source, self._rollup):
+            if conn is not None:
+                conn.close()
+        self._source = self._rollup = None
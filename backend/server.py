@@ -1,3 +1,814 @@
-# Placeholder backend for supervisor
-# The actual application is Next.js running in /app
-print("Backend not needed - using Next.js")
+#!/usr/bin/env python3
+"""
+PANDA Lounge backend service
+Asyncio HTTP service for the latency-critical paths of the Next.js app.
+
+Endpoints:
+- GET  /health           service status and counters
+- POST /api/qr/validate  validate a QR token without touching SQLite
+- POST /api/qr/validate/batch  validate up to QR_BATCH_MAX tokens at once
+- GET  /api/wheel/status?user_id=...  wheel cooldown status from the cache
+- POST /api/wheel/spins  notify the cooldown cache that a spin was written
+- GET  /api/admin/stats  dashboard stats and chart data from the rollups
+- GET  /api/analytics?range=7d|30d|3m|1y  analytics report (needs NumPy)
+- POST /api/audit  queue audit events for group commit into AuditLog
+- GET  /api/audit/archive?action=&user_id=&since=&until=&limit=  query archived audit rows
+- GET  /api/music/search?q=&limit=  cached, coalesced Spotify jukebox search
+- GET  /api/notifications?user_id=&role=  unread notifications from memory
+- GET  /api/notifications/stream?user_id=&role=  the same, pushed as Server-Sent Events
+- POST /api/notifications/read  mark one notification read
+- POST /api/notifications/read-all  mark all of a user's notifications read
+- POST /api/ratelimit/check  may this user / IP perform a rate-limited action now
+- POST /api/ratelimit/record  count a successful rate-limited action
+- POST /api/ratelimit/reset  clear limiter state and optionally bypass it (test harnesses)
+- GET  /api/staff/stats?staff_id=  rating and tip aggregates per staff member
+- POST /api/staff/stats/refresh  apply new StaffRating / Tip rows now
+- GET  /api/staff/stats/check  compare the aggregates with a full recompute
+- POST /api/qr/render/batch  render QR images for many tokens (needs segno)
+- GET  /api/qr/image?key=&format=png|svg  a rendered QR image from the cache
+
+The service is internal: the Next.js app (or the door-scanner gateway) calls
+it with the already-authenticated validator's id. When BACKEND_SERVICE_KEY
+is set, every request must carry it in the X-Service-Key header. It listens
+on 127.0.0.1 by default and refuses to bind a non-loopback BACKEND_HOST
+without BACKEND_SERVICE_KEY.
+"""
+
+import asyncio
+import base64
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import signal
+import time
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from audit import AUDIT_ARCHIVE_INTERVAL, AUDIT_RETENTION_DAYS, AuditQueueFull, AuditWriter
+from cooldown import SPIN_POLL_INTERVAL, CooldownService
+from music_search import MIN_QUERY_LENGTH, SEARCH_FETCH_LIMIT, MusicSearchProxy, SpotifyError
+from notifications import NOTIFY_POLL_INTERVAL, SSE_HEARTBEAT_INTERVAL, NotificationService
+from qr_validation import BATCH_MAX_TOKENS, QRValidator
+from rate_limit import RATE_LIMIT_BYPASS_MAX, RATE_LIMIT_SETTINGS_REFRESH, RATE_LIMIT_SWEEP_INTERVAL, RateLimiter
+from rollup import ROLLUP_INTERVAL, RollupEngine
+from staff_stats import STAFF_STATS_POLL_INTERVAL, StaffStatsService
+
+try:
+    from analytics import ANALYTICS_REFRESH_INTERVAL, DEFAULT_RANGE, AnalyticsEngine
+except ImportError:  # NumPy is optional; /api/analytics is disabled without it
+    AnalyticsEngine = None
+
+try:
+    from qr_render import FORMATS as QR_IMAGE_FORMATS
+    from qr_render import QR_IMAGE_SWEEP_INTERVAL, QR_RENDER_MAX_TOKENS, QRRenderPipeline
+except ImportError:  # segno is optional; QR image rendering is disabled without it
+    QRRenderPipeline = None
+
+# Configuration
+HOST = os.environ.get("BACKEND_HOST", "127.0.0.1")
+PORT = int(os.environ.get("BACKEND_PORT", "8001"))
+SERVICE_KEY = os.environ.get("BACKEND_SERVICE_KEY", "")
+NONCE_PURGE_INTERVAL = 30
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+KEEP_ALIVE_TIMEOUT = 75
+
+logging.basicConfig(format="[%(asctime)s] %(levelname)s: %(message)s", datefmt="%H:%M:%S", level=logging.INFO)
+logger = logging.getLogger("panda.server")
+
+
+class HTTPError(Exception):
+    """Raised by handlers to short-circuit with an error response"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method, target, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Invalid JSON body")
+
+
+class Response:
+    __slots__ = ("status", "body", "headers")
+
+    def __init__(self, body=b"", status=200, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    def encode(self, keep_alive):
+        reason = HTTPStatus(self.status).phrase
+        lines = [f"HTTP/1.1 {self.status} {reason}"]
+        for name, value in self.headers.items():
+            lines.append(f"{name}: {value}")
+        lines.append(f"Content-Length: {len(self.body)}")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + self.body
+
+
+class EventStream:
+    """Handler result that takes over the connection for Server-Sent Events.
+
+    `run(reader, writer)` owns the socket until the client disconnects; the
+    connection is closed afterwards, so the body needs no length or chunking.
+    """
+
+    __slots__ = ("run",)
+
+    def __init__(self, run):
+        self.run = run
+
+    def head(self):
+        return (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: text/event-stream; charset=utf-8\r\n"
+            "Cache-Control: no-cache\r\n"
+            "X-Accel-Buffering: no\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("latin-1")
+
+
+def json_response(data, status=200):
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+    return Response(body, status, {"Content-Type": "application/json; charset=utf-8"})
+
+
+class BackendServer:
+    """Minimal HTTP/1.1 server with keep-alive and a static route table"""
+
+    def __init__(self, host=HOST, port=PORT, db_path=None):
+        self.host = host
+        self.port = port
+        self.started_at = time.time()
+        self.qr = QRValidator(db_path)
+        self.cooldowns = CooldownService(db_path)
+        self.rollups = RollupEngine(db_path)
+        self.audit = AuditWriter(db_path)
+        self.music = MusicSearchProxy()
+        self.notifications = NotificationService(db_path)
+        self.limiter = RateLimiter(db_path)
+        self.staff_stats = StaffStatsService(db_path)
+        self.analytics = AnalyticsEngine(db_path) if AnalyticsEngine else None
+        self.qr_images = QRRenderPipeline() if QRRenderPipeline else None
+        self.routes = {
+            ("GET", "/health"): self.handle_health,
+            ("POST", "/api/qr/validate"): self.handle_qr_validate,
+            ("POST", "/api/qr/validate/batch"): self.handle_qr_validate_batch,
+            ("GET", "/api/wheel/status"): self.handle_wheel_status,
+            ("POST", "/api/wheel/spins"): self.handle_wheel_spin,
+            ("GET", "/api/admin/stats"): self.handle_admin_stats,
+            ("POST", "/api/audit"): self.handle_audit,
+            ("GET", "/api/audit/archive"): self.handle_audit_archive,
+            ("GET", "/api/music/search"): self.handle_music_search,
+            ("GET", "/api/notifications"): self.handle_notifications,
+            ("GET", "/api/notifications/stream"): self.handle_notification_stream,
+            ("POST", "/api/notifications/read"): self.handle_notification_read,
+            ("POST", "/api/notifications/read-all"): self.handle_notification_read_all,
+            ("POST", "/api/ratelimit/check"): self.handle_rate_limit_check,
+            ("POST", "/api/ratelimit/record"): self.handle_rate_limit_record,
+            ("POST", "/api/ratelimit/reset"): self.handle_rate_limit_reset,
+            ("GET", "/api/staff/stats"): self.handle_staff_stats,
+            ("POST", "/api/staff/stats/refresh"): self.handle_staff_stats_refresh,
+            ("GET", "/api/staff/stats/check"): self.handle_staff_stats_check,
+        }
+        if self.analytics:
+            self.routes[("GET", "/api/analytics")] = self.handle_analytics
+        if self.qr_images:
+            self.routes[("POST", "/api/qr/render/batch")] = self.handle_qr_render_batch
+            self.routes[("GET", "/api/qr/image")] = self.handle_qr_image
+        self._server = None
+        self._background = []
+
+    async def start(self):
+        await self.qr.start()
+        await self.cooldowns.start()
+        await self.rollups.start()
+        await self.audit.start()
+        await self.notifications.start()
+        await self.limiter.start()
+        await self.staff_stats.start()
+        if AUDIT_RETENTION_DAYS > 0:
+            self._background.append(asyncio.create_task(self._archive_audit()))
+        if self.analytics:
+            await self.analytics.start()
+            self._background.append(asyncio.create_task(self._refresh_analytics()))
+        else:
+            logger.warning("NumPy is not installed: /api/analytics is disabled")
+        if self.qr_images:
+            await self.qr_images.start()
+            self._background.append(asyncio.create_task(self._sweep_qr_images()))
+        else:
+            logger.warning("segno is not installed: QR image rendering is disabled")
+        self._background.append(asyncio.create_task(self._purge_nonces()))
+        self._background.append(asyncio.create_task(self._poll_spins()))
+        self._background.append(asyncio.create_task(self._run_rollups()))
+        self._background.append(asyncio.create_task(self._poll_notifications()))
+        self._background.append(asyncio.create_task(self._notification_heartbeat()))
+        self._background.append(asyncio.create_task(self._refresh_rate_limits()))
+        self._background.append(asyncio.create_task(self._sweep_rate_limits()))
+        self._background.append(asyncio.create_task(self._poll_staff_stats()))
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logger.info(f"Backend listening on http://{self.host}:{self.port}")
+
+    async def serve_forever(self):
+        await self.start()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+        await self.close()
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in self._background:
+            task.cancel()
+        await self.qr.close()
+        await self.cooldowns.close()
+        await self.rollups.close()
+        await self.audit.close()
+        await self.music.close()
+        await self.notifications.close()
+        await self.limiter.close()
+        await self.staff_stats.close()
+        if self.analytics:
+            await self.analytics.close()
+        if self.qr_images:
+            await self.qr_images.close()
+        logger.info("Backend stopped")
+
+    # Handlers
+
+    async def handle_health(self, request):
+        return json_response({
+            "status": "ok",
+            "uptime": round(time.time() - self.started_at, 1),
+            "qr": {
+                **self.qr.stats,
+                "nonces": len(self.qr.nonces),
+                "pending_events": self.qr.events.pending,
+                "written_events": self.qr.events.written,
+                "ignored_events": self.qr.events.ignored,
+            },
+            "cooldown": {
+                **self.cooldowns.stats,
+                "cached_users": len(self.cooldowns.cache),
+                "hits": self.cooldowns.cache.hits,
+                "misses": self.cooldowns.cache.misses,
+                "evictions": self.cooldowns.cache.evictions,
+            },
+            "rollup": {**self.rollups.stats, "watermarks": self.rollups.watermarks},
+            "analytics": self.analytics.stats if self.analytics else None,
+            "audit": {**self.audit.stats, "pending": self.audit.pending},
+            "music": self.music.metrics(),
+            "notifications": {
+                **self.notifications.stats,
+                "connections": self.notifications.connections,
+                "audiences": len(self.notifications.rings),
+                "last_id": self.notifications.last_id,
+            },
+            "ratelimit": {**self.limiter.stats, "keys": len(self.limiter.state), "limits": self.limiter.settings},
+            "staff_stats": {
+                **self.staff_stats.stats,
+                "staff": len(self.staff_stats.aggregates),
+                "rating_id": self.staff_stats.rating_id,
+                "tip_id": self.staff_stats.tip_id,
+            },
+            "qr_images": self.qr_images.stats if self.qr_images else None,
+        })
+
+    async def handle_qr_validate(self, request):
+        """POST /api/qr/validate  body: {token, validator_id}"""
+        body = request.json()
+        token = body.get("token")
+        validator_id = body.get("validator_id")
+
+        if not token or not isinstance(token, str):
+            raise HTTPError(400, "Token is required")
+        if not validator_id or not isinstance(validator_id, str):
+            raise HTTPError(401, "Unauthorized")
+
+        result = await self.qr.validate(token, validator_id)
+        return json_response(result, 200 if result["valid"] else 400)
+
+    async def handle_qr_validate_batch(self, request):
+        """POST /api/qr/validate/batch  body: {tokens: [...], validator_id}
+
+        Always 200 when the batch itself is well-formed; check each result's
+        `valid` flag.
+        """
+        body = request.json()
+        tokens = body.get("tokens")
+        validator_id = body.get("validator_id")
+
+        if not isinstance(tokens, list) or not tokens:
+            raise HTTPError(400, "Tokens are required")
+        if len(tokens) > BATCH_MAX_TOKENS:
+            raise HTTPError(413, f"At most {BATCH_MAX_TOKENS} tokens per batch")
+        if not validator_id or not isinstance(validator_id, str):
+            raise HTTPError(401, "Unauthorized")
+
+        results = await self.qr.validate_batch(tokens, validator_id)
+        return json_response({
+            "results": results,
+            "valid": sum(1 for r in results if r["valid"]),
+            "invalid": sum(1 for r in results if not r["valid"]),
+        })
+
+    async def handle_wheel_status(self, request):
+        """GET /api/wheel/status?user_id=...  same body as the Next.js route"""
+        user_id = request.query.get("user_id")
+        if not user_id:
+            return json_response({
+                "error": "Unauthorized",
+                "canSpin": False,
+                "state": "LOCKED",
+                "message": "Увійдіть для доступу до колеса фортуни",
+            }, 401)
+        return json_response(await self.cooldowns.status(user_id))
+
+    async def handle_wheel_spin(self, request):
+        """POST /api/wheel/spins  body: {user_id, next_allowed_at?, prize_name?}
+
+        next_allowed_at is Unix milliseconds; without it the user's entry is
+        dropped and re-read from SQLite on the next status lookup.
+        """
+        body = request.json()
+        user_id = body.get("user_id")
+        next_allowed_at = body.get("next_allowed_at")
+        if not user_id or not isinstance(user_id, str):
+            raise HTTPError(400, "user_id is required")
+        if next_allowed_at is not None and not isinstance(next_allowed_at, int):
+            raise HTTPError(400, "next_allowed_at must be Unix milliseconds")
+
+        self.cooldowns.record_spin(user_id, next_allowed_at, body.get("prize_name"))
+        return json_response({"ok": True})
+
+    async def handle_admin_stats(self, request):
+        """GET /api/admin/stats  stats + chartData, answered from memory"""
+        dashboard = self.rollups.dashboard()
+        dashboard["gaugesAt"] = self.rollups.gauges_at
+        return json_response(dashboard)
+
+    async def handle_analytics(self, request):
+        """GET /api/analytics?range=7d  same shape as the Next.js analytics route"""
+        try:
+            report = await self.analytics.report(request.query.get("range", DEFAULT_RANGE))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        return json_response(report)
+
+    async def handle_audit(self, request):
+        """POST /api/audit  body: one event or {events: [...]}
+
+        Events use logger.auditLog's context fields (action, userId,
+        entityType, entityId, details, ip, userAgent). Returns 202 once they
+        are queued; they are committed within AUDIT_FLUSH_MS. Returns 503,
+        queuing none of them, while the database is too far behind; the
+        caller then writes them itself.
+        """
+        body = request.json()
+        events = body.get("events") if isinstance(body, dict) and "events" in body else [body]
+        if not isinstance(events, list) or not events:
+            raise HTTPError(400, "At least one event is required")
+
+        try:
+            ids = self.audit.record_many(events)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        except AuditQueueFull as e:
+            raise HTTPError(503, str(e))
+        return json_response({"ids": ids}, 202)
+
+    async def handle_audit_archive(self, request):
+        """GET /api/audit/archive  filters: action, user_id, since/until (Unix ms), limit"""
+        try:
+            since = int(request.query["since"]) if "since" in request.query else None
+            until = int(request.query["until"]) if "until" in request.query else None
+            limit = min(int(request.query.get("limit", "100")), 1000)
+        except ValueError:
+            raise HTTPError(400, "since, until and limit must be integers")
+
+        rows = await self.audit.query_archive(
+            action=request.query.get("action"),
+            user_id=request.query.get("user_id"),
+            since=since,
+            until=until,
+            limit=limit,
+        )
+        return json_response({"rows": rows, "count": len(rows)})
+
+    async def handle_music_search(self, request):
+        """GET /api/music/search?q=&limit=  same body as the Next.js route"""
+        query = request.query.get("q", "")
+        if not query:
+            raise HTTPError(400, "Query parameter is required")
+        try:
+            limit = max(1, min(int(request.query.get("limit", "10")), SEARCH_FETCH_LIMIT))
+        except ValueError:
+            raise HTTPError(400, "limit must be an integer")
+
+        if len(query) < MIN_QUERY_LENGTH:
+            return json_response({"tracks": [], "message": "Query too short"})
+
+        try:
+            tracks, source = await self.music.search(query, limit)
+        except SpotifyError as e:
+            raise HTTPError(502, str(e))
+        return json_response({"tracks": tracks, "query": query, "total": len(tracks), "source": source})
+
+    async def handle_notifications(self, request):
+        """GET /api/notifications?user_id=&role=  {unreadCount, notifications}, newest first"""
+        user_id = self._notification_user(request.query)
+        return json_response(await self.notifications.unread(user_id, request.query.get("role")))
+
+    async def handle_notification_stream(self, request):
+        """GET /api/notifications/stream?user_id=&role=
+
+        Server-Sent Events: `snapshot` (the GET body), then `notification`,
+        `read` and `read_all`, each with the user's current unreadCount.
+        """
+        user_id = self._notification_user(request.query)
+        role = request.query.get("role")
+        return EventStream(lambda reader, writer: self.notifications.serve_stream(user_id, role, reader, writer))
+
+    async def handle_notification_read(self, request):
+        """POST /api/notifications/read  body: {user_id, role?, id}"""
+        body = request.json()
+        user_id = self._notification_user(body)
+        try:
+            notification_id = int(body.get("id"))
+        except (TypeError, ValueError):
+            raise HTTPError(400, "id must be a notification id")
+
+        if not await self.notifications.mark_read(user_id, notification_id, body.get("role")):
+            raise HTTPError(404, "Notification not found")
+        return json_response({"success": True})
+
+    async def handle_notification_read_all(self, request):
+        """POST /api/notifications/read-all  body: {user_id, role?}"""
+        body = request.json()
+        user_id = self._notification_user(body)
+        changed = await self.notifications.read_all(user_id, body.get("role"))
+        return json_response({"success": True, "updated": changed})
+
+    @staticmethod
+    def _notification_user(params):
+        user_id = params.get("user_id")
+        if not user_id or not isinstance(user_id, str):
+            raise HTTPError(401, "Unauthorized")
+        return user_id
+
+    async def handle_rate_limit_check(self, request):
+        """POST /api/ratelimit/check  body: {policy, user_id?, ip?, cost?}
+
+        Always 200 for a known policy; check `allowed`. An allowed check
+        consumes the policy's attempt budget.
+        """
+        policy, user_id, ip, cost = self._rate_limit_args(request.json())
+        try:
+            return json_response(self.limiter.check(policy, user_id, ip, cost))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+    async def handle_rate_limit_record(self, request):
+        """POST /api/ratelimit/record  body: {policy, user_id?, ip?, cost?} after the action succeeded"""
+        policy, user_id, ip, cost = self._rate_limit_args(request.json())
+        try:
+            self.limiter.record(policy, user_id, ip, cost)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        return json_response({"ok": True})
+
+    async def handle_rate_limit_reset(self, request):
+        """POST /api/ratelimit/reset  body: {user_ids?, ips?, bypass_seconds?}
+
+        For test harnesses: forgets the listed users' / IPs' state (everyone's
+        without either, which needs BACKEND_SERVICE_KEY) and, with
+        bypass_seconds, lets them skip every policy for that long.
+        bypass_seconds 0 ends an earlier bypass.
+        """
+        body = request.json()
+        user_ids = body.get("user_ids") or []
+        ips = body.get("ips") or []
+        bypass = body.get("bypass_seconds", 0)
+        for name, values in (("user_ids", user_ids), ("ips", ips)):
+            if not isinstance(values, list) or not all(isinstance(v, str) and v for v in values):
+                raise HTTPError(400, f"{name} must be a list of strings")
+        if isinstance(bypass, bool) or not isinstance(bypass, (int, float)) or bypass < 0:
+            raise HTTPError(400, "bypass_seconds must be a non-negative number")
+        if not user_ids and not ips and not SERVICE_KEY:
+            raise HTTPError(403, "Resetting every subject requires BACKEND_SERVICE_KEY")
+        dropped = self.limiter.reset(user_ids, ips, bypass)
+        return json_response({"reset": dropped, "bypassSeconds": min(bypass, RATE_LIMIT_BYPASS_MAX)})
+
+    @staticmethod
+    def _rate_limit_args(body):
+        policy = body.get("policy")
+        user_id = body.get("user_id")
+        ip = body.get("ip")
+        cost = body.get("cost", 1)
+        if not policy or not isinstance(policy, str):
+            raise HTTPError(400, "policy is required")
+        if not user_id and not ip:
+            raise HTTPError(400, "user_id or ip is required")
+        if not isinstance(cost, int) or cost < 1:
+            raise HTTPError(400, "cost must be a positive integer")
+        return policy, user_id, ip, cost
+
+    async def handle_staff_stats(self, request):
+        """GET /api/staff/stats?staff_id=  {staff: {id: summary}}, or one staff member's summary"""
+        staff_id = self._staff_id(request.query.get("staff_id"))
+        if staff_id is not None:
+            return json_response(self.staff_stats.summary(staff_id))
+        return json_response({"staff": self.staff_stats.summary()})
+
+    async def handle_staff_stats_refresh(self, request):
+        """POST /api/staff/stats/refresh  body: {staff_id?} after writing a StaffRating or Tip
+
+        Tails the new rows right away (instead of on the next poll) and
+        returns the staff member's summary.
+        """
+        staff_id = self._staff_id(request.json().get("staff_id"))
+        applied = await self.staff_stats.poll()
+        summary = self.staff_stats.summary(staff_id) if staff_id is not None else None
+        return json_response({"applied": applied, "summary": summary})
+
+    async def handle_staff_stats_check(self, request):
+        """GET /api/staff/stats/check  200 when consistent, 409 with the mismatches otherwise"""
+        mismatches = await self.staff_stats.check()
+        return json_response({
+            "consistent": not mismatches,
+            "staff": len(self.staff_stats.aggregates),
+            "mismatches": mismatches[:100],
+        }, 409 if mismatches else 200)
+
+    @staticmethod
+    def _staff_id(value):
+        if value is None or value == "":
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise HTTPError(400, "staff_id must be an integer")
+
+    async def handle_qr_render_batch(self, request):
+        """POST /api/qr/render/batch  body: {tokens: [...], formats?: ["png", "svg"], inline?}
+
+        Always 200 when the batch itself is well-formed; each result has a
+        `key` for /api/qr/image, or an `error`. With `inline`, results also
+        carry `dataUrls` per format.
+        """
+        body = request.json()
+        tokens = body.get("tokens")
+        formats = body.get("formats", ["png"])
+
+        if not isinstance(tokens, list) or not tokens or not all(isinstance(t, str) for t in tokens):
+            raise HTTPError(400, "Tokens are required")
+        if len(tokens) > QR_RENDER_MAX_TOKENS:
+            raise HTTPError(413, f"At most {QR_RENDER_MAX_TOKENS} tokens per batch")
+        if not isinstance(formats, list):
+            raise HTTPError(400, "formats must be a list")
+
+        try:
+            results = await self.qr_images.render_batch(tokens, formats)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+        if body.get("inline"):
+            for result in results:
+                if "key" not in result:
+                    continue
+                result["dataUrls"] = {}
+                for fmt in dict.fromkeys(formats):
+                    image = await self.qr_images.image(result["key"], fmt)
+                    if image:
+                        data = base64.b64encode(image[0]).decode("ascii")
+                        result["dataUrls"][fmt] = f"data:{QR_IMAGE_FORMATS[fmt]};base64,{data}"
+
+        return json_response({
+            "results": results,
+            "rendered": sum(1 for r in results if r.get("cached") is False),
+            "cached": sum(1 for r in results if r.get("cached")),
+            "rejected": sum(1 for r in results if "error" in r),
+        })
+
+    async def handle_qr_image(self, request):
+        """GET /api/qr/image?key=&format=png  cacheable until the token expires"""
+        fmt = request.query.get("format", "png")
+        image = await self.qr_images.image(request.query.get("key", ""), fmt)
+        if image is None:
+            raise HTTPError(404, "Image not found or expired")
+
+        data, exp = image
+        return Response(data, 200, {
+            "Content-Type": QR_IMAGE_FORMATS[fmt],
+            "Cache-Control": f"private, max-age={max(0, exp - int(time.time()))}, immutable",
+        })
+
+    # Connection handling
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except HTTPError as e:
+                    writer.write(json_response({"error": e.message}, e.status).encode(False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                response = await self._dispatch(request)
+                if isinstance(response, EventStream):
+                    writer.write(response.head())
+                    await response.run(reader, writer)
+                    break
+                writer.write(response.encode(keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "Request header too large")
+        if len(head) > MAX_HEADER_BYTES:
+            raise HTTPError(431, "Request header too large")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", "0") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), target, headers, body)
+
+    async def _dispatch(self, request):
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            return json_response({"error": "Not found"}, 404)
+
+        if SERVICE_KEY and not hmac.compare_digest(request.headers.get("x-service-key", ""), SERVICE_KEY):
+            return json_response({"error": "Unauthorized"}, 401)
+
+        try:
+            return await handler(request)
+        except HTTPError as e:
+            return json_response({"error": e.message}, e.status)
+        except Exception as e:
+            logger.exception(f"{request.method} {request.path} failed")
+            return json_response({"error": str(e) or "Internal server error"}, 500)
+
+    async def _purge_nonces(self):
+        while True:
+            await asyncio.sleep(NONCE_PURGE_INTERVAL)
+            purged = self.qr.purge_expired()
+            if purged:
+                logger.info(f"Purged {purged} expired nonces")
+
+    async def _run_rollups(self):
+        while True:
+            await asyncio.sleep(ROLLUP_INTERVAL)
+            try:
+                await self.rollups.catch_up()
+                if self.rollups.gauges_stale():
+                    await self.rollups.refresh_gauges()
+            except Exception as e:
+                logger.error(f"Rollup catch-up failed: {e}")
+
+    async def _refresh_analytics(self):
+        while True:
+            await asyncio.sleep(ANALYTICS_REFRESH_INTERVAL)
+            try:
+                await self.analytics.refresh()
+            except Exception as e:
+                logger.error(f"Analytics refresh failed: {e}")
+
+    async def _archive_audit(self):
+        while True:
+            await asyncio.sleep(AUDIT_ARCHIVE_INTERVAL)
+            try:
+                await self.audit.archive_old()
+            except Exception as e:
+                logger.error(f"Audit archival failed: {e}")
+
+    async def _poll_spins(self):
+        """Catch spins written by the Next.js app without a notification"""
+        while True:
+            await asyncio.sleep(SPIN_POLL_INTERVAL)
+            try:
+                await self.cooldowns.poll_spins()
+            except Exception as e:
+                logger.error(f"Failed to poll new wheel spins: {e}")
+
+    async def _poll_notifications(self):
+        """Push Notification rows written by the Next.js app"""
+        while True:
+            await asyncio.sleep(NOTIFY_POLL_INTERVAL)
+            try:
+                await self.notifications.poll()
+            except Exception as e:
+                logger.error(f"Failed to poll new notifications: {e}")
+
+    async def _notification_heartbeat(self):
+        while True:
+            await asyncio.sleep(SSE_HEARTBEAT_INTERVAL)
+            self.notifications.heartbeat()
+
+    async def _refresh_rate_limits(self):
+        """Pick up SystemSettings changes made in the admin panel"""
+        while True:
+            await asyncio.sleep(RATE_LIMIT_SETTINGS_REFRESH)
+            try:
+                await self.limiter.refresh_settings()
+            except Exception as e:
+                logger.error(f"Rate limit settings refresh failed: {e}")
+
+    async def _sweep_rate_limits(self):
+        while True:
+            await asyncio.sleep(RATE_LIMIT_SWEEP_INTERVAL)
+            self.limiter.sweep()
+
+    async def _poll_staff_stats(self):
+        """Fold StaffRating and Tip rows written by the Next.js app into the aggregates"""
+        while True:
+            await asyncio.sleep(STAFF_STATS_POLL_INTERVAL)
+            try:
+                await self.staff_stats.poll()
+            except Exception as e:
+                logger.error(f"Failed to poll staff ratings and tips: {e}")
+
+    async def _sweep_qr_images(self):
+        """Delete rendered QR images once their tokens expire"""
+        while True:
+            await asyncio.sleep(QR_IMAGE_SWEEP_INTERVAL)
+            try:
+                removed = await self.qr_images.sweep()
+                if removed:
+                    logger.info(f"Removed {removed} expired QR images")
+            except Exception as e:
+                logger.error(f"QR image sweep failed: {e}")
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main():
+    if not SERVICE_KEY and not is_loopback(HOST):
+        logger.error(f"Refusing to listen on {HOST} without BACKEND_SERVICE_KEY")
+        raise SystemExit(1)
+    server = BackendServer()
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
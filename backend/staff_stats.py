@@ -0,0 +1,360 @@
+"""
+Staff rating and tip aggregates for the PANDA Lounge backend service.
+
+Staff.average_service, average_personality and tips_total are denormalised
+copies of StaffRating and Tip. Keeping them right used to mean an AVG() or
+SUM() over every row of a staff member on each write, which grows with
+their history. This module keeps running aggregates instead:
+- per staff member: rating count and sums, tip count and sum, plus
+  exponentially time-decayed sums (STAFF_STATS_HALF_LIFE_DAYS) for "recent"
+  averages that favour the last few months
+- new StaffRating and Tip rows are found by tailing both tables by primary
+  key; each row is an O(1) update, and only the staff members it touched
+  are written back to their Staff columns
+- a rebuild streams both tables once, so aggregates can always be
+  recomputed from scratch (at startup, or after a manual data fix)
+- check() recomputes with GROUP BY and reports any staff member whose
+  aggregates, or stored Staff columns, disagree
+
+Averages are sum / count over integer sums, so they equal SQLite's AVG()
+exactly; decayed values are for display and are not checked.
+"""
+
+import asyncio
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+logger = logging.getLogger("panda.staffstats")
+
+# Configuration
+STAFF_STATS_HALF_LIFE_DAYS = float(os.environ.get("STAFF_STATS_HALF_LIFE_DAYS", "90"))
+STAFF_STATS_POLL_INTERVAL = float(os.environ.get("STAFF_STATS_POLL_MS", "1000")) / 1000
+STAFF_STATS_WRITEBACK = os.environ.get("STAFF_STATS_WRITEBACK", "1") != "0"
+STAFF_STATS_TAIL_BATCH = 5000
+STAFF_STATS_STREAM_BATCH = 10000
+
+DAY_MS = 24 * 60 * 60 * 1000
+TOLERANCE = 1e-9
+
+
+class StaffAggregate:
+    """Running counts and sums for one staff member.
+
+    Decayed sums are kept relative to `decay_at`, the newest timestamp seen:
+    a newer event first scales them down, an older one is added with a
+    smaller weight, so events may arrive in any order.
+    """
+
+    __slots__ = ("ratings", "service_sum", "personality_sum", "tips", "tips_sum",
+                 "decay_at", "decay_weight", "decay_service", "decay_personality", "decay_tips")
+
+    def __init__(self):
+        self.ratings = self.service_sum = self.personality_sum = 0
+        self.tips = self.tips_sum = 0
+        self.decay_at = None
+        self.decay_weight = self.decay_service = self.decay_personality = self.decay_tips = 0.0
+
+    def _weight(self, at, half_life):
+        if not half_life:
+            return 1.0
+        if self.decay_at is None:
+            self.decay_at = at
+        elif at > self.decay_at:
+            factor = 2.0 ** ((self.decay_at - at) / half_life)
+            self.decay_weight *= factor
+            self.decay_service *= factor
+            self.decay_personality *= factor
+            self.decay_tips *= factor
+            self.decay_at = at
+        return 2.0 ** ((at - self.decay_at) / half_life)
+
+    def add_rating(self, service, personality, at, half_life):
+        self.ratings += 1
+        self.service_sum += service
+        self.personality_sum += personality
+        weight = self._weight(at, half_life)
+        self.decay_weight += weight
+        self.decay_service += weight * service
+        self.decay_personality += weight * personality
+
+    def add_tip(self, amount, at, half_life):
+        self.tips += 1
+        self.tips_sum += amount
+        self.decay_tips += self._weight(at, half_life) * amount
+
+    @property
+    def average_service(self):
+        return self.service_sum / self.ratings if self.ratings else 0.0
+
+    @property
+    def average_personality(self):
+        return self.personality_sum / self.ratings if self.ratings else 0.0
+
+    def columns(self):
+        """(average_service, average_personality, tips_total) as stored on Staff"""
+        return self.average_service, self.average_personality, self.tips_sum
+
+    def summary(self, now, half_life):
+        decay = 2.0 ** ((self.decay_at - now) / half_life) if half_life and self.decay_at is not None else 1.0
+        weight = self.decay_weight
+        return {
+            "ratingsCount": self.ratings,
+            "averageService": self.average_service,
+            "averagePersonality": self.average_personality,
+            "tipsCount": self.tips,
+            "tipsTotal": self.tips_sum,
+            "tipsAverage": round(self.tips_sum / self.tips) if self.tips else 0,
+            # Ratios of decayed sums: the common decay factor cancels out
+            "recentService": self.decay_service / weight if weight else 0.0,
+            "recentPersonality": self.decay_personality / weight if weight else 0.0,
+            # Tips per half-life, roughly: each tip counts half as much every half-life
+            "recentTips": round(self.decay_tips * decay),
+        }
+
+
+def stream(conn, sql, params=()):
+    """Rows of a query, fetched in batches rather than all at once"""
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(STAFF_STATS_STREAM_BATCH)
+        if not rows:
+            return
+        yield from rows
+
+
+def check_consistency(conn, aggregates, rating_id=None, tip_id=None, stored=True):
+    """Compare aggregates with a GROUP BY recompute (and the Staff columns).
+
+    Only rows up to rating_id / tip_id are recomputed, so a tailing service
+    can be checked while new rows keep arriving. Returns a list of
+    {staff_id, field, aggregate, recomputed[, stored]} mismatches.
+    """
+    rating_bound = "WHERE id <= ?" if rating_id is not None else ""
+    tip_bound = "WHERE id <= ?" if tip_id is not None else ""
+    expected = {}
+    for staff_id, count, service, personality in conn.execute(
+        'SELECT staff_id, COUNT(*), AVG(service_rating), AVG(personality_rating) '
+        f'FROM "StaffRating" {rating_bound} GROUP BY staff_id',
+        () if rating_id is None else (rating_id,),
+    ):
+        expected[staff_id] = {"ratings": count, "average_service": service,
+                              "average_personality": personality, "tips": 0, "tips_total": 0}
+    for staff_id, count, total in conn.execute(
+        f'SELECT staff_id, COUNT(*), SUM(amount) FROM "Tip" {tip_bound} GROUP BY staff_id',
+        () if tip_id is None else (tip_id,),
+    ):
+        entry = expected.setdefault(staff_id, {"ratings": 0, "average_service": 0.0,
+                                               "average_personality": 0.0, "tips": 0, "tips_total": 0})
+        entry["tips"], entry["tips_total"] = count, total
+
+    columns = {}
+    if stored:
+        for staff_id, service, personality, tips_total in conn.execute(
+            'SELECT id, average_service, average_personality, tips_total FROM "Staff"'
+        ):
+            columns[staff_id] = {"average_service": service or 0.0,
+                                 "average_personality": personality or 0.0,
+                                 "tips_total": tips_total or 0}
+
+    empty = StaffAggregate()
+    mismatches = []
+    for staff_id in sorted(set(expected) | set(aggregates) | set(columns)):
+        agg = aggregates.get(staff_id, empty)
+        actual = {"ratings": agg.ratings, "average_service": agg.average_service,
+                  "average_personality": agg.average_personality, "tips": agg.tips,
+                  "tips_total": agg.tips_sum}
+        recomputed = expected.get(staff_id, {"ratings": 0, "average_service": 0.0,
+                                             "average_personality": 0.0, "tips": 0, "tips_total": 0})
+        for field, value in actual.items():
+            if not math.isclose(value, recomputed[field], rel_tol=TOLERANCE, abs_tol=TOLERANCE):
+                mismatches.append({"staff_id": staff_id, "field": field,
+                                   "aggregate": value, "recomputed": recomputed[field]})
+        if staff_id in columns:
+            for field, value in columns[staff_id].items():
+                if not math.isclose(value, recomputed[field], rel_tol=TOLERANCE, abs_tol=TOLERANCE):
+                    mismatches.append({"staff_id": staff_id, "field": field, "aggregate": actual[field],
+                                       "recomputed": recomputed[field], "stored": value})
+    return mismatches
+
+
+class StaffStatsService:
+    """Staff aggregates in memory, kept current by tailing StaffRating and Tip.
+
+    SQLite work (rebuilds, tailing, write-back, checks) runs on one thread.
+    """
+
+    def __init__(self, db_path=None, half_life_days=STAFF_STATS_HALF_LIFE_DAYS, writeback=STAFF_STATS_WRITEBACK):
+        self.db_path = db_path
+        self.half_life = half_life_days * DAY_MS if half_life_days > 0 else 0
+        self.writeback = writeback
+        self.aggregates = {}
+        self.rating_id = 0
+        self.tip_id = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="staffstats-db")
+        self.stats = {"rebuilds": 0, "rebuild_rows": 0, "rebuild_seconds": 0.0, "ratings": 0, "tips": 0,
+                      "staff_written": 0, "checks": 0, "mismatches": 0}
+        self._conn = None
+        # Rebuilds and polls move the watermarks; two at once would count rows twice
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        await self.rebuild()
+
+    async def close(self):
+        self.executor.submit(self._close_connection).result()
+        self.executor.shutdown(wait=True)
+
+    async def rebuild(self):
+        """Recompute every aggregate in one pass over both tables.
+
+        Staff columns that disagree with the result are corrected. Returns
+        the number of rows read.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with self._lock:
+            aggregates, rating_id, tip_id, rows = await loop.run_in_executor(self.executor, self._scan)
+            self.aggregates, self.rating_id, self.tip_id = aggregates, rating_id, tip_id
+            if self.writeback:
+                fixed = await loop.run_in_executor(self.executor, self._repair, aggregates)
+                if fixed:
+                    logger.info(f"Corrected the stored aggregates of {fixed} staff members")
+        elapsed = loop.time() - started
+        self.stats["rebuilds"] += 1
+        self.stats["rebuild_rows"] = rows
+        self.stats["rebuild_seconds"] = round(elapsed, 3)
+        logger.info(f"Staff aggregates rebuilt from {rows} rows for {len(aggregates)} staff in {elapsed:.2f}s")
+        return rows
+
+    async def poll(self):
+        """Apply StaffRating and Tip rows written since the last poll; returns how many"""
+        async with self._lock:
+            return await self._apply_new()
+
+    async def _apply_new(self):
+        loop = asyncio.get_running_loop()
+        ratings, tips = await loop.run_in_executor(self.executor, self._query_new, self.rating_id, self.tip_id)
+        touched = set()
+        for row_id, staff_id, service, personality, created_at in ratings:
+            self._aggregate(staff_id).add_rating(service, personality, created_at, self.half_life)
+            self.rating_id = max(self.rating_id, row_id)
+            touched.add(staff_id)
+        for row_id, staff_id, amount, created_at in tips:
+            self._aggregate(staff_id).add_tip(amount, created_at, self.half_life)
+            self.tip_id = max(self.tip_id, row_id)
+            touched.add(staff_id)
+        self.stats["ratings"] += len(ratings)
+        self.stats["tips"] += len(tips)
+
+        if touched and self.writeback:
+            updates = [(*self.aggregates[staff_id].columns(), staff_id) for staff_id in touched]
+            await loop.run_in_executor(self.executor, self._write_columns, updates)
+            self.stats["staff_written"] += len(updates)
+        return len(ratings) + len(tips)
+
+    def summary(self, staff_id=None, now=None):
+        """{staff_id: summary} for everyone, or one staff member's summary"""
+        now = db.now_ms() if now is None else now
+        if staff_id is not None:
+            return self._aggregate_or_empty(staff_id).summary(now, self.half_life)
+        return {staff_id: agg.summary(now, self.half_life) for staff_id, agg in self.aggregates.items()}
+
+    async def check(self):
+        """Mismatches between the aggregates, a recompute and the Staff columns"""
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            await self._apply_new()
+            mismatches = await loop.run_in_executor(self.executor, self._check)
+        self.stats["checks"] += 1
+        self.stats["mismatches"] = len(mismatches)
+        return mismatches
+
+    def _aggregate(self, staff_id):
+        agg = self.aggregates.get(staff_id)
+        if agg is None:
+            agg = self.aggregates[staff_id] = StaffAggregate()
+        return agg
+
+    def _aggregate_or_empty(self, staff_id):
+        return self.aggregates.get(staff_id) or StaffAggregate()
+
+    # The methods below run on the staffstats-db thread
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = db.connect(self.db_path)
+        return self._conn
+
+    def _scan(self):
+        conn = self._connection()
+        aggregates = {}
+        rating_id = tip_id = rows = 0
+        # Read both tables in one snapshot, so the watermarks match what was read
+        with conn:
+            conn.execute("BEGIN")
+            for row_id, staff_id, service, personality, created_at in stream(
+                conn, 'SELECT id, staff_id, service_rating, personality_rating, created_at FROM "StaffRating" ORDER BY id'
+            ):
+                agg = aggregates.get(staff_id) or aggregates.setdefault(staff_id, StaffAggregate())
+                agg.add_rating(service, personality, created_at, self.half_life)
+                rating_id = row_id
+                rows += 1
+            for row_id, staff_id, amount, created_at in stream(
+                conn, 'SELECT id, staff_id, amount, created_at FROM "Tip" ORDER BY id'
+            ):
+                agg = aggregates.get(staff_id) or aggregates.setdefault(staff_id, StaffAggregate())
+                agg.add_tip(amount, created_at, self.half_life)
+                tip_id = row_id
+                rows += 1
+        return aggregates, rating_id, tip_id, rows
+
+    def _repair(self, aggregates):
+        conn = self._connection()
+        empty = StaffAggregate()
+        updates = []
+        for staff_id, service, personality, tips_total in conn.execute(
+            'SELECT id, average_service, average_personality, tips_total FROM "Staff"'
+        ).fetchall():
+            columns = aggregates.get(staff_id, empty).columns()
+            stored = (service or 0.0, personality or 0.0, tips_total or 0)
+            if any(not math.isclose(a, b, rel_tol=TOLERANCE, abs_tol=TOLERANCE) for a, b in zip(columns, stored)):
+                updates.append((*columns, staff_id))
+        self._write_columns(updates)
+        return len(updates)
+
+    def _check(self):
+        # Stored columns are only expected to match when this service maintains them
+        return check_consistency(self._connection(), self.aggregates, self.rating_id, self.tip_id,
+                                 stored=self.writeback)
+
+    def _query_new(self, rating_id, tip_id):
+        conn = self._connection()
+        ratings = conn.execute(
+            'SELECT id, staff_id, service_rating, personality_rating, created_at FROM "StaffRating" '
+            "WHERE id > ? ORDER BY id LIMIT ?",
+            (rating_id, STAFF_STATS_TAIL_BATCH),
+        ).fetchall()
+        tips = conn.execute(
+            'SELECT id, staff_id, amount, created_at FROM "Tip" WHERE id > ? ORDER BY id LIMIT ?',
+            (tip_id, STAFF_STATS_TAIL_BATCH),
+        ).fetchall()
+        return ratings, tips
+
+    def _write_columns(self, updates):
+        if not updates:
+            return
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                'UPDATE "Staff" SET average_service = ?, average_personality = ?, tips_total = ? WHERE id = ?',
+                updates,
+            )
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,218 @@
+"""
+Wheel prize sampler for the PANDA Lounge backend service.
+
+Loads the active WheelPrize rows once and draws prizes in O(1) with Vose's
+alias method instead of the weighted linear scan /api/wheel/spin does on
+every request. Draws follow the spin route exactly: the weighted pick runs
+over every active prize, a prize whose `max_per_period` cap is reached is
+replaced by a uniform pick among the prizes still under their cap, and when
+every prize is capped the first active prize is returned.
+
+Benchmark-only: the spin route still draws in TypeScript, since a backend
+round trip per spin costs more than scanning a handful of prizes. This
+module is the model wheel_sampler_benchmark.py checks for fairness and cap
+enforcement, so it must keep the route's semantics.
+"""
+
+import logging
+import random
+
+import db
+
+logger = logging.getLogger("panda.wheel")
+
+PRIZE_COLUMNS = (
+    "id", "name", "description", "type", "value", "probability",
+    "color", "icon", "is_active", "max_per_period", "current_count",
+)
+
+# Fields that change which prizes are drawable or how likely they are
+WEIGHT_FIELDS = ("probability", "is_active", "max_per_period", "current_count")
+
+
+def build_alias_table(weights):
+    """Vose's alias method: returns (prob, alias) lists for the given weights"""
+    n = len(weights)
+    total = float(sum(weights))
+    scaled = [w * n / total for w in weights]
+    prob = [0.0] * n
+    alias = list(range(n))
+
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] = (scaled[l] + scaled[s]) - 1.0
+        (small if scaled[l] < 1.0 else large).append(l)
+
+    # Whatever is left is 1.0 up to floating point error
+    for i in large + small:
+        prob[i] = 1.0
+    return prob, alias
+
+
+def is_drawable(prize):
+    """Active with a positive weight: can come up in the weighted pick"""
+    return bool(prize["is_active"]) and (prize["probability"] or 0) > 0
+
+
+def is_available(prize):
+    """Under its period cap (the route's `availablePrizes`)"""
+    cap = prize["max_per_period"]
+    return not cap or (prize["current_count"] or 0) < cap
+
+
+class WheelSampler:
+    """Alias-method prize sampler kept in sync with the WheelPrize table"""
+
+    def __init__(self, db_path=None, rng=None):
+        self.db_path = db_path
+        self.rng = rng or random.Random()
+        self.prizes = {}
+        self.rebuilds = 0
+        self._order = []
+        self._drawable = []
+        self._available = []
+        self._prob = []
+        self._alias = []
+
+    def load(self, rows=None):
+        """Load prizes from the database (or from the given dict rows)"""
+        if rows is None:
+            rows = self._fetch_prizes()
+        self.prizes = {row["id"]: dict(row) for row in rows}
+        self._rebuild()
+        logger.info(f"Loaded {len(self.prizes)} wheel prizes ({len(self._drawable)} drawable)")
+
+    def refresh(self):
+        """Re-read WheelPrize and rebuild only if effective weights changed"""
+        changed = False
+        fresh = {row["id"]: row for row in self._fetch_prizes()}
+
+        for prize_id in self.prizes.keys() - fresh.keys():
+            del self.prizes[prize_id]
+            changed = True
+        for prize_id, row in fresh.items():
+            changed |= self._apply(prize_id, row)
+
+        if changed:
+            self._rebuild()
+        return changed
+
+    def update_prize(self, prize_id, **fields):
+        """Apply an admin edit to one prize; rebuilds only when needed"""
+        if prize_id not in self.prizes:
+            self.prizes[prize_id] = {column: None for column in PRIZE_COLUMNS}
+            self.prizes[prize_id].update(id=prize_id, current_count=0, is_active=True)
+        if self._apply(prize_id, fields):
+            self._rebuild()
+
+    def remove_prize(self, prize_id):
+        if self.prizes.pop(prize_id, None) is not None:
+            self._rebuild()
+
+    def record_win(self, prize_id):
+        """Count a win against the prize's period cap"""
+        prize = self.prizes[prize_id]
+        prize["current_count"] = (prize["current_count"] or 0) + 1
+        cap = prize["max_per_period"]
+        if cap and prize["current_count"] == cap:
+            self._refresh_available()
+
+    def reset_period(self):
+        """Start a new cap period (all current_count back to zero)"""
+        for prize in self.prizes.values():
+            prize["current_count"] = 0
+        self._refresh_available()
+
+    def draw(self):
+        """Draw one prize in O(1); returns the prize dict or None if none active"""
+        if not self._drawable:
+            return self.prizes[self._order[0]] if self._order else None
+        i = int(self.rng.random() * len(self._drawable))
+        if self.rng.random() >= self._prob[i]:
+            i = self._alias[i]
+        prize = self.prizes[self._drawable[i]]
+        if is_available(prize):
+            return prize
+        if not self._available:
+            return self.prizes[self._order[0]]
+        return self.prizes[self._available[int(self.rng.random() * len(self._available))]]
+
+    def table(self):
+        """(prize_ids, prob, alias) of the current alias table, for batch sampling"""
+        return list(self._drawable), list(self._prob), list(self._alias)
+
+    def active(self):
+        """Ids of the active prizes, in route order"""
+        return list(self._order)
+
+    def available(self):
+        """Ids of the active prizes still under their cap, in route order"""
+        return list(self._available)
+
+    def expected_distribution(self):
+        """Exact draw probability of every active prize under the route's rules"""
+        total = sum(self.prizes[i]["probability"] for i in self._drawable)
+        expected = dict.fromkeys(self._drawable, 0.0)
+        if not total:
+            return {self._order[0]: 1.0} if self._order else {}
+        capped = 0.0
+        for i in self._drawable:
+            share = self.prizes[i]["probability"] / total
+            if is_available(self.prizes[i]):
+                expected[i] += share
+            else:
+                capped += share
+        if capped:
+            fallback = self._available or self._order[:1]
+            for i in fallback:
+                expected[i] = expected.get(i, 0.0) + capped / len(fallback)
+        return expected
+
+    def _apply(self, prize_id, fields):
+        prize = self.prizes.setdefault(prize_id, {"id": prize_id})
+        before = tuple(prize.get(f) for f in WEIGHT_FIELDS)
+        for column in PRIZE_COLUMNS:
+            if column in fields:
+                prize[column] = fields[column]
+        return before != tuple(prize.get(f) for f in WEIGHT_FIELDS)
+
+    def _rebuild(self):
+        active = sorted(
+            (p for p in self.prizes.values() if p.get("is_active")),
+            key=lambda p: p["id"],
+        )
+        self._order = [p["id"] for p in active]
+        self._drawable = [p["id"] for p in active if is_drawable(p)]
+        if self._drawable:
+            weights = [self.prizes[i]["probability"] for i in self._drawable]
+            self._prob, self._alias = build_alias_table(weights)
+        else:
+            self._prob, self._alias = [], []
+        self._refresh_available()
+        self.rebuilds += 1
+
+    def _refresh_available(self):
+        # Caps only change which prizes a capped pick falls back to, not the table
+        self._available = [i for i in self._order if is_available(self.prizes[i])]
+
+    def _fetch_prizes(self):
+        conn = db.connect(self.db_path, readonly=True)
+        try:
+            available = {row[1] for row in conn.execute('PRAGMA table_info("WheelPrize")')}
+            columns = [c for c in PRIZE_COLUMNS if c in available]
+            cursor = conn.execute(
+                f'SELECT {", ".join(columns)} FROM "WheelPrize" WHERE is_active = 1'
+            )
+            rows = []
+            for values in cursor:
+                row = dict.fromkeys(PRIZE_COLUMNS)
+                row.update(current_count=0, is_active=True)
+                row.update(zip(columns, values))
+                rows.append(row)
+            return rows
+        finally:
+            conn.close()
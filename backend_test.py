@@ -4,16 +4,28 @@ QR System Testing for PANDA Lounge
 Tests the QR generation and validation system with comprehensive security checks.
 """
 
-import requests
+import argparse
 import json
+import math
+import os
+import threading
 import time
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import sys
 
+import rate_limits
+from db_inspector import DBInspector
+from event_recorder import configure, get_recorder
+from session_pool import SessionPool
+from server_timing import timing_fields
+
 # Configuration
 BASE_URL = "http://localhost:3000"
 DB_PATH = "/app/prisma/dev.db"
+BACKEND_URL = "http://localhost:8001"
+BACKEND_SERVICE_KEY = os.environ.get("BACKEND_SERVICE_KEY", "")
 
 # Test users from seed data
 TEST_USERS = {
@@ -22,68 +34,34 @@ TEST_USERS = {
     "admin": {"email": "admin@panda.com", "password": "admin123", "role": "admin"}
 }
 
+# Dedicated guests for the load mode (registered on demand)
+LOAD_EMAIL_DOMAIN = "load.panda.test"
+LOAD_PASSWORD = "load123"
+
 class QRSystemTester:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
+    def __init__(self, pool=None):
+        self.pool = pool or SessionPool(TEST_USERS, BASE_URL, headers={
             'Content-Type': 'application/json',
             'User-Agent': 'QR-System-Tester/1.0'
         })
-        self.auth_tokens = {}
+        self.session = self.pool.session()
+        self.db = DBInspector(DB_PATH)
+        self.recorder = get_recorder()
         
-    def log(self, message, level="INFO"):
-        """Log test messages with timestamp"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        print(f"[{timestamp}] {level}: {message}")
+    def log(self, message, level="INFO", **fields):
+        """Record a test event (printed in verbose mode)"""
+        self.recorder.record(level, message, source="qr", **fields)
         
     def authenticate_user(self, user_key):
-        """Authenticate user and get session cookies"""
-        user = TEST_USERS[user_key]
-        self.log(f"Authenticating user: {user['email']}")
-        
-        # First, get the CSRF token by visiting the login page
-        try:
-            login_page = self.session.get(f"{BASE_URL}/auth/login")
-            if login_page.status_code != 200:
-                self.log(f"Failed to access login page: {login_page.status_code}", "ERROR")
-                return False
-        except Exception as e:
-            self.log(f"Error accessing login page: {e}", "ERROR")
-            return False
-            
-        # Try to authenticate via NextAuth credentials endpoint
-        auth_data = {
-            "email": user["email"],
-            "password": user["password"],
-            "redirect": "false",
-            "json": "true"
-        }
-        
-        try:
-            # Use NextAuth credentials signin endpoint
-            auth_response = self.session.post(
-                f"{BASE_URL}/api/auth/signin/credentials",
-                data=auth_data,
-                allow_redirects=False
-            )
-            
-            self.log(f"Auth response status: {auth_response.status_code}")
-            self.log(f"Auth response headers: {dict(auth_response.headers)}")
-            
-            # Check if we got session cookies
-            cookies = self.session.cookies.get_dict()
-            self.log(f"Session cookies: {list(cookies.keys())}")
-            
-            if 'next-auth.session-token' in cookies or 'next-auth.csrf-token' in cookies:
-                self.log(f"Successfully authenticated {user['email']}")
-                return True
-            else:
-                self.log(f"Authentication failed for {user['email']} - no session cookies", "ERROR")
-                return False
-                
-        except Exception as e:
-            self.log(f"Authentication error for {user['email']}: {e}", "ERROR")
+        """Switch the session to user_key using the pool's cached login"""
+        cookies = self.pool.cookies(user_key)
+        if cookies is None:
+            self.log(f"Authentication failed for {TEST_USERS[user_key]['email']}", "ERROR")
             return False
+
+        self.session.cookies.clear()
+        self.session.cookies.update(cookies)
+        return True
     
     def make_api_request(self, method, endpoint, data=None):
         """Make authenticated API request"""
@@ -97,11 +75,13 @@ class QRSystemTester:
             else:
                 raise ValueError(f"Unsupported method: {method}")
                 
-            self.log(f"{method} {endpoint} -> {response.status_code}")
+            self.log(f"{method} {endpoint} -> {response.status_code}",
+                     method=method, endpoint=endpoint, status=response.status_code,
+                     **timing_fields(response))
             
             # Log response details for debugging
             if response.status_code >= 400:
-                self.log(f"Error response: {response.text}", "ERROR")
+                self.log(f"Error response: {response.text}", "ERROR", endpoint=endpoint, status=response.status_code)
                 
             return response
             
@@ -109,40 +89,6 @@ class QRSystemTester:
             self.log(f"API request error: {e}", "ERROR")
             return None
     
-    def check_database_records(self, table_name, condition=None):
-        """Check database records for validation"""
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            if condition:
-                query = f"SELECT * FROM {table_name} WHERE {condition}"
-            else:
-                query = f"SELECT * FROM {table_name}"
-                
-            cursor.execute(query)
-            records = cursor.fetchall()
-            
-            # Get column names
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = [col[1] for col in cursor.fetchall()]
-            
-            conn.close()
-            
-            self.log(f"Database query: {query}")
-            self.log(f"Found {len(records)} records in {table_name}")
-            
-            # Convert to dict format for easier reading
-            result = []
-            for record in records:
-                result.append(dict(zip(columns, record)))
-                
-            return result
-            
-        except Exception as e:
-            self.log(f"Database error: {e}", "ERROR")
-            return []
-    
     def test_qr_generation(self, user_key, qr_type="visit"):
         """Test QR code generation"""
         self.log(f"\n=== TEST: QR Generation ({user_key} -> {qr_type}) ===")
@@ -213,14 +159,19 @@ class QRSystemTester:
             self.log("No token provided for tampering test", "ERROR")
             return False
             
-        # Tamper with the signature (change last few characters)
-        parts = original_token.split('.')
-        if len(parts) != 2:
-            self.log("Invalid token format for tampering test", "ERROR")
-            return False
-            
-        tampered_signature = parts[1][:-3] + "XXX"  # Change last 3 characters
-        tampered_token = f"{parts[0]}.{tampered_signature}"
+        # Tamper with the signature (change a few characters of it)
+        if '.' in original_token:
+            parts = original_token.split('.')
+            if len(parts) != 2:
+                self.log("Invalid token format for tampering test", "ERROR")
+                return False
+            tampered_signature = parts[1][:-3] + "XXX"  # Change last 3 characters
+            tampered_token = f"{parts[0]}.{tampered_signature}"
+        else:
+            # Compact token: the truncated MAC is the tail; the final base32
+            # character carries padding bits, so change the three before it
+            replacement = "AAA" if original_token[-4:-1] != "AAA" else "BBB"
+            tampered_token = original_token[:-4] + replacement + original_token[-1]
         
         self.log(f"Original token: {original_token[:50]}...")
         self.log(f"Tampered token: {tampered_token[:50]}...")
@@ -378,8 +329,12 @@ class QRSystemTester:
         # Check database records
         self.log("\n" + "="*60)
         self.log("=== DATABASE VALIDATION EVENTS ===")
-        validation_events = self.check_database_records("QRValidationEvent")
-        for event in validation_events[-5:]:  # Show last 5 events
+        try:
+            validation_events = self.db.tail("QRValidationEvent", "validated_at", 5)
+        except (sqlite3.Error, ValueError) as e:
+            self.log(f"Database error: {e}", "ERROR")
+            validation_events = []
+        for event in validation_events:
             self.log(f"Event: {event.get('qr_type')} | Success: {event.get('success')} | Error: {event.get('error_message', 'None')}")
         
         # Summary
@@ -392,11 +347,11 @@ class QRSystemTester:
         
         for test_name, result in test_results.items():
             status = "✅ PASS" if result else "❌ FAIL"
-            self.log(f"{test_name.replace('_', ' ').title()}: {status}")
+            self.log(f"{test_name.replace('_', ' ').title()}: {status}", "RESULT", test=test_name, passed=bool(result))
             if result:
                 passed += 1
         
-        self.log(f"\nOverall: {passed}/{total} tests passed")
+        self.log(f"\nOverall: {passed}/{total} tests passed", "RESULT", passed=passed, total=total)
         
         if passed == total:
             self.log("🎉 All tests passed! QR system is working correctly.")
@@ -405,8 +360,440 @@ class QRSystemTester:
             self.log("⚠️ Some tests failed. Please check the logs above.")
             return False
 
+class LatencyStats:
+    """Latency samples and outcome counters for one endpoint"""
+
+    # Histogram bucket upper bounds in milliseconds
+    BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self.errors = 0
+        self.status_codes = {}
+        self.lock = threading.Lock()
+
+    def record(self, elapsed_ms, status, ok):
+        with self.lock:
+            self.samples.append(elapsed_ms)
+            self.status_codes[status] = self.status_codes.get(status, 0) + 1
+            if not ok:
+                self.errors += 1
+
+    def percentile(self, sorted_samples, pct):
+        """Nearest-rank percentile of an already sorted sample list"""
+        if not sorted_samples:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * len(sorted_samples)))
+        return sorted_samples[rank - 1]
+
+    def histogram(self, sorted_samples):
+        buckets = {}
+        index = 0
+        for bound in self.BUCKETS_MS:
+            count = 0
+            while index < len(sorted_samples) and sorted_samples[index] <= bound:
+                count += 1
+                index += 1
+            buckets[f"<={bound}ms"] = count
+        buckets[f">{self.BUCKETS_MS[-1]}ms"] = len(sorted_samples) - index
+        return buckets
+
+    def summary(self, elapsed_seconds):
+        with self.lock:
+            samples = sorted(self.samples)
+            status_codes = {str(k): v for k, v in self.status_codes.items()}
+            errors = self.errors
+
+        return {
+            "requests": len(samples),
+            "errors": errors,
+            "status_codes": status_codes,
+            "throughput_rps": round(len(samples) / elapsed_seconds, 2) if elapsed_seconds > 0 else 0.0,
+            "latency_ms": {
+                "min": round(samples[0], 2) if samples else 0.0,
+                "mean": round(sum(samples) / len(samples), 2) if samples else 0.0,
+                "p50": round(self.percentile(samples, 50), 2),
+                "p95": round(self.percentile(samples, 95), 2),
+                "p99": round(self.percentile(samples, 99), 2),
+                "max": round(samples[-1], 2) if samples else 0.0,
+            },
+            "histogram": self.histogram(samples),
+        }
+
+
+class QRLoadTester:
+    """Drives the generate -> validate -> replay cycle from many simulated users"""
+
+    ENDPOINTS = ("generate", "validate", "replay")
+
+    def __init__(self, concurrency=10, rate=0.0, duration=30.0, users=None, validator_key="staff"):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.guests = {
+            f"load_{i}": {"email": f"load{i}@{LOAD_EMAIL_DOMAIN}", "password": LOAD_PASSWORD}
+            for i in range(users or concurrency)
+        }
+        self.validator_key = validator_key
+        self.tester = QRSystemTester(SessionPool(
+            {**self.guests, validator_key: TEST_USERS[validator_key]}, BASE_URL, headers={
+                'Content-Type': 'application/json',
+                'User-Agent': 'QR-Load-Tester/1.0'
+            }
+        ))
+        self.stats = {name: LatencyStats(name) for name in self.ENDPOINTS}
+        self.cycles = 0
+        self.cycles_lock = threading.Lock()
+        self.next_slot = 0.0
+        self.slot_lock = threading.Lock()
+
+    def log(self, message, level="INFO"):
+        self.tester.log(message, level)
+
+    def prepare_sessions(self):
+        """Register the load guests (idempotent) and log everyone in once"""
+        session = self.tester.pool.session()
+        try:
+            for key, user in self.guests.items():
+                response = session.post(f"{BASE_URL}/api/auth/register", json={
+                    "name": f"Load {key}",
+                    "email": user["email"],
+                    "password": user["password"]
+                })
+                if response.status_code not in (201, 409):
+                    self.log(f"Failed to register {user['email']}: {response.status_code}", "ERROR")
+                    return False
+        finally:
+            session.close()
+        return all(self.tester.pool.cookies(key) is not None for key in (*self.guests, self.validator_key))
+
+    def wait_for_slot(self):
+        """Pace cycles across all workers to the requested rate (cycles/sec)"""
+        if self.rate <= 0:
+            return
+        with self.slot_lock:
+            now = time.perf_counter()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + 1.0 / self.rate
+        delay = slot - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def timed_post(self, session, endpoint, data):
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{BASE_URL}{endpoint}", json=data)
+        except Exception:
+            return None, (time.perf_counter() - started) * 1000
+        return response, (time.perf_counter() - started) * 1000
+
+    def run_cycle(self, guest, validator):
+        response, elapsed = self.timed_post(guest, "/api/qr/generate", {"type": "visit"})
+        ok = response is not None and response.status_code == 200
+        self.stats["generate"].record(elapsed, response.status_code if response is not None else "error", ok)
+        if not ok:
+            return
+        token = response.json().get("token")
+
+        response, elapsed = self.timed_post(validator, "/api/qr/validate", {"token": token})
+        ok = response is not None and response.status_code == 200
+        self.stats["validate"].record(elapsed, response.status_code if response is not None else "error", ok)
+
+        # Replay must be rejected; a 400 is the expected outcome here
+        response, elapsed = self.timed_post(validator, "/api/qr/validate", {"token": token})
+        ok = response is not None and response.status_code == 400
+        self.stats["replay"].record(elapsed, response.status_code if response is not None else "error", ok)
+
+        with self.cycles_lock:
+            self.cycles += 1
+
+    def worker(self, guest_key, deadline):
+        # Per-worker sessions so simulated users never share a connection
+        guest = self.tester.pool.session(guest_key)
+        validator = self.tester.pool.session(self.validator_key)
+        try:
+            while time.perf_counter() < deadline:
+                self.wait_for_slot()
+                if time.perf_counter() >= deadline:
+                    break
+                self.run_cycle(guest, validator)
+        finally:
+            guest.close()
+            validator.close()
+
+    def run(self, report_path=None):
+        """Run the load test and return the report dict"""
+        self.log("🚀 Starting QR System Load Test")
+        self.log(f"Base URL: {BASE_URL}")
+        self.log(f"Concurrency: {self.concurrency} | Guests: {len(self.guests)} | "
+                 f"Rate: {self.rate or 'unlimited'} cycles/s | Duration: {self.duration}s")
+
+        if not self.prepare_sessions():
+            self.log("Failed to authenticate load test users", "ERROR")
+            return None
+
+        started_at = datetime.now().isoformat()
+        started = time.perf_counter()
+        deadline = started + self.duration
+        guest_keys = list(self.guests)
+        # Each guest generates far more than qr_generate_per_minute allows
+        with rate_limits.bypassed(self.tester.pool.user_ids(), source="qr_load"), ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [
+                pool.submit(self.worker, guest_keys[i % len(guest_keys)], deadline)
+                for i in range(self.concurrency)
+            ]
+        elapsed = time.perf_counter() - started
+
+        worker_errors = []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                worker_errors.append(f"{type(e).__name__}: {e}")
+                self.log(f"Load worker failed: {e}", "ERROR")
+
+        report = {
+            "started_at": started_at,
+            "base_url": BASE_URL,
+            "config": {
+                "concurrency": self.concurrency,
+                "rate": self.rate,
+                "duration": self.duration,
+                "users": len(self.guests),
+            },
+            "elapsed_seconds": round(elapsed, 3),
+            "cycles": self.cycles,
+            "cycles_per_second": round(self.cycles / elapsed, 2) if elapsed > 0 else 0.0,
+            "endpoints": {name: stats.summary(elapsed) for name, stats in self.stats.items()},
+            "worker_errors": worker_errors,
+        }
+
+        self.print_report(report)
+        if report_path:
+            with open(report_path, "w") as f:
+                json.dump(report, f, indent=2)
+            self.log(f"Report written to {report_path}")
+        return report
+
+    def print_report(self, report):
+        self.log("\n" + "="*60, "RESULT")
+        self.log("📈 LOAD TEST SUMMARY", "RESULT")
+        self.log("="*60, "RESULT")
+        self.log(f"Cycles: {report['cycles']} ({report['cycles_per_second']}/s) in {report['elapsed_seconds']}s", "RESULT")
+        if report["worker_errors"]:
+            self.log(f"❌ {len(report['worker_errors'])} of {report['config']['concurrency']} workers failed", "RESULT")
+
+        for name, summary in report["endpoints"].items():
+            latency = summary["latency_ms"]
+            self.log(
+                f"{name:<9} {summary['requests']:>7} req  {summary['throughput_rps']:>8} rps  "
+                f"errors {summary['errors']:<5} p50 {latency['p50']}ms  p95 {latency['p95']}ms  "
+                f"p99 {latency['p99']}ms  max {latency['max']}ms",
+                "RESULT"
+            )
+            peak = max(summary["histogram"].values()) or 1
+            for bucket, count in summary["histogram"].items():
+                if count:
+                    bar = "#" * max(1, round(count / peak * 40))
+                    self.log(f"    {bucket:>9} {count:>7} {bar}", "RESULT")
+
+class QRBatchTester:
+    """Compares per-token and batch validation on the backend service"""
+
+    def __init__(self, batch_size=100, batches=5, guest_key="demo", validator_key="staff"):
+        self.batch_size = batch_size
+        self.batches = batches
+        self.guest_key = guest_key
+        self.validator_key = validator_key
+        self.tester = QRSystemTester()
+        self.stats = {name: LatencyStats(name) for name in ("per_token", "batch")}
+
+    def log(self, message, level="INFO"):
+        self.tester.log(message, level)
+
+    def backend_session(self):
+        session = self.tester.pool.session()
+        if BACKEND_SERVICE_KEY:
+            session.headers["X-Service-Key"] = BACKEND_SERVICE_KEY
+        return session
+
+    def validator_id(self):
+        """User id of the validator, as the backend expects it"""
+        session = self.tester.pool.session(self.validator_key)
+        if session is None:
+            return None
+        try:
+            response = session.get(f"{BASE_URL}/api/auth/session")
+            return (response.json().get("user") or {}).get("id")
+        except Exception:
+            return None
+        finally:
+            session.close()
+
+    def generate_tokens(self, count, workers=8):
+        """Mint `count` visit tokens through the app as the guest"""
+        def generate(_):
+            session = self.tester.pool.session(self.guest_key)
+            try:
+                response = session.post(f"{BASE_URL}/api/qr/generate", json={"type": "visit"})
+                return response.json().get("token") if response.status_code == 200 else None
+            except Exception:
+                return None
+            finally:
+                session.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            tokens = [t for t in pool.map(generate, range(count)) if t]
+        return tokens
+
+    def run_per_token(self, session, tokens, validator_id):
+        stats = self.stats["per_token"]
+        valid = 0
+        started = time.perf_counter()
+        for token in tokens:
+            t0 = time.perf_counter()
+            try:
+                response = session.post(f"{BACKEND_URL}/api/qr/validate",
+                                        json={"token": token, "validator_id": validator_id})
+            except Exception:
+                stats.record((time.perf_counter() - t0) * 1000, "error", False)
+                continue
+            ok = response.status_code == 200
+            stats.record((time.perf_counter() - t0) * 1000, response.status_code, ok)
+            valid += ok
+        return valid, time.perf_counter() - started
+
+    def run_batches(self, session, tokens, validator_id):
+        stats = self.stats["batch"]
+        valid = 0
+        started = time.perf_counter()
+        for i in range(0, len(tokens), self.batch_size):
+            chunk = tokens[i:i + self.batch_size]
+            t0 = time.perf_counter()
+            try:
+                response = session.post(f"{BACKEND_URL}/api/qr/validate/batch",
+                                        json={"tokens": chunk, "validator_id": validator_id})
+            except Exception:
+                stats.record((time.perf_counter() - t0) * 1000, "error", False)
+                continue
+            ok = response.status_code == 200
+            stats.record((time.perf_counter() - t0) * 1000, response.status_code, ok)
+            if ok:
+                valid += response.json().get("valid", 0)
+        return valid, time.perf_counter() - started
+
+    def run(self, report_path=None):
+        """Validate the same number of fresh tokens both ways and compare"""
+        self.log("🚀 Starting QR Batch Validation Test")
+        self.log(f"Base URL: {BASE_URL} | Backend: {BACKEND_URL}")
+        total = self.batch_size * self.batches
+        self.log(f"Batch size: {self.batch_size} | Batches: {self.batches} | Tokens per path: {total}")
+
+        validator_id = self.validator_id()
+        if not validator_id:
+            self.log("Failed to authenticate the validator", "ERROR")
+            return None
+
+        guest_ids = self.tester.pool.user_ids([self.guest_key])
+        with rate_limits.bypassed(guest_ids, backend_url=BACKEND_URL, source="qr_batch"):
+            tokens = self.generate_tokens(total * 2)
+        if len(tokens) < total * 2:
+            self.log(f"Only {len(tokens)}/{total * 2} tokens generated", "ERROR")
+            return None
+
+        session = self.backend_session()
+        try:
+            per_token_valid, per_token_seconds = self.run_per_token(session, tokens[:total], validator_id)
+            batch_valid, batch_seconds = self.run_batches(session, tokens[total:], validator_id)
+            # Every token of the batch run is now used; replaying them must fail
+            replayed, _ = self.run_batches(session, tokens[total:total + self.batch_size], validator_id)
+        finally:
+            session.close()
+
+        report = {
+            "started_at": datetime.now().isoformat(),
+            "backend_url": BACKEND_URL,
+            "config": {"batch_size": self.batch_size, "batches": self.batches},
+            "per_token": {
+                "valid": per_token_valid,
+                "seconds": round(per_token_seconds, 3),
+                "tokens_per_second": round(total / per_token_seconds, 1),
+                **self.stats["per_token"].summary(per_token_seconds),
+            },
+            "batch": {
+                "valid": batch_valid,
+                "seconds": round(batch_seconds, 3),
+                "tokens_per_second": round(total / batch_seconds, 1),
+                **self.stats["batch"].summary(batch_seconds),
+            },
+            "replays_accepted": replayed,
+        }
+        report["speedup"] = round(report["batch"]["tokens_per_second"] / report["per_token"]["tokens_per_second"], 1)
+        passed = per_token_valid == total and batch_valid == total and replayed == 0
+        report["passed"] = passed
+
+        self.log("\n" + "="*60, "RESULT")
+        self.log("📦 BATCH VALIDATION SUMMARY", "RESULT")
+        self.log("="*60, "RESULT")
+        for name in ("per_token", "batch"):
+            r = report[name]
+            self.log(
+                f"{name:<9} {r['valid']}/{total} valid  {r['tokens_per_second']:>8} tokens/s  "
+                f"p50 {r['latency_ms']['p50']}ms  p99 {r['latency_ms']['p99']}ms per request",
+                "RESULT"
+            )
+        self.log(f"Speedup: {report['speedup']}x", "RESULT")
+        self.log(f"{'✅' if replayed == 0 else '❌'} Replayed batch: {replayed} tokens accepted", "RESULT")
+
+        if report_path:
+            with open(report_path, "w") as f:
+                json.dump(report, f, indent=2)
+            self.log(f"Report written to {report_path}")
+        return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="QR System tests for PANDA Lounge")
+    parser.add_argument("--load", action="store_true", help="Run the concurrent load test instead of the functional tests")
+    parser.add_argument("--concurrency", type=int, default=10, help="Workers running cycles in parallel")
+    parser.add_argument("--users", type=int, default=None, help="Load guests to register (default: one per worker)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Target generate->validate->replay cycles per second (0 = unlimited)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Load test duration in seconds")
+    parser.add_argument("--batch", action="store_true", help="Compare per-token and batch validation on the backend service")
+    parser.add_argument("--batch-size", type=int, default=100, help="Tokens per batch request")
+    parser.add_argument("--batches", type=int, default=5, help="Batches to validate (tokens per path = size x batches)")
+    parser.add_argument("--backend-url", default=BACKEND_URL, help="Backend service URL for --batch")
+    parser.add_argument("--report", help="Write the load or batch test report as JSON to this path")
+    parser.add_argument("--summary", action="store_true", help="Print only aggregates instead of every log line")
+    parser.add_argument("--events", help="Also write every log event as NDJSON to this path")
+    return parser.parse_args()
+
 def main():
     """Main test execution"""
+    args = parse_args()
+    configure(mode="summary" if args.summary else None, path=args.events)
+
+    if args.batch:
+        global BACKEND_URL
+        BACKEND_URL = args.backend_url
+        batch_tester = QRBatchTester(batch_size=args.batch_size, batches=args.batches)
+        try:
+            report = batch_tester.run(report_path=args.report)
+            sys.exit(0 if report and report["passed"] else 1)
+        except KeyboardInterrupt:
+            print("\n⚠️ Batch test interrupted by user")
+            sys.exit(1)
+
+    if args.load:
+        load_tester = QRLoadTester(concurrency=args.concurrency, rate=args.rate, duration=args.duration,
+                                   users=args.users)
+        try:
+            report = load_tester.run(report_path=args.report)
+            sys.exit(0 if report and not report["worker_errors"] else 1)
+        except KeyboardInterrupt:
+            print("\n⚠️ Load test interrupted by user")
+            sys.exit(1)
+
     tester = QRSystemTester()
     
     try:
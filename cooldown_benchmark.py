@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Wheel Cooldown Cache Benchmark
+Compares the cached wheel status path in backend/cooldown.py with the
+DB-backed path /api/wheel/status takes today (latest WheelSpin row per poll):
+- both paths must return the same status for every sampled user
+- per-lookup latency (p50/p99) and throughput under a skewed poll mix
+- cache hit ratio once warm
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import db
+from cooldown import CooldownService, build_status
+from event_recorder import get_recorder
+
+# Configuration
+DB_PATH = "/app/prisma/dev.db"
+COOLDOWN_MS = 7 * 24 * 60 * 60 * 1000
+
+WHEEL_SPIN_SCHEMA = """
+CREATE TABLE "WheelSpin" (
+    "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "user_id" TEXT NOT NULL,
+    "prize_id" INTEGER,
+    "prize_name" TEXT NOT NULL,
+    "state" TEXT NOT NULL DEFAULT 'COMPLETED',
+    "spun_at" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "next_allowed_at" DATETIME NOT NULL,
+    "client_fp" TEXT,
+    "ip" TEXT
+);
+CREATE INDEX "WheelSpin_user_id_spun_at_idx" ON "WheelSpin"("user_id", "spun_at");
+CREATE INDEX "WheelSpin_next_allowed_at_idx" ON "WheelSpin"("next_allowed_at");
+"""
+
+PRIZE_NAMES = ["🎁 Безкоштовний кальян", "💰 Знижка 20%", "💎 Бонус 50 балів", "🍹 Безкоштовний напій"]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def comparable(status):
+    """Status fields that do not depend on the moment of the lookup"""
+    return {k: status.get(k) for k in ("canSpin", "state", "nextSpinDate", "lastPrize")}
+
+
+def create_synthetic_db(path, users, spins_per_user, rng):
+    """WheelSpin history for `users` users; about a third are still in cooldown"""
+    now = db.now_ms()
+    conn = sqlite3.connect(path)
+    conn.executescript(WHEEL_SPIN_SCHEMA)
+    rows = []
+    for u in range(users):
+        user_id = f"bench-user-{u:07d}"
+        # Walk back from a last spin somewhere in the past three weeks
+        spun_at = now - rng.randrange(0, 3 * COOLDOWN_MS)
+        for _ in range(spins_per_user):
+            rows.append((user_id, rng.choice(PRIZE_NAMES), spun_at, spun_at + COOLDOWN_MS))
+            spun_at -= COOLDOWN_MS + rng.randrange(0, COOLDOWN_MS)
+    with conn:
+        conn.executemany(
+            'INSERT INTO "WheelSpin" (user_id, prize_name, spun_at, next_allowed_at) VALUES (?, ?, ?, ?)',
+            rows,
+        )
+    user_ids = [f"bench-user-{u:07d}" for u in range(users)]
+    conn.close()
+    return user_ids
+
+
+class CooldownBenchmark:
+    def __init__(self, db_path, user_ids, lookups=200_000, skew=1.1, seed=None):
+        self.db_path = db_path
+        self.user_ids = user_ids
+        self.lookups = lookups
+        self.skew = skew
+        self.rng = random.Random(seed)
+        self.results = {}
+
+    def log(self, message, level="INFO"):
+        """Record a benchmark event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="cooldown_benchmark")
+
+    def poll_mix(self):
+        """Zipf-distributed user ids: a few users poll far more than the rest"""
+        weights = [1 / (rank + 1) ** self.skew for rank in range(len(self.user_ids))]
+        return self.rng.choices(self.user_ids, weights=weights, k=self.lookups)
+
+    def db_status(self, conn, prize_column, user_id):
+        """What the Next.js route does: latest spin by (user_id, spun_at), then compute"""
+        row = conn.execute(
+            f'SELECT next_allowed_at, {prize_column} FROM "WheelSpin" '
+            "WHERE user_id = ? ORDER BY spun_at DESC LIMIT 1",
+            (user_id,),
+        ).fetchone()
+        return build_status(*row) if row else build_status(None, None)
+
+    def record(self, name, samples, elapsed):
+        samples.sort()
+        self.results[name] = {
+            "lookups": len(samples),
+            "seconds": round(elapsed, 3),
+            "lookups_per_second": round(len(samples) / elapsed),
+            "p50_us": round(percentile(samples, 50) / 1000, 2),
+            "p99_us": round(percentile(samples, 99) / 1000, 2),
+        }
+        r = self.results[name]
+        self.log(f"{name}: {r['lookups_per_second']:,} lookups/s | p50 {r['p50_us']}µs | p99 {r['p99_us']}µs")
+
+    def run_db_path(self, mix):
+        conn = db.connect(self.db_path, readonly=True)
+        try:
+            columns = {row[1] for row in conn.execute('PRAGMA table_info("WheelSpin")')}
+            prize_column = "prize_name" if "prize_name" in columns else "prize"
+            samples = []
+            started = time.perf_counter()
+            for user_id in mix:
+                t0 = time.perf_counter_ns()
+                self.db_status(conn, prize_column, user_id)
+                samples.append(time.perf_counter_ns() - t0)
+            self.record("db_backed", samples, time.perf_counter() - started)
+
+            # Correctness: the cache must agree with the database for every user
+            return {u: comparable(self.db_status(conn, prize_column, u)) for u in set(mix)}
+        finally:
+            conn.close()
+
+    async def run_cached_path(self, mix, expected):
+        service = CooldownService(self.db_path, capacity=len(self.user_ids) + 1)
+        await service.start()
+        self.log(f"Warm start: {len(service.cache)} users in cooldown preloaded")
+        try:
+            # One pass over the distinct users fills the remaining misses
+            mismatches = 0
+            for user_id, status in expected.items():
+                if comparable(await service.status(user_id)) != status:
+                    mismatches += 1
+            hits_before, misses_before = service.cache.hits, service.cache.misses
+
+            samples = []
+            started = time.perf_counter()
+            for user_id in mix:
+                t0 = time.perf_counter_ns()
+                await service.status(user_id)
+                samples.append(time.perf_counter_ns() - t0)
+            self.record("cached", samples, time.perf_counter() - started)
+
+            hits = service.cache.hits - hits_before
+            misses = service.cache.misses - misses_before
+            self.results["cached"]["hit_ratio"] = round(hits / max(1, hits + misses), 4)
+            self.results["cached"]["db_reads"] = service.stats["db_reads"]
+            return mismatches
+        finally:
+            await service.close()
+
+    def run(self):
+        self.log("🎡 Starting Wheel Cooldown Benchmark")
+        self.log(f"Database: {self.db_path} | Users: {len(self.user_ids):,} | Lookups: {self.lookups:,}")
+        if not self.user_ids:
+            self.log("No users with wheel spins", "ERROR")
+            return False
+
+        mix = self.poll_mix()
+        self.log("\n" + "="*60)
+        expected = self.run_db_path(mix)
+        mismatches = asyncio.run(self.run_cached_path(mix, expected))
+
+        self.log("\n" + "="*60)
+        speedup = self.results["cached"]["lookups_per_second"] / self.results["db_backed"]["lookups_per_second"]
+        self.results["speedup"] = round(speedup, 1)
+        self.results["mismatches"] = mismatches
+        self.log(f"Speedup: {speedup:.1f}x | hit ratio {self.results['cached']['hit_ratio']:.2%}")
+        passed = mismatches == 0
+        self.log(
+            f"{'✅' if passed else '❌'} {len(expected) - mismatches}/{len(expected)} users match the DB-backed status",
+            "INFO" if passed else "ERROR"
+        )
+        return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wheel cooldown cache vs DB-backed status benchmark")
+    parser.add_argument("--db", help=f"Read WheelSpin from this database (e.g. {DB_PATH}); defaults to a synthetic one")
+    parser.add_argument("--users", type=int, default=20_000, help="Users in the synthetic database")
+    parser.add_argument("--spins-per-user", type=int, default=5, help="Spin history per synthetic user")
+    parser.add_argument("--lookups", type=int, default=200_000, help="Status lookups per path")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of the poll mix")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+    parser.add_argument("--report", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="panda-cooldown-") as workdir:
+        if args.db:
+            db_path = args.db
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            user_ids = [row[0] for row in conn.execute('SELECT DISTINCT user_id FROM "WheelSpin"')]
+            conn.close()
+        else:
+            db_path = os.path.join(workdir, "cooldown.db")
+            user_ids = create_synthetic_db(db_path, args.users, args.spins_per_user, rng)
+
+        benchmark = CooldownBenchmark(db_path, user_ids, args.lookups, args.skew, args.seed)
+        passed = benchmark.run()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(benchmark.results, f, indent=2)
+        benchmark.log(f"Report written to {args.report}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Read-only SQLite inspector for the PANDA Lounge test harnesses
+Streams rows out of the app database without loading whole tables:
+- pooled read-only connections (mode=ro), safe to use while the app writes
+- parameterized filters on validated column names, so indexes stay usable
+- generators backed by fetchmany() batches
+- "tail N by index" queries for the most recent rows of a table
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Configuration
+DB_PATH = "/app/prisma/dev.db"
+POOL_SIZE = 4
+FETCH_BATCH_SIZE = 500
+
+OPERATORS = {"=", "!=", "<", "<=", ">", ">=", "LIKE", "IN", "IS NULL", "IS NOT NULL"}
+
+
+class DBInspector:
+    def __init__(self, db_path=DB_PATH, pool_size=POOL_SIZE, batch_size=FETCH_BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        self.columns = {}
+        self.indexes = {}
+        self.lock = threading.Lock()
+        self.journal_mode = None
+
+    def open_connection(self):
+        """Read-only connection in autocommit mode.
+
+        Autocommit means every query starts its own read transaction, so a
+        pooled connection always sees the latest commits (including ones still
+        in the WAL) instead of pinning an old snapshot.
+        """
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro",
+            uri=True,
+            timeout=5,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        if self.journal_mode is None:
+            self.journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection"""
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            conn = self.open_connection()
+        try:
+            yield conn
+        finally:
+            try:
+                self.pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def table_columns(self, table):
+        """Column names of a table (cached); raises ValueError for unknown tables"""
+        if table not in self.columns:
+            with self.connection() as conn:
+                columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+            if not columns:
+                raise ValueError(f"Unknown table: {table}")
+            with self.lock:
+                self.columns[table] = columns
+        return self.columns[table]
+
+    def indexed_columns(self, table):
+        """Leading columns of every index on a table (cached)"""
+        if table not in self.indexes:
+            self.table_columns(table)
+            leading = set()
+            with self.connection() as conn:
+                for index in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+                    first = conn.execute(f'PRAGMA index_info("{index[1]}")').fetchone()
+                    if first is not None:
+                        leading.add(first[2])
+            with self.lock:
+                self.indexes[table] = leading
+        return self.indexes[table]
+
+    def check_column(self, table, column):
+        if column not in self.table_columns(table):
+            raise ValueError(f"Unknown column {table}.{column}")
+        return f'"{column}"'
+
+    def build_where(self, table, filters):
+        """Turn {column: value} / {column: (op, value)} into a parameterized WHERE"""
+        if not filters:
+            return "", []
+
+        clauses, params = [], []
+        for column, condition in filters.items():
+            name = self.check_column(table, column)
+            op, value = condition if isinstance(condition, tuple) else ("=", condition)
+            op = op.upper()
+            if op not in OPERATORS:
+                raise ValueError(f"Unsupported operator: {op}")
+
+            if op in ("IS NULL", "IS NOT NULL"):
+                clauses.append(f"{name} {op}")
+            elif op == "IN":
+                values = list(value)
+                clauses.append(f"{name} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+            else:
+                clauses.append(f"{name} {op} ?")
+                params.append(value)
+        return " WHERE " + " AND ".join(clauses), params
+
+    def iter_rows(self, table, filters=None, columns=None, order_by=None, descending=False, limit=None):
+        """Yield matching rows as dicts, fetching them in batches"""
+        self.table_columns(table)
+        select = ", ".join(self.check_column(table, c) for c in columns) if columns else "*"
+        where, params = self.build_where(table, filters)
+
+        sql = f'SELECT {select} FROM "{table}"{where}'
+        if order_by:
+            sql += f" ORDER BY {self.check_column(table, order_by)} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self.connection() as conn:
+            cursor = conn.execute(sql, params)
+            try:
+                while True:
+                    batch = cursor.fetchmany(self.batch_size)
+                    if not batch:
+                        break
+                    for row in batch:
+                        yield dict(row)
+            finally:
+                cursor.close()
+
+    def tail(self, table, index_column, n, filters=None, columns=None):
+        """Last n rows ordered by an indexed column, returned oldest first.
+
+        The ORDER BY ... DESC LIMIT n form lets SQLite walk the index backwards
+        and stop after n rows instead of sorting the whole table.
+        """
+        if index_column not in self.indexed_columns(table):
+            raise ValueError(f"{table}.{index_column} is not the leading column of an index")
+        rows = list(self.iter_rows(table, filters, columns, order_by=index_column, descending=True, limit=n))
+        rows.reverse()
+        return rows
+
+    def count(self, table, filters=None):
+        self.table_columns(table)
+        where, params = self.build_where(table, filters)
+        with self.connection() as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM "{table}"{where}', params).fetchone()[0]
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Structured event recorder for the PANDA Lounge test harnesses
+Replaces per-line datetime formatting and print() with compact records:
+- monotonic perf_counter_ns timestamps, converted to wall time only on output
+- __slots__ records buffered in memory and written as NDJSON by a
+  background thread
+- "summary" mode prints only aggregates (and RESULT lines), so load runs
+  measure the server instead of the terminal
+
+Configured through the environment so every harness in a process shares one
+recorder:
+    HARNESS_LOG_MODE=verbose|summary|quiet   (default: verbose)
+    HARNESS_EVENTS_FILE=events.ndjson        (optional NDJSON output)
+"""
+
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Configuration
+BUFFER_SIZE = 1024
+MODES = ("verbose", "summary", "quiet")
+
+# Levels still echoed in summary mode
+SUMMARY_LEVELS = {"RESULT"}
+
+
+class Event:
+    __slots__ = ("t_ns", "level", "source", "message", "fields")
+
+    def __init__(self, t_ns, level, source, message, fields):
+        self.t_ns = t_ns
+        self.level = level
+        self.source = source
+        self.message = message
+        self.fields = fields
+
+
+class EventRecorder:
+    def __init__(self, path=None, mode="verbose", buffer_size=BUFFER_SIZE, stream=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+        self.path = path
+        self.mode = mode
+        self.buffer_size = buffer_size
+        self.stream = stream
+        self.origin_ns = time.perf_counter_ns()
+        self.origin_wall = time.time()
+        self.counts = {}
+        self.buffer = []
+        self.closed = False
+        self.lock = threading.Lock()
+        self._clock_second = None
+        self._clock_text = ""
+
+        self.queue = None
+        self.writer = None
+        if path:
+            self.queue = queue.SimpleQueue()
+            self.writer = threading.Thread(target=self._write_loop, name="event-writer", daemon=True)
+            self.writer.start()
+
+    def clock(self, t_ns=None):
+        """HH:MM:SS for a perf_counter_ns timestamp, formatted once per second"""
+        t_ns = time.perf_counter_ns() if t_ns is None else t_ns
+        second = int(self.origin_wall + (t_ns - self.origin_ns) / 1e9)
+        if second != self._clock_second:
+            self._clock_second = second
+            self._clock_text = datetime.fromtimestamp(second).strftime("%H:%M:%S")
+        return self._clock_text
+
+    def record(self, level, message, source="harness", echo=None, **fields):
+        """Record one event.
+
+        `echo` overrides the console line printed in verbose mode (callers
+        with their own layout); extra keyword fields go to the NDJSON only.
+        """
+        t_ns = time.perf_counter_ns()
+        key = (source, level)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+        if self.mode == "verbose" or (self.mode == "summary" and level in SUMMARY_LEVELS):
+            if echo is None:
+                echo = f"[{self.clock(t_ns)}] {level}: {message}"
+            print(echo, file=self.stream or sys.stdout)
+
+        if self.queue is not None:
+            event = Event(t_ns, level, source, message, fields)
+            with self.lock:
+                self.buffer.append(event)
+                if len(self.buffer) >= self.buffer_size:
+                    batch, self.buffer = self.buffer, []
+                    self.queue.put(batch)
+
+    def flush(self):
+        """Hand buffered events to the writer thread"""
+        if self.queue is None:
+            return
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+        if batch:
+            self.queue.put(batch)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.flush()
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+        if self.mode == "summary":
+            self.print_summary()
+
+    def summary(self):
+        """Event counts per source and level"""
+        totals = {}
+        for (source, level), count in self.counts.items():
+            totals.setdefault(source, {})[level] = count
+        return totals
+
+    def print_summary(self):
+        elapsed = (time.perf_counter_ns() - self.origin_ns) / 1e9
+        total = sum(self.counts.values())
+        print(f"[{self.clock()}] SUMMARY: {total} events in {elapsed:.2f}s", file=self.stream or sys.stdout)
+        for source, levels in sorted(self.summary().items()):
+            breakdown = ", ".join(f"{level}={count}" for level, count in sorted(levels.items()))
+            print(f"    {source}: {breakdown}", file=self.stream or sys.stdout)
+        if self.path:
+            print(f"    events written to {self.path}", file=self.stream or sys.stdout)
+
+    def _write_loop(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                batch = self.queue.get()
+                if batch is None:
+                    break
+                lines = []
+                for event in batch:
+                    record = {
+                        "ts": datetime.fromtimestamp(
+                            self.origin_wall + (event.t_ns - self.origin_ns) / 1e9
+                        ).isoformat(timespec="microseconds"),
+                        "t_ns": event.t_ns - self.origin_ns,
+                        "level": event.level,
+                        "source": event.source,
+                        "message": event.message,
+                    }
+                    if event.fields:
+                        record.update(event.fields)
+                    lines.append(json.dumps(record, ensure_ascii=False, default=str))
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    """Process-wide recorder configured from the environment"""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = EventRecorder(
+                    path=os.environ.get("HARNESS_EVENTS_FILE") or None,
+                    mode=os.environ.get("HARNESS_LOG_MODE", "verbose"),
+                )
+                atexit.register(_recorder.close)
+    return _recorder
+
+
+def reset():
+    """Drop the process-wide recorder so the next get_recorder() starts afresh (forked workers)"""
+    global _recorder
+    with _recorder_lock:
+        _recorder = None
+
+
+def configure(mode=None, path=None):
+    """Override the environment settings before the first get_recorder() call"""
+    if mode:
+        os.environ["HARNESS_LOG_MODE"] = mode
+    if path:
+        os.environ["HARNESS_EVENTS_FILE"] = path
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+API Latency Regression Benchmark
+Times the hot Next.js endpoints one request at a time and compares them
+with a baseline kept in the repo (latency_baseline.json):
+- warm-up requests first (not recorded), then a fixed number of timed ones
+- per endpoint p50/p95/p99 and the raw samples
+- bootstrap confidence intervals for the p50 and p95 ratio current/baseline;
+  a p95 whose whole interval lies above 1 + --threshold is a significant
+  slowdown and fails the run
+- --update-baseline stores the current samples as the new baseline;
+  without it a missing baseline file, or an endpoint missing from it,
+  fails the run
+- the Server-Timing phases of the timed requests, as a per-endpoint
+  breakdown (see server_timing.py)
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import rate_limits
+from backend_test import BASE_URL, TEST_USERS
+from event_recorder import get_recorder
+from server_timing import PhaseProfile
+from session_pool import SessionPool
+
+# Configuration
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "latency_baseline.json")
+BOOTSTRAP_RESAMPLES = 2000
+CONFIDENCE = 0.95
+SEARCH_QUERIES = ["drake", "dua lipa", "weeknd", "kalush", "imagine dragons", "coldplay", "adele", "jerry heil"]
+
+
+class Endpoint:
+    __slots__ = ("method", "path", "user", "ok_statuses", "payload")
+
+    def __init__(self, method, path, user=None, ok_statuses=(200,), payload=None):
+        self.method = method
+        self.path = path
+        self.user = user
+        self.ok_statuses = ok_statuses
+        # payload(benchmark, i) -> request kwargs (json= / params=)
+        self.payload = payload or (lambda benchmark, i: {})
+
+
+ENDPOINTS = {
+    "wheel_status": Endpoint("GET", "/api/wheel/status", user="demo"),
+    # After the first spin every request takes the cooldown path (429), which is what most users hit
+    "wheel_spin": Endpoint("POST", "/api/wheel/spin", user="demo", ok_statuses=(200, 429)),
+    "qr_generate": Endpoint(
+        "POST", "/api/qr/generate", user="demo",
+        payload=lambda benchmark, i: {"json": {"type": "visit"}},
+    ),
+    "qr_validate": Endpoint(
+        "POST", "/api/qr/validate", user="staff",
+        payload=lambda benchmark, i: {"json": {"token": benchmark.tokens[i]}},
+    ),
+    "admin_stats": Endpoint("GET", "/api/admin/stats", user="admin"),
+    "music_search": Endpoint(
+        "GET", "/api/music/search",
+        payload=lambda benchmark, i: {"params": {"q": SEARCH_QUERIES[i % len(SEARCH_QUERIES)], "limit": 10}},
+    ),
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted sample list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def bootstrap_ratio(baseline, current, pct, rng, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE):
+    """Point estimate and confidence interval of percentile(current) / percentile(baseline)"""
+    point = percentile(sorted(current), pct) / percentile(sorted(baseline), pct)
+    ratios = []
+    for _ in range(resamples):
+        b = percentile(sorted(rng.choices(baseline, k=len(baseline))), pct)
+        c = percentile(sorted(rng.choices(current, k=len(current))), pct)
+        ratios.append(c / b if b > 0 else math.inf)
+    ratios.sort()
+    tail = (1 - confidence) / 2
+    low = ratios[int(tail * resamples)]
+    high = ratios[min(resamples - 1, int((1 - tail) * resamples))]
+    return round(point, 3), round(low, 3), round(high, 3)
+
+
+class LatencyBenchmark:
+    def __init__(self, endpoints, baseline=None, warmup=10, iterations=200, threshold=0.10, seed=None,
+                 require_baseline=True):
+        self.endpoints = endpoints
+        self.baseline = baseline or {}
+        self.require_baseline = require_baseline
+        self.warmup = warmup
+        self.iterations = iterations
+        self.threshold = threshold
+        self.rng = random.Random(seed)
+        self.pool = SessionPool(TEST_USERS, BASE_URL, headers={
+            'Content-Type': 'application/json',
+            'User-Agent': 'Latency-Benchmark/1.0'
+        })
+        self.tokens = []
+        self.phases = PhaseProfile()
+        self.results = {}
+        self.regressions = []
+        self.unbaselined = []
+
+    def log(self, message, level="INFO"):
+        """Record a benchmark event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="latency_benchmark")
+
+    def prepare(self):
+        """QR tokens for qr_validate, generated before timing starts"""
+        if "qr_validate" not in self.endpoints:
+            return True
+        session = self.pool.session("demo")
+        if session is None:
+            self.log("Cannot log in as demo to generate QR tokens", "ERROR")
+            return False
+        with session:
+            for _ in range(self.warmup + self.iterations):
+                response = session.post(f"{BASE_URL}/api/qr/generate", json={"type": "visit"})
+                if response.status_code != 200:
+                    self.log(f"QR generation failed: {response.status_code}", "ERROR")
+                    return False
+                self.tokens.append(response.json()["token"])
+        return True
+
+    def measure(self, name, endpoint):
+        session = self.pool.session(endpoint.user)
+        if session is None:
+            self.log(f"{name}: cannot log in as {endpoint.user}", "ERROR")
+            return None
+
+        samples, statuses, errors = [], {}, 0
+        url = f"{BASE_URL}{endpoint.path}"
+        with session:
+            for i in range(self.warmup + self.iterations):
+                kwargs = endpoint.payload(self, i)
+                started = time.perf_counter()
+                try:
+                    response = session.request(endpoint.method, url, **kwargs)
+                    response.content  # include the body transfer
+                    status = response.status_code
+                except Exception as e:
+                    self.log(f"{name}: request error: {e}", "ERROR")
+                    status = "error"
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if i < self.warmup:
+                    continue
+                if status != "error":
+                    self.phases.add_response(endpoint.method, endpoint.path, response)
+                samples.append(round(elapsed_ms, 3))
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status not in endpoint.ok_statuses:
+                    errors += 1
+
+        ordered = sorted(samples)
+        return {
+            "method": endpoint.method,
+            "path": endpoint.path,
+            "requests": len(samples),
+            "errors": errors,
+            "status_codes": statuses,
+            "p50_ms": round(percentile(ordered, 50), 2),
+            "p95_ms": round(percentile(ordered, 95), 2),
+            "p99_ms": round(percentile(ordered, 99), 2),
+            "samples_ms": samples,
+        }
+
+    def compare(self, name, result):
+        """Attach baseline comparison; returns True on a significant p95 slowdown"""
+        base = self.baseline.get("endpoints", {}).get(name)
+        if not base:
+            return False
+        p50 = bootstrap_ratio(base["samples_ms"], result["samples_ms"], 50, self.rng)
+        p95 = bootstrap_ratio(base["samples_ms"], result["samples_ms"], 95, self.rng)
+        result["vs_baseline"] = {
+            "baseline_p95_ms": base["p95_ms"],
+            "p50_ratio": {"estimate": p50[0], "ci": [p50[1], p50[2]]},
+            "p95_ratio": {"estimate": p95[0], "ci": [p95[1], p95[2]]},
+        }
+        return p95[1] > 1 + self.threshold
+
+    def run(self):
+        self.log("⏱️ Starting API Latency Regression Benchmark")
+        self.log(f"Base URL: {BASE_URL} | Warm-up: {self.warmup} | Iterations: {self.iterations}")
+        if not self.baseline and self.require_baseline:
+            self.log("No baseline to compare with: record one with --update-baseline", "ERROR")
+            return False
+        if not self.prepare():
+            return False
+
+        self.log("\n" + "="*60)
+        failed = []
+        for name, endpoint in self.endpoints.items():
+            result = self.measure(name, endpoint)
+            if result is None:
+                failed.append(name)
+                continue
+            self.results[name] = result
+            slower = self.compare(name, result)
+            if self.require_baseline and "vs_baseline" not in result:
+                self.unbaselined.append(name)
+            line = f"{name}: p50 {result['p50_ms']}ms | p95 {result['p95_ms']}ms | p99 {result['p99_ms']}ms"
+            comparison = result.get("vs_baseline")
+            if comparison:
+                ratio = comparison["p95_ratio"]
+                line += f" | p95 x{ratio['estimate']} [{ratio['ci'][0]}, {ratio['ci'][1]}] vs {comparison['baseline_p95_ms']}ms"
+            if result["errors"]:
+                failed.append(name)
+                self.log(f"❌ {line} | {result['errors']} unexpected statuses {result['status_codes']}", "ERROR")
+            elif slower:
+                self.regressions.append(name)
+                self.log(f"❌ {line} | significant p95 slowdown", "ERROR")
+            elif name in self.unbaselined:
+                self.log(f"❌ {line} | not in the baseline (use --update-baseline)", "ERROR")
+            else:
+                self.log(f"✅ {line}")
+
+        if self.phases.groups:
+            self.log("\n" + "="*60)
+            self.log("Server-Timing breakdown (mean per request):\n" + self.phases.render())
+
+        self.log("\n" + "="*60)
+        missing = [name for name in self.unbaselined if name not in failed]
+        passed = not failed and not self.regressions and not missing
+        self.log(
+            f"{'✅' if passed else '❌'} {len(self.endpoints) - len(failed) - len(self.regressions) - len(missing)}"
+            f"/{len(self.endpoints)} endpoints within baseline"
+            + (f" | regressions: {', '.join(self.regressions)}" if self.regressions else "")
+            + (f" | not in baseline: {', '.join(missing)}" if missing else "")
+            + (f" | failed: {', '.join(failed)}" if failed else ""),
+            "INFO" if passed else "ERROR"
+        )
+        return passed
+
+    def baseline_snapshot(self):
+        return {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "base_url": BASE_URL,
+            "iterations": self.iterations,
+            "endpoints": {
+                name: {k: r[k] for k in ("method", "path", "p50_ms", "p95_ms", "p99_ms", "samples_ms")}
+                for name, r in self.results.items()
+            },
+        }
+
+
+def main():
+    global BASE_URL
+    parser = argparse.ArgumentParser(description="Latency regression benchmark for the hot API endpoints")
+    parser.add_argument("--base-url", default=BASE_URL, help="Next.js app under test")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated endpoints to time")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per endpoint")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed requests per endpoint")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 slowdown that counts as a regression")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline samples (JSON)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the current samples as the new baseline")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for the bootstrap")
+    parser.add_argument("--report", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    BASE_URL = args.base_url.rstrip("/")
+    unknown = [name for name in args.endpoints.split(",") if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)} (choose from {', '.join(ENDPOINTS)})")
+    endpoints = {name: ENDPOINTS[name] for name in args.endpoints.split(",")}
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    benchmark = LatencyBenchmark(endpoints, baseline, args.warmup, args.iterations, args.threshold, args.seed,
+                                 require_baseline=not args.update_baseline)
+    # demo generates and spins far more often than the limiter allows a guest
+    with rate_limits.bypassed(benchmark.pool.user_ids(), source="latency_benchmark"):
+        passed = benchmark.run()
+
+    if args.update_baseline and passed:
+        with open(args.baseline, "w") as f:
+            json.dump(benchmark.baseline_snapshot(), f, indent=2)
+        benchmark.log(f"Baseline written to {args.baseline}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({
+                "regressions": benchmark.regressions,
+                "unbaselined": benchmark.unbaselined,
+                "endpoints": benchmark.results,
+                "server_timing": benchmark.phases.summary(),
+            }, f, indent=2, ensure_ascii=False)
+        benchmark.log(f"Report written to {args.report}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+/**
+ * Dashboard numbers for /api/admin/stats
+ * The backend keeps hourly and daily rollups of visits, revenue and spins
+ * plus periodically refreshed gauges (backend/rollup.py), so the stats and
+ * the 7-day chart come from memory instead of ~30 count/aggregate queries.
+ * Without the backend (lib/backend.ts) the route queries Prisma.
+ */
+
+import { backendFetch, backendJSON } from '@/lib/backend'
+
+export interface DashboardStats {
+  todayVisits: number
+  weekVisits: number
+  monthRevenue: number
+  activeUsers: number
+  pendingMusicOrders: number
+  todayWheelSpins: number
+  activeCoupons: number
+  totalUsers: number
+  highRiskUsers: number
+}
+
+export interface ChartPoint {
+  date: string
+  visits: number
+  spins: number
+  revenue: number
+}
+
+export interface Dashboard {
+  stats: DashboardStats
+  chartData: ChartPoint[]
+}
+
+/**
+ * Stats and chart data from the backend rollups, or null to fall back to the database
+ */
+export async function rollupDashboard(): Promise<Dashboard | null> {
+  const response = await backendFetch('/api/admin/stats')
+  const data = response?.ok ? await backendJSON<Dashboard>(response) : null
+  return data && { stats: data.stats, chartData: data.chartData }
+}
@@ -0,0 +1,228 @@
+/**
+ * Analytics for /api/analytics
+ * The backend computes reports from NumPy column arrays and caches them
+ * per range (backend/analytics.py). Without the backend (lib/backend.ts),
+ * or if it runs without NumPy, the same report is computed here from
+ * Prisma, which reads the whole range on every request.
+ */
+
+import { backendFetch, backendJSON } from '@/lib/backend'
+import { prisma } from '@/lib/prisma'
+
+// Days per range (RANGES in backend/analytics.py)
+export const RANGES: Record<string, number> = { '7d': 7, '30d': 30, '3m': 90, '1y': 365 }
+
+const CATEGORY_NAMES: Record<string, string> = {
+  hookah: 'Кальяни',
+  cocktails: 'Коктейлі',
+  drinks: 'Напої',
+  kitchen: 'Кухня',
+  tea: 'Чай'
+}
+
+/**
+ * Report from the backend, or null to compute it from the database
+ */
+export async function backendAnalytics(range: string): Promise<any | null> {
+  const response = await backendFetch(`/api/analytics?${new URLSearchParams({ range })}`)
+  if (!response) {
+    return null
+  }
+  if (!response.ok) {
+    // 404: the backend runs without NumPy
+    console.error('Analytics backend error:', response.status)
+    return null
+  }
+  return backendJSON(response)
+}
+
+function localDate(date: Date): string {
+  const pad = (n: number) => String(n).padStart(2, '0')
+  return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}`
+}
+
+function percentages(amounts: number[]): number[] {
+  const total = amounts.reduce((sum, a) => sum + a, 0)
+  return amounts.map(a => (total ? Math.round((a / total) * 1000) / 10 : 0))
+}
+
+function round(value: number, digits: number): number {
+  const scale = 10 ** digits
+  return Math.round(value * scale) / scale
+}
+
+/**
+ * The backend's report (same shape and definitions), computed with Prisma
+ */
+export async function analyticsFromDatabase(range: string) {
+  const days = RANGES[range]
+  const now = new Date()
+  const starts: Date[] = []
+  for (let i = 0; i <= days; i++) {
+    starts.push(new Date(now.getFullYear(), now.getMonth(), now.getDate() - days + 1 + i))
+  }
+  const dates = starts.slice(0, days).map(localDate)
+  const window = { gte: starts[0], lt: starts[days] }
+  const dayIndex = (at: Date) => dates.indexOf(localDate(at))
+
+  const [visits, tips, ratings, promos, menu, staff] = await Promise.all([
+    prisma.visit.findMany({
+      where: { created_at: window },
+      select: { created_at: true, status: true, bill_amount: true, user_id: true }
+    }),
+    prisma.tip.findMany({
+      where: { created_at: window },
+      select: { staff_id: true, amount: true }
+    }),
+    prisma.staffRating.findMany({
+      where: { created_at: window },
+      select: { created_at: true, staff_id: true, service_rating: true, personality_rating: true }
+    }),
+    prisma.promoUsage.findMany({
+      where: { used_at: window },
+      select: { used_at: true, promo_code: { select: { source: true } } }
+    }),
+    prisma.menuItem.findMany({
+      orderBy: { id: 'asc' },
+      select: { category: true, name: true, price: true, order_count: true, likes_count: true }
+    }),
+    prisma.staff.findMany({
+      where: { is_active: true },
+      orderBy: { id: 'asc' },
+      select: { id: true, name: true }
+    })
+  ])
+
+  // Visits: only confirmed ones count, a null bill counts as unbilled
+  const visitsByDay = new Array(days).fill(0)
+  const revenueByDay = new Array(days).fill(0)
+  const visitsByHour = new Array(24).fill(0)
+  const perUser = new Map<string, number>()
+  let totalRevenue = 0
+  let billed = 0
+  const confirmed = visits.filter(v => v.status === 'confirmed')
+  for (const visit of confirmed) {
+    const day = dayIndex(visit.created_at)
+    visitsByDay[day]++
+    revenueByDay[day] += visit.bill_amount ?? 0
+    visitsByHour[visit.created_at.getHours()]++
+    perUser.set(visit.user_id, (perUser.get(visit.user_id) || 0) + 1)
+    totalRevenue += visit.bill_amount ?? 0
+    if (visit.bill_amount !== null) {
+      billed++
+    }
+  }
+  const totalVisits = confirmed.length
+  const uniqueVisitors = perUser.size
+  const oneTime = Array.from(perUser.values()).filter(count => count === 1).length
+
+  const tipsByStaff = new Map<number, number>()
+  let tipTotal = 0
+  for (const tip of tips) {
+    tipsByStaff.set(tip.staff_id, (tipsByStaff.get(tip.staff_id) || 0) + tip.amount)
+    tipTotal += tip.amount
+  }
+
+  const ratingCountByDay = new Array(days).fill(0)
+  const ratingSumByDay = new Array(days).fill(0)
+  const ratingsByStaff = new Map<number, { count: number; sum: number }>()
+  for (const rating of ratings) {
+    const score = (rating.service_rating + rating.personality_rating) / 2
+    const day = dayIndex(rating.created_at)
+    ratingCountByDay[day]++
+    ratingSumByDay[day] += score
+    const entry = ratingsByStaff.get(rating.staff_id) || { count: 0, sum: 0 }
+    entry.count++
+    entry.sum += score
+    ratingsByStaff.set(rating.staff_id, entry)
+  }
+
+  const sourceCounts = new Map<string, number>()
+  const promoOrdersByDay = new Array(days).fill(0)
+  for (const usage of promos) {
+    sourceCounts.set(usage.promo_code.source, (sourceCounts.get(usage.promo_code.source) || 0) + 1)
+    promoOrdersByDay[dayIndex(usage.used_at)]++
+  }
+  const sources = Array.from(sourceCounts.entries())
+  const sourceShare = percentages(sources.map(([, count]) => count))
+
+  const staffNames = new Map(staff.map(s => [s.id, s.name]))
+  const staffRows = staff.map(s => {
+    const entry = ratingsByStaff.get(s.id)
+    return {
+      name: s.name,
+      avgRating: entry ? round(entry.sum / entry.count, 2) : 0,
+      totalRatings: entry?.count || 0,
+      tips: tipsByStaff.get(s.id) || 0
+    }
+  })
+  staffRows.sort((a, b) => b.avgRating - a.avgRating || b.totalRatings - a.totalRatings)
+  const topTipped = Array.from(tipsByStaff.entries()).sort((a, b) => b[1] - a[1])
+
+  // MenuItem counters are lifetime totals, not range-bound
+  const byCategory = new Map<string, { orders: number; revenue: number }>()
+  for (const item of menu) {
+    const bucket = byCategory.get(item.category) || { orders: 0, revenue: 0 }
+    bucket.orders += item.order_count
+    bucket.revenue += item.order_count * item.price
+    byCategory.set(item.category, bucket)
+  }
+  const categories = Array.from(byCategory.entries()).sort((a, b) => b[1].revenue - a[1].revenue)
+  const categoryShare = percentages(categories.map(([, c]) => c.revenue))
+  const topItems = [...menu].sort((a, b) => b.order_count - a.order_count).slice(0, 5)
+  const topSales = [...menu].sort((a, b) => b.order_count * b.price - a.order_count * a.price).slice(0, 3)
+
+  return {
+    range,
+    overview: {
+      totalVisits,
+      uniqueVisitors,
+      avgVisitDuration: 0,
+      conversionRate: visits.length ? round((totalVisits / visits.length) * 100, 1) : 0,
+      totalRevenue,
+      // Share of visitors who came only once in the range
+      bounceRate: uniqueVisitors ? round((oneTime / uniqueVisitors) * 100, 1) : 0
+    },
+    visits: {
+      byDay: dates.map((date, i) => ({ date, count: visitsByDay[i] })),
+      byHour: visitsByHour.map((count, hour) => ({ hour, count })),
+      sources: sources.map(([source, count], i) => ({ source, count, percentage: sourceShare[i] }))
+    },
+    menu: {
+      byCategory: categories.map(([category, c]) => ({
+        category: CATEGORY_NAMES[category] || category,
+        orders: c.orders,
+        revenue: c.revenue
+      })),
+      topItems: topItems.map(i => ({
+        name: i.name,
+        orders: i.order_count,
+        revenue: i.order_count * i.price,
+        likes: i.likes_count
+      })),
+      trends: dates.map((date, i) => ({ date, orders: promoOrdersByDay[i] }))
+    },
+    staff: {
+      ratings: staffRows,
+      ratingTrends: dates.map((date, i) => ({
+        date,
+        avgRating: ratingCountByDay[i] ? round(ratingSumByDay[i] / ratingCountByDay[i], 2) : 0
+      })),
+      tipStats: {
+        total: tipTotal,
+        avgPerVisit: totalVisits ? round(tipTotal / totalVisits, 1) : 0,
+        topStaff: topTipped.slice(0, 3).map(([id, amount]) => ({ name: staffNames.get(id) || String(id), amount }))
+      }
+    },
+    revenue: {
+      avgCheck: billed ? Math.round(totalRevenue / billed) : 0,
+      byCategory: categories.map(([category, c], i) => ({
+        category: CATEGORY_NAMES[category] || category,
+        amount: c.revenue,
+        percentage: categoryShare[i]
+      })),
+      topSales: topSales.map(i => ({ item: i.name, revenue: i.order_count * i.price, orders: i.order_count })),
+      trends: dates.map((date, i) => ({ date, revenue: revenueByDay[i] }))
+    }
+  }
+}
@@ -0,0 +1,57 @@
+/**
+ * Requests to the backend service (backend/server.py)
+ * Every lib/ wrapper around the backend calls it through backendFetch. It
+ * resolves to null without BACKEND_URL, and when the backend is down or does
+ * not answer within BACKEND_TIMEOUT_MS; the wrapper then does the work itself
+ * (usually with Prisma), so the backend only ever makes a route faster.
+ */
+
+// Milliseconds before an unanswered backend request counts as a failure
+const BACKEND_TIMEOUT_MS = parseInt(process.env.BACKEND_TIMEOUT_MS || '2000', 10) || 2000
+
+export interface BackendRequestInit extends RequestInit {
+  // Overrides BACKEND_TIMEOUT_MS; 0 for none
+  timeoutMs?: number
+}
+
+/**
+ * The backend's response, or null if there is no backend or it could not be reached in time
+ * The timeout covers reading the body too. A `signal` passed in replaces it, so
+ * long-lived streams stay open until their caller aborts them.
+ */
+export async function backendFetch(
+  path: string,
+  { timeoutMs = BACKEND_TIMEOUT_MS, headers, signal, ...init }: BackendRequestInit = {}
+): Promise<Response | null> {
+  if (!process.env.BACKEND_URL) {
+    return null
+  }
+
+  const requestHeaders: Record<string, string> = { 'Content-Type': 'application/json' }
+  if (process.env.BACKEND_SERVICE_KEY) {
+    requestHeaders['X-Service-Key'] = process.env.BACKEND_SERVICE_KEY
+  }
+  try {
+    return await fetch(`${process.env.BACKEND_URL}${path}`, {
+      ...init,
+      headers: { ...requestHeaders, ...(headers as Record<string, string> | undefined) },
+      signal: signal ?? (timeoutMs > 0 ? AbortSignal.timeout(timeoutMs) : undefined),
+      cache: 'no-store'
+    })
+  } catch (error) {
+    console.error(`Backend ${path.split('?')[0]} unavailable:`, error)
+    return null
+  }
+}
+
+/**
+ * The JSON body of a backend response, or null if it cannot be read (e.g. the timeout hit mid-body)
+ */
+export async function backendJSON<T = any>(response: Response): Promise<T | null> {
+  try {
+    return await response.json()
+  } catch (error) {
+    console.error('Backend response unreadable:', error)
+    return null
+  }
+}
@@ -3,6 +3,8 @@
  * Provides consistent logging format for audit trails and debugging
  */
 
+import { backendFetch } from '@/lib/backend'
+
 type LogLevel = 'info' | 'warn' | 'error' | 'debug'
 
 interface LogContext {
@@ -72,6 +74,11 @@ class Logger {
     prisma: any,
     context: LogContext & { requestId?: string }
   ): Promise<void> {
+    // Prefer the backend's batched writer (backend/audit.py); fall back to a direct insert
+    if (await this.sendToBackend(context)) {
+      return
+    }
+
     try {
       await prisma.auditLog.create({
         data: {
@@ -93,6 +100,15 @@ class Logger {
       })
     }
   }
+
+  private async sendToBackend(context: LogContext): Promise<boolean> {
+    const { error, ...event } = context
+    const response = await backendFetch('/api/audit', {
+      method: 'POST',
+      body: JSON.stringify(event)
+    })
+    return response?.ok ?? false
+  }
 }
 
 export const logger = new Logger()
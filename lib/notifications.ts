@@ -0,0 +1,191 @@
+/**
+ * Notification reads and writes for the /api/notifications routes
+ * Served by the backend's in-memory unread rings (backend/notifications.py),
+ * which also pushes updates over the stream route; without the backend
+ * (lib/backend.ts) queried from Prisma directly.
+ *
+ * Rows with user_id = null are broadcasts to everyone whose role matches
+ * their type ('staff' reaches staff and admins, 'admin' only admins). Their
+ * is_read stays false: each reader gets a NotificationRead receipt instead,
+ * so one staff member reading a broadcast does not hide it from the others.
+ */
+
+import { backendFetch, backendJSON } from '@/lib/backend'
+import { prisma } from '@/lib/prisma'
+
+export interface NotificationItem {
+  id: string
+  type: string
+  title: string
+  message: string
+  timestamp: string
+  read: boolean
+  priority: string
+  actionUrl?: string
+}
+
+export interface NotificationList {
+  unreadCount: number
+  notifications: NotificationItem[]
+}
+
+const LIST_LIMIT = 50
+
+const BROADCAST_AUDIENCES: Record<string, string[]> = {
+  staff: ['staff', 'admin'],
+  admin: ['admin']
+}
+
+function audienceFilter(userId: string, role?: string) {
+  const broadcasts = Object.keys(BROADCAST_AUDIENCES).filter(type =>
+    role ? BROADCAST_AUDIENCES[type].includes(role) : false
+  )
+  return {
+    OR: [
+      { user_id: userId },
+      ...(broadcasts.length > 0
+        ? [{ user_id: null, type: { in: broadcasts }, reads: { none: { user_id: userId } } }]
+        : [])
+    ]
+  }
+}
+
+function formatNotification(row: {
+  id: number
+  title: string
+  message: string
+  data: string | null
+  is_read: boolean
+  created_at: Date
+}): NotificationItem {
+  let extra: Record<string, any> = {}
+  try {
+    extra = row.data ? JSON.parse(row.data) : {}
+  } catch {
+    // Malformed data only loses the display hints
+  }
+
+  return {
+    id: String(row.id),
+    type: extra.kind || 'system',
+    title: row.title,
+    message: row.message,
+    timestamp: row.created_at.toISOString(),
+    read: row.is_read,
+    priority: extra.priority || 'medium',
+    ...(extra.actionUrl ? { actionUrl: extra.actionUrl } : {})
+  }
+}
+
+/**
+ * Unread notifications, newest first, with the exact unread count
+ */
+export async function listNotifications(userId: string, role?: string): Promise<NotificationList> {
+  const params = new URLSearchParams({ user_id: userId, role: role || '' })
+  const response = await backendFetch(`/api/notifications?${params}`)
+  const list = response?.ok ? await backendJSON<NotificationList>(response) : null
+  if (list) {
+    return list
+  }
+
+  const where = {
+    ...audienceFilter(userId, role),
+    is_read: false,
+    AND: [{ OR: [{ expires_at: null }, { expires_at: { gt: new Date() } }] }]
+  }
+  const [rows, unreadCount] = await Promise.all([
+    prisma.notification.findMany({ where, orderBy: { id: 'desc' }, take: LIST_LIMIT }),
+    prisma.notification.count({ where })
+  ])
+  return { unreadCount, notifications: rows.map(formatNotification) }
+}
+
+/**
+ * Mark one notification read; false if it is not visible to the user or already read
+ */
+export async function markNotificationRead(userId: string, role: string | undefined, id: number): Promise<boolean> {
+  const response = await backendFetch('/api/notifications/read', {
+    method: 'POST',
+    body: JSON.stringify({ user_id: userId, role, id })
+  })
+  if (response && response.status < 500) {
+    return response.ok
+  }
+
+  const row = await prisma.notification.findFirst({
+    where: { id, is_read: false, ...audienceFilter(userId, role) },
+    select: { user_id: true }
+  })
+  if (!row) {
+    return false
+  }
+  if (row.user_id === null) {
+    // Upsert: a concurrent read of the same broadcast may have written the receipt already
+    await prisma.notificationRead.upsert({
+      where: { notification_id_user_id: { notification_id: id, user_id: userId } },
+      create: { notification_id: id, user_id: userId },
+      update: {}
+    })
+    return true
+  }
+  const { count } = await prisma.notification.updateMany({
+    where: { id, is_read: false },
+    data: { is_read: true }
+  })
+  return count > 0
+}
+
+/**
+ * Mark everything the user sees as read; returns how many were unread
+ */
+export async function markAllNotificationsRead(userId: string, role?: string): Promise<number> {
+  const response = await backendFetch('/api/notifications/read-all', {
+    method: 'POST',
+    body: JSON.stringify({ user_id: userId, role })
+  })
+  const data = response?.ok ? await backendJSON<{ updated: number }>(response) : null
+  if (data) {
+    return data.updated
+  }
+
+  const [{ count }, broadcasts] = await Promise.all([
+    prisma.notification.updateMany({
+      where: { is_read: false, user_id: userId },
+      data: { is_read: true }
+    }),
+    prisma.notification.findMany({
+      where: {
+        user_id: null,
+        is_read: false,
+        AND: [
+          audienceFilter(userId, role),
+          { OR: [{ expires_at: null }, { expires_at: { gt: new Date() } }] }
+        ]
+      },
+      select: { id: true }
+    })
+  ])
+  if (broadcasts.length === 0) {
+    return count
+  }
+  // createMany has no skipDuplicates on SQLite, and a concurrent read may add a receipt meanwhile
+  await prisma.$transaction(broadcasts.map(({ id }) => prisma.notificationRead.upsert({
+    where: { notification_id_user_id: { notification_id: id, user_id: userId } },
+    create: { notification_id: id, user_id: userId },
+    update: {}
+  })))
+  return count + broadcasts.length
+}
+
+/**
+ * The backend's Server-Sent Events stream for a user, or null without a backend
+ */
+export async function openNotificationStream(
+  userId: string,
+  role: string | undefined,
+  signal: AbortSignal
+): Promise<Response | null> {
+  const params = new URLSearchParams({ user_id: userId, role: role || '' })
+  const response = await backendFetch(`/api/notifications/stream?${params}`, { signal })
+  return response?.ok && response.body ? response : null
+}
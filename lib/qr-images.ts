@@ -0,0 +1,73 @@
+/**
+ * QR code images for issued tokens
+ * Batches are rendered by the backend's process pool and served from its
+ * on-disk cache (backend/qr_render.py); without the backend (lib/backend.ts)
+ * they are rendered here one by one.
+ */
+
+import QRCode from 'qrcode'
+import { backendFetch, backendJSON } from '@/lib/backend'
+
+// The style of every issued QR image (backend/qr_render.py matches it)
+export const QR_IMAGE_OPTIONS = {
+  errorCorrectionLevel: 'H' as const,
+  type: 'image/png' as const,
+  width: 400,
+  margin: 2,
+  color: {
+    dark: '#10B981',  // PANDA green
+    light: '#1F2937'  // Dark background
+  }
+}
+
+// Tokens per backend request (QR_RENDER_MAX_TOKENS on the backend)
+const BACKEND_BATCH = 500
+// A full batch takes seconds to render, far longer than the default timeout
+const RENDER_TIMEOUT_MS = 30000
+
+interface RenderResult {
+  key?: string
+  error?: string
+  dataUrls?: Record<string, string>
+}
+
+async function renderOnBackend(tokens: string[]): Promise<(string | null)[] | null> {
+  const images: (string | null)[] = []
+  for (let i = 0; i < tokens.length; i += BACKEND_BATCH) {
+    const response = await backendFetch('/api/qr/render/batch', {
+      method: 'POST',
+      body: JSON.stringify({ tokens: tokens.slice(i, i + BACKEND_BATCH), formats: ['png'], inline: true }),
+      timeoutMs: RENDER_TIMEOUT_MS
+    })
+    // 404: the backend runs without segno
+    const data = response?.ok ? await backendJSON<{ results: RenderResult[] }>(response) : null
+    if (!data) {
+      return null
+    }
+    images.push(...data.results.map(result => result.dataUrls?.png ?? null))
+  }
+  return images
+}
+
+/**
+ * PNG data URL for one token
+ */
+export async function renderQRImage(token: string): Promise<string> {
+  return QRCode.toDataURL(token, QR_IMAGE_OPTIONS)
+}
+
+/**
+ * PNG data URLs for many tokens, in order; null where the token could not be rendered
+ */
+export async function renderQRImages(tokens: string[]): Promise<(string | null)[]> {
+  const rendered = await renderOnBackend(tokens)
+  if (rendered) {
+    return rendered
+  }
+
+  const images: (string | null)[] = []
+  for (const token of tokens) {
+    images.push(await renderQRImage(token).catch(() => null))
+  }
+  return images
+}
@@ -1,7 +1,13 @@
 // QR Code Security System for PANDA Lounge
 // Provides signed QR codes with TTL, nonce, and anti-replay protection
+//
+// Tokens are compact binary (layout in backend/qr_token.py): version/type
+// byte, 12-byte nonce, iat/exp as uint32, packed user id and a 10-byte
+// truncated HMAC, base32hex-encoded so QR codes use alphanumeric mode.
+// Legacy `base64url(JSON).signature` tokens (they contain a ".") are still
+// accepted, and issued when QR_TOKEN_FORMAT=legacy or a custom subject is set.
 
-import { createHmac, randomBytes } from 'crypto'
+import { createHmac, randomBytes, timingSafeEqual } from 'crypto'
 import { prisma } from './prisma'
 
 export type QRPayloadType = 'visit' | 'promo' | 'referral' | 'staff_check'
@@ -15,6 +21,11 @@ export interface QRPayload {
   iat: number              // Issued at timestamp (Unix)
 }
 
+export interface QRDecodeResult {
+  payload?: QRPayload
+  error?: 'INVALID_FORMAT' | 'INVALID_SIGNATURE'
+}
+
 export interface QRValidationResult {
   valid: boolean
   payload?: QRPayload
@@ -22,9 +33,101 @@ export interface QRValidationResult {
   event_id?: string
 }
 
+// Compact token format (must match backend/qr_token.py)
+const TOKEN_VERSION = 1
+const MAC_BYTES = 10
+const NONCE_BYTES = 12
+const HEADER_BYTES = 21 // version/type, nonce, iat, exp; the user reference follows
+const UINT32_MAX = 0xffffffff
+
+// Longest validity a caller may ask for (either way: a negative TTL issues an expired code)
+export const MAX_TTL_MINUTES = 30 * 24 * 60
+const QR_TYPES: QRPayloadType[] = ['visit', 'promo', 'referral', 'staff_check'] // wire order; append only
+const BASE32 = '0123456789ABCDEFGHIJKLMNOPQRSTUV' // RFC 4648 base32hex
+const CUID_PATTERN = /^c[0-9a-z]{24}$/
+
+function base32Encode(data: Buffer): string {
+  let out = ''
+  let value = 0
+  let bits = 0
+  for (const byte of data) {
+    value = (value << 8) | byte
+    bits += 8
+    while (bits >= 5) {
+      bits -= 5
+      out += BASE32[(value >>> bits) & 31]
+    }
+    value &= (1 << bits) - 1
+  }
+  return bits > 0 ? out + BASE32[(value << (5 - bits)) & 31] : out
+}
+
+function base32Decode(text: string): Buffer | null {
+  const out: number[] = []
+  let value = 0
+  let bits = 0
+  for (const char of text.toUpperCase()) {
+    const index = BASE32.indexOf(char)
+    if (index < 0) return null
+    value = (value << 5) | index
+    bits += 5
+    if (bits >= 8) {
+      bits -= 8
+      out.push((value >>> bits) & 0xff)
+      value &= (1 << bits) - 1
+    }
+  }
+  // Only the encoder's own output: under 5 leftover bits, all zero
+  return bits < 5 && value === 0 ? Buffer.from(out) : null
+}
+
+/**
+ * User reference: 0 + a cuid's 24 base36 digits as eight uint16 triples, or length + UTF-8
+ */
+function packUser(userId: string): Buffer {
+  if (CUID_PATTERN.test(userId)) {
+    const packed = Buffer.alloc(17)
+    for (let i = 0; i < 8; i++) {
+      packed.writeUInt16BE(parseInt(userId.slice(1 + 3 * i, 4 + 3 * i), 36), 1 + 2 * i)
+    }
+    return packed
+  }
+
+  const raw = Buffer.from(userId, 'utf8')
+  if (raw.length === 0 || raw.length > 255) {
+    throw new Error('userId must be 1-255 bytes')
+  }
+  return Buffer.concat([Buffer.from([raw.length]), raw])
+}
+
+function unpackUser(data: Buffer): string | null {
+  const ref = data[0]
+  if (ref === 0) {
+    if (data.length !== 17) return null
+    let userId = 'c'
+    for (let i = 0; i < 8; i++) {
+      const triple = data.readUInt16BE(1 + 2 * i)
+      if (triple >= 36 ** 3) return null
+      userId += triple.toString(36).padStart(3, '0')
+    }
+    return userId
+  }
+  return data.length === ref + 1 ? data.subarray(1).toString('utf8') : null
+}
+
 export class QRSystem {
   private static readonly SECRET = process.env.QR_SECRET || 'fallback-secret-key'
   private static readonly TTL_MINUTES = parseInt(process.env.QR_TTL_MINUTES || '60')
+  private static readonly TOKEN_FORMAT = process.env.QR_TOKEN_FORMAT === 'legacy' ? 'legacy' : 'compact'
+
+  /**
+   * Is this a usable ttlMinutes from a request body? (undefined means the default)
+   */
+  static isValidTTL(ttlMinutes: unknown): boolean {
+    return ttlMinutes === undefined || (
+      typeof ttlMinutes === 'number' && Number.isFinite(ttlMinutes) && Math.abs(ttlMinutes) <= MAX_TTL_MINUTES
+    )
+  }
   
   /**
    * Generate a signed QR code payload
@@ -36,16 +139,25 @@ export class QRSystem {
     ttlMinutes?: number
   }): Promise<string> {
     const { subject, type, userId, ttlMinutes = this.TTL_MINUTES } = data
+    const now = Math.floor(Date.now() / 1000)
+    const exp = now + Math.round(ttlMinutes * 60)
+    // Compact tokens carry no subject; keep a custom one in a legacy token.
+    // iat/exp are uint32 there, so an exp outside that range needs one too.
+    const compact = this.TOKEN_FORMAT === 'compact' && subject === `${type} QR code` &&
+      Number.isInteger(exp) && exp >= 0 && exp <= UINT32_MAX
     
     // Create payload
-    const now = Math.floor(Date.now() / 1000)
     const payload: QRPayload = {
       sub: subject,
       type,
       userId,
-      nonce: randomBytes(16).toString('hex'),
+      nonce: randomBytes(compact ? NONCE_BYTES : 16).toString('hex'),
       iat: now,
-      exp: now + (ttlMinutes * 60)
+      exp
+    }
+
+    if (compact) {
+      return this.encodeCompact(payload)
     }
     
     // Serialize payload
@@ -59,6 +171,71 @@ export class QRSystem {
     return `${payloadBase64}.${signature}`
   }
   
+  /**
+   * Compact binary token for a payload (see the layout at the top of this file)
+   */
+  private static encodeCompact(payload: QRPayload): string {
+    const header = Buffer.alloc(HEADER_BYTES)
+    header.writeUInt8((TOKEN_VERSION << 4) | QR_TYPES.indexOf(payload.type), 0)
+    Buffer.from(payload.nonce, 'hex').copy(header, 1)
+    header.writeUInt32BE(payload.iat, 13)
+    header.writeUInt32BE(payload.exp, 17)
+    const body = Buffer.concat([header, packUser(payload.userId)])
+    const mac = createHmac('sha256', this.SECRET).update(body).digest().subarray(0, MAC_BYTES)
+    return base32Encode(Buffer.concat([body, mac]))
+  }
+
+  /**
+   * Verify a token of either format and decode its payload
+   */
+  static decodeToken(token: string): QRDecodeResult {
+    if (token.includes('.')) {
+      const parts = token.split('.')
+      if (parts.length !== 2) {
+        return { error: 'INVALID_FORMAT' }
+      }
+
+      const [payloadBase64, signature] = parts
+      if (signature !== this.sign(payloadBase64)) {
+        return { error: 'INVALID_SIGNATURE' }
+      }
+      try {
+        return { payload: JSON.parse(Buffer.from(payloadBase64, 'base64url').toString()) }
+      } catch {
+        return { error: 'INVALID_FORMAT' }
+      }
+    }
+
+    const raw = base32Decode(token)
+    if (!raw || raw.length < HEADER_BYTES + 1 + MAC_BYTES) {
+      return { error: 'INVALID_FORMAT' }
+    }
+
+    const body = raw.subarray(0, raw.length - MAC_BYTES)
+    const expected = createHmac('sha256', this.SECRET).update(body).digest().subarray(0, MAC_BYTES)
+    if (!timingSafeEqual(raw.subarray(raw.length - MAC_BYTES), expected)) {
+      return { error: 'INVALID_SIGNATURE' }
+    }
+
+    const version = body[0] >> 4
+    const type = QR_TYPES[body[0] & 0x0f]
+    const userId = unpackUser(body.subarray(HEADER_BYTES))
+    if (version !== TOKEN_VERSION || !type || userId === null) {
+      return { error: 'INVALID_FORMAT' }
+    }
+
+    return {
+      payload: {
+        sub: `${type} QR code`,
+        type,
+        userId,
+        nonce: body.subarray(1, 13).toString('hex'),
+        iat: body.readUInt32BE(13),
+        exp: body.readUInt32BE(17)
+      }
+    }
+  }
+  
   /**
    * Validate and parse a QR code
    */
@@ -68,24 +245,12 @@ export class QRSystem {
     validatorRole: string
   ): Promise<QRValidationResult> {
     try {
-      // Parse token
-      const parts = token.split('.')
-      if (parts.length !== 2) {
-        return { valid: false, error: 'INVALID_FORMAT' }
-      }
-      
-      const [payloadBase64, signature] = parts
-      
-      // Verify signature
-      const expectedSignature = this.sign(payloadBase64)
-      if (signature !== expectedSignature) {
-        return { valid: false, error: 'INVALID_SIGNATURE' }
+      // Verify signature and decode payload
+      const { payload, error } = this.decodeToken(token)
+      if (!payload) {
+        return { valid: false, error }
       }
       
-      // Decode payload
-      const payloadString = Buffer.from(payloadBase64, 'base64url').toString()
-      const payload: QRPayload = JSON.parse(payloadString)
-      
       // Validate expiration
       const now = Math.floor(Date.now() / 1000)
       if (payload.exp < now) {
@@ -98,12 +263,14 @@ export class QRSystem {
       })
       
       if (existingEvent) {
-        // Log replay attempt
-        await this.logValidation({
-          payload,
-          validatorId,
-          success: false,
-          error: 'REPLAY_ATTACK'
+        // Log replay attempt (in AuditLog: qr_nonce is unique and already taken)
+        await prisma.auditLog.create({
+          data: {
+            user_id: validatorId,
+            action: 'qr_replay_attempt',
+            entity_type: 'QRValidationEvent',
+            details: JSON.stringify({ nonce: payload.nonce, type: payload.type, userId: payload.userId, exp: payload.exp })
+          }
         })
         
         return { valid: false, error: 'ALREADY_USED', payload }
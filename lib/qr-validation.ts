@@ -0,0 +1,31 @@
+/**
+ * QR validation for /api/qr/validate
+ * The backend keeps used nonces and validator roles in memory and writes
+ * QRValidationEvent rows in batches (backend/qr_validation.py), so a scan costs
+ * one indexed nonce lookup. Without the backend (lib/backend.ts) the route
+ * validates with QRSystem.validateQR.
+ */
+
+import { backendFetch, backendJSON } from '@/lib/backend'
+import type { QRValidationResult } from '@/lib/qr-system'
+
+/**
+ * Result from the backend validator, or null to fall back to QRSystem
+ */
+export async function backendValidateQR(token: string, validatorId: string): Promise<QRValidationResult | null> {
+  const response = await backendFetch('/api/qr/validate', {
+    method: 'POST',
+    body: JSON.stringify({ token, validator_id: validatorId })
+  })
+  // 400 is a rejected token (the body says why); anything else means the
+  // backend could not decide, so validate here instead
+  if (!response || (response.status !== 200 && response.status !== 400)) {
+    return null
+  }
+  const result = await backendJSON(response)
+  if (!result) {
+    return null
+  }
+  const { valid, payload, error, event_id } = result
+  return { valid, payload, error, event_id }
+}
@@ -0,0 +1,85 @@
+/**
+ * Rate limit checks for abuse-prone routes
+ * Asks the backend's in-memory limiter (backend/rate_limit.py), so a
+ * rejected request costs no database round-trip. Limits come from the
+ * 'limits' SystemSettings. Without the backend (lib/backend.ts) requests
+ * are allowed and the routes' own database checks still apply.
+ */
+
+import { NextRequest, NextResponse } from 'next/server'
+import { backendFetch, backendJSON } from '@/lib/backend'
+
+export type RateLimitPolicy = 'wheel_spin' | 'qr_generate' | 'music_order' | 'promo_create'
+
+export interface RateLimitSubject {
+  userId?: string
+  ip?: string
+}
+
+export interface RateLimitResult {
+  allowed: boolean
+  retryAfter: number | null // seconds; null when the request can never fit
+  remaining?: number | null
+  rule?: string | null
+}
+
+const ALLOWED: RateLimitResult = { allowed: true, retryAfter: 0 }
+
+// Reverse proxies in front of the app; each appends the address it got the request from
+const TRUSTED_PROXY_HOPS = Math.max(1, parseInt(process.env.TRUSTED_PROXY_HOPS || '1', 10) || 1)
+
+/**
+ * Client address as seen by the outermost trusted proxy, or X-Real-IP
+ * Read TRUSTED_PROXY_HOPS entries from the right of X-Forwarded-For:
+ * everything further left is whatever the client chose to send.
+ */
+export function requestIp(req: NextRequest): string | undefined {
+  const forwarded = (req.headers.get('x-forwarded-for') || '')
+    .split(',')
+    .map(address => address.trim())
+    .filter(Boolean)
+  return forwarded[Math.max(0, forwarded.length - TRUSTED_PROXY_HOPS)] || req.headers.get('x-real-ip') || undefined
+}
+
+function callLimiter(path: string, policy: RateLimitPolicy, subject: RateLimitSubject, cost: number) {
+  return backendFetch(path, {
+    method: 'POST',
+    body: JSON.stringify({ policy, user_id: subject.userId, ip: subject.ip, cost })
+  })
+}
+
+/**
+ * May the subject perform the action now? An allowed check uses up one attempt.
+ */
+export async function checkRateLimit(
+  policy: RateLimitPolicy,
+  subject: RateLimitSubject,
+  cost: number = 1
+): Promise<RateLimitResult> {
+  const response = await callLimiter('/api/ratelimit/check', policy, subject, cost)
+  return (response?.ok && (await backendJSON<RateLimitResult>(response))) || ALLOWED
+}
+
+/**
+ * Count a successful action (spins per day, promos per week, ...)
+ */
+export async function recordRateLimit(
+  policy: RateLimitPolicy,
+  subject: RateLimitSubject,
+  cost: number = 1
+): Promise<void> {
+  await callLimiter('/api/ratelimit/record', policy, subject, cost)
+}
+
+/**
+ * 429 body and Retry-After header for a rejected check
+ */
+export function rateLimitResponse(result: RateLimitResult, message: string, body: Record<string, unknown> = {}) {
+  return NextResponse.json(
+    { error: 'RATE_LIMITED', message, retryAfter: result.retryAfter, ...body },
+    {
+      status: 429,
+      headers: result.retryAfter ? { 'Retry-After': String(result.retryAfter) } : undefined
+    }
+  )
+}
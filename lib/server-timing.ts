@@ -0,0 +1,57 @@
+/**
+ * Server-Timing instrumentation for API routes
+ * Times the phases of a request and reports them to the caller in the
+ * Server-Timing header (plus the route's requestId in X-Request-Id), so the
+ * test harnesses can break a slow response down without server logs.
+ *
+ * Phase names may nest with dots ("tx.spin" inside "tx").
+ */
+
+import { NextResponse } from 'next/server'
+
+interface TimingEntry {
+  name: string
+  duration: number
+  description?: string
+}
+
+export class ServerTiming {
+  private entries: TimingEntry[] = []
+  private startedAt = performance.now()
+
+  constructor(public readonly requestId: string = Math.random().toString(36).substring(7)) {}
+
+  /**
+   * Time an async phase; the duration is recorded even if it throws
+   */
+  async time<T>(name: string, fn: () => Promise<T>, description?: string): Promise<T> {
+    const start = performance.now()
+    try {
+      return await fn()
+    } finally {
+      this.entries.push({ name, duration: performance.now() - start, description })
+    }
+  }
+
+  header(): string {
+    const total: TimingEntry = { name: 'total', duration: performance.now() - this.startedAt }
+    return [...this.entries, total]
+      .map(({ name, duration, description }) =>
+        `${name};dur=${duration.toFixed(1)}` + (description ? `;desc="${description.replace(/"/g, "'")}"` : '')
+      )
+      .join(', ')
+  }
+
+  /**
+   * Attach the Server-Timing and X-Request-Id headers to a response
+   */
+  apply<T extends NextResponse>(response: T): T {
+    response.headers.set('Server-Timing', this.header())
+    response.headers.set('X-Request-Id', this.requestId)
+    return response
+  }
+
+  json(body: unknown, init?: ResponseInit): NextResponse {
+    return this.apply(NextResponse.json(body, init))
+  }
+}
@@ -44,6 +44,10 @@ export class SettingsManager {
     { key: 'max_wheel_spins_per_day', value: '1', description: 'Максимум прокруток колеса в день', category: 'limits', is_public: false },
     { key: 'max_promos_per_staff_week', value: '2', description: 'Максимум промокодов на стафф в неделю', category: 'limits', is_public: false },
     { key: 'risk_score_threshold', value: '15', description: 'Порог риск-скора для блокировки', category: 'limits', is_public: false },
+    { key: 'wheel_spin_attempts_per_minute', value: '6', description: 'Максимум попыток прокрутки в минуту', category: 'limits', is_public: false },
+    { key: 'qr_generate_per_minute', value: '10', description: 'Максимум генераций QR в минуту', category: 'limits', is_public: false },
+    { key: 'music_order_interval_minutes', value: '10', description: 'Минимальный интервал между заказами музыки (мин)', category: 'limits', is_public: false },
+    { key: 'rate_limit_ip_per_minute', value: '120', description: 'Максимум запросов с одного IP в минуту', category: 'limits', is_public: false },
   ]
 
   static async initializeSettings() {
@@ -1,6 +1,11 @@
 // Spotify API integration for PANDA hookah bar jukebox
 // Using Client Credentials Flow for public track search (no user auth required)
 
+import { backendFetch } from '@/lib/backend'
+
+// Longer than the backend's own SPOTIFY_TIMEOUT (5 s) so its error reaches us first
+const BACKEND_SEARCH_TIMEOUT_MS = 8000
+
 export interface SpotifyTrack {
   id: string
   name: string
@@ -150,7 +155,29 @@ export class SpotifyAPI {
     }
   }
 
+  // Cached, coalesced search through the backend service (backend/music_search.py)
+  private static async searchViaBackend(query: string, limit: number) {
+    const params = new URLSearchParams({ q: query, limit: limit.toString() })
+    const response = await backendFetch(`/api/music/search?${params}`, { timeoutMs: BACKEND_SEARCH_TIMEOUT_MS })
+
+    if (!response?.ok) {
+      throw new Error(`Backend music search failed: ${response ? response.status : 'unavailable'}`)
+    }
+
+    const data = await response.json()
+    return data.tracks as ReturnType<typeof SpotifyAPI.formatTrackForJukebox>[]
+  }
+
   static async searchForJukebox(query: string, limit: number = 10) {
+    if (process.env.BACKEND_URL) {
+      try {
+        const tracks = await this.searchViaBackend(query, limit)
+        return tracks.length > 0 ? tracks : this.getMockSearchResults(query, limit)
+      } catch (error) {
+        console.error('Backend music search error, calling Spotify directly:', error)
+      }
+    }
+
     try {
       const result = await this.searchTracks(query, limit)
       const tracks = result.tracks.items
@@ -0,0 +1,53 @@
+/**
+ * Staff.average_service, average_personality and tips_total upkeep
+ * The backend keeps running aggregates over StaffRating and Tip
+ * (backend/staff_stats.py) and writes these columns back, so after a new
+ * rating or tip the routes only ask it to pick the row up. Without the
+ * backend (lib/backend.ts) they are updated here instead.
+ */
+
+import { backendFetch } from '@/lib/backend'
+import { prisma } from '@/lib/prisma'
+
+async function refreshOnBackend(staffId: number): Promise<boolean> {
+  const response = await backendFetch('/api/staff/stats/refresh', {
+    method: 'POST',
+    body: JSON.stringify({ staff_id: staffId })
+  })
+  return response?.ok ?? false
+}
+
+/**
+ * Call after creating a StaffRating row
+ */
+export async function staffRatingRecorded(staffId: number): Promise<void> {
+  if (await refreshOnBackend(staffId)) {
+    return
+  }
+
+  const { _avg } = await prisma.staffRating.aggregate({
+    where: { staff_id: staffId },
+    _avg: { service_rating: true, personality_rating: true }
+  })
+  await prisma.staff.update({
+    where: { id: staffId },
+    data: {
+      average_service: _avg.service_rating ?? 0,
+      average_personality: _avg.personality_rating ?? 0
+    }
+  })
+}
+
+/**
+ * Call after creating a Tip row
+ */
+export async function staffTipRecorded(staffId: number, amount: number): Promise<void> {
+  if (await refreshOnBackend(staffId)) {
+    return
+  }
+
+  await prisma.staff.update({
+    where: { id: staffId },
+    data: { tips_total: { increment: amount } }
+  })
+}
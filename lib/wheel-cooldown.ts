@@ -0,0 +1,46 @@
+/**
+ * Wheel cooldown lookups for /api/wheel/status
+ * The backend keeps every user's last spin in an LRU/TTL cache
+ * (backend/cooldown.py) and answers status checks from memory; the spin
+ * route tells it about each new spin so the cache never waits for its
+ * poll. Without the backend (lib/backend.ts) the routes query Prisma
+ * themselves.
+ */
+
+import { backendFetch, backendJSON } from '@/lib/backend'
+
+export interface WheelStatus {
+  canSpin: boolean
+  state: 'READY' | 'COOLDOWN'
+  message: string
+  nextSpinDate?: string
+  lastPrize?: string | null
+  timeLeft?: { days: number; hours: number; minutes: number }
+}
+
+/**
+ * Status body from the backend cache, or null to fall back to the database
+ */
+export async function cachedWheelStatus(userId: string): Promise<WheelStatus | null> {
+  const response = await backendFetch(`/api/wheel/status?${new URLSearchParams({ user_id: userId })}`)
+  return response?.ok ? backendJSON<WheelStatus>(response) : null
+}
+
+/**
+ * Call after writing a WheelSpin row (or with nextAllowedAt = null after
+ * deleting a user's spins, so the cache re-reads them)
+ */
+export async function wheelSpinRecorded(
+  userId: string,
+  nextAllowedAt: Date | null,
+  prizeName?: string | null
+): Promise<void> {
+  await backendFetch('/api/wheel/spins', {
+    method: 'POST',
+    body: JSON.stringify({
+      user_id: userId,
+      next_allowed_at: nextAllowedAt ? nextAllowedAt.getTime() : null,
+      prize_name: prizeName ?? null
+    })
+  })
+}
@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+"""
+Notification Fan-out Load Test
+Holds thousands of idle Server-Sent Events connections open against the
+backend's /api/notifications/stream and checks what replacing the 30s
+notification poll costs and delivers:
+- every stream gets a snapshot whose unreadCount matches the database
+- server RSS per connection and CPU while all connections sit idle
+  (heartbeats only)
+- Notification rows inserted behind the service's back (as the Next.js app
+  does) reach every subscriber of their audience exactly once; broadcasts
+  reach every connected staff member / admin; delivery latency p50/p99
+- mark-read and read-all push `read`/`read_all` with counts that match the
+  database, and the GET fallback agrees afterwards
+- a staff member reading broadcasts (one, then all) leaves them unread for
+  every other staff member / admin
+
+By default the backend is started on a temporary database built from
+prisma/schema.prisma; --url/--db test a running one instead (no server
+RSS/CPU figures then).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from async_client import AsyncHTTPClient
+from event_recorder import get_recorder
+from server_timing import percentile
+from synthetic_db import SCHEMA_PATH, prisma_ddl
+
+# Configuration
+BACKEND_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "server.py")
+CONNECT_CONCURRENCY = 200
+DELIVERY_TIMEOUT = 10
+STARTUP_TIMEOUT = 20
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+
+KINDS = [("visit", "medium"), ("promo", "high"), ("wheel", "low"), ("tips", "medium"), ("system", "low")]
+
+
+def raise_fd_limit(needed):
+    """Raise the soft open-files limit (inherited by the spawned backend); returns the new limit"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = hard if hard == resource.RLIM_INFINITY else min(hard, max(soft, needed))
+    if target > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def process_usage(pid):
+    """(RSS in KB, CPU seconds) of a process from /proc"""
+    with open(f"/proc/{pid}/statm") as f:
+        rss_pages = int(f.read().split()[1])
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu_ticks = int(fields[11]) + int(fields[12])  # utime + stime
+    return rss_pages * PAGE_KB, cpu_ticks / CLOCK_TICKS
+
+
+def create_database(path, users, backlog, rng):
+    """Schema from prisma/schema.prisma plus a per-user unread/read backlog"""
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        tables, indexes = prisma_ddl(f.read())
+    conn = sqlite3.connect(path)
+    conn.executescript("\n".join(tables + indexes))
+    now = int(time.time() * 1000)
+    rows = []
+    for user_id, _role in users:
+        for _ in range(rng.randint(0, backlog)):
+            rows.append(notification_row(user_id, "user", rng, now - rng.randint(0, 30 * 86_400_000), rng.random() < 0.4))
+    for audience in ("staff", "admin"):
+        for _ in range(backlog):
+            rows.append(notification_row(None, audience, rng, now - rng.randint(0, 7 * 86_400_000), rng.random() < 0.5))
+    # A few already expired ones must never be counted
+    rows += [notification_row(user_id, "user", rng, now - 86_400_000, False, now - 1000) for user_id, _ in users[:50]]
+    insert_notifications(conn, rows)
+    conn.close()
+
+
+def notification_row(user_id, audience, rng, created_at, is_read=False, expires_at=None):
+    kind, priority = rng.choice(KINDS)
+    data = json.dumps({"kind": kind, "priority": priority, "actionUrl": f"/{kind}"})
+    return (user_id, audience, f"{kind} notification", "Load test message", data, int(is_read), expires_at, created_at)
+
+
+def insert_notifications(conn, rows):
+    """Insert rows and return their ids (in order)"""
+    ids = []
+    with conn:
+        for row in rows:
+            cursor = conn.execute(
+                'INSERT INTO "Notification" (user_id, type, title, message, data, is_read, expires_at, created_at) '
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            ids.append(cursor.lastrowid)
+    return ids
+
+
+def unread_truth(conn, user_id, role):
+    """Unread count the service should report, straight from the table"""
+    audiences = [a for a, roles in (("staff", ("staff", "admin")), ("admin", ("admin",))) if role in roles]
+    placeholders = ", ".join("?" for _ in audiences) or "NULL"
+    return conn.execute(
+        f'SELECT COUNT(*) FROM "Notification" n WHERE is_read = 0 AND (expires_at IS NULL OR expires_at > ?) '
+        f"AND (user_id = ? OR (user_id IS NULL AND type IN ({placeholders}) AND NOT EXISTS ("
+        f'SELECT 1 FROM "NotificationRead" r WHERE r.notification_id = n.id AND r.user_id = ?)))',
+        (int(time.time() * 1000), user_id, *audiences, user_id),
+    ).fetchone()[0]
+
+
+class SSEConnection:
+    """One EventSource-like client; events are kept with their arrival time"""
+
+    def __init__(self, user_id, role):
+        self.user_id = user_id
+        self.role = role
+        self.events = []
+        self.heartbeats = 0
+        self.snapshot = asyncio.get_running_loop().create_future()
+        self.closed = False
+        self._writer = None
+        self._task = None
+
+    async def connect(self, base_url, headers):
+        parts = urlsplit(base_url)
+        reader, self._writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        query = urlencode({"user_id": self.user_id, "role": self.role})
+        head = f"GET /api/notifications/stream?{query} HTTP/1.1\r\nHost: {parts.netloc}\r\nAccept: text/event-stream\r\n"
+        head += "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+        self._writer.write((head + "\r\n").encode("latin-1"))
+        status = (await reader.readuntil(b"\r\n")).split(b" ", 2)[1]
+        await reader.readuntil(b"\r\n\r\n")
+        if status != b"200":
+            raise ConnectionError(f"stream refused with {status.decode()}")
+        self._task = asyncio.create_task(self._read(reader))
+        return await self.snapshot
+
+    async def _read(self, reader):
+        event, data = "message", []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.rstrip(b"\r\n").decode()
+                if not line:
+                    if data:
+                        self._dispatch(event, "\n".join(data))
+                    event, data = "message", []
+                elif line.startswith(":"):
+                    self.heartbeats += 1
+                elif line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].strip())
+        except ConnectionError:
+            pass
+        finally:
+            self.closed = True
+            if not self.snapshot.done():
+                self.snapshot.set_exception(ConnectionError("stream closed before the snapshot"))
+
+    def _dispatch(self, event, data):
+        payload = json.loads(data)
+        if event == "snapshot" and not self.snapshot.done():
+            self.snapshot.set_result(payload)
+        else:
+            self.events.append((event, payload, time.perf_counter()))
+
+    async def close(self):
+        if self._writer:
+            self._writer.close()
+        if self._task:
+            self._task.cancel()
+
+
+class NotificationLoadTest:
+    def __init__(self, base_url, db_path, users, backend_pid=None, idle_seconds=20, inserts=500,
+                 broadcasts=5, reads=200, max_p99_ms=1500, seed=None):
+        self.base_url = base_url
+        self.db_path = db_path
+        self.users = users
+        self.backend_pid = backend_pid
+        self.idle_seconds = idle_seconds
+        self.inserts = inserts
+        self.broadcasts = broadcasts
+        self.reads = reads
+        self.max_p99_ms = max_p99_ms
+        self.rng = random.Random(seed)
+        self.headers = {"X-Service-Key": os.environ["BACKEND_SERVICE_KEY"]} if os.environ.get("BACKEND_SERVICE_KEY") else {}
+        self.connections = []
+        self.results = {"connections": len(users)}
+        self.checks = {}
+
+    def log(self, message, level="INFO"):
+        """Record a test event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="notification_load")
+
+    def check(self, name, passed, detail):
+        self.checks[name] = {"passed": passed, "detail": detail}
+        self.log(f"{'✅' if passed else '❌'} {name}: {detail}", "INFO" if passed else "ERROR")
+
+    async def run(self):
+        # Inserts run on a worker thread so the SSE readers keep timestamping arrivals
+        self.conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        self.http = AsyncHTTPClient(self.headers)
+        try:
+            await self.connect_all()
+            await self.measure_idle()
+            await self.deliver()
+            await self.read_and_read_all()
+            await self.broadcast_reads()
+            await self.verify_fallback()
+        finally:
+            for connection in self.connections:
+                await connection.close()
+            await self.http.close()
+            self.conn.close()
+        return all(check["passed"] for check in self.checks.values())
+
+    async def connect_all(self):
+        self.log(f"Opening {len(self.users)} SSE connections...")
+        before = process_usage(self.backend_pid) if self.backend_pid else None
+        gate = asyncio.Semaphore(CONNECT_CONCURRENCY)
+        connect_ms = []
+        failures = Counter()
+
+        async def open_one(user_id, role):
+            connection = SSEConnection(user_id, role)
+            async with gate:
+                started = time.perf_counter()
+                try:
+                    snapshot = await asyncio.wait_for(connection.connect(self.base_url, self.headers), DELIVERY_TIMEOUT)
+                except (OSError, asyncio.TimeoutError) as e:
+                    failures[type(e).__name__] += 1
+                    await connection.close()
+                    return None
+                connect_ms.append((time.perf_counter() - started) * 1000)
+            return connection, snapshot
+
+        started = time.perf_counter()
+        opened = await asyncio.gather(*(open_one(user_id, role) for user_id, role in self.users))
+        elapsed = time.perf_counter() - started
+        mismatched = 0
+        for result in opened:
+            if result is None:
+                continue
+            connection, snapshot = result
+            self.connections.append(connection)
+            if snapshot["unreadCount"] != unread_truth(self.conn, connection.user_id, connection.role):
+                mismatched += 1
+
+        connect_ms.sort()
+        self.results["connect"] = {
+            "opened": len(self.connections),
+            "failed": dict(failures),
+            "seconds": round(elapsed, 2),
+            "p50_ms": round(percentile(connect_ms, 50), 1),
+            "p99_ms": round(percentile(connect_ms, 99), 1),
+            "snapshot_mismatches": mismatched,
+        }
+        self.check("connections", len(self.connections) == len(self.users),
+                   f"{len(self.connections)}/{len(self.users)} open in {elapsed:.1f}s "
+                   f"(p50 {percentile(connect_ms, 50):.0f}ms, p99 {percentile(connect_ms, 99):.0f}ms)")
+        self.check("snapshots", mismatched == 0, f"{mismatched} snapshot unread counts differ from the database")
+        if before:
+            rss_kb = process_usage(self.backend_pid)[0]
+            per_connection = (rss_kb - before[0]) / max(1, len(self.connections))
+            self.results["memory"] = {"rss_before_kb": before[0], "rss_after_kb": rss_kb,
+                                      "per_connection_kb": round(per_connection, 2)}
+            self.log(f"Backend RSS {before[0] / 1024:.1f} MB -> {rss_kb / 1024:.1f} MB "
+                     f"({per_connection:.1f} KB per connection, rings included)")
+
+    async def measure_idle(self):
+        self.log(f"Holding {len(self.connections)} idle connections for {self.idle_seconds}s...")
+        heartbeats = sum(c.heartbeats for c in self.connections)
+        before = process_usage(self.backend_pid) if self.backend_pid else None
+        await asyncio.sleep(self.idle_seconds)
+        beats = sum(c.heartbeats for c in self.connections) - heartbeats
+        dropped = sum(1 for c in self.connections if c.closed)
+        self.results["idle"] = {"seconds": self.idle_seconds, "heartbeats": beats, "dropped": dropped}
+        if before:
+            cpu = process_usage(self.backend_pid)[1] - before[1]
+            self.results["idle"]["cpu_percent"] = round(100 * cpu / self.idle_seconds, 2)
+            self.log(f"Backend CPU while idle: {100 * cpu / self.idle_seconds:.2f}% "
+                     f"({beats} heartbeats delivered)")
+        self.check("idle", dropped == 0, f"{dropped} connections dropped while idle")
+
+    def recipients(self, user_id, audience):
+        if user_id is not None:
+            return [c for c in self.connections if c.user_id == user_id]
+        roles = ("staff", "admin") if audience == "staff" else ("admin",)
+        return [c for c in self.connections if c.role in roles]
+
+    async def deliver(self):
+        self.log(f"Inserting {self.inserts} notifications and {self.broadcasts} broadcasts...")
+        start_index = {id(c): len(c.events) for c in self.connections}
+        expected = {}
+        commit_times = {}
+        now = int(time.time() * 1000)
+        batches = [self.inserts // 10 or 1] * 10
+        for batch in batches:
+            rows = [notification_row(self.rng.choice(self.connections).user_id, "user", self.rng, now)
+                    for _ in range(batch)]
+            ids = await asyncio.to_thread(insert_notifications, self.conn, rows)
+            committed = time.perf_counter()
+            for notification_id, row in zip(ids, rows):
+                expected[notification_id] = self.recipients(row[0], row[1])
+                commit_times[notification_id] = committed
+            await asyncio.sleep(0.1)
+        for i in range(self.broadcasts):
+            row = notification_row(None, "staff" if i % 2 == 0 else "admin", self.rng, now)
+            [notification_id] = await asyncio.to_thread(insert_notifications, self.conn, [row])
+            expected[notification_id] = self.recipients(None, row[1])
+            commit_times[notification_id] = time.perf_counter()
+
+        total = sum(len(recipients) for recipients in expected.values())
+        deadline = time.monotonic() + DELIVERY_TIMEOUT
+        while time.monotonic() < deadline:
+            received = sum(len(c.events) - start_index[id(c)] for c in self.connections)
+            if received >= total:
+                break
+            await asyncio.sleep(0.1)
+
+        latencies, missing, duplicates, unexpected = [], 0, 0, 0
+        by_connection = defaultdict(Counter)
+        for connection in self.connections:
+            for name, payload, arrived in connection.events[start_index[id(connection)]:]:
+                if name != "notification":
+                    continue
+                notification_id = int(payload["id"])
+                by_connection[id(connection)][notification_id] += 1
+                if notification_id in commit_times:
+                    latencies.append((arrived - commit_times[notification_id]) * 1000)
+        for notification_id, recipients in expected.items():
+            for connection in recipients:
+                seen = by_connection[id(connection)][notification_id]
+                missing += seen == 0
+                duplicates += max(0, seen - 1)
+        wanted = {(id(c), n) for n, recipients in expected.items() for c in recipients}
+        unexpected = sum(1 for cid, counts in by_connection.items() for n in counts if (cid, n) not in wanted)
+
+        latencies.sort()
+        p50, p99 = percentile(latencies, 50), percentile(latencies, 99)
+        self.results["delivery"] = {
+            "notifications": len(expected),
+            "deliveries": total,
+            "missing": missing,
+            "duplicates": duplicates,
+            "unexpected": unexpected,
+            "p50_ms": round(p50, 1),
+            "p99_ms": round(p99, 1),
+            "max_ms": round(latencies[-1], 1) if latencies else 0.0,
+        }
+        self.check("delivery", missing == duplicates == unexpected == 0,
+                   f"{total} deliveries of {len(expected)} notifications: {missing} missing, "
+                   f"{duplicates} duplicated, {unexpected} to the wrong audience")
+        self.check("latency", p99 <= self.max_p99_ms, f"p50 {p50:.0f}ms, p99 {p99:.0f}ms (limit {self.max_p99_ms}ms)")
+
+    async def read_and_read_all(self):
+        guests = [c for c in self.connections if c.role == "guest"]
+        sample = self.rng.sample(guests, min(self.reads, len(guests)))
+        self.log(f"Marking one notification read for {len(sample)} users, then read-all for half of them...")
+        marks = []
+        for connection in sample:
+            row = self.conn.execute(
+                'SELECT id FROM "Notification" WHERE user_id = ? AND is_read = 0 '
+                "AND (expires_at IS NULL OR expires_at > ?) ORDER BY RANDOM() LIMIT 1",
+                (connection.user_id, int(time.time() * 1000)),
+            ).fetchone()
+            if row:
+                marks.append((connection, row[0], len(connection.events)))
+
+        responses = await asyncio.gather(*(
+            self.http.post(f"{self.base_url}/api/notifications/read",
+                           json={"user_id": c.user_id, "role": c.role, "id": notification_id})
+            for c, notification_id, _ in marks
+        ))
+        # Marking again must be refused and must not push a second event
+        repeats = await asyncio.gather(*(
+            self.http.post(f"{self.base_url}/api/notifications/read",
+                           json={"user_id": c.user_id, "role": c.role, "id": notification_id})
+            for c, notification_id, _ in marks[:20]
+        ))
+        await asyncio.sleep(0.5)
+
+        bad_status = sum(1 for r in responses if r.status_code != 200) + sum(1 for r in repeats if r.status_code != 404)
+        wrong = 0
+        for connection, notification_id, start in marks:
+            events = [p for name, p, _ in connection.events[start:] if name == "read"]
+            truth = unread_truth(self.conn, connection.user_id, connection.role)
+            if len(events) != 1 or int(events[0]["id"]) != notification_id or events[0]["unreadCount"] != truth:
+                wrong += 1
+        self.check("mark_read", bad_status == 0 and wrong == 0,
+                   f"{len(marks)} marked: {bad_status} unexpected statuses, {wrong} missing/incorrect read events")
+
+        half = sample[:len(sample) // 2]
+        starts = [len(c.events) for c in half]
+        await asyncio.gather(*(
+            self.http.post(f"{self.base_url}/api/notifications/read-all", json={"user_id": c.user_id, "role": c.role})
+            for c in half
+        ))
+        await asyncio.sleep(0.5)
+        wrong = sum(
+            1 for c, start in zip(half, starts)
+            if [p["unreadCount"] for name, p, _ in c.events[start:] if name == "read_all"] != [0]
+            or unread_truth(self.conn, c.user_id, c.role) != 0
+        )
+        self.check("read_all", wrong == 0, f"{len(half)} users: {wrong} without exactly one read_all to zero")
+
+    async def broadcast_reads(self):
+        staff = [c for c in self.connections if c.role in ("staff", "admin")]
+        if len(staff) < 2:
+            self.log("Fewer than two staff connections: skipping the broadcast read check", "WARNING")
+            return
+        reader, others = staff[0], staff[1:]
+        row = self.conn.execute(
+            'SELECT id FROM "Notification" n WHERE user_id IS NULL AND type = \'staff\' AND is_read = 0 '
+            "AND (expires_at IS NULL OR expires_at > ?) AND NOT EXISTS ("
+            'SELECT 1 FROM "NotificationRead" r WHERE r.notification_id = n.id AND r.user_id = ?) LIMIT 1',
+            (int(time.time() * 1000), reader.user_id),
+        ).fetchone()
+        if row is None:
+            self.log("No unread staff broadcast: skipping the broadcast read check", "WARNING")
+            return
+        self.log(f"{reader.user_id} reads broadcast {row[0]}, then everything; {len(others)} other staff watch...")
+        truths = [unread_truth(self.conn, c.user_id, c.role) for c in others]
+        start = {id(c): len(c.events) for c in staff}
+
+        response = await self.http.post(f"{self.base_url}/api/notifications/read",
+                                        json={"user_id": reader.user_id, "role": reader.role, "id": row[0]})
+        await self.http.post(f"{self.base_url}/api/notifications/read-all",
+                             json={"user_id": reader.user_id, "role": reader.role})
+        await asyncio.sleep(0.5)
+
+        events = [(name, p) for name, p, _ in reader.events[start[id(reader)]:] if name in ("read", "read_all")]
+        reader_ok = (response.status_code == 200 and [name for name, _ in events] == ["read", "read_all"]
+                     and int(events[0][1]["id"]) == row[0] and events[1][1]["unreadCount"] == 0
+                     and unread_truth(self.conn, reader.user_id, reader.role) == 0)
+        affected = sum(
+            1 for c, truth in zip(others, truths)
+            if any(name in ("read", "read_all") for name, _, _ in c.events[start[id(c)]:])
+            or unread_truth(self.conn, c.user_id, c.role) != truth
+        )
+        self.check("broadcast_reads", reader_ok and affected == 0,
+                   f"reader {'ok' if reader_ok else 'wrong status/events'}, "
+                   f"{affected}/{len(others)} other staff affected")
+
+    async def verify_fallback(self):
+        sample = self.rng.sample(self.connections, min(200, len(self.connections)))
+        responses = await asyncio.gather(*(
+            self.http.get(f"{self.base_url}/api/notifications", params={"user_id": c.user_id, "role": c.role})
+            for c in sample
+        ))
+        wrong = sum(
+            1 for c, r in zip(sample, responses)
+            if r.status_code != 200 or r.json()["unreadCount"] != unread_truth(self.conn, c.user_id, c.role)
+        )
+        self.check("fallback", wrong == 0, f"{wrong}/{len(sample)} GET /api/notifications counts differ from the database")
+
+
+def start_backend(db_path, port, workdir):
+    env = {
+        **os.environ,
+        "DB_PATH": db_path,
+        "BACKEND_HOST": "127.0.0.1",
+        "BACKEND_PORT": str(port),
+        "ROLLUP_DB_PATH": os.path.join(workdir, "rollup.db"),
+        "AUDIT_ARCHIVE_DIR": os.path.join(workdir, "audit-archive"),
+    }
+    process = subprocess.Popen([sys.executable, BACKEND_SCRIPT], env=env,
+                               stdout=subprocess.DEVNULL, stderr=open(os.path.join(workdir, "backend.log"), "w"))
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"backend exited with {process.returncode}; see {workdir}/backend.log")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("backend did not start listening in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the backend's notification stream")
+    parser.add_argument("--connections", type=int, default=5000, help="Idle SSE connections to hold open")
+    parser.add_argument("--staff-share", type=float, default=0.02, help="Share of connections that are staff")
+    parser.add_argument("--backlog", type=int, default=20, help="Max existing notifications per user")
+    parser.add_argument("--idle", type=float, default=20, help="Seconds to hold the connections idle")
+    parser.add_argument("--inserts", type=int, default=500, help="Per-user notifications to insert")
+    parser.add_argument("--broadcasts", type=int, default=4, help="Staff/admin broadcasts to insert")
+    parser.add_argument("--reads", type=int, default=200, help="Users that mark a notification read")
+    parser.add_argument("--max-p99-ms", type=float, default=1500, help="Delivery latency limit")
+    parser.add_argument("--port", type=int, default=8091, help="Port for the spawned backend")
+    parser.add_argument("--url", help="Test a running backend instead (requires --db)")
+    parser.add_argument("--db", help="Database the running backend reads (rows are inserted into it)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+    parser.add_argument("--report", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+    if bool(args.url) != bool(args.db):
+        parser.error("--url and --db go together")
+
+    limit = raise_fd_limit(args.connections * 2 + 256)
+    if limit < args.connections * 2 + 256:
+        get_recorder().record("WARNING", f"Open-files limit is {limit}; lowering --connections to fit",
+                              source="notification_load")
+        args.connections = max(1, (limit - 256) // 2)
+
+    rng = random.Random(args.seed)
+    users = [(f"load-user-{i:05d}", "staff" if rng.random() < args.staff_share else "guest")
+             for i in range(args.connections)]
+    users[0] = (users[0][0], "admin")
+
+    print("=" * 60)
+    print("🔔 PANDA Lounge notification fan-out load test")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory(prefix="panda-notify-") as workdir:
+        backend = None
+        if args.url:
+            base_url, db_path = args.url.rstrip("/"), args.db
+        else:
+            db_path = os.path.join(workdir, "notify.db")
+            create_database(db_path, users, args.backlog, rng)
+            backend = start_backend(db_path, args.port, workdir)
+            base_url = f"http://127.0.0.1:{args.port}"
+
+        test = NotificationLoadTest(
+            base_url, db_path, users,
+            backend_pid=backend.pid if backend else None,
+            idle_seconds=args.idle,
+            inserts=args.inserts,
+            broadcasts=args.broadcasts,
+            reads=args.reads,
+            max_p99_ms=args.max_p99_ms,
+            seed=args.seed,
+        )
+        try:
+            passed = asyncio.run(test.run())
+        finally:
+            if backend:
+                backend.send_signal(signal.SIGTERM)
+                try:
+                    backend.wait(10)
+                except subprocess.TimeoutExpired:
+                    backend.kill()
+
+    print("=" * 60)
+    print(f"{'✅ PASSED' if passed else '❌ FAILED'}: "
+          f"{sum(c['passed'] for c in test.checks.values())}/{len(test.checks)} checks")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({**test.results, "checks": test.checks}, f, indent=2)
+        test.log(f"Report written to {args.report}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+QR Image Rendering Benchmark
+Measures the batch pipeline in backend/qr_render.py against rendering one
+image at a time, as /api/qr/generate does for every request:
+- images/sec serially, and per core and in total with 1..N worker processes
+- time to issue a guest list cold (empty cache) and again warm (all hits)
+- every image is a valid PNG/SVG stored under its token's key, with its
+  mtime at the token's `exp`, and a sweep past `exp` removes them all
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import qr_token
+from event_recorder import get_recorder
+from qr_render import QR_SECRET, QRRenderPipeline, image_path, render
+
+# Configuration
+GUEST_TTL_SECONDS = 6 * 60 * 60
+SIGNATURES = {"png": b"\x89PNG\r\n\x1a\n", "svg": b"<?xml"}
+
+
+class QRRenderBenchmark:
+    def __init__(self, images=500, formats=("png",), workers=(1,), seed=None):
+        self.images = images
+        self.formats = formats
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self.keyed = qr_token.keyed_mac(QR_SECRET)
+        self.results = {}
+
+    def log(self, message, level="INFO"):
+        """Record a benchmark event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="qr_render_benchmark")
+
+    def guest_list(self, count):
+        """Visit and referral tokens for a synthetic event guest list"""
+        tokens = []
+        for _ in range(count):
+            user_id = "c" + "".join(self.rng.choice(qr_token.BASE36_DIGITS) for _ in range(24))
+            qr_type = self.rng.choice(("visit", "referral"))
+            tokens.append(qr_token.encode_compact(qr_token.new_payload(qr_type, user_id, GUEST_TTL_SECONDS), self.keyed))
+        return tokens
+
+    def run_serial(self, tokens):
+        """One image at a time in this process, like the per-request path"""
+        sample = tokens[:min(len(tokens), 200)]
+        started = time.perf_counter()
+        for token in sample:
+            for fmt in self.formats:
+                render(token, fmt)
+        elapsed = time.perf_counter() - started
+        rate = len(sample) * len(self.formats) / elapsed
+        self.results["serial"] = {"images_per_second": round(rate, 1)}
+        self.log(f"serial: {rate:,.1f} images/s | a {len(tokens)}-guest list would take "
+                 f"{len(tokens) * len(self.formats) / rate:.1f}s")
+
+    def verify(self, cache_dir, tokens, results):
+        """Problems with the stored images (empty list when they are all good)"""
+        problems = []
+        for token, result in zip(tokens, results):
+            if "key" not in result:
+                problems.append(f"{token[:12]}…: {result.get('error')}")
+                continue
+            for fmt in self.formats:
+                path = image_path(cache_dir, result["key"], fmt)
+                try:
+                    with open(path, "rb") as f:
+                        head = f.read(len(SIGNATURES[fmt]))
+                    mtime = int(os.stat(path).st_mtime)
+                except FileNotFoundError:
+                    problems.append(f"{result['key'][:12]}.{fmt}: missing")
+                    continue
+                if head != SIGNATURES[fmt]:
+                    problems.append(f"{result['key'][:12]}.{fmt}: not a {fmt}")
+                if mtime != result["exp"]:
+                    problems.append(f"{result['key'][:12]}.{fmt}: mtime {mtime} != exp {result['exp']}")
+        return problems
+
+    async def run_pipeline(self, workers, tokens, cache_dir):
+        name = f"workers_{workers}"
+        pipeline = QRRenderPipeline(cache_dir=cache_dir, workers=workers)
+        await pipeline.start()
+        try:
+            # Spawn every worker before timing (the service does this once at startup)
+            warmup = self.guest_list(workers)
+            await pipeline.render_batch(warmup, self.formats)
+
+            started = time.perf_counter()
+            cold = await pipeline.render_batch(tokens, self.formats)
+            cold_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            warm = await pipeline.render_batch(tokens, self.formats)
+            warm_seconds = time.perf_counter() - started
+
+            problems = self.verify(cache_dir, tokens, cold)
+            misses = sum(1 for r in warm if not r.get("cached"))
+            expiry = int(time.time()) + GUEST_TTL_SECONDS + 1
+            stored = len(tokens) * len(self.formats) + len(warmup) * len(self.formats)
+            swept = await pipeline.sweep(now=expiry)
+        finally:
+            await pipeline.close()
+
+        images = len(tokens) * len(self.formats)
+        cores = min(workers, os.cpu_count() or 1)
+        self.results[name] = {
+            "workers": workers,
+            "cold_seconds": round(cold_seconds, 3),
+            "warm_seconds": round(warm_seconds, 3),
+            "images_per_second": round(images / cold_seconds, 1),
+            "images_per_second_per_core": round(images / cold_seconds / cores, 1),
+            "warm_misses": misses,
+            "stored": stored,
+            "swept": swept,
+            "problems": problems[:10],
+        }
+        r = self.results[name]
+        self.log(f"{name}: cold {cold_seconds:.2f}s ({r['images_per_second']:,} images/s, "
+                 f"{r['images_per_second_per_core']:,}/core) | warm {warm_seconds * 1000:.0f}ms")
+        for problem in problems[:10]:
+            self.log(problem, "ERROR")
+        return not problems and misses == 0 and swept == stored
+
+    def run(self):
+        self.log("🔳 Starting QR Image Rendering Benchmark")
+        self.log(f"Guests: {self.images:,} | Formats: {', '.join(self.formats)} | "
+                 f"Workers: {', '.join(map(str, self.workers))} | CPUs: {os.cpu_count()}")
+
+        tokens = self.guest_list(self.images)
+        self.log("\n" + "="*60)
+        self.run_serial(tokens)
+
+        passed = True
+        for workers in self.workers:
+            cache_dir = tempfile.mkdtemp(prefix="panda-qr-images-")
+            try:
+                ok = asyncio.run(self.run_pipeline(workers, tokens, cache_dir))
+            finally:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            passed = passed and ok
+
+        self.log("\n" + "="*60)
+        best = max((self.results[f"workers_{w}"] for w in self.workers), key=lambda r: r["images_per_second"])
+        self.results["best"] = best["workers"]
+        self.log(f"Best: {best['workers']} workers, {self.images:,} guests issued in {best['cold_seconds']:.2f}s "
+                 f"({best['images_per_second'] / self.results['serial']['images_per_second']:.1f}x serial)")
+        for workers in self.workers:
+            r = self.results[f"workers_{workers}"]
+            ok = not r["problems"] and r["warm_misses"] == 0 and r["swept"] == r["stored"]
+            self.log(
+                f"{'✅' if ok else '❌'} {workers} workers: {len(r['problems'])} bad images, "
+                f"{r['warm_misses']} warm misses, {r['swept']}/{r['stored']} swept after exp",
+                "INFO" if ok else "ERROR"
+            )
+        return passed
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Batch QR image rendering throughput benchmark")
+    parser.add_argument("--images", type=int, default=500, help="Guests (tokens) to issue")
+    parser.add_argument("--formats", default="png", help="Comma-separated formats to render (png, svg)")
+    parser.add_argument("--workers", default=",".join(map(str, sorted({1, cpus}))),
+                        help="Comma-separated worker process counts to measure")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+    parser.add_argument("--report", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    benchmark = QRRenderBenchmark(
+        args.images,
+        tuple(args.formats.split(",")),
+        tuple(int(w) for w in args.workers.split(",")),
+        args.seed,
+    )
+    passed = benchmark.run()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(benchmark.results, f, indent=2)
+        benchmark.log(f"Report written to {args.report}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
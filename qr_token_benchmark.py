@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+QR Token Format Benchmark
+Compares the compact binary QR tokens in backend/qr_token.py with the legacy
+`base64url(JSON).base64url(HMAC)` tokens backend_test.py gets from
+/api/qr/generate today:
+- both formats must decode back to the same payload, and a flipped
+  character in either must fail verification
+- encode and decode (verify + parse) throughput per format
+- token length and the QR symbol it needs at error-correction level H
+  (version and module count), since that decides how well phones scan it
+"""
+
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import qr_token
+from event_recorder import get_recorder
+
+# Configuration
+QR_SECRET = os.environ.get("QR_SECRET", "fallback-secret-key")
+TTL_SECONDS = {"visit": 15 * 60, "promo": 60 * 60, "referral": 24 * 60 * 60, "staff_check": 5 * 60}
+
+# QR data codewords at error-correction level H, versions 1-40 (ISO/IEC 18004 table 7)
+DATA_CODEWORDS_H = [
+    9, 16, 26, 36, 46, 60, 66, 86, 100, 122,
+    140, 158, 180, 197, 223, 253, 283, 313, 341, 385,
+    406, 442, 464, 514, 538, 596, 628, 661, 701, 745,
+    793, 845, 901, 961, 986, 1054, 1096, 1142, 1222, 1276,
+]
+ALPHANUMERIC = set(string.digits + string.ascii_uppercase + " $%*+-./:")
+
+
+def qr_symbol(data):
+    """(version, modules per side, mode) of the smallest level-H QR code for `data`"""
+    alphanumeric = set(data) <= ALPHANUMERIC
+    for version, codewords in enumerate(DATA_CODEWORDS_H, start=1):
+        band = 0 if version < 10 else 1 if version < 27 else 2
+        if alphanumeric:
+            count_bits = (9, 11, 13)[band]
+            data_bits = 11 * (len(data) // 2) + 6 * (len(data) % 2)
+        else:
+            count_bits = (8, 16, 16)[band]
+            data_bits = 8 * len(data.encode())
+        if 4 + count_bits + data_bits <= codewords * 8:
+            return version, 17 + 4 * version, "alphanumeric" if alphanumeric else "byte"
+    raise ValueError(f"{len(data)} characters do not fit a level-H QR code")
+
+
+def fake_cuid(rng):
+    """A user id shaped like Prisma's cuid() default"""
+    return "c" + "".join(rng.choice(qr_token.BASE36_DIGITS) for _ in range(24))
+
+
+def tamper(token):
+    """Change one MAC character (not the final base32 one, which carries padding bits)"""
+    i = len(token) - 2
+    return token[:i] + ("A" if token[i] != "A" else "B") + token[i + 1:]
+
+
+class QRTokenBenchmark:
+    def __init__(self, tokens=50_000, repeats=3, seed=None):
+        self.tokens = tokens
+        self.repeats = repeats
+        self.rng = random.Random(seed)
+        self.keyed = qr_token.keyed_mac(QR_SECRET)
+        self.results = {}
+
+    def log(self, message, level="INFO"):
+        """Record a benchmark event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="qr_token_benchmark")
+
+    def payloads(self):
+        """Payloads of every type for cuid users, as /api/qr/generate builds them"""
+        now = int(time.time())
+        users = [fake_cuid(self.rng) for _ in range(max(1, self.tokens // 10))]
+        payloads = []
+        for _ in range(self.tokens):
+            qr_type = self.rng.choice(qr_token.QR_TYPES)
+            payload = qr_token.new_payload(qr_type, self.rng.choice(users), TTL_SECONDS[qr_type], now=now)
+            payload["nonce"] = self.rng.getrandbits(8 * qr_token.NONCE_BYTES).to_bytes(qr_token.NONCE_BYTES, "big").hex()
+            payloads.append(payload)
+        return payloads
+
+    def best_rate(self, fn, items):
+        """Best items/s over the repeats"""
+        best = 0.0
+        for _ in range(self.repeats):
+            started = time.perf_counter()
+            for item in items:
+                fn(item, self.keyed)
+            best = max(best, len(items) / (time.perf_counter() - started))
+        return best
+
+    def run_format(self, name, encode, payloads):
+        tokens = [encode(payload, self.keyed) for payload in payloads]
+        mismatches = sum(1 for payload, token in zip(payloads, tokens)
+                         if qr_token.decode(token, self.keyed) != (payload, None))
+        tamper_passed = sum(1 for token in tokens[:1000]
+                            if qr_token.decode(tamper(token), self.keyed)[1] is None)
+
+        lengths = sorted(len(token) for token in tokens)
+        version, modules, mode = qr_symbol(max(tokens, key=len))
+        self.results[name] = {
+            "encode_per_second": round(self.best_rate(encode, payloads)),
+            "decode_per_second": round(self.best_rate(qr_token.decode, tokens)),
+            "min_length": lengths[0],
+            "max_length": lengths[-1],
+            "qr_mode": mode,
+            "qr_version": version,
+            "qr_modules": modules * modules,
+            "qr_side": modules,
+            "mismatches": mismatches,
+            "tampered_accepted": tamper_passed,
+            "example": tokens[0],
+        }
+        r = self.results[name]
+        self.log(f"{name}: encode {r['encode_per_second']:,}/s | decode {r['decode_per_second']:,}/s")
+        self.log(f"{name}: {r['min_length']}-{r['max_length']} chars | QR v{version} ({mode}) "
+                 f"{modules}x{modules} = {r['qr_modules']:,} modules")
+        return mismatches == 0 and tamper_passed == 0
+
+    def run_live(self):
+        """Measure the tokens the running Next.js app hands out (as backend_test.py does)"""
+        from backend_test import QRSystemTester
+
+        tester = QRSystemTester()
+        live = {}
+        for qr_type in ("visit", "promo"):
+            user_key = "demo" if qr_type == "visit" else "staff"
+            result = tester.test_qr_generation(user_key, qr_type)
+            if not result or "token" not in result:
+                self.log(f"Could not generate a live {qr_type} token", "ERROR")
+                return False
+            token = result["token"]
+            version, modules, mode = qr_symbol(token)
+            payload, error = qr_token.decode(token, self.keyed)
+            live[qr_type] = {
+                "format": "legacy" if "." in token else "compact",
+                "length": len(token),
+                "qr_version": version,
+                "qr_modules": modules * modules,
+                "decoded": error is None,
+            }
+            self.log(f"live {qr_type}: {live[qr_type]['format']} {len(token)} chars | QR v{version} ({mode}) "
+                     f"{modules}x{modules}" + ("" if error is None else f" | decode: {error} (QR_SECRET differs?)"))
+        self.results["live"] = live
+        return True
+
+    def run(self, live=False):
+        self.log("🔳 Starting QR Token Format Benchmark")
+        self.log(f"Tokens: {self.tokens:,} | Repeats: {self.repeats}")
+
+        payloads = self.payloads()
+        self.log("\n" + "="*60)
+        passed = self.run_format("legacy", qr_token.encode_legacy, payloads)
+        passed = self.run_format("compact", qr_token.encode_compact, payloads) and passed
+        if live:
+            self.log("\n" + "="*60)
+            passed = self.run_live() and passed
+
+        self.log("\n" + "="*60)
+        legacy, compact = self.results["legacy"], self.results["compact"]
+        self.results["encode_speedup"] = round(compact["encode_per_second"] / legacy["encode_per_second"], 2)
+        self.results["decode_speedup"] = round(compact["decode_per_second"] / legacy["decode_per_second"], 2)
+        self.results["module_ratio"] = round(compact["qr_modules"] / legacy["qr_modules"], 3)
+        self.log(f"Compact vs legacy: encode {self.results['encode_speedup']}x | decode {self.results['decode_speedup']}x | "
+                 f"{legacy['max_length'] - compact['max_length']} fewer chars | "
+                 f"{1 - self.results['module_ratio']:.0%} fewer QR modules")
+
+        for name in ("legacy", "compact"):
+            r = self.results[name]
+            ok = r["mismatches"] == 0 and r["tampered_accepted"] == 0
+            self.log(
+                f"{'✅' if ok else '❌'} {name}: {self.tokens - r['mismatches']}/{self.tokens} round-trips, "
+                f"{r['tampered_accepted']} tampered tokens accepted",
+                "INFO" if ok else "ERROR"
+            )
+        return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact vs legacy QR token format benchmark")
+    parser.add_argument("--tokens", type=int, default=50_000, help="Payloads to encode and decode per format")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes per measurement (best is reported)")
+    parser.add_argument("--live", action="store_true", help="Also measure tokens from the running app (see backend_test.py)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+    parser.add_argument("--report", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    benchmark = QRTokenBenchmark(args.tokens, args.repeats, args.seed)
+    passed = benchmark.run(live=args.live)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(benchmark.results, f, indent=2)
+        benchmark.log(f"Report written to {args.report}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Query Plan Regression Suite
+Runs the SQL Prisma issues for the hot routes (wheel spin/status, QR
+validate, admin stats, admin users) against a large database:
+- EXPLAIN QUERY PLAN for every query; a full table SCAN (no index) that the
+  baseline does not already accept fails the run
+- timed executions (median/p95 over --repeats); a query more than
+  --tolerance slower than its baseline fails the run
+- --update-baseline stores the current plans and timings as the new baseline
+
+Without --db the suite generates a synthetic database (synthetic_db.py) of
+the requested --preset in a temporary directory.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from event_recorder import get_recorder
+from rollup import local_midnight
+from synthetic_db import PRESETS, SyntheticDatabase
+
+# Configuration
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plan_baseline.json")
+BASELINE_SEED = 42
+BASELINE_NOW = 1_790_000_000_000  # fixed end of history so baseline databases are identical
+PAGE_SIZE = 20
+DAY_MS = 24 * 60 * 60 * 1000
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def in_list(count):
+    return ", ".join("?" * count)
+
+
+class HotQuery:
+    __slots__ = ("name", "route", "sql", "params")
+
+    def __init__(self, name, route, sql, params=lambda s: ()):
+        self.name = name
+        self.route = route
+        self.sql = sql
+        self.params = params
+
+
+class Samples:
+    """Realistic parameter values read from the database under test"""
+
+    def __init__(self, conn):
+        one = lambda sql: (conn.execute(sql).fetchone() or (None,))[0]
+        self.now = one('SELECT MAX(created_at) FROM "Visit"') or int(time.time() * 1000)
+        self.today_start = local_midnight(self.now)
+        self.week_start = self.today_start - 7 * DAY_MS
+        self.month_start = self.today_start - 30 * DAY_MS
+        self.user_id = one('SELECT user_id FROM "WheelSpin" ORDER BY id DESC LIMIT 1') or one('SELECT id FROM "User" LIMIT 1')
+        self.email = one("SELECT email FROM \"User\" WHERE role = 'admin' AND email IS NOT NULL LIMIT 1") or ""
+        self.nonce = one('SELECT qr_nonce FROM "QRValidationEvent" ORDER BY id LIMIT 1') or "missing"
+        page = [r[0] for r in conn.execute(f'SELECT id FROM "User" ORDER BY created_at DESC LIMIT {PAGE_SIZE}')]
+        self.page_user_ids = tuple(page + [""] * (PAGE_SIZE - len(page)))
+        self.search = "%4242%"
+
+
+USER_COLUMNS = '"id", "name", "email", "phone", "role", "created_at", "last_login", "is_blocked", "risk_score"'
+SEARCH_WHERE = '("name" LIKE ? OR "email" LIKE ? OR "phone" LIKE ?)'
+
+HOT_QUERIES = [
+    # /api/wheel/spin and /api/wheel/status
+    HotQuery(
+        "wheel.last_spin", "/api/wheel/spin, /api/wheel/status",
+        'SELECT * FROM "WheelSpin" WHERE "user_id" = ? ORDER BY "spun_at" DESC LIMIT 1 OFFSET 0',
+        lambda s: (s.user_id,),
+    ),
+    HotQuery("wheel.active_prizes", "/api/wheel/spin", 'SELECT * FROM "WheelPrize" WHERE "is_active" = 1'),
+    HotQuery(
+        "session.user_by_email", "/api/admin/*",
+        f'SELECT {USER_COLUMNS} FROM "User" WHERE "email" = ? LIMIT 1 OFFSET 0',
+        lambda s: (s.email,),
+    ),
+    # /api/qr/validate
+    HotQuery(
+        "qr.nonce_replay_check", "/api/qr/validate",
+        'SELECT * FROM "QRValidationEvent" WHERE "qr_nonce" = ? LIMIT 1 OFFSET 0',
+        lambda s: (s.nonce,),
+    ),
+    HotQuery(
+        "qr.user", "/api/qr/validate",
+        f'SELECT {USER_COLUMNS} FROM "User" WHERE "id" = ? LIMIT 1 OFFSET 0',
+        lambda s: (s.user_id,),
+    ),
+    HotQuery(
+        "qr.user_last_confirmed_visit", "/api/qr/validate",
+        'SELECT * FROM "Visit" WHERE "status" = \'confirmed\' AND "user_id" IN (?) '
+        'ORDER BY "confirmed_at" DESC LIMIT 1 OFFSET 0',
+        lambda s: (s.user_id,),
+    ),
+    HotQuery(
+        "qr.user_visit_count", "/api/qr/validate",
+        'SELECT "user_id", COUNT(*) FROM "Visit" WHERE "user_id" IN (?) GROUP BY "user_id"',
+        lambda s: (s.user_id,),
+    ),
+    HotQuery(
+        "qr.stats_by_type", "/api/qr/stats",
+        'SELECT "qr_type", COUNT(*) FROM "QRValidationEvent" WHERE "validated_at" >= ? GROUP BY "qr_type"',
+        lambda s: (s.week_start,),
+    ),
+    HotQuery(
+        "qr.recent_validations", "/api/qr/stats",
+        'SELECT * FROM "QRValidationEvent" ORDER BY "validated_at" DESC LIMIT 50 OFFSET 0',
+    ),
+    # /api/admin/stats
+    HotQuery(
+        "stats.visits_today", "/api/admin/stats",
+        'SELECT COUNT(*) FROM "Visit" WHERE "created_at" >= ? AND "status" = \'confirmed\'',
+        lambda s: (s.today_start,),
+    ),
+    HotQuery(
+        "stats.visits_week", "/api/admin/stats",
+        'SELECT COUNT(*) FROM "Visit" WHERE "created_at" >= ? AND "status" = \'confirmed\'',
+        lambda s: (s.week_start,),
+    ),
+    HotQuery(
+        "stats.revenue_month", "/api/admin/stats",
+        'SELECT SUM("bill_amount") FROM "Visit" '
+        'WHERE "created_at" >= ? AND "status" = \'confirmed\' AND "bill_amount" IS NOT NULL',
+        lambda s: (s.month_start,),
+    ),
+    HotQuery(
+        "stats.active_users", "/api/admin/stats",
+        'SELECT COUNT(*) FROM "User" WHERE "last_login" >= ?',
+        lambda s: (s.now - 30 * DAY_MS,),
+    ),
+    HotQuery(
+        "stats.pending_music_orders", "/api/admin/stats",
+        'SELECT COUNT(*) FROM "MusicOrder" WHERE "status" = \'pending\'',
+    ),
+    HotQuery(
+        "stats.spins_today", "/api/admin/stats",
+        'SELECT COUNT(*) FROM "WheelSpin" WHERE "spun_at" >= ?',
+        lambda s: (s.today_start,),
+    ),
+    HotQuery(
+        "stats.active_coupons", "/api/admin/stats",
+        'SELECT COUNT(*) FROM "Coupon" WHERE "expires_at" >= ? AND "redeemed_at" IS NULL',
+        lambda s: (s.now,),
+    ),
+    HotQuery("stats.total_users", "/api/admin/stats", 'SELECT COUNT(*) FROM "User"'),
+    HotQuery(
+        "stats.high_risk_users", "/api/admin/stats",
+        'SELECT COUNT(*) FROM "User" WHERE "risk_score" >= 10',
+    ),
+    HotQuery(
+        "stats.recent_visits", "/api/admin/stats",
+        'SELECT * FROM "Visit" ORDER BY "created_at" DESC LIMIT 5 OFFSET 0',
+    ),
+    HotQuery(
+        "stats.recent_spins", "/api/admin/stats",
+        'SELECT * FROM "WheelSpin" ORDER BY "spun_at" DESC LIMIT 5 OFFSET 0',
+    ),
+    HotQuery(
+        "stats.daily_visits", "/api/admin/stats",
+        'SELECT COUNT(*), SUM("bill_amount") FROM "Visit" '
+        'WHERE "created_at" >= ? AND "created_at" < ? AND "status" = \'confirmed\'',
+        lambda s: (s.today_start - DAY_MS, s.today_start),
+    ),
+    HotQuery(
+        "stats.daily_spins", "/api/admin/stats",
+        'SELECT COUNT(*) FROM "WheelSpin" WHERE "spun_at" >= ? AND "spun_at" < ?',
+        lambda s: (s.today_start - DAY_MS, s.today_start),
+    ),
+    # /api/admin/users
+    HotQuery(
+        "users.search_page", "/api/admin/users",
+        f'SELECT {USER_COLUMNS} FROM "User" WHERE {SEARCH_WHERE} '
+        f'ORDER BY "created_at" DESC LIMIT {PAGE_SIZE} OFFSET 0',
+        lambda s: (s.search,) * 3,
+    ),
+    HotQuery(
+        "users.search_count", "/api/admin/users",
+        f'SELECT COUNT(*) FROM "User" WHERE {SEARCH_WHERE}',
+        lambda s: (s.search,) * 3,
+    ),
+    HotQuery(
+        "users.page", "/api/admin/users",
+        f'SELECT {USER_COLUMNS} FROM "User" ORDER BY "created_at" DESC LIMIT {PAGE_SIZE} OFFSET 0',
+    ),
+    HotQuery(
+        "users.page_visits", "/api/admin/users",
+        f'SELECT "id", "status", "created_at", "bill_amount", "user_id" FROM "Visit" '
+        f'WHERE "user_id" IN ({in_list(PAGE_SIZE)}) ORDER BY "created_at" DESC',
+        lambda s: s.page_user_ids,
+    ),
+    HotQuery(
+        "users.page_spins", "/api/admin/users",
+        f'SELECT "spun_at", "prize_name", "user_id" FROM "WheelSpin" '
+        f'WHERE "user_id" IN ({in_list(PAGE_SIZE)}) ORDER BY "spun_at" DESC',
+        lambda s: s.page_user_ids,
+    ),
+    HotQuery(
+        "users.page_active_coupons", "/api/admin/users",
+        f'SELECT "type", "code", "expires_at", "user_id" FROM "Coupon" '
+        f'WHERE "expires_at" >= ? AND "redeemed_at" IS NULL AND "user_id" IN ({in_list(PAGE_SIZE)})',
+        lambda s: (s.now,) + s.page_user_ids,
+    ),
+    HotQuery(
+        "users.page_coupon_counts", "/api/admin/users",
+        f'SELECT "user_id", COUNT(*) FROM "Coupon" WHERE "user_id" IN ({in_list(PAGE_SIZE)}) GROUP BY "user_id"',
+        lambda s: s.page_user_ids,
+    ),
+]
+
+
+class QueryPlanSuite:
+    def __init__(self, db_path, baseline=None, repeats=20, tolerance=1.0, min_delta_ms=2.0, strict=False):
+        self.db_path = db_path
+        self.baseline = baseline or {}
+        self.repeats = repeats
+        self.tolerance = tolerance
+        self.min_delta_ms = min_delta_ms
+        self.strict = strict
+        self.results = {}
+        self.failures = []
+
+    def log(self, message, level="INFO"):
+        """Record a test event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="query_plans")
+
+    def table_rows(self, conn):
+        tables = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_%' ESCAPE '\\'"
+        )]
+        return {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in sorted(tables)}
+
+    def explain(self, conn, query, params):
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query.sql}", params)]
+        full_scans = sorted({m.group(1) for m in map(FULL_SCAN.match, plan) if m})
+        return plan, full_scans
+
+    def time_query(self, conn, query, params):
+        conn.execute(query.sql, params).fetchall()  # warm the page cache
+        samples = []
+        for _ in range(self.repeats):
+            started = time.perf_counter()
+            conn.execute(query.sql, params).fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        return round(percentile(samples, 50), 3), round(percentile(samples, 95), 3)
+
+    def check(self, query, result, comparable_timings):
+        """Failure messages for one query against its baseline entry"""
+        failures, notes = [], []
+        base = self.baseline.get("queries", {}).get(query.name)
+        accepted = set(base["full_scans"]) if base else set()
+        new_scans = [t for t in result["full_scans"] if t not in accepted]
+
+        if self.strict and result["full_scans"]:
+            failures.append(f"full scan of {', '.join(result['full_scans'])}")
+        elif new_scans and base is None:
+            failures.append(f"full scan of {', '.join(new_scans)} (not in baseline)")
+        elif new_scans:
+            failures.append(f"new full scan of {', '.join(new_scans)} (index regression)")
+        elif result["full_scans"]:
+            notes.append(f"accepted full scan of {', '.join(result['full_scans'])}")
+
+        if base is None:
+            notes.append("no baseline yet")
+            return failures, notes
+        if base["plan"] != result["plan"] and not new_scans:
+            notes.append("plan changed")
+        if comparable_timings:
+            limit = max(base["median_ms"] * (1 + self.tolerance), base["median_ms"] + self.min_delta_ms)
+            if result["median_ms"] > limit:
+                failures.append(f"median {result['median_ms']}ms vs baseline {base['median_ms']}ms")
+        return failures, notes
+
+    def run(self, queries=HOT_QUERIES):
+        self.log("🔎 Starting Query Plan Regression Suite")
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            rows = self.table_rows(conn)
+            samples = Samples(conn)
+            self.log(f"Database: {self.db_path} | {sum(rows.values()):,} rows | {len(queries)} queries")
+
+            # Timings only mean something against a database of the same size
+            base_rows = self.baseline.get("rows")
+            comparable_timings = base_rows == rows
+            if self.baseline and not comparable_timings:
+                self.log("Row counts differ from the baseline database: comparing plans only", "WARNING")
+
+            self.log("\n" + "="*60)
+            for query in queries:
+                params = query.params(samples)
+                plan, full_scans = self.explain(conn, query, params)
+                median_ms, p95_ms = self.time_query(conn, query, params)
+                result = {
+                    "route": query.route,
+                    "plan": plan,
+                    "full_scans": full_scans,
+                    "temp_btree": any("TEMP B-TREE" in line for line in plan),
+                    "median_ms": median_ms,
+                    "p95_ms": p95_ms,
+                }
+                failures, notes = self.check(query, result, comparable_timings)
+                result["failures"] = failures
+                self.results[query.name] = result
+
+                marker = "❌" if failures else ("⚠️" if result["full_scans"] else "✅")
+                detail = "; ".join(failures + notes)
+                self.log(
+                    f"{marker} {query.name}: {median_ms}ms (p95 {p95_ms}ms){' | ' + detail if detail else ''}",
+                    "ERROR" if failures else "INFO"
+                )
+                self.failures += [f"{query.name}: {f}" for f in failures]
+            self.rows = rows
+        finally:
+            conn.close()
+
+        self.log("\n" + "="*60)
+        scans = [name for name, r in self.results.items() if r["full_scans"]]
+        self.log(f"Full table scans: {len(scans)}/{len(self.results)} queries ({', '.join(scans) or 'none'})")
+        passed = not self.failures
+        self.log(
+            f"{'✅' if passed else '❌'} {len(self.results) - len({f.split(':')[0] for f in self.failures})}"
+            f"/{len(self.results)} queries within baseline",
+            "INFO" if passed else "ERROR"
+        )
+        return passed
+
+    def baseline_snapshot(self):
+        return {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "rows": self.rows,
+            "queries": {
+                name: {k: r[k] for k in ("route", "plan", "full_scans", "median_ms", "p95_ms")}
+                for name, r in self.results.items()
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN and timing regression suite for the hot queries")
+    parser.add_argument("--db", help="Database to check; defaults to a generated synthetic one")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="medium", help="Synthetic database size without --db")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline plans and timings (JSON)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the current results as the new baseline")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed executions per query")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="Allowed slowdown over baseline (1.0 = 2x)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--strict", action="store_true", help="Fail on every full table scan, even accepted ones")
+    parser.add_argument("-k", dest="pattern", help="Only run queries whose name contains this")
+    parser.add_argument("--report", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    queries = [q for q in HOT_QUERIES if not args.pattern or args.pattern in q.name]
+    with tempfile.TemporaryDirectory(prefix="panda-plans-") as workdir:
+        db_path = args.db
+        if not db_path:
+            db_path = os.path.join(workdir, "synthetic.db")
+            SyntheticDatabase(db_path, PRESETS[args.preset], seed=BASELINE_SEED, now_ms=BASELINE_NOW).create()
+
+        suite = QueryPlanSuite(db_path, baseline, args.repeats, args.tolerance, args.min_delta_ms, args.strict)
+        passed = suite.run(queries)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(suite.baseline_snapshot(), f, indent=2, ensure_ascii=False)
+        suite.log(f"Baseline written to {args.baseline}")
+        passed = True
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"failures": suite.failures, "queries": suite.results}, f, indent=2, ensure_ascii=False)
+        suite.log(f"Report written to {args.report}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
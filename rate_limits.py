@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Rate limiter control for the PANDA Lounge test harnesses
+With BACKEND_URL set, the Next.js app asks the backend's in-memory limiter
+(backend/rate_limit.py) before generating QR codes or spinning the wheel,
+so a harness that does either faster than a real guest gets 429s after a
+handful of requests. bypassed() resets the limiter for the harness's own
+users and suspends it for them for the duration of a run, then lifts the
+bypass again; real users keep their limits.
+
+The harness environment needs the same BACKEND_URL (and BACKEND_SERVICE_KEY)
+as the app; without BACKEND_URL the app does not rate-limit and this is a
+no-op.
+"""
+
+import os
+from contextlib import contextmanager
+
+import requests
+
+from event_recorder import get_recorder
+
+# Configuration
+BACKEND_URL = os.environ.get("BACKEND_URL", "")
+BACKEND_SERVICE_KEY = os.environ.get("BACKEND_SERVICE_KEY", "")
+BYPASS_SECONDS = 60 * 60  # safety net if a run dies without lifting it
+
+
+def reset(user_ids=None, bypass_seconds=0, backend_url=None, source="rate_limits"):
+    """Clear the limiter state (of these users, or everyone) and bypass it for bypass_seconds.
+
+    Resetting everyone needs BACKEND_SERVICE_KEY. Returns False when there is
+    no backend or it could not be reached.
+    """
+    backend_url = (backend_url or BACKEND_URL).rstrip("/")
+    if not backend_url:
+        return False
+    body = {"bypass_seconds": bypass_seconds}
+    if user_ids:
+        body["user_ids"] = list(user_ids)
+    try:
+        response = requests.post(
+            f"{backend_url}/api/ratelimit/reset",
+            json=body,
+            headers={"X-Service-Key": BACKEND_SERVICE_KEY} if BACKEND_SERVICE_KEY else {},
+            timeout=10,
+        )
+        response.raise_for_status()
+    except requests.RequestException as e:
+        get_recorder().record("WARNING", f"Could not reset the rate limiter at {backend_url}: {e}", source=source)
+        return False
+    return True
+
+
+@contextmanager
+def bypassed(user_ids, backend_url=None, source="rate_limits"):
+    """Run the block with the limiter reset and bypassed for these users"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        # Never fall back to resetting everyone
+        get_recorder().record("WARNING", "No user ids, rate limits stay in place", source=source)
+        yield
+        return
+    if reset(user_ids, BYPASS_SECONDS, backend_url, source):
+        get_recorder().record("INFO", f"Rate limits bypassed for {len(user_ids)} users", source=source)
+    try:
+        yield
+    finally:
+        reset(user_ids, 0, backend_url, source)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Admin Dashboard Rollup Benchmark
+Compares the rollup engine in backend/rollup.py with the live queries
+/api/admin/stats runs on every dashboard load, on a synthetic database with
+millions of rows:
+- live dashboard latency (9 stats + 7 days x 3 chart queries)
+- initial rollup build, incremental catch-up and in-memory dashboard latency
+- rollup numbers must equal the live queries (week window hour-aligned)
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import db
+from event_recorder import get_recorder
+from rollup import DAY_MS, HOUR_MS, RollupEngine, local_day, local_midnight
+
+# Configuration
+DASHBOARD_SCHEMA = """
+CREATE TABLE "User" (
+    "id" TEXT NOT NULL PRIMARY KEY,
+    "role" TEXT NOT NULL DEFAULT 'guest',
+    "created_at" DATETIME NOT NULL,
+    "last_login" DATETIME,
+    "risk_score" INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE "Visit" (
+    "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "user_id" TEXT NOT NULL,
+    "visit_code" TEXT NOT NULL,
+    "status" TEXT NOT NULL DEFAULT 'pending',
+    "bill_amount" INTEGER,
+    "expires_at" DATETIME NOT NULL,
+    "created_at" DATETIME NOT NULL
+);
+CREATE TABLE "WheelSpin" (
+    "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "user_id" TEXT NOT NULL,
+    "prize_name" TEXT NOT NULL,
+    "spun_at" DATETIME NOT NULL,
+    "next_allowed_at" DATETIME NOT NULL
+);
+CREATE INDEX "WheelSpin_user_id_spun_at_idx" ON "WheelSpin"("user_id", "spun_at");
+CREATE INDEX "WheelSpin_next_allowed_at_idx" ON "WheelSpin"("next_allowed_at");
+CREATE TABLE "MusicOrder" (
+    "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "user_id" TEXT NOT NULL,
+    "title" TEXT NOT NULL,
+    "paid_amount" INTEGER NOT NULL,
+    "status" TEXT NOT NULL DEFAULT 'pending',
+    "created_at" DATETIME NOT NULL
+);
+CREATE TABLE "Coupon" (
+    "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "user_id" TEXT NOT NULL,
+    "type" TEXT NOT NULL,
+    "code" TEXT NOT NULL,
+    "expires_at" DATETIME NOT NULL,
+    "redeemed_at" DATETIME,
+    "created_at" DATETIME NOT NULL
+);
+"""
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class SyntheticDashboardDB:
+    """Seeds the tables the dashboard reads with `days` of history"""
+
+    def __init__(self, path, days, rng):
+        self.path = path
+        self.days = days
+        self.rng = rng
+        self.user_count = 0
+
+    def timestamp(self, now):
+        return now - self.rng.randrange(0, self.days * DAY_MS)
+
+    def create(self, users, visits, spins, orders, coupons):
+        conn = sqlite3.connect(self.path)
+        conn.executescript(DASHBOARD_SCHEMA)
+        conn.close()
+        self.add_users(users)
+        self.add_rows(visits, spins, orders, coupons)
+
+    def add_users(self, count, now=None):
+        now = db.now_ms() if now is None else now
+        rng = self.rng
+        start = self.user_count
+        rows = (
+            (f"u{i:08d}", self.timestamp(now),
+             self.timestamp(now) if rng.random() < 0.6 else None,
+             rng.choice((0, 0, 0, 5, 12)))
+            for i in range(start, start + count)
+        )
+        self.user_count += count
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany('INSERT INTO "User" (id, created_at, last_login, risk_score) VALUES (?, ?, ?, ?)', rows)
+
+    def add_rows(self, visits, spins, orders, coupons, now=None, recent=False):
+        """Insert rows spread over the history (or over the last hour if `recent`)"""
+        now = db.now_ms() if now is None else now
+        rng = self.rng
+        when = (lambda: now - rng.randrange(0, HOUR_MS)) if recent else (lambda: self.timestamp(now))
+        user = lambda: f"u{rng.randrange(self.user_count):08d}"
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                'INSERT INTO "Visit" (user_id, visit_code, status, bill_amount, expires_at, created_at) '
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (user(), f"V{now:x}{i}", "confirmed" if rng.random() < 0.9 else "expired",
+                     rng.randrange(200, 3000) if rng.random() < 0.7 else None, ts + DAY_MS, ts)
+                    for i, ts in ((i, when()) for i in range(visits))
+                ),
+            )
+            conn.executemany(
+                'INSERT INTO "WheelSpin" (user_id, prize_name, spun_at, next_allowed_at) VALUES (?, ?, ?, ?)',
+                ((user(), "💰 Знижка 10%", ts, ts + 7 * DAY_MS) for ts in (when() for _ in range(spins))),
+            )
+            conn.executemany(
+                'INSERT INTO "MusicOrder" (user_id, title, paid_amount, status, created_at) VALUES (?, ?, ?, ?, ?)',
+                (
+                    (user(), "Track", 50, rng.choice(("pending", "played", "rejected")), when())
+                    for _ in range(orders)
+                ),
+            )
+            conn.executemany(
+                'INSERT INTO "Coupon" (user_id, type, code, expires_at, redeemed_at, created_at) '
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (user(), "discount", f"C{now:x}{i}", ts + 30 * DAY_MS,
+                     ts + HOUR_MS if rng.random() < 0.5 else None, ts)
+                    for i, ts in ((i, when()) for i in range(coupons))
+                ),
+            )
+
+
+def live_dashboard(conn, now, week_start=None):
+    """The queries GET /api/admin/stats runs, against SQLite directly"""
+    today_start = local_midnight(now)
+    week_start = now - 7 * DAY_MS if week_start is None else week_start
+    month = datetime.fromtimestamp(now / 1000)
+    month_start = int(month.replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000)
+    one = lambda sql, *params: conn.execute(sql, params).fetchone()[0]
+
+    stats = {
+        "todayVisits": one('SELECT COUNT(*) FROM "Visit" WHERE created_at >= ? AND status = \'confirmed\'', today_start),
+        "weekVisits": one('SELECT COUNT(*) FROM "Visit" WHERE created_at >= ? AND status = \'confirmed\'', week_start),
+        "monthRevenue": one(
+            'SELECT COALESCE(SUM(bill_amount), 0) FROM "Visit" '
+            "WHERE created_at >= ? AND status = 'confirmed' AND bill_amount IS NOT NULL", month_start),
+        "activeUsers": one('SELECT COUNT(*) FROM "User" WHERE last_login >= ?', now - 30 * DAY_MS),
+        "pendingMusicOrders": one('SELECT COUNT(*) FROM "MusicOrder" WHERE status = \'pending\''),
+        "todayWheelSpins": one('SELECT COUNT(*) FROM "WheelSpin" WHERE spun_at >= ?', today_start),
+        "activeCoupons": one('SELECT COUNT(*) FROM "Coupon" WHERE expires_at >= ? AND redeemed_at IS NULL', now),
+        "totalUsers": one('SELECT COUNT(*) FROM "User"'),
+        "highRiskUsers": one('SELECT COUNT(*) FROM "User" WHERE risk_score >= 10'),
+    }
+
+    chart = []
+    noon = today_start + DAY_MS // 2
+    for i in range(6, -1, -1):
+        moment = noon - i * DAY_MS
+        day_start = local_midnight(moment)
+        day_end = day_start + DAY_MS
+        chart.append({
+            "date": local_day(moment),
+            "visits": one(
+                'SELECT COUNT(*) FROM "Visit" WHERE created_at >= ? AND created_at < ? AND status = \'confirmed\'',
+                day_start, day_end),
+            "spins": one('SELECT COUNT(*) FROM "WheelSpin" WHERE spun_at >= ? AND spun_at < ?', day_start, day_end),
+            "revenue": one(
+                'SELECT COALESCE(SUM(bill_amount), 0) FROM "Visit" WHERE created_at >= ? AND created_at < ? '
+                "AND status = 'confirmed' AND bill_amount IS NOT NULL", day_start, day_end),
+        })
+    return {"stats": stats, "chartData": chart}
+
+
+class RollupBenchmark:
+    def __init__(self, seed_db, workdir, repeats=5, dashboard_calls=10_000, increment=10_000):
+        self.seed_db = seed_db
+        self.rollup_path = os.path.join(workdir, "rollup.db")
+        self.repeats = repeats
+        self.dashboard_calls = dashboard_calls
+        self.increment = increment
+        self.results = {}
+
+    def log(self, message, level="INFO"):
+        """Record a benchmark event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="rollup_benchmark")
+
+    def run_live(self):
+        conn = db.connect(self.seed_db.path, readonly=True)
+        try:
+            samples = []
+            for _ in range(self.repeats):
+                started = time.perf_counter()
+                live_dashboard(conn, db.now_ms())
+                samples.append((time.perf_counter() - started) * 1000)
+        finally:
+            conn.close()
+        samples.sort()
+        self.results["live"] = {
+            "loads": len(samples),
+            "p50_ms": round(percentile(samples, 50), 2),
+            "max_ms": round(samples[-1], 2),
+        }
+        self.log(f"live queries: p50 {self.results['live']['p50_ms']}ms per dashboard load "
+                 f"(max {self.results['live']['max_ms']}ms, {len(samples)} loads)")
+
+    async def run_rollup(self):
+        engine = RollupEngine(self.seed_db.path, self.rollup_path)
+        try:
+            started = time.perf_counter()
+            await engine.start()
+            build = time.perf_counter() - started
+            rows = engine.stats["rows_rolled_up"]
+            self.log(f"initial build: {rows:,} rows in {build:.2f}s ({rows / build:,.0f} rows/s)")
+
+            samples = []
+            for _ in range(self.dashboard_calls):
+                t0 = time.perf_counter_ns()
+                engine.dashboard()
+                samples.append(time.perf_counter_ns() - t0)
+            samples.sort()
+            self.log(f"rollup dashboard: p50 {percentile(samples, 50) / 1000:.1f}µs "
+                     f"p99 {percentile(samples, 99) / 1000:.1f}µs ({len(samples):,} calls)")
+
+            # Recent activity arrives; only the new rows are read
+            self.seed_db.add_rows(self.increment, self.increment, 0, 0, recent=True)
+            self.seed_db.add_users(self.increment // 10)
+            started = time.perf_counter()
+            new_rows = await engine.catch_up()
+            catch_up = time.perf_counter() - started
+            self.log(f"incremental catch-up: {new_rows:,} new rows in {catch_up * 1000:.1f}ms")
+            await engine.refresh_gauges()
+
+            self.results["rollup"] = {
+                "initial_rows": rows,
+                "initial_build_seconds": round(build, 3),
+                "dashboard_p50_us": round(percentile(samples, 50) / 1000, 2),
+                "dashboard_p99_us": round(percentile(samples, 99) / 1000, 2),
+                "incremental_rows": new_rows,
+                "incremental_ms": round(catch_up * 1000, 2),
+            }
+
+            # Correctness against the live queries, same instant and hour-aligned week
+            now = db.now_ms()
+            rolled = engine.dashboard(now)
+            conn = db.connect(self.seed_db.path, readonly=True)
+            try:
+                live = live_dashboard(conn, now, week_start=(now - 7 * DAY_MS) // HOUR_MS * HOUR_MS)
+            finally:
+                conn.close()
+            return self.compare(live, rolled)
+        finally:
+            await engine.close()
+
+    def compare(self, live, rolled):
+        mismatches = [
+            f"{key}: live {value} vs rollup {rolled['stats'][key]}"
+            for key, value in live["stats"].items() if rolled["stats"][key] != value
+        ]
+        mismatches += [
+            f"chart {l['date']}: live {l} vs rollup {r}"
+            for l, r in zip(live["chartData"], rolled["chartData"]) if l != r
+        ]
+        for mismatch in mismatches:
+            self.log(f"❌ {mismatch}", "ERROR")
+        self.results["mismatches"] = mismatches
+        return not mismatches
+
+    def run(self):
+        self.log("📊 Starting Admin Dashboard Rollup Benchmark")
+        self.log("\n" + "="*60)
+        self.run_live()
+        self.log("\n" + "="*60)
+        passed = asyncio.run(self.run_rollup())
+
+        self.log("\n" + "="*60)
+        speedup = self.results["live"]["p50_ms"] * 1000 / max(self.results["rollup"]["dashboard_p50_us"], 0.01)
+        self.results["speedup"] = round(speedup)
+        self.log(f"Speedup per dashboard load: {speedup:,.0f}x")
+        self.log(
+            f"{'✅' if passed else '❌'} Rollup numbers {'match' if passed else 'differ from'} the live queries",
+            "INFO" if passed else "ERROR"
+        )
+        return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Admin dashboard rollups vs live queries benchmark")
+    parser.add_argument("--users", type=int, default=200_000, help="Synthetic users")
+    parser.add_argument("--visits", type=int, default=2_000_000, help="Synthetic visits")
+    parser.add_argument("--spins", type=int, default=1_000_000, help="Synthetic wheel spins")
+    parser.add_argument("--orders", type=int, default=200_000, help="Synthetic music orders")
+    parser.add_argument("--coupons", type=int, default=500_000, help="Synthetic coupons")
+    parser.add_argument("--days", type=int, default=365, help="Days of history to spread rows over")
+    parser.add_argument("--repeats", type=int, default=5, help="Live dashboard loads to time")
+    parser.add_argument("--increment", type=int, default=10_000, help="New visits and spins for the catch-up test")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+    parser.add_argument("--report", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="panda-rollup-") as workdir:
+        seed_db = SyntheticDashboardDB(os.path.join(workdir, "dashboard.db"), args.days, random.Random(args.seed))
+        started = time.perf_counter()
+        seed_db.create(args.users, args.visits, args.spins, args.orders, args.coupons)
+        total = args.users + args.visits + args.spins + args.orders + args.coupons
+
+        benchmark = RollupBenchmark(seed_db, workdir, args.repeats, increment=args.increment)
+        benchmark.log(f"Seeded {total:,} rows in {time.perf_counter() - started:.1f}s")
+        passed = benchmark.run()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(benchmark.results, f, indent=2)
+        benchmark.log(f"Report written to {args.report}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
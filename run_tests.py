@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Parallel Test Runner for PANDA Lounge
+Discovers the harness suites (run_comprehensive_tests / run_assessment) and
+their standalone test_* methods, runs them in parallel worker processes and
+merges the results.
+
+Isolation: every worker logs in as its own copy of the seed test users
+(demo+w0@panda.com, ...), provisioned into the database it tests against,
+so cooldowns, QR nonces and rate limits never collide between workers, even
+on a shared server or backend service. With --server-cmd every worker also
+gets its own copy of the seed database and its own app server pointed at
+that copy; the seed is restored into it before each test, so state never
+leaks between tests either.
+
+Example:
+    python run_tests.py --workers 4 --server-cmd "npx next start -p {port}"
+"""
+
+import argparse
+import contextlib
+import importlib
+import inspect
+import io
+import json
+import multiprocessing
+import os
+import shlex
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import event_recorder
+from event_recorder import get_recorder
+
+# Configuration
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SEED_DB = "/app/prisma/dev.db"
+BASE_URL = "http://localhost:3000"
+BASE_PORT = 3100
+SERVER_READY_TIMEOUT = 120
+SUITE_METHODS = ("run_comprehensive_tests", "run_assessment")
+MODULE_PATTERNS = ("_test.py", "_assessment.py")
+
+# Per-worker state, set by init_worker()
+WORKER = {}
+
+# Each TEST_USERS dict as shipped (by id, modules may share one), before run_task() rewrites it
+SEED_USERS = {}
+
+
+def log(message, level="INFO"):
+    """Record a runner event (printed in verbose mode)"""
+    get_recorder().record(level, message, source="runner")
+
+
+def discover(pattern=None, suites=True, tests=True):
+    """Find harness classes with a suite method and their runnable tests.
+
+    Returns a list of (module, class, method) tuples. Only test_* methods
+    whose parameters all have defaults can run on their own.
+    """
+    tasks = []
+    for filename in sorted(os.listdir(ROOT)):
+        if not filename.endswith(MODULE_PATTERNS):
+            continue
+        module_name = filename[:-3]
+        module = importlib.import_module(module_name)
+
+        for class_name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module_name:
+                continue
+            suite = next((m for m in SUITE_METHODS if hasattr(cls, m)), None)
+            if suite is None:
+                continue
+
+            if suites:
+                tasks.append((module_name, class_name, suite))
+            if tests:
+                for method_name, method in inspect.getmembers(cls, inspect.isfunction):
+                    if not method_name.startswith("test_"):
+                        continue
+                    params = list(inspect.signature(method).parameters.values())[1:]
+                    if all(p.default is not inspect.Parameter.empty for p in params):
+                        tasks.append((module_name, class_name, method_name))
+
+    if pattern:
+        tasks = [t for t in tasks if pattern in ".".join(t)]
+    return tasks
+
+
+def copy_database(source, destination):
+    """Consistent copy through SQLite's backup API (safe while the app writes)"""
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(destination, timeout=30)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def worker_email(email, index):
+    local, _, domain = email.partition("@")
+    return f"{local}+w{index}@{domain}"
+
+
+def provision_users(db_path, users, index):
+    """Clone the seed test users for one worker (idempotent).
+
+    The copies keep the seed user's role and password hash under a worker
+    specific email and id; unique contact columns are left empty.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        columns = [row[1] for row in conn.execute('PRAGMA table_info("User")')]
+        with conn:
+            for user in users.values():
+                email = worker_email(user["email"], index)
+                if conn.execute('SELECT 1 FROM "User" WHERE email = ?', (email,)).fetchone():
+                    continue
+                row = conn.execute('SELECT * FROM "User" WHERE email = ?', (user["email"],)).fetchone()
+                if row is None:
+                    continue
+                values = dict(zip(columns, row))
+                values.update(id=f"{values['id']}w{index}", email=email, phone=None, oauth_id=None,
+                              referral_code=None)
+                conn.execute(
+                    f'INSERT INTO "User" ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})',
+                    [values[c] for c in columns],
+                )
+    finally:
+        conn.close()
+
+
+def use_worker_users(module):
+    """Point a harness module's TEST_USERS at this worker's copies.
+
+    The dict is updated in place, so modules that imported it see the
+    worker's users too.
+    """
+    users = getattr(module, "TEST_USERS", None)
+    if not isinstance(users, dict):
+        return
+    seed = SEED_USERS.setdefault(id(users), {key: dict(user) for key, user in users.items()})
+    provision_users(WORKER["db_path"], seed, WORKER["index"])
+    for key, user in seed.items():
+        users[key] = dict(user, email=worker_email(user["email"], WORKER["index"]))
+
+
+def init_worker(slots):
+    """Claim a worker slot (base URL + private database) for this process"""
+    slot = slots.get()
+    WORKER.update(slot)
+    event_recorder.reset()
+    sys.path.insert(0, ROOT)
+
+
+def run_task(task):
+    """Run one suite or test method inside a worker and capture its output"""
+    module_name, class_name, method_name = task
+    if WORKER.get("isolated"):
+        copy_database(WORKER["seed_db"], WORKER["db_path"])
+
+    module = importlib.import_module(module_name)
+    module.BASE_URL = WORKER["base_url"]
+    if hasattr(module, "DB_PATH"):
+        module.DB_PATH = WORKER["db_path"]
+    use_worker_users(module)
+
+    output = io.StringIO()
+    started = time.perf_counter()
+    error = None
+    result = None
+    instance = None
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            instance = getattr(module, class_name)()
+            result = getattr(instance, method_name)()
+        except SystemExit as e:
+            result = e.code in (0, None)
+        except Exception:
+            error = traceback.format_exc()
+
+    # WheelAPIAssessment reports through its findings list instead of return values
+    findings = getattr(instance, "findings", None) if error is None else None
+    if findings is not None and (result is None or method_name == "run_assessment"):
+        passed = not any(f["status"] == "FAIL" for f in findings)
+    else:
+        passed = error is None and bool(result)
+
+    return {
+        "task": ".".join(task),
+        "worker": WORKER["index"],
+        "passed": passed,
+        "seconds": round(time.perf_counter() - started, 3),
+        "error": error,
+        "output": output.getvalue(),
+    }
+
+
+def wait_for_port(port, process, timeout=SERVER_READY_TIMEOUT):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        with socket.socket() as sock:
+            sock.settimeout(0.5)
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return True
+        time.sleep(0.5)
+    return False
+
+
+class ParallelTestRunner:
+    def __init__(self, workers, seed_db=SEED_DB, server_cmd=None, base_url=BASE_URL, base_port=BASE_PORT):
+        self.workers = workers
+        self.seed_db = seed_db
+        self.server_cmd = server_cmd
+        self.base_url = base_url
+        self.base_port = base_port
+        self.workdir = None
+        self.servers = []
+
+    def prepare_slots(self):
+        """Seed one database per worker and start its server if configured"""
+        self.workdir = tempfile.mkdtemp(prefix="panda-tests-")
+        slots = []
+        for index in range(self.workers):
+            if not self.server_cmd:
+                slots.append({
+                    "index": index,
+                    "base_url": self.base_url,
+                    "db_path": self.seed_db,
+                    "seed_db": self.seed_db,
+                    "isolated": False
+                })
+                continue
+
+            db_path = os.path.join(self.workdir, f"worker-{index}.db")
+            copy_database(self.seed_db, db_path)
+            port = self.base_port + index
+            env = dict(os.environ, DATABASE_URL=f"file:{db_path}", PORT=str(port),
+                       NEXTAUTH_URL=f"http://localhost:{port}")
+            log_file = open(os.path.join(self.workdir, f"server-{index}.log"), "w")
+            process = subprocess.Popen(
+                shlex.split(self.server_cmd.format(port=port)),
+                cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT
+            )
+            self.servers.append((process, log_file))
+            slots.append({
+                "index": index,
+                "base_url": f"http://localhost:{port}",
+                "db_path": db_path,
+                "seed_db": self.seed_db,
+                "isolated": True,
+                "port": port
+            })
+
+        for slot, (process, _) in zip(slots, self.servers):
+            if not wait_for_port(slot["port"], process):
+                log(f"Server for worker {slot['index']} did not start (see {self.workdir})", "ERROR")
+                return None
+        return slots
+
+    def cleanup(self):
+        for process, log_file in self.servers:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log_file.close()
+        if self.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def run(self, tasks, verbose=False):
+        log("🚀 Starting Parallel Test Runner")
+        log(f"Tasks: {len(tasks)} | Workers: {self.workers} | Seed database: {self.seed_db}")
+        if not self.server_cmd:
+            log("No --server-cmd given: workers share one server and database "
+                "(each with its own test users, but no seed restore between tests)", "WARNING")
+
+        results = []
+        started = time.perf_counter()
+        try:
+            slots = self.prepare_slots()
+            if slots is None:
+                return None
+
+            manager = multiprocessing.Manager()
+            slot_queue = manager.Queue()
+            for slot in slots:
+                slot_queue.put(slot)
+
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                     initargs=(slot_queue,)) as pool:
+                futures = {pool.submit(run_task, task): task for task in tasks}
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"task": ".".join(futures[future]), "worker": None, "passed": False,
+                                  "seconds": 0.0, "error": str(e), "output": ""}
+                    results.append(result)
+                    status = "✅ PASS" if result["passed"] else "❌ FAIL"
+                    log(f"{status} {result['task']} ({result['seconds']}s, worker {result['worker']})")
+                    if verbose or not result["passed"]:
+                        for line in (result["output"] + (result["error"] or "")).splitlines():
+                            print(f"    {line}")
+            manager.shutdown()
+        finally:
+            self.cleanup()
+
+        elapsed = time.perf_counter() - started
+        results.sort(key=lambda r: r["task"])
+        passed = sum(1 for r in results if r["passed"])
+        serial = sum(r["seconds"] for r in results)
+
+        log("\n" + "="*60)
+        log("🎯 PARALLEL TEST SUMMARY")
+        log("="*60)
+        log(f"Overall: {passed}/{len(results)} passed")
+        log(f"Wall time: {elapsed:.1f}s (sum of test times: {serial:.1f}s)")
+        return {
+            "started_at": datetime.now().isoformat(),
+            "workers": self.workers,
+            "passed": passed,
+            "total": len(results),
+            "wall_seconds": round(elapsed, 3),
+            "serial_seconds": round(serial, 3),
+            "results": results
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the PANDA Lounge test harnesses in parallel")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Parallel worker processes")
+    parser.add_argument("--seed-db", default=SEED_DB, help="Seeded SQLite database copied for each worker")
+    parser.add_argument("--server-cmd", help="Command starting an app server on {port}, run once per worker")
+    parser.add_argument("--base-url", default=BASE_URL, help="Shared server when --server-cmd is not given")
+    parser.add_argument("--base-port", type=int, default=BASE_PORT, help="First port for per-worker servers")
+    parser.add_argument("-k", dest="pattern", help="Only run tasks whose module.Class.method contains this")
+    parser.add_argument("--suites-only", action="store_true", help="Skip standalone test_* methods")
+    parser.add_argument("--tests-only", action="store_true", help="Skip the run_* suites")
+    parser.add_argument("--list", action="store_true", help="List discovered tasks and exit")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print output of passing tests too")
+    parser.add_argument("--report", help="Write merged results as JSON to this path")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    tasks = discover(args.pattern, suites=not args.tests_only, tests=not args.suites_only)
+    if args.list:
+        for task in tasks:
+            print(".".join(task))
+        sys.exit(0)
+    if not tasks:
+        log("No tests found", "ERROR")
+        sys.exit(1)
+
+    runner = ParallelTestRunner(args.workers, args.seed_db, args.server_cmd, args.base_url, args.base_port)
+    report = runner.run(tasks, verbose=args.verbose)
+    if report is None:
+        sys.exit(1)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        log(f"Report written to {args.report}")
+
+    sys.exit(0 if report["passed"] == report["total"] else 1)
+
+
+if __name__ == "__main__":
+    main()
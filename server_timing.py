@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Server-Timing capture for the PANDA Lounge test harnesses
+The API routes report their phases in a Server-Timing header and their
+requestId in X-Request-Id (lib/server-timing.ts). This module:
+- parses both headers off a response into recorder fields (request_id,
+  server_timing, client_ms), which the harnesses attach to every request
+- aggregates the per-phase timings across runs (NDJSON event files or live)
+  and prints a flame-style breakdown per endpoint and status
+- includes a stand-in server that speaks the NextAuth login flow and the
+  wheel/QR endpoints with the same headers, for offline testing
+
+Usage:
+    python server_timing.py serve --port 3100 [--slow cooldown=4]
+    python server_timing.py report events.ndjson [more.ndjson ...] [--report out.json]
+"""
+
+import argparse
+import json
+import math
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Configuration
+BAR_WIDTH = 48
+NETWORK_PHASE = "network"  # client time not covered by the server's total
+
+# Stand-in phase medians (ms), roughly what the routes take on a dev SQLite
+STANDIN_PHASES = {
+    "session": 6.0,
+    "cooldown": 1.5,
+    "audit": 3.0,
+    "prizes": 1.2,
+    "tx.spin": 2.0,
+    "tx.prize": 1.0,
+    "tx.coupon": 1.8,
+    "tx.audit": 2.2,
+    "qr.sign": 0.4,
+    "qr.lookup": 1.4,
+    "qr.redeem": 2.5,
+}
+STANDIN_COOLDOWN_MS = 7 * 24 * 60 * 60 * 1000
+
+
+def parse_server_timing(value):
+    """[(name, dur_ms, desc), ...] in header order; entries without dur get 0.0"""
+    entries = []
+    for metric in (value or "").split(","):
+        name, *params = (part.strip() for part in metric.split(";"))
+        if not name:
+            continue
+        duration, description = 0.0, None
+        for param in params:
+            key, _, raw = param.partition("=")
+            key, raw = key.strip().lower(), raw.strip()
+            if key == "dur":
+                try:
+                    duration = float(raw)
+                except ValueError:
+                    pass
+            elif key == "desc":
+                description = raw.strip('"')
+        entries.append((name, duration, description))
+    return entries
+
+
+def timing_fields(response):
+    """Recorder fields for a response: request_id, server_timing {phase: ms}, client_ms"""
+    if response is None:
+        return {}
+    fields = {}
+    request_id = response.headers.get("x-request-id")
+    if request_id:
+        fields["request_id"] = request_id
+    entries = parse_server_timing(response.headers.get("server-timing"))
+    if entries:
+        fields["server_timing"] = {name: duration for name, duration, _ in entries}
+    elapsed = getattr(response, "elapsed", None)
+    if isinstance(elapsed, timedelta):
+        elapsed = elapsed.total_seconds()
+    if elapsed:
+        fields["client_ms"] = round(elapsed * 1000, 3)
+    return fields
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted sample list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class PhaseProfile:
+    """Per-phase timings grouped by "METHOD endpoint [status]"."""
+
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, key, phases, client_ms=None):
+        group = self.groups.setdefault(key, {"requests": 0, "order": [], "phases": {}, "client": []})
+        group["requests"] += 1
+        for name, duration in phases.items():
+            if name not in group["phases"]:
+                group["order"].append(name)
+                group["phases"][name] = []
+            group["phases"][name].append(duration)
+        if client_ms is not None:
+            group["client"].append(client_ms)
+
+    def add_response(self, method, endpoint, response):
+        fields = timing_fields(response)
+        if "server_timing" in fields:
+            self.add(f"{method.upper()} {endpoint} [{response.status_code}]", fields["server_timing"], fields.get("client_ms"))
+        return fields
+
+    def load_events(self, path):
+        """Add every recorded request with Server-Timing from an NDJSON event file"""
+        added = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if '"server_timing"' not in line:
+                    continue
+                event = json.loads(line)
+                key = f"{event.get('method', '?').upper()} {event.get('endpoint', '?')} [{event.get('status', '?')}]"
+                self.add(key, event["server_timing"], event.get("client_ms"))
+                added += 1
+        return added
+
+    def summary(self):
+        """Per group: request count and, per phase, the mean share per request plus p50/p95 when present"""
+        result = {}
+        for key, group in self.groups.items():
+            requests = group["requests"]
+            phases = {}
+            for name in group["order"]:
+                samples = sorted(group["phases"][name])
+                phases[name] = {
+                    "seen": len(samples),
+                    "mean_ms": round(sum(samples) / requests, 3),
+                    "p50_ms": round(percentile(samples, 50), 3),
+                    "p95_ms": round(percentile(samples, 95), 3),
+                }
+            client = sorted(group["client"])
+            entry = {"requests": requests, "phases": phases}
+            if client:
+                entry["client_mean_ms"] = round(sum(client) / len(client), 3)
+                entry["client_p95_ms"] = round(percentile(client, 95), 3)
+                if "total" in phases:
+                    entry["phases"][NETWORK_PHASE] = {
+                        "seen": len(client),
+                        "mean_ms": round(max(0.0, entry["client_mean_ms"] - phases["total"]["mean_ms"]), 3),
+                    }
+            result[key] = entry
+        return result
+
+    def render(self, width=BAR_WIDTH):
+        """Flame-style text: top-level phases laid end to end, nested ones under their parent"""
+        lines = []
+        for key, entry in sorted(self.summary().items()):
+            phases = entry["phases"]
+            span = max(entry.get("client_mean_ms", 0.0), phases.get("total", {}).get("mean_ms", 0.0))
+            span = span or sum(p["mean_ms"] for name, p in phases.items() if "." not in name) or 1.0
+            header = f"{key}  n={entry['requests']}"
+            if "client_mean_ms" in entry:
+                header += f"  client mean {entry['client_mean_ms']:.1f}ms p95 {entry['client_p95_ms']:.1f}ms"
+            lines.append(header)
+
+            # Parents are reported after their children finish, so lay out by depth;
+            # "a.b" without an "a" phase is a top-level phase of its own
+            names = [n for n in phases if n not in ("total", NETWORK_PHASE)]
+            parents = {n: n.rpartition(".")[0] if n.rpartition(".")[0] in phases else "" for n in names}
+            offsets = {"total": 0.0, NETWORK_PHASE: phases.get("total", {}).get("mean_ms", 0.0)}
+            cursor = {}
+            for name in sorted(names, key=lambda n: n.count(".") if parents[n] else 0):
+                parent = parents[name]
+                start = cursor.get(parent, offsets.get(parent, 0.0))
+                offsets[name] = start
+                cursor[parent] = start + phases[name]["mean_ms"]
+
+            tree = [n for n in ("total", NETWORK_PHASE) if n in phases]
+            for name in names:
+                if not parents[name]:
+                    tree += [name] + [n for n in names if n.startswith(name + ".")]
+            for name in tree:
+                mean, start = phases[name]["mean_ms"], offsets[name]
+                left = int(round(start / span * width))
+                length = max(1, int(round(mean / span * width))) if mean > 0 else 0
+                bar = (" " * left + "█" * length).ljust(width)[:width]
+                label = ("  " if parents.get(name) else "") + name
+                stats = f"{mean:7.2f}ms"
+                if "p95_ms" in phases[name]:
+                    stats += f"  p95 {phases[name]['p95_ms']:.2f}ms"
+                if phases[name]["seen"] < entry["requests"]:
+                    stats += f"  ({phases[name]['seen']}/{entry['requests']})"
+                lines.append(f"  {label:<14} |{bar}| {stats}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # the race tests connect hundreds of clients at once
+
+
+class TimingStandIn:
+    """Local server with the app's auth flow, wheel and QR routes and Server-Timing headers.
+
+    Phases sleep for a lognormal draw around STANDIN_PHASES (times `slow`
+    factors), so a harness run shows the same breakdown shape as the app.
+    """
+
+    def __init__(self, port=0, slow=None, seed=None):
+        self.slow = slow or {}
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.spins = {}
+        self.tokens = {}
+        self._lock = threading.Lock()
+        self._server = StandInServer(("127.0.0.1", port), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def phase(self, timing, name):
+        with self._lock:
+            draw = self.rng.lognormvariate(0, 0.35)
+        duration = STANDIN_PHASES[name] * self.slow.get(name, 1.0) * draw
+        time.sleep(duration / 1000)
+        timing.append((name, duration))
+        return duration
+
+    def wheel_spin(self, user, timing):
+        self.phase(timing, "cooldown")
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            next_allowed = self.spins.get(user, 0)
+            locked = now_ms < next_allowed
+            if not locked:
+                self.spins[user] = now_ms + STANDIN_COOLDOWN_MS
+        if locked:
+            self.phase(timing, "audit")
+            return 429, {"success": False, "error": "COOLDOWN_ACTIVE", "nextSpinDate": next_allowed}
+
+        self.phase(timing, "prizes")
+        tx = [self.phase(timing, name) for name in ("tx.spin", "tx.prize", "tx.coupon", "tx.audit")]
+        timing.append(("tx", sum(tx)))
+        return 200, {
+            "success": True,
+            "prize": {"id": 1, "name": "Знижка 10%", "type": "discount", "value": 10},
+            "coupon": {"code": f"WHEEL{uuid.uuid4().hex[:8].upper()}"},
+            "nextSpinDate": now_ms + STANDIN_COOLDOWN_MS,
+        }
+
+    def wheel_status(self, user, timing):
+        self.phase(timing, "cooldown")
+        with self._lock:
+            next_allowed = self.spins.get(user, 0)
+        if time.time() * 1000 < next_allowed:
+            return 200, {"canSpin": False, "state": "COOLDOWN", "nextSpinDate": next_allowed}
+        return 200, {"canSpin": True, "state": "READY"}
+
+    def qr_generate(self, user, timing):
+        self.phase(timing, "qr.sign")
+        token = uuid.uuid4().hex
+        with self._lock:
+            self.tokens[token] = user
+        return 200, {"success": True, "token": token}
+
+    def qr_validate(self, body, timing):
+        self.phase(timing, "qr.lookup")
+        with self._lock:
+            owner = self.tokens.pop(body.get("token"), None)
+        if owner is None:
+            return 400, {"success": False, "error": "INVALID_TOKEN"}
+        self.phase(timing, "qr.redeem")
+        return 200, {"success": True, "user": owner}
+
+    def _handler(self):
+        standin = self
+        authenticated = {
+            ("GET", "/api/wheel/status"): lambda user, body, timing: standin.wheel_status(user, timing),
+            ("POST", "/api/wheel/spin"): lambda user, body, timing: standin.wheel_spin(user, timing),
+            ("POST", "/api/qr/generate"): lambda user, body, timing: standin.qr_generate(user, timing),
+            ("POST", "/api/qr/validate"): lambda user, body, timing: standin.qr_validate(body, timing),
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out as separate writes; don't let Nagle hold the body back
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, format, *args):
+                pass
+
+            def reply(self, status, data, timing=None, request_id=None, cookie=None, started=None):
+                body = json.dumps(data, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if timing is not None:
+                    total = (time.perf_counter() - started) * 1000
+                    metrics = [f"{name};dur={duration:.1f}" for name, duration in timing]
+                    self.send_header("Server-Timing", ", ".join(metrics + [f"total;dur={total:.1f}"]))
+                    self.send_header("X-Request-Id", request_id)
+                if cookie:
+                    self.send_header("Set-Cookie", f"next-auth.session-token={cookie}; Path=/; HttpOnly")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def user(self):
+                for pair in self.headers.get("Cookie", "").split(";"):
+                    name, _, value = pair.strip().partition("=")
+                    if name == "next-auth.session-token" and value:
+                        return value
+                return None
+
+            def handle_request(self, method):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", "0") or 0))
+                path = self.path.split("?")[0]
+                with standin._lock:
+                    standin.requests += 1
+
+                if path == "/api/auth/csrf":
+                    return self.reply(200, {"csrfToken": uuid.uuid4().hex})
+                if path == "/api/auth/signin/credentials":
+                    form = {k: v[-1] for k, v in parse_qs(raw.decode()).items()}
+                    return self.reply(200, {"url": None}, cookie=form.get("email", "guest"))
+                if path == "/api/auth/register":
+                    return self.reply(201, {"success": True})
+                if path == "/api/auth/session":
+                    user = self.user()
+                    expires = (datetime.utcnow() + timedelta(days=30)).isoformat(timespec="milliseconds") + "Z"
+                    return self.reply(200, {"user": {"id": user, "email": user}, "expires": expires} if user else {})
+
+                route = authenticated.get((method, path))
+                if route is None:
+                    return self.reply(404, {"error": "Not found"})
+                started = time.perf_counter()
+                request_id = uuid.uuid4().hex[:6]
+                timing = []
+                standin.phase(timing, "session")
+                user = self.user()
+                if user is None:
+                    return self.reply(401, {"success": False, "error": "Unauthorized"}, timing, request_id, started=started)
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    body = {}
+                status, data = route(user, body, timing)
+                self.reply(status, data, timing, request_id, started=started)
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+        return Handler
+
+
+def parse_slow(values):
+    """["cooldown=4", ...] -> {"cooldown": 4.0}"""
+    slow = {}
+    for value in values or []:
+        name, _, factor = value.partition("=")
+        if name not in STANDIN_PHASES or not factor:
+            raise argparse.ArgumentTypeError(f"expected PHASE=FACTOR with PHASE in {', '.join(STANDIN_PHASES)}")
+        slow[name] = float(factor)
+    return slow
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server-Timing stand-in server and per-phase reports")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Run the stand-in server")
+    serve.add_argument("--port", type=int, default=3100, help="Port to listen on (127.0.0.1)")
+    serve.add_argument("--slow", action="append", metavar="PHASE=FACTOR", help="Slow a phase down, e.g. cooldown=4")
+    serve.add_argument("--seed", type=int, default=None, help="Random seed for the phase durations")
+
+    report = commands.add_parser("report", help="Per-phase breakdown of recorded harness runs")
+    report.add_argument("events", nargs="+", help="NDJSON event files (HARNESS_EVENTS_FILE / --events)")
+    report.add_argument("--report", help="Write the aggregated phases as JSON to this path")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        try:
+            standin = TimingStandIn(args.port, parse_slow(args.slow), args.seed)
+        except argparse.ArgumentTypeError as e:
+            serve.error(str(e))
+        standin.start()
+        print(f"Server-Timing stand-in listening on {standin.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            standin.stop()
+        return
+
+    profile = PhaseProfile()
+    added = sum(profile.load_events(path) for path in args.events)
+    if not added:
+        print("❌ No requests with Server-Timing in the given event files")
+        sys.exit(1)
+    print(f"{added} timed requests from {len(args.events)} file(s)\n")
+    print(profile.render())
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(profile.summary(), f, indent=2, ensure_ascii=False)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Authenticated session pool for the PANDA Lounge test harnesses
+Logs each test user in through NextAuth once, caches the session cookies
+until they expire and hands out warm keep-alive requests.Session objects.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from event_recorder import get_recorder
+
+# Configuration
+BASE_URL = "http://localhost:3000"
+POOL_MAXSIZE = 64
+REFRESH_MARGIN_SECONDS = 60
+DEFAULT_SESSION_TTL = 30 * 24 * 60 * 60  # NextAuth default maxAge
+
+
+class CachedLogin:
+    """Cookie jar of one logged-in user plus when it stops being valid"""
+
+    __slots__ = ("cookies", "expires_at", "email", "user_id")
+
+    def __init__(self, cookies, expires_at, email, user_id=None):
+        self.cookies = cookies
+        self.expires_at = expires_at
+        self.email = email
+        self.user_id = user_id
+
+    def is_fresh(self):
+        return time.time() < self.expires_at - REFRESH_MARGIN_SECONDS
+
+
+class SessionPool:
+    def __init__(self, users, base_url=BASE_URL, headers=None, pool_maxsize=POOL_MAXSIZE):
+        self.users = users
+        self.base_url = base_url
+        self.headers = headers or {}
+        self.pool_maxsize = pool_maxsize
+        self.logins = {}
+        self.login_count = 0
+        self.lock = threading.Lock()
+        self.user_locks = {key: threading.Lock() for key in users}
+
+    def log(self, message, level="INFO"):
+        """Record a pool event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="session_pool")
+
+    def session(self, user_key=None):
+        """New keep-alive session, authenticated as user_key if given.
+
+        Returns None if the user cannot be logged in.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(self.headers)
+
+        if user_key is not None:
+            cookies = self.cookies(user_key)
+            if cookies is None:
+                session.close()
+                return None
+            session.cookies.update(cookies)
+        return session
+
+    def cookies(self, user_key):
+        """Cached session cookies for user_key, logging in only when needed"""
+        login = self.logins.get(user_key)
+        if login and login.is_fresh():
+            return login.cookies
+
+        with self.user_locks[user_key]:
+            login = self.logins.get(user_key)
+            if login and login.is_fresh():
+                return login.cookies
+
+            login = self.login(user_key)
+            if login is None:
+                return None
+            with self.lock:
+                self.logins[user_key] = login
+            return login.cookies
+
+    def user_ids(self, user_keys=None):
+        """Database ids of these users (default: all), from their NextAuth sessions.
+
+        Users that cannot be logged in are left out.
+        """
+        ids = []
+        for user_key in self.users if user_keys is None else user_keys:
+            if self.cookies(user_key) is None:
+                continue
+            login = self.logins.get(user_key)
+            if login is not None and login.user_id:
+                ids.append(login.user_id)
+        return ids
+
+    def invalidate(self, user_key=None):
+        """Forget cached cookies for one user (or everyone)"""
+        with self.lock:
+            if user_key is None:
+                self.logins.clear()
+            else:
+                self.logins.pop(user_key, None)
+
+    def login(self, user_key):
+        """Run the NextAuth credentials flow once and capture the cookie jar"""
+        user = self.users[user_key]
+        self.log(f"Authenticating user: {user['email']}")
+
+        session = requests.Session()
+        session.headers.update(self.headers)
+        try:
+            # Step 1: Get CSRF token
+            csrf_response = session.get(f"{self.base_url}/api/auth/csrf")
+            if csrf_response.status_code != 200:
+                self.log("Failed to get CSRF token", "ERROR")
+                return None
+            csrf_token = csrf_response.json().get('csrfToken')
+
+            # Step 2: Authenticate via NextAuth credentials endpoint
+            auth_response = session.post(
+                f"{self.base_url}/api/auth/signin/credentials",
+                data={
+                    "email": user["email"],
+                    "password": user["password"],
+                    "csrfToken": csrf_token,
+                    "redirect": "false",
+                    "json": "true"
+                },
+                allow_redirects=False
+            )
+
+            # Step 3: Follow the callback URL if NextAuth returned one
+            if auth_response.status_code in [200, 302]:
+                try:
+                    callback_url = auth_response.json().get('url')
+                    if callback_url:
+                        session.get(callback_url, allow_redirects=True)
+                except ValueError:
+                    pass
+
+            # Step 4: Verify session and read its expiry
+            session_response = session.get(f"{self.base_url}/api/auth/session")
+            session_data = {}
+            if session_response.status_code == 200:
+                try:
+                    session_data = session_response.json() or {}
+                except ValueError:
+                    pass
+
+            if not session_data.get('user'):
+                self.log(f"❌ Authentication failed for {user['email']} - no valid session", "ERROR")
+                return None
+
+            self.login_count += 1
+            self.log(f"✅ Successfully authenticated {user['email']}")
+            return CachedLogin(session.cookies.copy(), self.session_expiry(session, session_data), user['email'],
+                               session_data['user'].get('id'))
+
+        except Exception as e:
+            self.log(f"Authentication error for {user['email']}: {e}", "ERROR")
+            return None
+        finally:
+            session.close()
+
+    def session_expiry(self, session, session_data):
+        """Earliest of the session cookie expiry and the NextAuth session expiry"""
+        candidates = [
+            cookie.expires for cookie in session.cookies
+            if 'session-token' in cookie.name and cookie.expires
+        ]
+
+        expires = session_data.get('expires')
+        if expires:
+            try:
+                candidates.append(datetime.fromisoformat(expires.replace('Z', '+00:00')).timestamp())
+            except ValueError:
+                pass
+
+        return min(candidates) if candidates else time.time() + DEFAULT_SESSION_TTL
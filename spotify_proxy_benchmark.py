@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Spotify Search Proxy Benchmark
+Replays a room of guests typing jukebox searches keystroke by keystroke
+against a local Spotify stand-in, once the way SpotifyAPI.searchForJukebox
+does today (one upstream call per query) and once through
+backend/music_search.py:
+- the proxy must return the same tracks as a full upstream search
+- upstream search calls, cache/prefix/coalesced hit rate
+- end-to-end latency (p50/p95) of every keystroke query
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from event_recorder import get_recorder
+from music_search import MIN_QUERY_LENGTH, MusicSearchProxy, format_track, normalize_query
+
+# Configuration
+SEARCH_LIMIT = 10  # what the music page asks for
+
+ARTISTS = [
+    "Drake", "Dua Lipa", "The Weeknd", "Ed Sheeran", "Adele", "Queen", "Billie Eilish", "Harry Styles",
+    "Olivia Rodrigo", "Kalush", "Jerry Heil", "Okean Elzy", "Go_A", "Tina Karol", "Monatik", "Max Barskih",
+    "Imagine Dragons", "Coldplay", "Rihanna", "Eminem", "Taylor Swift", "Bad Bunny", "Post Malone", "SZA",
+]
+WORDS = [
+    "love", "night", "fire", "dance", "heart", "city", "dream", "light", "rain", "summer", "blue", "gold",
+    "home", "wild", "stars", "shadow", "river", "sky", "forever", "midnight", "echo", "storm", "ocean", "dust",
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def build_catalog(size, rng):
+    """Spotify-shaped tracks; about two thirds have a preview like the real catalog"""
+    tracks = []
+    for i in range(size):
+        artist = rng.choice(ARTISTS)
+        title = " ".join(w.capitalize() for w in rng.sample(WORDS, rng.randint(1, 3)))
+        track_id = f"standin{i:06d}"
+        tracks.append({
+            "id": track_id,
+            "name": title,
+            "artists": [{"id": f"artist-{ARTISTS.index(artist)}", "name": artist}],
+            "album": {
+                "id": f"album-{i // 10}",
+                "name": f"{rng.choice(WORDS).capitalize()} Sessions",
+                "images": [{"url": f"https://i.scdn.co/image/{track_id}", "height": 300, "width": 300}],
+            },
+            "duration_ms": rng.randint(120_000, 300_000),
+            "preview_url": f"https://p.scdn.co/mp3-preview/{track_id}" if rng.random() < 0.66 else None,
+            "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+            "uri": f"spotify:track:{track_id}",
+            "popularity": rng.randint(20, 100),
+        })
+    tracks.sort(key=lambda t: -t["popularity"])
+    return tracks
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 turns a burst of guests into SYN retries
+    request_queue_size = 256
+
+
+class SpotifyStandIn:
+    """Local server speaking the two Spotify endpoints the jukebox uses.
+
+    Search matches every query term as a substring of the track name,
+    artists and album, ranked by popularity, after `latency` seconds.
+    """
+
+    def __init__(self, catalog, latency):
+        self.catalog = catalog
+        self.latency = latency
+        self.search_calls = 0
+        self.token_calls = 0
+        self._lock = threading.Lock()
+        self._matches = {}
+        self._haystacks = [
+            normalize_query(f"{t['name']} {' '.join(a['name'] for a in t['artists'])} {t['album']['name']}")
+            for t in catalog
+        ]
+        self._server = StandInServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def matching(self, query):
+        # Memoised so the stand-in's own CPU time doesn't count as upstream latency
+        key = normalize_query(query)
+        found = self._matches.get(key)
+        if found is None:
+            terms = key.split()
+            found = [t for t, text in zip(self.catalog, self._haystacks) if all(term in text for term in terms)]
+            self._matches[key] = found
+        return found
+
+    def search(self, query, limit, offset=0):
+        found = self.matching(query)
+        return {
+            "tracks": {
+                "href": f"{self.url}/v1/search",
+                "items": found[offset:offset + limit],
+                "limit": limit,
+                "next": None,
+                "offset": offset,
+                "previous": None,
+                "total": len(found),
+            }
+        }
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def reply(self, data):
+                body = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", "0")))
+                with standin._lock:
+                    standin.token_calls += 1
+                self.reply({"access_token": "standin-token", "token_type": "Bearer", "expires_in": 3600})
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path != "/v1/search":
+                    self.send_error(404)
+                    return
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                with standin._lock:
+                    standin.search_calls += 1
+                time.sleep(standin.latency)
+                self.reply(standin.search(params["q"], int(params.get("limit", 20)), int(params.get("offset", 0))))
+
+        return Handler
+
+
+class SpotifyProxyBenchmark:
+    def __init__(self, standin, guests=200, duration=5.0, seed=None):
+        self.standin = standin
+        self.guests = guests
+        self.duration = duration
+        self.rng = random.Random(seed)
+        self.results = {}
+
+    def log(self, message, level="INFO"):
+        """Record a benchmark event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="spotify_benchmark")
+
+    def keystrokes(self):
+        """(offset_seconds, query) for every guest typing a Zipf-popular search"""
+        targets = ARTISTS + [t["name"] for t in self.standin.catalog[:50]]
+        weights = [1 / (rank + 1) for rank in range(len(targets))]
+        schedule = []
+        for _ in range(self.guests):
+            target = self.rng.choices(targets, weights=weights)[0]
+            typed = target[:self.rng.randint(min(len(target), MIN_QUERY_LENGTH + 2), len(target))]
+            at = self.rng.uniform(0, self.duration)
+            for end in range(MIN_QUERY_LENGTH, len(typed) + 1):
+                schedule.append((at, typed[:end]))
+                at += self.rng.uniform(0.08, 0.25)
+        schedule.sort()
+        return schedule
+
+    def expected(self, query):
+        """Jukebox tracks from a complete upstream result set"""
+        items = self.standin.search(query, len(self.standin.catalog))["tracks"]["items"]
+        return [t["id"] for t in items if t["preview_url"]][:SEARCH_LIMIT]
+
+    async def replay(self, name, schedule, search):
+        samples = []
+        answers = {}
+
+        async def one(at, query):
+            started = time.perf_counter()
+            answers[query] = await search(query)
+            samples.append((time.perf_counter() - started) * 1000)
+
+        calls_before = self.standin.search_calls
+        origin = time.perf_counter()
+        tasks = []
+        for at, query in schedule:
+            delay = at - (time.perf_counter() - origin)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(at, query)))
+        await asyncio.gather(*tasks)
+
+        samples.sort()
+        self.results[name] = {
+            "queries": len(samples),
+            "upstream_searches": self.standin.search_calls - calls_before,
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+        }
+        r = self.results[name]
+        self.log(f"{name}: {r['upstream_searches']:,} upstream searches | p50 {r['p50_ms']}ms | p95 {r['p95_ms']}ms")
+        return answers
+
+    async def run_direct(self, schedule):
+        """SpotifyAPI.searchForJukebox: searchTracks(query, limit), then keep previews"""
+        executor = ThreadPoolExecutor(max_workers=64)
+        loop = asyncio.get_running_loop()
+
+        def fetch(query):
+            params = urlencode({"q": query, "type": "track", "limit": SEARCH_LIMIT, "market": "UA"})
+            with urlopen(Request(f"{self.standin.url}/v1/search?{params}")) as response:
+                items = json.loads(response.read())["tracks"]["items"]
+            return [format_track(t) for t in items if t["preview_url"]]
+
+        async def search(query):
+            return await loop.run_in_executor(executor, fetch, query)
+
+        try:
+            await self.replay("direct", schedule, search)
+        finally:
+            executor.shutdown()
+
+    async def run_proxy(self, schedule):
+        proxy = MusicSearchProxy(
+            api_url=f"{self.standin.url}/v1",
+            token_url=f"{self.standin.url}/api/token",
+            client_id="bench",
+            client_secret="bench",
+        )
+
+        async def search(query):
+            tracks, _ = await proxy.search(query, SEARCH_LIMIT)
+            return tracks
+
+        try:
+            answers = await self.replay("proxy", schedule, search)
+            metrics = proxy.metrics()
+            self.results["proxy"].update({
+                k: metrics[k] for k in ("hits", "prefix_hits", "coalesced", "misses", "hit_rate")
+            })
+            self.log(
+                f"Hit rate {metrics['hit_rate']:.2%}: {metrics['hits']} cached, {metrics['prefix_hits']} from a prefix, "
+                f"{metrics['coalesced']} coalesced, {metrics['misses']} upstream"
+            )
+            return answers
+        finally:
+            await proxy.close()
+
+    def run(self):
+        self.log("🎵 Starting Spotify Search Proxy Benchmark")
+        schedule = self.keystrokes()
+        self.log(
+            f"Catalog: {len(self.standin.catalog):,} tracks | Guests: {self.guests} | "
+            f"Queries: {len(schedule):,} | Upstream latency: {self.standin.latency * 1000:.0f}ms"
+        )
+
+        self.log("\n" + "="*60)
+        asyncio.run(self.run_direct(schedule))
+        answers = asyncio.run(self.run_proxy(schedule))
+
+        self.log("\n" + "="*60)
+        mismatches = sum(1 for query, tracks in answers.items() if [t["id"] for t in tracks] != self.expected(query))
+        direct, proxy = self.results["direct"], self.results["proxy"]
+        self.results["upstream_reduction"] = round(direct["upstream_searches"] / max(1, proxy["upstream_searches"]), 1)
+        self.results["mismatches"] = mismatches
+        self.log(
+            f"Upstream searches: {direct['upstream_searches']:,} -> {proxy['upstream_searches']:,} "
+            f"({self.results['upstream_reduction']}x fewer) | p95 {direct['p95_ms']}ms -> {proxy['p95_ms']}ms"
+        )
+        passed = mismatches == 0
+        self.log(
+            f"{'✅' if passed else '❌'} {len(answers) - mismatches}/{len(answers)} distinct queries match a full upstream search",
+            "INFO" if passed else "ERROR"
+        )
+        return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spotify search proxy vs direct search benchmark")
+    parser.add_argument("--catalog", type=int, default=5000, help="Tracks in the stand-in catalog")
+    parser.add_argument("--guests", type=int, default=200, help="Guests searching during the run")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds over which guests start typing")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Stand-in search latency")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+    parser.add_argument("--report", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    standin = SpotifyStandIn(build_catalog(args.catalog, rng), args.latency_ms / 1000)
+    standin.start()
+    try:
+        benchmark = SpotifyProxyBenchmark(standin, args.guests, args.duration, args.seed)
+        passed = benchmark.run()
+    finally:
+        standin.stop()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(benchmark.results, f, indent=2)
+        benchmark.log(f"Report written to {args.report}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Staff Aggregates Benchmark
+Compares the incremental staff aggregates in backend/staff_stats.py with
+recomputing Staff.average_service / average_personality / tips_total on
+every write (AVG() and SUM() over the staff member's whole history):
+- per-write latency (p50/p99) and throughput of both paths, for staff
+  members with 100k+ ratings each
+- time and rows/sec of a from-scratch rebuild (one streaming pass)
+- the consistency checker must find no mismatch between the aggregates, a
+  GROUP BY recompute and the stored Staff columns afterwards
+
+With --db it only rebuilds and checks an existing database, without writing
+to it.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import db
+from event_recorder import get_recorder
+from server_timing import percentile
+from staff_stats import StaffStatsService
+from synthetic_db import SCHEMA_PATH, STAFF_NAMES, prisma_ddl
+
+# Configuration
+DB_PATH = "/app/prisma/dev.db"
+DAY_MS = 24 * 60 * 60 * 1000
+HISTORY_DAYS = 3 * 365
+TIP_AMOUNTS = [50, 100, 150, 200, 300, 500]
+
+
+def create_synthetic_db(path, staff, ratings_per_staff, tips_per_staff, rng):
+    """Staff with long rating and tip histories; ratings drift upwards over time"""
+    tables, indexes = prisma_ddl(open(SCHEMA_PATH).read())
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    for statement in tables:
+        conn.execute(statement)
+
+    now = db.now_ms()
+    start = now - HISTORY_DAYS * DAY_MS
+    with conn:
+        conn.executemany(
+            'INSERT INTO "Staff" (id, name, is_active, average_service, average_personality, tips_total, created_at) '
+            "VALUES (?, ?, 1, 0, 0, 0, ?)",
+            [(i + 1, STAFF_NAMES[i % len(STAFF_NAMES)], start) for i in range(staff)],
+        )
+        for staff_id in range(1, staff + 1):
+            def ratings():
+                for _ in range(ratings_per_staff):
+                    at = rng.randint(start, now)
+                    trend = (at - start) / (now - start)  # 0 long ago .. 1 today
+                    service = min(5, max(1, round(rng.gauss(3 + 1.5 * trend, 0.8))))
+                    personality = min(5, max(1, round(rng.gauss(3.5 + trend, 0.8))))
+                    yield f"user{rng.randrange(50_000)}", staff_id, service, personality, at, at
+            conn.executemany(
+                'INSERT INTO "StaffRating" (user_id, staff_id, service_rating, personality_rating, visit_date, created_at) '
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ratings(),
+            )
+            conn.executemany(
+                'INSERT INTO "Tip" (staff_id, user_id, amount, created_at) VALUES (?, ?, ?, ?)',
+                ((staff_id, None, rng.choice(TIP_AMOUNTS), rng.randint(start, now)) for _ in range(tips_per_staff)),
+            )
+    for statement in indexes:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+class StaffStatsBenchmark:
+    def __init__(self, db_path, writes=2000, tip_share=0.3, seed=None):
+        self.db_path = db_path
+        self.writes = writes
+        self.tip_share = tip_share
+        self.rng = random.Random(seed)
+        self.results = {}
+
+    def log(self, message, level="INFO"):
+        """Record a benchmark event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="staff_stats_benchmark")
+
+    def write_mix(self, staff_ids):
+        """(kind, staff_id, values) for the writes both paths replay"""
+        mix = []
+        for _ in range(self.writes):
+            staff_id = self.rng.choice(staff_ids)
+            if self.rng.random() < self.tip_share:
+                mix.append(("tip", staff_id, (self.rng.choice(TIP_AMOUNTS),)))
+            else:
+                mix.append(("rating", staff_id, (self.rng.randint(1, 5), self.rng.randint(1, 5))))
+        return mix
+
+    @staticmethod
+    def insert(conn, kind, staff_id, values):
+        now = db.now_ms()
+        if kind == "rating":
+            conn.execute(
+                'INSERT INTO "StaffRating" (user_id, staff_id, service_rating, personality_rating, visit_date, created_at) '
+                "VALUES ('bench', ?, ?, ?, ?, ?)",
+                (staff_id, *values, now, now),
+            )
+        else:
+            conn.execute(
+                'INSERT INTO "Tip" (staff_id, amount, created_at) VALUES (?, ?, ?)', (staff_id, *values, now)
+            )
+
+    def record(self, name, samples, elapsed):
+        samples.sort()
+        self.results[name] = {
+            "writes": len(samples),
+            "seconds": round(elapsed, 3),
+            "writes_per_second": round(len(samples) / elapsed),
+            "p50_ms": round(percentile(samples, 50) / 1e6, 3),
+            "p99_ms": round(percentile(samples, 99) / 1e6, 3),
+        }
+        r = self.results[name]
+        self.log(f"{name}: {r['writes_per_second']:,} writes/s | p50 {r['p50_ms']}ms | p99 {r['p99_ms']}ms")
+
+    def run_recompute(self, mix):
+        """What the routes would do: insert, then AVG()/SUM() the history and update Staff"""
+        conn = db.connect(self.db_path)
+        try:
+            samples = []
+            started = time.perf_counter()
+            for kind, staff_id, values in mix:
+                t0 = time.perf_counter_ns()
+                with conn:
+                    self.insert(conn, kind, staff_id, values)
+                    if kind == "rating":
+                        service, personality = conn.execute(
+                            'SELECT AVG(service_rating), AVG(personality_rating) FROM "StaffRating" WHERE staff_id = ?',
+                            (staff_id,),
+                        ).fetchone()
+                        conn.execute(
+                            'UPDATE "Staff" SET average_service = ?, average_personality = ? WHERE id = ?',
+                            (service, personality, staff_id),
+                        )
+                    else:
+                        total = conn.execute(
+                            'SELECT SUM(amount) FROM "Tip" WHERE staff_id = ?', (staff_id,)
+                        ).fetchone()[0]
+                        conn.execute('UPDATE "Staff" SET tips_total = ? WHERE id = ?', (total, staff_id))
+                samples.append(time.perf_counter_ns() - t0)
+            self.record("recompute_on_write", samples, time.perf_counter() - started)
+        finally:
+            conn.close()
+
+    async def run_incremental(self, service, mix):
+        """Insert, then let the service fold the new row in and write the Staff columns"""
+        conn = db.connect(self.db_path)
+        try:
+            samples = []
+            started = time.perf_counter()
+            for kind, staff_id, values in mix:
+                t0 = time.perf_counter_ns()
+                with conn:
+                    self.insert(conn, kind, staff_id, values)
+                await service.poll()
+                samples.append(time.perf_counter_ns() - t0)
+            self.record("incremental", samples, time.perf_counter() - started)
+        finally:
+            conn.close()
+
+    async def run_checks(self, writeback):
+        service = StaffStatsService(self.db_path, writeback=writeback)
+        await service.start()
+        try:
+            r = self.results["rebuild"] = {
+                "rows": service.stats["rebuild_rows"],
+                "seconds": service.stats["rebuild_seconds"],
+                "rows_per_second": round(service.stats["rebuild_rows"] / max(service.stats["rebuild_seconds"], 1e-9)),
+                "staff": len(service.aggregates),
+            }
+            self.log(f"rebuild: {r['rows']:,} rows for {r['staff']} staff in {r['seconds']}s "
+                     f"({r['rows_per_second']:,} rows/s)")
+
+            if self.writes and writeback:
+                mix = self.write_mix(sorted(service.aggregates))
+                self.log("\n" + "="*60)
+                self.run_recompute(mix)
+                await service.poll()  # catch up with the recompute path's rows
+                await self.run_incremental(service, mix)
+                speedup = (self.results["incremental"]["writes_per_second"]
+                           / self.results["recompute_on_write"]["writes_per_second"])
+                self.results["speedup"] = round(speedup, 1)
+                self.log(f"Speedup: {speedup:.1f}x writes/s")
+
+            self.log("\n" + "="*60)
+            for staff_id, summary in sorted(service.summary().items())[:5]:
+                self.log(f"staff {staff_id}: {summary['ratingsCount']:,} ratings | service "
+                         f"{summary['averageService']:.3f} (recent {summary['recentService']:.3f}) | personality "
+                         f"{summary['averagePersonality']:.3f} (recent {summary['recentPersonality']:.3f}) | "
+                         f"tips {summary['tipsTotal']:,}")
+            mismatches = await service.check()
+        finally:
+            await service.close()
+
+        self.results["mismatches"] = mismatches[:20]
+        for mismatch in mismatches[:10]:
+            self.log(f"Mismatch: {mismatch}", "ERROR")
+        return mismatches
+
+    def run(self, writeback=True):
+        self.log("👥 Starting Staff Aggregates Benchmark")
+        self.log(f"Database: {self.db_path} | Writes per path: {self.writes:,}")
+        mismatches = asyncio.run(self.run_checks(writeback))
+        passed = not mismatches
+        self.log(
+            f"{'✅' if passed else '❌'} {len(mismatches)} mismatches between the aggregates, "
+            f"a full recompute{' and the Staff columns' if writeback else ''}",
+            "INFO" if passed else "ERROR"
+        )
+        return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental staff aggregates vs recompute-on-write benchmark")
+    parser.add_argument("--db", help=f"Only rebuild and check this database, without writing (e.g. {DB_PATH})")
+    parser.add_argument("--staff", type=int, default=4, help="Staff members in the synthetic database")
+    parser.add_argument("--ratings-per-staff", type=int, default=120_000, help="Rating history per staff member")
+    parser.add_argument("--tips-per-staff", type=int, default=30_000, help="Tip history per staff member")
+    parser.add_argument("--writes", type=int, default=2000, help="New ratings/tips written per path")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+    parser.add_argument("--report", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="panda-staff-stats-") as workdir:
+        if args.db:
+            benchmark = StaffStatsBenchmark(args.db, writes=0)
+            passed = benchmark.run(writeback=False)
+        else:
+            db_path = os.path.join(workdir, "staff.db")
+            rng = random.Random(args.seed)
+            started = time.perf_counter()
+            create_synthetic_db(db_path, args.staff, args.ratings_per_staff, args.tips_per_staff, rng)
+            benchmark = StaffStatsBenchmark(db_path, args.writes, seed=args.seed)
+            benchmark.log(f"Synthetic database: {args.staff} staff x {args.ratings_per_staff:,} ratings "
+                          f"+ {args.tips_per_staff:,} tips in {time.perf_counter() - started:.1f}s")
+            passed = benchmark.run()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(benchmark.results, f, indent=2)
+        benchmark.log(f"Report written to {args.report}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
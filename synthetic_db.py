@@ -0,0 +1,602 @@
+#!/usr/bin/env python3
+"""
+Synthetic Production Database Generator
+Builds a SQLite database with the schema `prisma db push` would create from
+prisma/schema.prisma and fills it with production-sized, seeded data:
+- User, Visit, WheelSpin, Coupon, QRValidationEvent and AuditLog volumes
+  are configurable (presets from `small` to `production`)
+- activity follows the lounge's shape: evening peaks, busy Fridays and
+  Saturdays, growth over the history window and a few very active regulars
+- wheel spins respect the 7-day cooldown per user
+- rows from a base database (the dev.db seed accounts, staff, menu) are
+  copied first so the app's test logins keep working
+
+Loading uses bulk executemany in chunks with journaling off; indexes are
+created after the data is in. The same --seed and --now yield the same rows.
+
+Point the harnesses at the result with wheel_test.py --db, run_tests.py
+--seed-db, cooldown_benchmark.py --db, or DB_PATH for the backend service.
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from db import to_base36
+from event_recorder import get_recorder
+
+# Configuration
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prisma", "schema.prisma")
+BASE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prisma", "prisma", "dev.db")
+CHUNK_SIZE = 50_000
+LOCAL_UTC_OFFSET_HOURS = 3  # Europe/Kyiv (summer time)
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+COOLDOWN_MS = 7 * DAY_MS
+SPIN_SLOT_MS = 9 * DAY_MS  # cooldown plus the average wait before the next spin
+
+PRESETS = {
+    "small": {"users": 10_000, "visits": 50_000, "spins": 20_000, "coupons": 10_000, "qr_events": 50_000, "audit": 100_000},
+    "medium": {"users": 100_000, "visits": 500_000, "spins": 200_000, "coupons": 100_000, "qr_events": 500_000, "audit": 1_000_000},
+    "production": {"users": 1_000_000, "visits": 5_000_000, "spins": 2_000_000, "coupons": 1_000_000, "qr_events": 5_000_000, "audit": 10_000_000},
+}
+
+# Share of traffic per local hour of day (the lounge opens at noon) and per weekday (Mon..Sun)
+HOUR_WEIGHTS = [2, 1, 0.5, 0.2, 0.1, 0.1, 0.1, 0.1, 0.2, 0.3, 0.5, 1, 2, 2, 2, 3, 4, 6, 9, 12, 13, 12, 9, 5]
+WEEKDAY_WEIGHTS = [0.8, 0.8, 0.9, 1.0, 1.5, 1.7, 1.2]
+
+PRISMA_TYPES = {"String": "TEXT", "Int": "INTEGER", "Boolean": "BOOLEAN", "DateTime": "DATETIME", "Float": "REAL"}
+
+WHEEL_PRIZES = [
+    ("🎁 Безкоштовний кальян", "free_item", None, 5),
+    ("💰 Знижка 20%", "discount", 20, 15),
+    ("💎 Бонус 50 балів", "points", 50, 25),
+    ("🍹 Безкоштовний напій", "free_item", None, 15),
+    ("💰 Знижка 10%", "discount", 10, 30),
+    ("🎟️ Спробуй ще раз", "points", 0, 10),
+]
+STAFF_NAMES = ["Олексій", "Марія", "Дмитро", "Анна", "Іван", "Софія", "Максим", "Катерина", "Андрій", "Юлія"]
+FIRST_NAMES = ["Олександр", "Анастасія", "Богдан", "Вікторія", "Денис", "Ірина", "Назар", "Оксана", "Роман", "Тетяна"]
+COUPON_KINDS = [("wheel_prize", "discount", 60), ("birthday", "free_item", 15), ("referral", "discount", 15), ("instagram", "discount", 10)]
+QR_TYPES = [("visit", 70), ("promo", 20), ("referral", 7), ("staff_check", 3)]
+# error_message codes of failed validations (QRSystem.validateQR / backend/qr_validation.py)
+QR_ERRORS = [("EXPIRED", 40), ("REPLAY_ATTACK", 15), ("INSUFFICIENT_PERMISSIONS", 15), ("INVALID_SIGNATURE", 10),
+             ("INVALID_FORMAT", 10), ("ALREADY_USED", 5), ("VALIDATION_ERROR", 5)]
+AUDIT_ACTIONS = [
+    ("wheel_spin_success", "WheelSpin", 25),
+    ("wheel_spin_blocked", "WheelSpin", 10),
+    ("visit_confirm", "Visit", 30),
+    ("qr_validate", "QRValidationEvent", 20),
+    ("promo_create", "PromoCode", 3),
+    ("coupon_redeem", "Coupon", 10),
+    ("user_block", "User", 1),
+    ("role_change", "User", 1),
+]
+USER_AGENTS = [
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148",
+    "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 Chrome/126.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/126.0 Safari/537.36",
+]
+
+
+BASE36_PAIRS = [to_base36(n, 2) for n in range(36 ** 2)]
+
+
+def base36_8(value):
+    """to_base36(value, 8) for values below 36**8, two digits at a time"""
+    value, d = divmod(value % 36 ** 8, 1296)
+    value, c = divmod(value, 1296)
+    a, b = divmod(value, 1296)
+    return BASE36_PAIRS[a] + BASE36_PAIRS[b] + BASE36_PAIRS[c] + BASE36_PAIRS[d]
+
+
+def log(message, level="INFO"):
+    """Record a generator event (printed in verbose mode)"""
+    get_recorder().record(level, message, source="synthetic_db")
+
+
+def prisma_ddl(schema_text):
+    """(CREATE TABLE statements, CREATE INDEX statements) for a Prisma SQLite schema.
+
+    Mirrors what `prisma db push` emits: quoted identifiers, autoincrement
+    integer ids, cuid ids as TEXT, @unique as "<Model>_<field>_key" indexes
+    and @@index as "<Model>_<fields>_idx".
+    """
+    models = re.findall(r"^model\s+(\w+)\s*\{(.*?)^\}", schema_text, re.M | re.S)
+    model_names = {name for name, _ in models}
+    tables, indexes = [], []
+
+    for model, body in models:
+        columns, constraints = [], []
+        for raw in body.splitlines():
+            line = raw.split("//")[0].strip()
+            if not line:
+                continue
+            if line.startswith("@@"):
+                fields = [f.strip() for f in re.search(r"\[([^\]]*)\]", line).group(1).split(",")]
+                quoted = ", ".join(f'"{f}"' for f in fields)
+                if line.startswith("@@unique"):
+                    indexes.append(f'CREATE UNIQUE INDEX "{model}_{"_".join(fields)}_key" ON "{model}"({quoted});')
+                elif line.startswith("@@index"):
+                    indexes.append(f'CREATE INDEX "{model}_{"_".join(fields)}_idx" ON "{model}"({quoted});')
+                continue
+
+            name, type_spec, *rest = line.split(None, 2)
+            attrs = rest[0] if rest else ""
+            base_type = type_spec.rstrip("?[]")
+            if base_type in model_names:
+                relation = re.search(r"fields:\s*\[(\w+)\],\s*references:\s*\[(\w+)\]", attrs)
+                if relation:
+                    on_delete = re.search(r"onDelete:\s*(\w+)", attrs)
+                    action = on_delete.group(1) if on_delete else ("SetNull" if type_spec.endswith("?") else "Restrict")
+                    action = re.sub(r"(?<!^)(?=[A-Z])", " ", action).upper()
+                    constraints.append(
+                        f'CONSTRAINT "{model}_{relation.group(1)}_fkey" FOREIGN KEY ("{relation.group(1)}") '
+                        f'REFERENCES "{base_type}" ("{relation.group(2)}") ON DELETE {action} ON UPDATE CASCADE'
+                    )
+                continue
+
+            sql_type = PRISMA_TYPES[base_type]
+            column = f'"{name}" {sql_type}'
+            if "@id" in attrs:
+                column += " NOT NULL PRIMARY KEY"
+                if "autoincrement()" in attrs:
+                    column += " AUTOINCREMENT"
+            elif not type_spec.endswith("?"):
+                column += " NOT NULL"
+            default = re.search(r"@default\(((?:[^()]|\(\))*)\)", attrs)
+            if default and "@id" not in attrs:
+                value = default.group(1)
+                if value == "now()":
+                    column += " DEFAULT CURRENT_TIMESTAMP"
+                elif value.startswith('"'):
+                    column += " DEFAULT '" + value.strip('"').replace("'", "''") + "'"
+                else:
+                    column += f" DEFAULT {value}"
+            if "@unique" in attrs:
+                indexes.append(f'CREATE UNIQUE INDEX "{model}_{name}_key" ON "{model}"("{name}");')
+            columns.append(column)
+
+        tables.append(f'CREATE TABLE "{model}" (\n    ' + ",\n    ".join(columns + constraints) + "\n);")
+    return tables, indexes
+
+
+class TimeSampler:
+    """Timestamps over the history window, weighted by hour, weekday and growth"""
+
+    def __init__(self, now_ms, days, rng, growth=3.0):
+        self.rng = rng
+        self.start = now_ms - days * DAY_MS
+        self.hours = days * 24
+        offset = LOCAL_UTC_OFFSET_HOURS * HOUR_MS
+        weights = []
+        for h in range(self.hours):
+            local = datetime.fromtimestamp((self.start + h * HOUR_MS + offset) / 1000, tz=timezone.utc)
+            # The last day of the window is `growth` times as busy as the first
+            trend = 1 + (growth - 1) * h / max(1, self.hours - 1)
+            weights.append(HOUR_WEIGHTS[local.hour] * WEEKDAY_WEIGHTS[local.weekday()] * trend)
+        self.cum_weights = list(itertools.accumulate(weights))
+
+    def sample(self, count, after=None):
+        """`count` timestamps (ms), each later than the matching `after` value if given"""
+        hours = self.rng.choices(range(self.hours), cum_weights=self.cum_weights, k=count)
+        stamps = [self.start + h * HOUR_MS + int(self.rng.random() * HOUR_MS) for h in hours]
+        if after is not None:
+            stamps = [max(t, a + int(self.rng.random() * HOUR_MS)) for t, a in zip(stamps, after)]
+        return stamps
+
+    def evening_after(self, ms):
+        """Timestamp at a weighted local hour of the day of `ms` (or the next day), after `ms`"""
+        offset = LOCAL_UTC_OFFSET_HOURS * HOUR_MS
+        day_start = (ms + offset) // DAY_MS * DAY_MS - offset
+        hour = self.rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+        at = day_start + hour * HOUR_MS + int(self.rng.random() * HOUR_MS)
+        return at if at >= ms else at + DAY_MS
+
+    def hour_after(self, ms):
+        """Weighted timestamp in the window no earlier than `ms`"""
+        first = max(0, (ms - self.start) // HOUR_MS)
+        if first >= self.hours:
+            return ms
+        low = self.cum_weights[first - 1] if first else 0.0
+        pick = low + self.rng.random() * (self.cum_weights[-1] - low)
+        hour = min(bisect.bisect_left(self.cum_weights, pick), self.hours - 1)
+        return max(ms, self.start + hour * HOUR_MS + int(self.rng.random() * HOUR_MS))
+
+
+class SyntheticDatabase:
+    def __init__(self, path, volumes, days=365, seed=None, schema_path=SCHEMA_PATH, now_ms=None):
+        self.path = path
+        self.volumes = volumes
+        self.days = days
+        self.rng = random.Random(seed)
+        self.schema_path = schema_path
+        self.now = now_ms if now_ms is not None else int(time.time() * 1000)
+        self.times = TimeSampler(self.now, days, self.rng)
+        self.counts = {}
+        self.conn = None
+        self._cuid_counter = itertools.count()
+        self._fingerprint = to_base36(self.rng.randrange(36 ** 4), 4)
+        self.user_ids = []
+        self.user_created = []
+        self.user_weights = None
+        self.validator_ids = []
+        self.staff = []
+        self.prizes = []
+
+    def cuid(self, at_ms):
+        """Deterministic, unique id in the shape of Prisma's cuid()"""
+        n = next(self._cuid_counter)
+        return (
+            f"c{base36_8(at_ms)}{base36_8(n)}{self._fingerprint}"
+            f"{BASE36_PAIRS[self.rng.getrandbits(10) % 1296]}{BASE36_PAIRS[n % 1296]}"
+        )
+
+    def fake_ip(self):
+        x = self.rng.getrandbits(24)
+        return f"10.{x >> 16}.{x >> 8 & 255}.{(x & 255) or 1}"
+
+    def create(self, base_db=None):
+        if os.path.exists(self.path):
+            raise FileExistsError(f"{self.path} already exists")
+        with open(self.schema_path, encoding="utf-8") as f:
+            tables, indexes = prisma_ddl(f.read())
+
+        self.conn = sqlite3.connect(self.path, isolation_level=None)
+        for pragma in ("journal_mode = OFF", "synchronous = OFF", "locking_mode = EXCLUSIVE",
+                       "temp_store = MEMORY", "cache_size = -262144"):
+            self.conn.execute(f"PRAGMA {pragma}")
+        for statement in tables:
+            self.conn.execute(statement)
+
+        started = time.perf_counter()
+        if base_db:
+            self.copy_base(base_db)
+        self.load_reference()
+        self.load_users()
+        self.load_visits()
+        self.load_spins()
+        self.load_coupons()
+        self.load_qr_events()
+        self.load_audit()
+        log(f"Loaded {sum(self.counts.values()):,} rows in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        for statement in indexes:
+            self.conn.execute(statement)
+        self.conn.execute("ANALYZE")
+        log(f"Built {len(indexes)} indexes in {time.perf_counter() - started:.1f}s")
+
+        self.conn.execute("PRAGMA journal_mode = DELETE")
+        self.conn.execute("PRAGMA locking_mode = NORMAL")
+        self.conn.close()
+        return self.counts
+
+    def insert(self, table, columns, rows):
+        """Bulk-insert an iterable of row tuples in CHUNK_SIZE transactions"""
+        sql = f'INSERT INTO "{table}" ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+        total = 0
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, CHUNK_SIZE))
+            if not chunk:
+                break
+            self.conn.execute("BEGIN")
+            self.conn.executemany(sql, chunk)
+            self.conn.execute("COMMIT")
+            total += len(chunk)
+        self.counts[table] = self.counts.get(table, 0) + total
+        return total
+
+    def copy_base(self, base_db):
+        """Copy every table the base database shares with the schema, column by column"""
+        self.conn.execute("ATTACH DATABASE ? AS base", (f"file:{base_db}?mode=ro",))
+        try:
+            tables = [r[0] for r in self.conn.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")]
+            for table in tables:
+                if table.startswith("sqlite_"):
+                    continue
+                base_columns = {r[1] for r in self.conn.execute(f'PRAGMA base.table_info("{table}")')}
+                columns = [r[1] for r in self.conn.execute(f'PRAGMA main.table_info("{table}")') if r[1] in base_columns]
+                if not columns:
+                    continue
+                quoted = ", ".join(f'"{c}"' for c in columns)
+                try:
+                    copied = self.conn.execute(
+                        f'INSERT INTO main."{table}" ({quoted}) SELECT {quoted} FROM base."{table}"'
+                    ).rowcount
+                except sqlite3.IntegrityError as e:
+                    log(f"Skipped base rows of {table}: {e}", "WARNING")
+                    continue
+                if copied:
+                    self.counts[table] = copied
+            log(f"Copied base rows from {base_db}: {json.dumps(self.counts, ensure_ascii=False)}")
+        finally:
+            self.conn.execute("DETACH DATABASE base")
+
+    def load_reference(self):
+        """Staff and wheel prizes, unless the base database brought its own"""
+        if not self.conn.execute('SELECT COUNT(*) FROM "Staff"').fetchone()[0]:
+            start = self.now - self.days * DAY_MS
+            self.insert("Staff", ("name", "is_active", "created_at"), [
+                (name, 1, start) for name in STAFF_NAMES
+            ])
+        if not self.conn.execute('SELECT COUNT(*) FROM "WheelPrize"').fetchone()[0]:
+            self.insert("WheelPrize", ("name", "type", "value", "probability", "created_at", "updated_at"), [
+                (name, kind, value, probability, self.now, self.now) for name, kind, value, probability in WHEEL_PRIZES
+            ])
+        self.staff = [r for r in self.conn.execute('SELECT id, name FROM "Staff"')]
+        self.prizes = [r for r in self.conn.execute('SELECT id, name, type, value, probability FROM "WheelPrize" WHERE is_active')]
+
+    def load_users(self):
+        count = self.volumes["users"]
+        # Sign-ups follow the same growth curve as traffic
+        created = sorted(self.times.sample(count))
+        rng = self.rng
+
+        def rows():
+            for i, created_at in enumerate(created):
+                user_id = self.cuid(created_at)
+                role = "admin" if i % 50_000 == 0 else ("staff" if i % 2_000 == 0 else "guest")
+                risk = rng.choice((0, 0, 0, 0, 10, 25)) if rng.random() < 0.97 else rng.randint(60, 100)
+                self.user_ids.append(user_id)
+                self.user_created.append(created_at)
+                if role != "guest":
+                    self.validator_ids.append(user_id)
+                yield (
+                    user_id, f"{rng.choice(FIRST_NAMES)} {i}", f"guest{i:07d}@panda.test", f"+38067{i:07d}",
+                    role, created_at, self.times.hour_after(created_at), int(rng.random() < 0.005), risk,
+                    f"PANDA{to_base36(i, 6).upper()}",
+                )
+
+        self.insert("User", (
+            "id", "name", "email", "phone", "role", "created_at", "last_login", "is_blocked", "risk_score",
+            "referral_code",
+        ), rows())
+        self.validator_ids += [r[0] for r in self.conn.execute(
+            "SELECT id FROM \"User\" WHERE role IN ('staff', 'admin') AND email NOT LIKE '%@panda.test'"
+        )]
+        # A few regulars account for most of the activity (Zipf over a shuffled order)
+        ranks = list(range(1, count + 1))
+        rng.shuffle(ranks)
+        self.user_weights = list(itertools.accumulate(1 / r ** 0.8 for r in ranks))
+        log(f"Users: {count:,} ({len(self.validator_ids)} staff/admin validators)")
+
+    def active_users(self, count):
+        """Indexes of `count` users drawn by activity"""
+        return self.rng.choices(range(len(self.user_ids)), cum_weights=self.user_weights, k=count)
+
+    def load_visits(self):
+        count = self.volumes["visits"]
+        users = self.active_users(count)
+        stamps = self.times.sample(count, after=[self.user_created[u] for u in users])
+        rng = self.rng
+
+        def rows():
+            for n, (u, created_at) in enumerate(zip(users, stamps)):
+                roll = rng.random()
+                status = "confirmed" if roll < 0.8 else ("expired" if roll < 0.95 else "pending")
+                confirmed = status == "confirmed"
+                yield (
+                    self.user_ids[u], f"V{to_base36(n, 7).upper()}", status,
+                    int(rng.lognormvariate(6.6, 0.5)) if confirmed else None,
+                    f"B{n:08d}" if confirmed else None,
+                    rng.choice(self.staff)[1] if confirmed else None,
+                    created_at + rng.randint(60_000, 15 * 60_000) if confirmed else None,
+                    created_at + 15 * 60_000, created_at,
+                )
+
+        self.insert("Visit", (
+            "user_id", "visit_code", "status", "bill_amount", "bill_number", "staff_name", "confirmed_at",
+            "expires_at", "created_at",
+        ), rows())
+        log(f"Visits: {count:,}")
+
+    def load_spins(self):
+        """Spin histories that respect the 7-day cooldown; capped by each user's tenure"""
+        # Regulars can't spin more than once per cooldown, so their surplus goes to other users
+        spins_per_user = {}
+        remaining = self.volumes["spins"]
+        for _ in range(8):
+            if not remaining:
+                break
+            overflow = 0
+            for u in self.active_users(remaining):
+                if spins_per_user.get(u, 0) < (self.now - self.user_created[u]) // SPIN_SLOT_MS:
+                    spins_per_user[u] = spins_per_user.get(u, 0) + 1
+                else:
+                    overflow += 1
+            remaining = overflow
+        rng = self.rng
+
+        def next_spin(spun_at):
+            return self.times.evening_after(spun_at + COOLDOWN_MS + int(rng.expovariate(1 / DAY_MS)))
+
+        histories = {}
+        for u in sorted(spins_per_user):
+            # Early enough in the user's tenure that the whole history fits
+            latest_start = self.now - spins_per_user[u] * SPIN_SLOT_MS
+            spun_at = self.times.evening_after(
+                self.user_created[u] + int(rng.random() * max(0, latest_start - self.user_created[u]))
+            )
+            history = histories[u] = []
+            for _ in range(spins_per_user[u]):
+                if spun_at > self.now:
+                    break
+                history.append(spun_at)
+                spun_at = next_spin(spun_at)
+
+        # Waits longer than the average slot push some histories past now;
+        # users whose cooldown leaves room take the spins that were cut off
+        shortfall = self.volumes["spins"] - sum(map(len, histories.values()))
+        while shortfall > 0:
+            added = 0
+            for u in self.active_users(shortfall):
+                history = histories.setdefault(u, [])
+                spun_at = next_spin(history[-1]) if history else self.times.evening_after(self.user_created[u])
+                if spun_at <= self.now:
+                    history.append(spun_at)
+                    added += 1
+            if not added:
+                break
+            shortfall -= added
+
+        names = [p[1] for p in self.prizes]
+        weights = [p[4] for p in self.prizes]
+        by_name = {p[1]: p for p in self.prizes}
+        self.spin_wins = []
+
+        def rows():
+            for u in sorted(histories):
+                history = histories[u]
+                for spun_at, name in zip(history, rng.choices(names, weights=weights, k=len(history))):
+                    prize = by_name[name]
+                    if prize[2] == "discount" and prize[3]:
+                        self.spin_wins.append((u, prize[3], spun_at))
+                    yield (
+                        self.user_ids[u], prize[0], prize[1], "COMPLETED", spun_at, spun_at + COOLDOWN_MS,
+                        f"fp{rng.getrandbits(48):012x}", self.fake_ip(),
+                    )
+
+        written = self.insert("WheelSpin", (
+            "user_id", "prize_id", "prize_name", "state", "spun_at", "next_allowed_at", "client_fp", "ip",
+        ), rows())
+        if written < self.volumes["spins"]:
+            log(f"Wheel spins: {written:,} of {self.volumes['spins']:,} requested, "
+                f"the cooldown leaves no room for the rest", "WARNING")
+        else:
+            log(f"Wheel spins: {written:,}")
+
+    def load_coupons(self):
+        """Wheel discounts first (as the spin route creates them), then other kinds"""
+        count = self.volumes["coupons"]
+        rng = self.rng
+        wins = self.spin_wins[:count]
+        others = count - len(wins)
+        kinds = [k for k in COUPON_KINDS if k[0] != "wheel_prize"]
+        users = self.active_users(others)
+        stamps = self.times.sample(others, after=[self.user_created[u] for u in users])
+
+        def rows():
+            items = [(u, "wheel_prize", "discount", pct, at) for u, pct, at in wins]
+            drawn = rng.choices(kinds, weights=[k[2] for k in kinds], k=others)
+            for u, at, (kind, kind_type, _) in zip(users, stamps, drawn):
+                items.append((u, kind, kind_type, rng.choice((10, 15, 20)) if kind_type == "discount" else None, at))
+            for n, (u, kind, kind_type, pct, created_at) in enumerate(items):
+                expires_at = created_at + 7 * DAY_MS
+                redeemed = created_at + rng.randint(HOUR_MS, 7 * DAY_MS) if rng.random() < 0.4 else None
+                yield (
+                    self.user_ids[u], kind_type, pct, kind, f"{kind[:5].upper()}{to_base36(n, 8).upper()}",
+                    expires_at, redeemed if redeemed and redeemed < min(expires_at, self.now) else None, created_at,
+                )
+
+        self.insert("Coupon", (
+            "user_id", "type", "value_pct", "kind", "code", "expires_at", "redeemed_at", "created_at",
+        ), rows())
+        log(f"Coupons: {count:,} ({len(wins):,} from wheel discounts)")
+
+    def load_qr_events(self):
+        count = self.volumes["qr_events"]
+        users = self.active_users(count)
+        stamps = self.times.sample(count, after=[self.user_created[u] for u in users])
+        types = [t for t, _ in QR_TYPES]
+        type_weights = [w for _, w in QR_TYPES]
+        errors = [e for e, _ in QR_ERRORS]
+        error_weights = [w for _, w in QR_ERRORS]
+        validators = self.validator_ids or self.user_ids[:1]
+        rng = self.rng
+
+        def rows():
+            drawn = rng.choices(types, weights=type_weights, k=count)
+            for u, issued_at, qr_type in zip(users, stamps, drawn):
+                validated_at = issued_at + int(rng.expovariate(1 / 40_000))
+                success = rng.random() < 0.95
+                yield (
+                    self.cuid(validated_at), qr_type, f"{rng.getrandbits(128):032x}", f"{qr_type} QR",
+                    issued_at, issued_at + 5 * 60_000, self.user_ids[u], rng.choice(validators), validated_at,
+                    int(success), None if success else rng.choices(errors, weights=error_weights)[0],
+                )
+
+        self.insert("QRValidationEvent", (
+            "id", "qr_type", "qr_nonce", "qr_subject", "qr_issued_at", "qr_expires_at", "user_id",
+            "validator_id", "validated_at", "success", "error_message",
+        ), rows())
+        log(f"QR validation events: {count:,}")
+
+    def load_audit(self):
+        count = self.volumes["audit"]
+        users = self.active_users(count)
+        stamps = self.times.sample(count, after=[self.user_created[u] for u in users])
+        actions = [(a, e) for a, e, _ in AUDIT_ACTIONS]
+        action_weights = [w for _, _, w in AUDIT_ACTIONS]
+        rng = self.rng
+
+        def rows():
+            drawn = rng.choices(actions, weights=action_weights, k=count)
+            for u, created_at, (action, entity_type) in zip(users, stamps, drawn):
+                details = {"requestId": f"req-{rng.getrandbits(32):08x}"}
+                if action == "wheel_spin_blocked":
+                    details["reason"] = "cooldown"
+                yield (
+                    self.cuid(created_at), self.user_ids[u], action, entity_type, str(rng.getrandbits(23) + 1),
+                    json.dumps(details), self.fake_ip(),
+                    rng.choice(USER_AGENTS), created_at,
+                )
+
+        self.insert("AuditLog", (
+            "id", "user_id", "action", "entity_type", "entity_id", "details", "ip_address", "user_agent", "created_at",
+        ), rows())
+        log(f"Audit log rows: {count:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a production-sized synthetic PANDA Lounge database")
+    parser.add_argument("output", help="Path of the SQLite database to create (must not exist)")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small", help="Base row volumes")
+    for table in PRESETS["small"]:
+        parser.add_argument(f"--{table.replace('_', '-')}", type=int, help=f"Override the preset's {table} count")
+    parser.add_argument("--days", type=int, default=365, help="Days of history to spread rows over")
+    parser.add_argument("--base-db", default=BASE_DB, help="Copy seed rows (accounts, staff, menu) from this database first")
+    parser.add_argument("--no-base", action="store_true", help="Start from an empty schema")
+    parser.add_argument("--schema", default=SCHEMA_PATH, help="Prisma schema to build tables from")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible databases")
+    parser.add_argument("--now", type=int, default=None, help="End of the history window (Unix ms); defaults to now")
+    args = parser.parse_args()
+
+    volumes = dict(PRESETS[args.preset])
+    for table in volumes:
+        value = getattr(args, table)
+        if value is not None:
+            volumes[table] = value
+    if volumes["users"] < 1:
+        parser.error("at least one user is required")
+
+    base_db = None if args.no_base else args.base_db
+    if base_db and not os.path.exists(base_db):
+        log(f"Base database {base_db} not found; starting from an empty schema", "WARNING")
+        base_db = None
+
+    log(f"🐼 Generating {args.output}: {json.dumps(volumes)} over {args.days} days")
+    started = time.perf_counter()
+    database = SyntheticDatabase(args.output, volumes, args.days, args.seed, args.schema, args.now)
+    counts = database.create(base_db)
+    size_mb = os.path.getsize(args.output) / 1024 / 1024
+    log("\n" + "="*60)
+    for table, rows in sorted(counts.items()):
+        log(f"{table}: {rows:,}")
+    log(f"✅ {sum(counts.values()):,} rows, {size_mb:,.1f} MB in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Production Traffic Replay
+Replays a time window of real traffic from a database snapshot against a
+running app, at 1x, 10x or 100x speed:
+- AuditLog wheel_spin_success / wheel_spin_blocked rows become POST
+  /api/wheel/spin, each preceded by --status-polls GET /api/wheel/status
+  (status polls are only debug-logged, so the wheel page's poll before the
+  spin button enables is reconstructed)
+- QRValidationEvent rows become POST /api/qr/generate at qr_issued_at (the
+  owner) and POST /api/qr/validate at validated_at (staff); failed
+  validations send a token with a bad signature
+- requests are fired open-loop at their scheduled offset / speed, so the
+  original concurrency is preserved instead of being throttled by the
+  responses (async_client.py keeps thousands in flight)
+- original users map onto registered replay users; --db resets their wheel
+  cooldowns on the target first, then users whose first spin in the window
+  was blocked get one untimed spin so the replay starts from the same state
+
+Per action the report compares the original run (count, peak rate, outcome
+mix) with the replay (status mix, p50/p95/p99 latency, schedule lag), and
+with the latencies of an earlier replay report given to --compare.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import rate_limits
+from async_client import AsyncAPIClient
+from backend_test import BASE_URL, TEST_USERS
+from event_recorder import get_recorder
+from server_timing import PhaseProfile, percentile
+from session_pool import SessionPool
+from synthetic_db import BASE_DB
+
+# Configuration
+REPLAY_EMAIL_DOMAIN = "replay.panda.test"
+REPLAY_PASSWORD = "replay123"
+STATUS_POLL_LEAD_MS = 3000
+START_LEAD_S = 1.0  # sessions and tokens ready before the first scheduled request
+MAX_IN_FLIGHT = 2000
+INVALID_TOKEN = "eyJyZXBsYXkiOnRydWV9.invalid-signature"
+
+SPIN_OUTCOMES = {"wheel_spin_success": "success", "wheel_spin_blocked": "blocked"}
+ACTIONS = {
+    "wheel_status": ("GET", "/api/wheel/status"),
+    "wheel_spin": ("POST", "/api/wheel/spin"),
+    "qr_generate": ("POST", "/api/qr/generate"),
+    "qr_validate": ("POST", "/api/qr/validate"),
+}
+# Replay response status -> outcome in the original tables' terms
+STATUS_OUTCOMES = {
+    "wheel_status": {200: "ok"},
+    "wheel_spin": {200: "success", 429: "blocked"},
+    "qr_generate": {200: "ok"},
+    "qr_validate": {200: "valid", 400: "invalid"},
+}
+
+
+class ReplayRequest:
+    __slots__ = ("offset_ms", "action", "user", "ref", "expect", "qr_type")
+
+    def __init__(self, offset_ms, action, user, ref=None, expect=None, qr_type=None):
+        self.offset_ms = offset_ms
+        self.action = action
+        self.user = user          # original user id, or "staff" for validations
+        self.ref = ref            # QR nonce linking a generate to its validation
+        self.expect = expect      # outcome in the original run
+        self.qr_type = qr_type
+
+
+def parse_local(value):
+    """ISO local date/time -> epoch ms (the tables store DateTime as epoch ms)"""
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+
+def fmt_ms(epoch_ms):
+    return datetime.fromtimestamp(epoch_ms / 1000).strftime("%Y-%m-%d %H:%M")
+
+
+class TrafficExtractor:
+    """Reads a window of AuditLog/QRValidationEvent rows into a request schedule"""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        self.tables = {name for (name,) in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    def close(self):
+        self.conn.close()
+
+    def timestamps(self):
+        """Every replayable event time, for finding the busiest window"""
+        queries = []
+        if "AuditLog" in self.tables:
+            queries.append(
+                f'SELECT created_at FROM "AuditLog" WHERE action IN ({",".join("?" * len(SPIN_OUTCOMES))})'
+            )
+        if "QRValidationEvent" in self.tables:
+            queries.append('SELECT validated_at FROM "QRValidationEvent"')
+        if not queries:
+            return []
+        params = list(SPIN_OUTCOMES) if "AuditLog" in self.tables else []
+        return [row[0] for row in self.conn.execute(" UNION ALL ".join(queries), params)]
+
+    def busiest_window(self, minutes, days=7):
+        """Start of the busiest minutes-long window (on a minutes grid) in the last `days` of data"""
+        stamps = self.timestamps()
+        if not stamps:
+            return None
+        width = minutes * 60_000
+        since = max(stamps) - days * 24 * 60 * 60 * 1000
+        buckets = {}
+        for stamp in stamps:
+            if stamp >= since:
+                buckets[stamp // width] = buckets.get(stamp // width, 0) + 1
+        return max(buckets, key=lambda b: (buckets[b], b)) * width
+
+    def schedule(self, start_ms, end_ms, status_polls=1):
+        """Requests in [start_ms, end_ms) sorted by offset, plus the tokens needed before the window"""
+        requests = []
+        if "AuditLog" in self.tables:
+            rows = self.conn.execute(
+                f'SELECT user_id, action, created_at FROM "AuditLog" '
+                f'WHERE created_at >= ? AND created_at < ? AND action IN ({",".join("?" * len(SPIN_OUTCOMES))})',
+                (start_ms, end_ms, *SPIN_OUTCOMES),
+            )
+            for user_id, action, created_at in rows:
+                offset = created_at - start_ms
+                for poll in range(status_polls, 0, -1):
+                    poll_offset = offset - poll * STATUS_POLL_LEAD_MS
+                    if poll_offset >= 0:
+                        requests.append(ReplayRequest(poll_offset, "wheel_status", user_id))
+                requests.append(ReplayRequest(offset, "wheel_spin", user_id, expect=SPIN_OUTCOMES[action]))
+
+        early_tokens = []
+        if "QRValidationEvent" in self.tables:
+            rows = self.conn.execute(
+                'SELECT qr_nonce, qr_type, user_id, qr_issued_at, validated_at, success FROM "QRValidationEvent" '
+                'WHERE (validated_at >= ? AND validated_at < ?) OR (qr_issued_at >= ? AND qr_issued_at < ?)',
+                (start_ms, end_ms, start_ms, end_ms),
+            )
+            for nonce, qr_type, user_id, issued_at, validated_at, success in rows:
+                issued_in = start_ms <= issued_at < end_ms
+                validated_in = start_ms <= validated_at < end_ms
+                if issued_in:
+                    requests.append(ReplayRequest(issued_at - start_ms, "qr_generate", user_id, nonce, "ok", qr_type))
+                if validated_in:
+                    expect = "valid" if success else "invalid"
+                    requests.append(ReplayRequest(validated_at - start_ms, "qr_validate", "staff", nonce, expect, qr_type))
+                    if success and not issued_in:
+                        early_tokens.append(ReplayRequest(0, "qr_generate", user_id, nonce, "ok", qr_type))
+
+        requests.sort(key=lambda r: r.offset_ms)
+        return requests, early_tokens
+
+
+def original_summary(schedule, window_ms):
+    """Per action: count, outcome mix and peak requests/s of the original timeline"""
+    summary = {}
+    for request in schedule:
+        entry = summary.setdefault(request.action, {"count": 0, "outcomes": {}, "per_second": {}})
+        entry["count"] += 1
+        if request.expect:
+            entry["outcomes"][request.expect] = entry["outcomes"].get(request.expect, 0) + 1
+        second = request.offset_ms // 1000
+        entry["per_second"][second] = entry["per_second"].get(second, 0) + 1
+    for entry in summary.values():
+        per_second = entry.pop("per_second")
+        entry["peak_per_s"] = max(per_second.values())
+        entry["mean_per_min"] = round(entry["count"] / (window_ms / 60_000), 2)
+    return summary
+
+
+class TrafficReplayer:
+    def __init__(self, schedule, early_tokens, window_ms, speed=1.0, users=100, db_path=None,
+                 max_in_flight=MAX_IN_FLIGHT):
+        self.schedule = schedule
+        self.early_tokens = early_tokens
+        self.window_ms = window_ms
+        self.speed = speed
+        self.db_path = db_path
+        self.max_in_flight = max_in_flight
+        self.users = {
+            f"replay_{i}": {"email": f"replay{i}@{REPLAY_EMAIL_DOMAIN}", "password": REPLAY_PASSWORD}
+            for i in range(users)
+        }
+        self.pool = SessionPool({**self.users, "staff": TEST_USERS["staff"], "admin": TEST_USERS["admin"]}, BASE_URL, headers={
+            'Content-Type': 'application/json',
+            'User-Agent': 'Traffic-Replay/1.0'
+        })
+        self.user_map = {}
+        self.sessions = {}
+        self.tokens = {}
+        self.results = {action: {"latencies": [], "lags": [], "statuses": {}, "outcomes": {}, "matched": 0, "errors": 0}
+                        for action in ACTIONS}
+        self.phases = PhaseProfile()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def log(self, message, level="INFO"):
+        """Record a test event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="traffic_replay")
+
+    def map_users(self):
+        """Original user ids -> replay users, round robin in order of first appearance"""
+        keys = list(self.users)
+        for request in self.schedule + self.early_tokens:
+            if request.user == "staff" or request.user in self.user_map:
+                continue
+            if request.qr_type == "staff_check":
+                # only admins can generate staff_check codes
+                self.user_map[request.user] = "admin"
+                continue
+            self.user_map[request.user] = keys[len(self.user_map) % len(keys)]
+
+    def prepare_users(self):
+        """Register the replay users (idempotent) and reset their cooldowns when --db is given"""
+        self.map_users()
+        used = sorted(set(self.user_map.values()) - {"admin"})
+        session = self.pool.session()
+        try:
+            for key in used:
+                user = self.users[key]
+                response = session.post(f"{BASE_URL}/api/auth/register", json={
+                    "name": f"Replay {key}",
+                    "email": user["email"],
+                    "password": user["password"]
+                })
+                if response.status_code not in (201, 409):
+                    self.log(f"Failed to register {user['email']}: {response.status_code}", "ERROR")
+                    return False
+        finally:
+            session.close()
+
+        if self.db_path:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                with conn:
+                    conn.execute(
+                        'DELETE FROM "WheelSpin" WHERE user_id IN (SELECT id FROM "User" WHERE email LIKE ?)',
+                        (f"%@{REPLAY_EMAIL_DOMAIN}",)
+                    )
+            finally:
+                conn.close()
+            self.log("Reset the replay users' wheel cooldowns")
+        self.log(f"Mapped {len(self.user_map)} original users onto {len(used)} replay users")
+        return True
+
+    async def open_sessions(self, client):
+        for key in sorted(set(self.user_map.values()) | {"staff"}):
+            session = await client.session(key)
+            if session is None:
+                self.log(f"Cannot log in as {key}", "ERROR")
+                return False
+            self.sessions[key] = session
+        return True
+
+    def qr_body(self, request):
+        # Tokens must outlive the slowest path from generation to validation in the replay
+        ttl_minutes = int(self.window_ms / 60_000 / self.speed) + 10
+        return {"type": request.qr_type or "visit", "subject": "traffic replay", "ttlMinutes": ttl_minutes}
+
+    async def generate_early_tokens(self, client):
+        """Tokens for validations whose QR was issued before the window (not timed)"""
+        async def generate(i):
+            request = self.early_tokens[i]
+            http = self.sessions[self.user_map[request.user]]
+            try:
+                response = await http.post(f"{BASE_URL}/api/qr/generate", json=self.qr_body(request))
+            except Exception as e:
+                response = None
+                self.log(f"Token generation failed: {e!r}", "ERROR")
+            future = self.tokens.setdefault(request.ref, asyncio.get_running_loop().create_future())
+            future.set_result(response.json().get("token") if response is not None and response.status_code == 200 else None)
+
+        await client.fan_out(len(self.early_tokens), generate)
+
+    async def prime_cooldowns(self, client):
+        """One untimed spin for every user whose first spin in the window was blocked,
+        so the cooldown they had from before the window is in place again"""
+        first = {}
+        for request in self.schedule:
+            if request.action == "wheel_spin":
+                first.setdefault(self.user_map[request.user], request.expect)
+        blocked = [key for key, expect in first.items() if expect == "blocked"]
+        if not blocked:
+            return
+        self.log(f"Priming the cooldown of {len(blocked)} users blocked at the start of the window")
+
+        async def spin(i):
+            try:
+                await self.sessions[blocked[i]].post(f"{BASE_URL}/api/wheel/spin", json={})
+            except Exception as e:
+                self.log(f"Priming spin failed: {e!r}", "ERROR")
+
+        await client.fan_out(len(blocked), spin)
+
+    async def fire(self, client, request, due):
+        loop = asyncio.get_running_loop()
+        lag_ms = (loop.time() - due) * 1000
+        method, path = ACTIONS[request.action]
+        user_key = "staff" if request.user == "staff" else self.user_map[request.user]
+        http = self.sessions[user_key]
+
+        body = None
+        token_future = None
+        if request.action == "qr_generate":
+            body = self.qr_body(request)
+            token_future = self.tokens.setdefault(request.ref, loop.create_future())
+        elif request.action == "qr_validate":
+            token = INVALID_TOKEN
+            if request.expect == "valid":
+                # wait for the generate scheduled before it if that is still in flight
+                token = await self.tokens.setdefault(request.ref, loop.create_future()) or INVALID_TOKEN
+            body = {"token": token}
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await (http.post(f"{BASE_URL}{path}", json=body) if method == "POST" else http.get(f"{BASE_URL}{path}"))
+        except Exception as e:
+            response = None
+            self.log(f"{request.action}: request error: {e!r}", "ERROR")
+        finally:
+            self.in_flight -= 1
+
+        if token_future is not None and not token_future.done():
+            ok = response is not None and response.status_code == 200
+            token_future.set_result(response.json().get("token") if ok else None)
+
+        result = self.results[request.action]
+        result["lags"].append(max(0.0, lag_ms))
+        if response is None:
+            result["errors"] += 1
+            return
+        result["latencies"].append(response.elapsed * 1000)
+        result["statuses"][response.status_code] = result["statuses"].get(response.status_code, 0) + 1
+        outcome = STATUS_OUTCOMES[request.action].get(response.status_code)
+        if outcome is None:
+            result["errors"] += 1
+            outcome = f"status_{response.status_code}"
+        result["outcomes"][outcome] = result["outcomes"].get(outcome, 0) + 1
+        if request.expect in (None, outcome):
+            result["matched"] += 1
+        self.phases.add_response(method, path, response)
+
+    async def replay(self):
+        async with AsyncAPIClient(self.pool, BASE_URL, source="replay", max_in_flight=self.max_in_flight) as client:
+            if not await self.open_sessions(client):
+                return False
+            await self.prime_cooldowns(client)
+            if self.early_tokens:
+                self.log(f"Generating {len(self.early_tokens)} QR tokens issued before the window")
+                await self.generate_early_tokens(client)
+
+            loop = asyncio.get_running_loop()
+            start = loop.time() + START_LEAD_S
+            tasks = []
+            for request in self.schedule:
+                due = start + request.offset_ms / 1000 / self.speed
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self.fire(client, request, due)))
+            await asyncio.gather(*tasks)
+            self.log(f"Connections: {client.http.pool.opened} opened, {client.http.pool.reused} reused")
+        return True
+
+    def report(self, original, baseline=None):
+        """Per action comparison of the original run, this replay and an earlier replay"""
+        actions = {}
+        for action, result in self.results.items():
+            if action not in original:
+                continue
+            latencies = sorted(result["latencies"])
+            lags = sorted(result["lags"])
+            count = len(result["lags"])
+            entry = {
+                "original": original[action],
+                "replay": {
+                    "count": count,
+                    "errors": result["errors"],
+                    "status_codes": {str(k): v for k, v in sorted(result["statuses"].items())},
+                    "outcomes": result["outcomes"],
+                    "outcome_match_pct": round(100 * result["matched"] / count, 1) if count else 0.0,
+                    "p50_ms": round(percentile(latencies, 50), 2),
+                    "p95_ms": round(percentile(latencies, 95), 2),
+                    "p99_ms": round(percentile(latencies, 99), 2),
+                    "lag_p95_ms": round(percentile(lags, 95), 2),
+                },
+            }
+            previous = (baseline or {}).get("actions", {}).get(action)
+            if previous and previous["replay"]["p95_ms"]:
+                entry["vs_compare"] = {
+                    "speed": baseline.get("speed"),
+                    "p50_ratio": round(entry["replay"]["p50_ms"] / max(previous["replay"]["p50_ms"], 1e-9), 3),
+                    "p95_ratio": round(entry["replay"]["p95_ms"] / previous["replay"]["p95_ms"], 3),
+                }
+            actions[action] = entry
+        return actions
+
+
+def print_report(replayer, actions, window, speed):
+    replayer.log("\n" + "="*60)
+    replayer.log(f"🎬 REPLAY REPORT ({fmt_ms(window[0])} - {fmt_ms(window[1])}, {speed:g}x)")
+    replayer.log("="*60)
+    for action, entry in actions.items():
+        original, replay = entry["original"], entry["replay"]
+        mix = lambda outcomes: ", ".join(f"{k} {v}" for k, v in sorted(outcomes.items())) or "-"
+        marker = "✅" if not replay["errors"] else "❌"
+        replayer.log(f"{marker} {action}")
+        replayer.log(f"    original: {original['count']} requests | peak {original['peak_per_s']}/s "
+                     f"(x{speed:g} = {original['peak_per_s'] * speed:g}/s) | {mix(original['outcomes'])}")
+        replayer.log(f"    replay:   {replay['count']} requests | {mix(replay['outcomes'])} | "
+                     f"match {replay['outcome_match_pct']}% | errors {replay['errors']}")
+        line = (f"    latency:  p50 {replay['p50_ms']}ms | p95 {replay['p95_ms']}ms | p99 {replay['p99_ms']}ms | "
+                f"schedule lag p95 {replay['lag_p95_ms']}ms")
+        if "vs_compare" in entry:
+            line += f" | p95 x{entry['vs_compare']['p95_ratio']} vs {entry['vs_compare']['speed']:g}x run"
+        replayer.log(line)
+    replayer.log(f"Peak in flight: {replayer.peak_in_flight}")
+
+
+def main():
+    global BASE_URL
+    parser = argparse.ArgumentParser(description="Replay a window of production traffic from AuditLog/QRValidationEvent")
+    parser.add_argument("--source", default=BASE_DB, help="Database snapshot to extract the traffic from")
+    parser.add_argument("--start", help="Window start, local ISO time (default: busiest window of the last 7 days)")
+    parser.add_argument("--minutes", type=int, default=60, help="Window length")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor (1, 10, 100, ...)")
+    parser.add_argument("--status-polls", type=int, default=1, help="Wheel status polls replayed before each spin")
+    parser.add_argument("--users", type=int, default=100, help="Replay users the original users are mapped onto")
+    parser.add_argument("--db", help="SQLite database of the target app (resets the replay users' cooldowns)")
+    parser.add_argument("--base-url", default=BASE_URL, help="App under test")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT, help="Cap on concurrent requests")
+    parser.add_argument("--compare", help="Earlier replay report (JSON) to compare latencies with")
+    parser.add_argument("--dry-run", action="store_true", help="Print the extracted schedule summary only")
+    parser.add_argument("--report", help="Write the replay report as JSON to this path")
+    args = parser.parse_args()
+
+    BASE_URL = args.base_url.rstrip("/")
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    extractor = TrafficExtractor(args.source)
+    try:
+        if not {"AuditLog", "QRValidationEvent"} & extractor.tables:
+            get_recorder().record("ERROR", f"❌ {args.source} has neither an AuditLog nor a QRValidationEvent table",
+                                  source="traffic_replay")
+            sys.exit(1)
+        start_ms = parse_local(args.start) if args.start else extractor.busiest_window(args.minutes)
+        if start_ms is None:
+            get_recorder().record("ERROR", f"❌ No replayable traffic in {args.source}", source="traffic_replay")
+            sys.exit(1)
+        end_ms = start_ms + args.minutes * 60_000
+        schedule, early_tokens = extractor.schedule(start_ms, end_ms, args.status_polls)
+    finally:
+        extractor.close()
+
+    window_ms = end_ms - start_ms
+    original = original_summary(schedule, window_ms)
+    replayer = TrafficReplayer(schedule, early_tokens, window_ms, args.speed, args.users, args.db, args.max_in_flight)
+    replayer.log("🎬 Starting Production Traffic Replay")
+    replayer.log(f"Source: {args.source} | Window: {fmt_ms(start_ms)} - {fmt_ms(end_ms)} | "
+                 f"Speed: {args.speed:g}x ({window_ms / 1000 / args.speed:.1f}s) | Target: {BASE_URL}")
+    for action, entry in original.items():
+        replayer.log(f"  {action}: {entry['count']} requests, peak {entry['peak_per_s']}/s, {entry['outcomes'] or '-'}")
+    if not schedule:
+        replayer.log("Nothing to replay in this window", "ERROR")
+        sys.exit(1)
+    if args.dry_run:
+        sys.exit(0)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    if not replayer.prepare_users():
+        sys.exit(1)
+    started = time.perf_counter()
+    try:
+        # Many original users share each replay user (and every request one IP)
+        with rate_limits.bypassed(replayer.pool.user_ids(), source="traffic_replay"):
+            completed = asyncio.run(replayer.replay())
+    except KeyboardInterrupt:
+        print("\n⚠️ Replay interrupted by user")
+        sys.exit(1)
+    if not completed:
+        sys.exit(1)
+    replayer.log(f"Replayed {len(schedule)} requests in {time.perf_counter() - started:.1f}s")
+
+    actions = replayer.report(original, baseline)
+    print_report(replayer, actions, (start_ms, end_ms), args.speed)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({
+                "source": os.path.abspath(args.source),
+                "window": {"start": fmt_ms(start_ms), "end": fmt_ms(end_ms)},
+                "speed": args.speed,
+                "peak_in_flight": replayer.peak_in_flight,
+                "actions": actions,
+                "server_timing": replayer.phases.summary(),
+            }, f, indent=2, ensure_ascii=False)
+        replayer.log(f"Report written to {args.report}")
+
+    passed = all(not entry["replay"]["errors"] for entry in actions.values())
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,17 +8,19 @@ import requests
 import json
 from datetime import datetime
 
+from event_recorder import get_recorder
+
 BASE_URL = "http://localhost:3000"
 
 class WheelAPIAssessment:
     def __init__(self):
         self.session = requests.Session()
         self.findings = []
+        self.recorder = get_recorder()
         
     def log_finding(self, category, status, message, details=None):
-        """Log a finding with timestamp"""
+        """Record a finding (printed in verbose mode)"""
         finding = {
-            'timestamp': datetime.now().strftime("%H:%M:%S"),
             'category': category,
             'status': status,  # 'PASS', 'FAIL', 'WARNING', 'INFO'
             'message': message,
@@ -33,10 +35,12 @@ class WheelAPIAssessment:
             'INFO': 'ℹ️'
         }
         
-        print(f"[{finding['timestamp']}] {status_icon.get(status, '•')} {category}: {message}")
-        if details:
-            for key, value in details.items():
-                print(f"    {key}: {value}")
+        echo = None
+        if self.recorder.mode == "verbose":
+            lines = [f"[{self.recorder.clock()}] {status_icon.get(status, '•')} {category}: {message}"]
+            lines.extend(f"    {key}: {value}" for key, value in (details or {}).items())
+            echo = "\n".join(lines)
+        self.recorder.record(status, message, source="assessment", echo=echo, category=category, details=details)
     
     def test_endpoint_existence(self):
         """Test if wheel API endpoints exist and respond"""
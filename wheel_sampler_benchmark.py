@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Wheel Prize Sampler Benchmark
+Checks fairness and throughput of the alias-method sampler in backend/
+against the weighted linear scan used by /api/wheel/spin:
+- chi-square goodness of fit over millions of vectorised NumPy draws, with
+  and without a capped prize (re-picked uniformly, as the route does)
+- single-draw throughput of the alias table vs the linear scan
+- period caps (max_per_period) are never exceeded
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from event_recorder import get_recorder
+from wheel_sampler import WheelSampler, is_available
+
+# Configuration
+DB_PATH = "/app/prisma/dev.db"
+
+# Seed prizes (see WheelAPIAssessment.test_database_setup)
+SEED_PRIZES = [
+    {"id": 1, "name": "🎁 Безкоштовний кальян", "type": "free_item", "value": None, "probability": 5},
+    {"id": 2, "name": "💰 Знижка 20%", "type": "discount", "value": 20, "probability": 15},
+    {"id": 3, "name": "💎 Бонус 50 балів", "type": "points", "value": 50, "probability": 25},
+    {"id": 4, "name": "🍹 Безкоштовний напій", "type": "free_item", "value": None, "probability": 15},
+    {"id": 5, "name": "💰 Знижка 10%", "type": "discount", "value": 10, "probability": 30},
+    {"id": 6, "name": "🎟️ Спробуй ще раз", "type": "points", "value": 0, "probability": 10},
+]
+
+
+def chi2_sf(x, dof):
+    """Survival function of the chi-square distribution (upper tail p-value)"""
+    if x <= 0:
+        return 1.0
+    a, z = dof / 2.0, x / 2.0
+    log_prefix = a * math.log(z) - z - math.lgamma(a)
+
+    if z < a + 1:
+        # Series for the regularized lower incomplete gamma P(a, z)
+        term = total = 1.0 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= z / n
+            total += term
+        return max(0.0, 1.0 - math.exp(log_prefix) * total)
+
+    # Continued fraction for the regularized upper incomplete gamma Q(a, z)
+    tiny = 1e-300
+    b = z + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 10000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(log_prefix) * h
+
+
+class WheelSamplerBenchmark:
+    def __init__(self, sampler, draws=5_000_000, batch_size=1_000_000, alpha=0.001, seed=None):
+        self.sampler = sampler
+        self.draws = draws
+        self.batch_size = batch_size
+        self.alpha = alpha
+        self.rng = np.random.default_rng(seed)
+        self.results = {}
+
+    def log(self, message, level="INFO"):
+        """Record a benchmark event (printed in verbose mode)"""
+        get_recorder().record(level, message, source="wheel_sampler_benchmark")
+
+    def alias_batch(self, size, prob, alias):
+        """Vectorised alias-method draws (indices into the drawable prizes)"""
+        columns = self.rng.integers(0, len(prob), size=size)
+        coins = self.rng.random(size) < prob[columns]
+        return np.where(coins, columns, alias[columns])
+
+    def linear_scan_batch(self, size, weights):
+        """Vectorised equivalent of the spin route's cumulative-weight scan"""
+        cumulative = np.cumsum(weights)
+        return np.searchsorted(cumulative, self.rng.random(size) * cumulative[-1], side="left")
+
+    def route_rules(self, indices):
+        """Prize ids for weighted picks, re-picking capped prizes as the route does"""
+        ids = self.sampler.table()[0]
+        picked = np.array(ids)[indices]
+        capped = np.array([not is_available(self.sampler.prizes[i]) for i in ids])[indices]
+        if capped.any():
+            available = np.array(self.sampler.available() or self.sampler.active()[:1])
+            picked[capped] = available[self.rng.integers(0, len(available), size=int(capped.sum()))]
+        return picked
+
+    def goodness_of_fit(self, name, draw_batch):
+        """Draw self.draws prizes in batches and run a chi-square test"""
+        expected = {i: p for i, p in self.sampler.expected_distribution().items() if p > 0}
+        ids = sorted(expected)
+        labels = np.array(ids)
+        counts = np.zeros(len(ids), dtype=np.int64)
+
+        started = time.perf_counter()
+        remaining = self.draws
+        while remaining > 0:
+            size = min(self.batch_size, remaining)
+            picked = self.route_rules(draw_batch(size))
+            counts += np.bincount(np.searchsorted(labels, picked), minlength=len(ids))
+            remaining -= size
+        elapsed = time.perf_counter() - started
+
+        expected_counts = np.array([expected[i] * self.draws for i in ids])
+        statistic = float(((counts - expected_counts) ** 2 / expected_counts).sum())
+        p_value = chi2_sf(statistic, len(ids) - 1)
+        passed = p_value >= self.alpha
+
+        self.log(f"{name}: {self.draws:,} draws in {elapsed:.2f}s ({self.draws / elapsed / 1e6:.1f}M draws/s)")
+        for prize_id, count, exp in zip(ids, counts, expected_counts):
+            prize = self.sampler.prizes[prize_id]
+            self.log(f"    {prize['name']:<24} observed {count / self.draws:7.4%}  expected {exp / self.draws:7.4%}")
+        self.log(
+            f"{'✅' if passed else '❌'} chi2 = {statistic:.2f} (dof {len(ids) - 1}), p = {p_value:.4f}",
+            "INFO" if passed else "ERROR"
+        )
+
+        self.results[name] = {
+            "draws": self.draws,
+            "seconds": round(elapsed, 3),
+            "draws_per_second": round(self.draws / elapsed),
+            "chi2": round(statistic, 3),
+            "p_value": round(p_value, 6),
+            "passed": passed,
+        }
+        return passed
+
+    def single_draw_throughput(self, iterations=500_000):
+        """Per-call throughput of sampler.draw() vs a Python linear scan"""
+        active = [self.sampler.prizes[i] for i in self.sampler.active()]
+        rng = random.Random(0)
+
+        def linear_scan():
+            total = sum(p["probability"] for p in active)
+            r = rng.random() * total
+            selected = active[0]
+            for prize in active:
+                r -= prize["probability"]
+                if r <= 0:
+                    selected = prize
+                    break
+            if not is_available(selected):
+                available = [p for p in active if is_available(p)]
+                selected = available[int(rng.random() * len(available))] if available else active[0]
+            return selected
+
+        timings = {}
+        for name, draw in (("alias_draw", self.sampler.draw), ("linear_scan_draw", linear_scan)):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                draw()
+            elapsed = time.perf_counter() - started
+            timings[name] = {
+                "iterations": iterations,
+                "ns_per_draw": round(elapsed / iterations * 1e9),
+                "draws_per_second": round(iterations / elapsed),
+            }
+            self.log(f"{name}: {timings[name]['ns_per_draw']} ns/draw ({timings[name]['draws_per_second']:,} draws/s)")
+
+        self.results["single_draw"] = timings
+
+    def cap_enforcement(self, cap=100, spins=20_000):
+        """A capped prize must stop being drawn once it reaches its cap"""
+        prize_id = self.sampler.table()[0][0]
+        original = dict(self.sampler.prizes[prize_id])
+        self.sampler.update_prize(prize_id, max_per_period=cap, current_count=0)
+
+        wins = 0
+        for _ in range(spins):
+            prize = self.sampler.draw()
+            if prize is None:
+                break
+            self.sampler.record_win(prize["id"])
+            if prize["id"] == prize_id:
+                wins += 1
+
+        passed = wins <= cap
+        self.log(
+            f"{'✅' if passed else '❌'} Capped prize won {wins} times (cap {cap}) over {spins:,} spins",
+            "INFO" if passed else "ERROR"
+        )
+        self.sampler.update_prize(prize_id, **{k: original[k] for k in ("max_per_period", "current_count")})
+        self.sampler.reset_period()
+        self.results["cap_enforcement"] = {"cap": cap, "wins": wins, "spins": spins, "passed": passed}
+        return passed
+
+    def run(self):
+        self.log("🎡 Starting Wheel Sampler Benchmark")
+        ids, prob, alias = self.sampler.table()
+        self.log(f"Drawable prizes: {len(ids)} | Draws per test: {self.draws:,} | alpha: {self.alpha}")
+        if not ids:
+            self.log("No drawable prizes", "ERROR")
+            return False
+
+        prob, alias = np.array(prob), np.array(alias)
+        weights = np.array([self.sampler.prizes[i]["probability"] for i in ids], dtype=np.float64)
+
+        self.log("\n" + "="*60)
+        alias_ok = self.goodness_of_fit("alias_numpy", lambda size: self.alias_batch(size, prob, alias))
+        self.log("\n" + "="*60)
+        scan_ok = self.goodness_of_fit("linear_scan_numpy", lambda size: self.linear_scan_batch(size, weights))
+        self.log("\n" + "="*60)
+        capped_ok = self.capped_goodness_of_fit(prob, alias)
+        self.log("\n" + "="*60)
+        self.single_draw_throughput()
+        self.log("\n" + "="*60)
+        cap_ok = self.cap_enforcement()
+
+        return alias_ok and scan_ok and capped_ok and cap_ok
+
+    def capped_goodness_of_fit(self, prob, alias):
+        """Fairness once the most likely prize hits its cap and picks fall through"""
+        prize_id = max(self.sampler.table()[0], key=lambda i: self.sampler.prizes[i]["probability"])
+        original = dict(self.sampler.prizes[prize_id])
+        self.sampler.update_prize(prize_id, max_per_period=1, current_count=1)
+        try:
+            self.log(f"Capped: {original['name']}")
+            return self.goodness_of_fit("alias_numpy_capped", lambda size: self.alias_batch(size, prob, alias))
+        finally:
+            self.sampler.update_prize(prize_id, **{k: original[k] for k in ("max_per_period", "current_count")})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wheel prize sampler fairness and throughput benchmark")
+    parser.add_argument("--db", help=f"Load prizes from this database (e.g. {DB_PATH}); defaults to the seed prizes")
+    parser.add_argument("--draws", type=int, default=5_000_000, help="Draws per chi-square test")
+    parser.add_argument("--batch-size", type=int, default=1_000_000, help="Draws per vectorised batch")
+    parser.add_argument("--alpha", type=float, default=0.001, help="Significance level of the chi-square test")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+    parser.add_argument("--report", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    sampler = WheelSampler(args.db, rng=random.Random(args.seed))
+    if args.db:
+        sampler.load()
+    else:
+        sampler.load([dict(p, is_active=True, max_per_period=None, current_count=0) for p in SEED_PRIZES])
+
+    benchmark = WheelSamplerBenchmark(sampler, args.draws, args.batch_size, args.alpha, args.seed)
+    passed = benchmark.run()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(benchmark.results, f, indent=2)
+        benchmark.log(f"Report written to {args.report}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
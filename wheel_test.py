@@ -7,14 +7,30 @@ Tests the new wheel API endpoints with FSM and server-side validation
 """
 
 import requests
+import argparse
+import asyncio
 import json
+import math
+import os
+import sqlite3
 import time
 import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import sys
 
+import rate_limits
+from async_client import AsyncAPIClient
+from event_recorder import configure, get_recorder
+from session_pool import SessionPool
+from server_timing import timing_fields
+
 # Configuration
 BASE_URL = "http://localhost:3000"
+DB_PATH = "/app/prisma/dev.db"
+# Backend service the app points BACKEND_URL at (its caches are told about deleted spins)
+BACKEND_URL = os.environ.get("BACKEND_URL", "")
+BACKEND_SERVICE_KEY = os.environ.get("BACKEND_SERVICE_KEY", "")
 
 # Test users from the request
 TEST_USERS = {
@@ -22,97 +38,34 @@ TEST_USERS = {
     "admin": {"email": "admin@panda.com", "password": "admin123"}
 }
 
+# Dedicated users for the stress mode (registered on demand)
+STRESS_EMAIL_DOMAIN = "stress.panda.test"
+STRESS_PASSWORD = "stress123"
+
 class WheelTester:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
+    def __init__(self, pool=None, race_requests=2):
+        self.race_requests = race_requests
+        self.pool = pool or SessionPool(TEST_USERS, BASE_URL, headers={
             'Content-Type': 'application/json',
             'User-Agent': 'Wheel-Tester/2.1'
         })
+        self.session = self.pool.session()
+        self.recorder = get_recorder()
         
-    def log(self, message, level="INFO"):
-        """Log test messages with timestamp"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        print(f"[{timestamp}] {level}: {message}")
+    def log(self, message, level="INFO", **fields):
+        """Record a test event (printed in verbose mode)"""
+        self.recorder.record(level, message, source="wheel", **fields)
         
     def authenticate_user(self, user_key):
-        """Authenticate user via NextAuth and get session cookies"""
-        user = TEST_USERS[user_key]
-        self.log(f"Authenticating user: {user['email']}")
-        
-        try:
-            # Step 1: Get CSRF token
-            csrf_response = self.session.get(f"{BASE_URL}/api/auth/csrf")
-            if csrf_response.status_code == 200:
-                csrf_data = csrf_response.json()
-                csrf_token = csrf_data.get('csrfToken')
-                self.log(f"Got CSRF token: {csrf_token[:20]}...")
-            else:
-                self.log("Failed to get CSRF token", "ERROR")
-                return False
-            
-            # Step 2: Visit the login page to get proper session setup
-            login_page = self.session.get(f"{BASE_URL}/auth/login")
-            if login_page.status_code != 200:
-                self.log(f"Failed to access login page: {login_page.status_code}", "ERROR")
-                return False
-            
-            # Step 3: Authenticate via NextAuth credentials endpoint
-            auth_data = {
-                "email": user["email"],
-                "password": user["password"],
-                "csrfToken": csrf_token,
-                "redirect": "false",
-                "json": "true"
-            }
-            
-            auth_response = self.session.post(
-                f"{BASE_URL}/api/auth/signin/credentials",
-                data=auth_data,
-                allow_redirects=False
-            )
-            
-            self.log(f"Auth response status: {auth_response.status_code}")
-            
-            # Step 4: Check if we got redirected to callback
-            if auth_response.status_code in [200, 302]:
-                try:
-                    response_data = auth_response.json()
-                    if response_data.get('url'):
-                        # Follow the callback URL
-                        callback_response = self.session.get(response_data['url'], allow_redirects=True)
-                        self.log(f"Callback response status: {callback_response.status_code}")
-                except:
-                    pass
-            
-            # Step 5: Verify session by checking session endpoint
-            session_response = self.session.get(f"{BASE_URL}/api/auth/session")
-            if session_response.status_code == 200:
-                try:
-                    session_data = session_response.json()
-                    if session_data and session_data.get('user'):
-                        self.log(f"✅ Successfully authenticated {user['email']}")
-                        self.log(f"Session user: {session_data['user'].get('email')}")
-                        return True
-                except:
-                    pass
-            
-            # Check for session cookies as fallback
-            cookies = self.session.cookies.get_dict()
-            session_cookies = [k for k in cookies.keys() if 'next-auth' in k and 'session' in k]
-            
-            if session_cookies:
-                self.log(f"✅ Successfully authenticated {user['email']} (via cookies)")
-                self.log(f"Session cookies: {session_cookies}")
-                return True
-            else:
-                self.log(f"❌ Authentication failed for {user['email']} - no valid session", "ERROR")
-                self.log(f"Available cookies: {list(cookies.keys())}")
-                return False
-                
-        except Exception as e:
-            self.log(f"Authentication error for {user['email']}: {e}", "ERROR")
+        """Switch the session to user_key using the pool's cached login"""
+        cookies = self.pool.cookies(user_key)
+        if cookies is None:
+            self.log(f"❌ Authentication failed for {TEST_USERS[user_key]['email']} - no valid session", "ERROR")
             return False
+
+        self.session.cookies.clear()
+        self.session.cookies.update(cookies)
+        return True
     
     def make_api_request(self, method, endpoint, data=None):
         """Make authenticated API request"""
@@ -126,11 +79,13 @@ class WheelTester:
             else:
                 raise ValueError(f"Unsupported method: {method}")
                 
-            self.log(f"{method} {endpoint} -> {response.status_code}")
+            self.log(f"{method} {endpoint} -> {response.status_code}",
+                     method=method, endpoint=endpoint, status=response.status_code,
+                     **timing_fields(response))
             
             # Log response details for debugging
             if response.status_code >= 400:
-                self.log(f"Error response: {response.text[:200]}...", "ERROR")
+                self.log(f"Error response: {response.text[:200]}...", "ERROR", endpoint=endpoint, status=response.status_code)
                 
             return response
             
@@ -276,53 +231,35 @@ class WheelTester:
                 self.log(f"❌ Expected cooldown error, got: {response.status_code} - {data.get('error', 'Unknown')}", "ERROR")
                 return None
     
+    async def fire_race_spins(self, user_key):
+        """Send race_requests spins for user_key at once, one keep-alive session each"""
+        async with AsyncAPIClient(self.pool, BASE_URL, source="wheel", max_in_flight=self.race_requests) as client:
+            sessions = [await client.session(user_key) for _ in range(self.race_requests)]
+            if None in sessions:
+                return [{'id': i + 1, 'status': 'error', 'error': 'login failed'} for i in range(self.race_requests)]
+
+            async def make_spin_request(i):
+                try:
+                    response = await sessions[i].post(f"{BASE_URL}/api/wheel/spin", json={})
+                    return {
+                        'id': i + 1,
+                        'status': response.status_code,
+                        'data': response.json() if response.status_code in [200, 429] else None,
+                        'timing': timing_fields(response)
+                    }
+                except Exception as e:
+                    return {'id': i + 1, 'status': 'error', 'error': str(e)}
+
+            return await client.fan_out(self.race_requests, make_spin_request)
+    
     def test_race_condition_protection(self, user_key):
         """Test race condition protection with simultaneous requests"""
-        self.log(f"\n=== TEST: Race Condition Protection ({user_key}) ===")
+        self.log(f"\n=== TEST: Race Condition Protection ({user_key}, {self.race_requests} requests) ===")
         
         if not self.authenticate_user(user_key):
             return False
         
-        # Create a shared session for both requests
-        session1 = requests.Session()
-        session2 = requests.Session()
-        
-        # Copy cookies from authenticated session
-        for cookie in self.session.cookies:
-            session1.cookies.set_cookie(cookie)
-            session2.cookies.set_cookie(cookie)
-        
-        # Set headers
-        headers = {'Content-Type': 'application/json'}
-        session1.headers.update(headers)
-        session2.headers.update(headers)
-        
-        results = []
-        
-        def make_spin_request(session, request_id):
-            try:
-                response = session.post(f"{BASE_URL}/api/wheel/spin", json={})
-                results.append({
-                    'id': request_id,
-                    'status': response.status_code,
-                    'data': response.json() if response.status_code in [200, 429] else None
-                })
-            except Exception as e:
-                results.append({
-                    'id': request_id,
-                    'status': 'error',
-                    'error': str(e)
-                })
-        
-        # Start two simultaneous requests
-        thread1 = threading.Thread(target=make_spin_request, args=(session1, 1))
-        thread2 = threading.Thread(target=make_spin_request, args=(session2, 2))
-        
-        thread1.start()
-        thread2.start()
-        
-        thread1.join()
-        thread2.join()
+        results = asyncio.run(self.fire_race_spins(user_key))
         
         # Analyze results
         successful_spins = [r for r in results if r.get('status') == 200 and r.get('data', {}).get('success')]
@@ -333,7 +270,8 @@ class WheelTester:
         self.log(f"Cooldown responses: {len(cooldown_responses)}")
         
         for result in results:
-            self.log(f"Request {result['id']}: Status {result['status']}")
+            self.log(f"Request {result['id']}: Status {result['status']}",
+                     method="POST", endpoint="/api/wheel/spin", status=result['status'], **result.get('timing', {}))
             if result.get('data'):
                 self.log(f"  Success: {result['data'].get('success', 'N/A')}")
                 self.log(f"  Error: {result['data'].get('error', 'None')}")
@@ -440,11 +378,11 @@ class WheelTester:
         
         for test_name, result in test_results.items():
             status = "✅ PASS" if result else "❌ FAIL"
-            self.log(f"{test_name.replace('_', ' ').title()}: {status}")
+            self.log(f"{test_name.replace('_', ' ').title()}: {status}", "RESULT", test=test_name, passed=bool(result))
             if result:
                 passed += 1
         
-        self.log(f"\nOverall: {passed}/{total} tests passed")
+        self.log(f"\nOverall: {passed}/{total} tests passed", "RESULT", passed=passed, total=total)
         
         if passed == total:
             self.log("🎉 All wheel API tests passed! System is working correctly.")
@@ -453,9 +391,338 @@ class WheelTester:
             self.log("⚠️ Some tests failed. Please check the logs above.")
             return False
 
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted sample list"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+def fire_spins(base_url, jobs, start_at):
+    """Process pool worker: fire every (user_key, cookies) spin at start_at.
+
+    Each spin gets its own thread and session so all requests in the chunk
+    hit /api/wheel/spin at the same moment.
+    """
+    results = []
+    lock = threading.Lock()
+
+    def spin(user_key, cookies):
+        session = requests.Session()
+        session.headers.update({'Content-Type': 'application/json'})
+        session.cookies.update(cookies)
+
+        delay = start_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{base_url}/api/wheel/spin", json={})
+            status = response.status_code
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+        except Exception as e:
+            status, data = "error", {"error": str(e)}
+        finished = time.time()
+        latency_ms = (time.perf_counter() - started) * 1000
+        session.close()
+
+        with lock:
+            results.append({
+                'user': user_key,
+                'status': status,
+                'success': status == 200 and bool(data.get('success')),
+                'error': data.get('error'),
+                'latency_ms': latency_ms,
+                'finished_at': finished
+            })
+
+    threads = [threading.Thread(target=spin, args=job) for job in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+class WheelStressTester:
+    """Fires hundreds of concurrent spins and reconciles the database afterwards.
+
+    Every level sends `requests` spins spread round-robin over `users`
+    dedicated stress users, so each user races many copies of itself through
+    the findFirst-then-create cooldown check in /api/wheel/spin. The stress
+    users' WheelSpin rows are deleted before each level to reopen the
+    cooldown; Coupon and AuditLog rows are kept and reconciled by time window.
+    """
+
+    def __init__(self, users=50, processes=None, db_path=DB_PATH):
+        self.user_count = users
+        self.processes = processes or os.cpu_count() or 4
+        self.db_path = db_path
+        self.users = {
+            f"stress_{i}": {"email": f"stress{i}@{STRESS_EMAIL_DOMAIN}", "password": STRESS_PASSWORD}
+            for i in range(users)
+        }
+        self.pool = SessionPool(self.users, BASE_URL, headers={
+            'Content-Type': 'application/json',
+            'User-Agent': 'Wheel-Stress-Tester/2.1'
+        })
+        self.user_ids = {}
+        self.recorder = get_recorder()
+
+    def log(self, message, level="INFO", **fields):
+        """Record a test event (printed in verbose mode)"""
+        self.recorder.record(level, message, source="wheel_stress", **fields)
+
+    def prepare_users(self):
+        """Register the stress users (idempotent) and log each one in once"""
+        session = self.pool.session()
+        try:
+            for key, user in self.users.items():
+                response = session.post(f"{BASE_URL}/api/auth/register", json={
+                    "name": f"Stress {key}",
+                    "email": user["email"],
+                    "password": user["password"]
+                })
+                if response.status_code not in (201, 409):
+                    self.log(f"Failed to register {user['email']}: {response.status_code}", "ERROR")
+                    return False
+        finally:
+            session.close()
+
+        for key in self.users:
+            if self.pool.cookies(key) is None:
+                return False
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute(
+                'SELECT email, id FROM "User" WHERE email LIKE ?', (f"%@{STRESS_EMAIL_DOMAIN}",)
+            ).fetchall()
+        finally:
+            conn.close()
+        emails = {user["email"]: key for key, user in self.users.items()}
+        self.user_ids = {emails[email]: user_id for email, user_id in rows if email in emails}
+        self.log(f"Prepared {len(self.user_ids)} stress users")
+        return len(self.user_ids) == len(self.users)
+
+    def reset_cooldowns(self):
+        """Delete the stress users' spins so every user can spin again"""
+        ids = list(self.user_ids.values())
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                conn.execute(
+                    f'DELETE FROM "WheelSpin" WHERE user_id IN ({",".join("?" * len(ids))})', ids
+                )
+        finally:
+            conn.close()
+
+        if BACKEND_URL:
+            # The backend's cooldown cache only tails new spins; drop the deleted ones
+            with requests.Session() as session:
+                session.headers.update({"X-Service-Key": BACKEND_SERVICE_KEY} if BACKEND_SERVICE_KEY else {})
+                for user_id in ids:
+                    session.post(f"{BACKEND_URL}/api/wheel/spins", json={"user_id": user_id})
+
+    def run_level(self, request_count):
+        """Fire request_count concurrent spins and reconcile the outcome"""
+        self.log(f"\n=== STRESS LEVEL: {request_count} concurrent spins across {self.user_count} users ===")
+        self.reset_cooldowns()
+
+        keys = list(self.users)
+        jobs = [
+            (keys[i % len(keys)], self.pool.cookies(keys[i % len(keys)]).get_dict())
+            for i in range(request_count)
+        ]
+        processes = min(self.processes, request_count)
+        chunks = [jobs[i::processes] for i in range(processes)]
+
+        # Give every process time to spawn its threads before the shared start
+        level_start_ms = int(time.time() * 1000)
+        start_at = time.time() + 1.0 + request_count / 500
+        results = []
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(fire_spins, BASE_URL, chunk, start_at) for chunk in chunks]
+            for future in futures:
+                results.extend(future.result())
+
+        latencies = sorted(r['latency_ms'] for r in results)
+        wall_seconds = max(r['finished_at'] for r in results) - start_at if results else 0.0
+        successes = {}
+        for r in results:
+            if r['success']:
+                successes[r['user']] = successes.get(r['user'], 0) + 1
+
+        report = {
+            "requests": request_count,
+            "users": self.user_count,
+            "processes": processes,
+            "http_success": sum(successes.values()),
+            "http_cooldown": sum(1 for r in results if r['status'] == 429),
+            "http_errors": sum(1 for r in results if r['status'] not in (200, 429)),
+            "users_with_multiple_successes": sum(1 for count in successes.values() if count > 1),
+            "wall_seconds": round(wall_seconds, 3),
+            "throughput_rps": round(len(results) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50), 2),
+                "p95": round(percentile(latencies, 95), 2),
+                "p99": round(percentile(latencies, 99), 2),
+                "max": round(latencies[-1], 2) if latencies else 0.0
+            }
+        }
+        report.update(self.reconcile(level_start_ms))
+        self.print_level(report)
+        return report
+
+    def reconcile(self, since_ms):
+        """Cross-check WheelSpin, Coupon and AuditLog rows written since since_ms"""
+        ids = list(self.user_ids.values())
+        placeholders = ",".join("?" * len(ids))
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            spins = conn.execute(
+                f'SELECT id, user_id, spun_at, next_allowed_at FROM "WheelSpin" '
+                f'WHERE user_id IN ({placeholders}) AND spun_at >= ? ORDER BY user_id, spun_at',
+                ids + [since_ms]
+            ).fetchall()
+            coupons = conn.execute(
+                f'SELECT code FROM "Coupon" WHERE user_id IN ({placeholders}) '
+                f"AND kind = 'wheel_prize' AND created_at >= ?",
+                ids + [since_ms]
+            ).fetchall()
+            try:
+                audits = conn.execute(
+                    f'SELECT entity_id, details FROM "AuditLog" WHERE user_id IN ({placeholders}) '
+                    f"AND action = 'wheel_spin_success' AND created_at >= ?",
+                    ids + [since_ms]
+                ).fetchall()
+            except sqlite3.OperationalError:
+                audits = None  # AuditLog table missing in older databases
+        finally:
+            conn.close()
+
+        # Any spin that starts before the previous one's cooldown ends is a duplicate
+        duplicate_spins = 0
+        previous = None
+        for spin_id, user_id, spun_at, next_allowed_at in spins:
+            if previous and previous[0] == user_id and spun_at < previous[1]:
+                duplicate_spins += 1
+            previous = (user_id, next_allowed_at)
+
+        result = {
+            "db_spins": len(spins),
+            "db_coupons": len(coupons),
+            "duplicate_spins_in_cooldown": duplicate_spins,
+            "orphan_coupons": None,
+            "unaudited_spins": None
+        }
+        if audits is not None:
+            audited_spins = {entity_id for entity_id, _ in audits}
+            audited_coupons = set()
+            for _, details in audits:
+                try:
+                    code = json.loads(details or "{}").get("coupon_code")
+                except ValueError:
+                    code = None
+                if code:
+                    audited_coupons.add(code)
+            result["orphan_coupons"] = sum(1 for (code,) in coupons if code not in audited_coupons)
+            result["unaudited_spins"] = sum(1 for spin in spins if str(spin[0]) not in audited_spins)
+        return result
+
+    def print_level(self, report):
+        latency = report["latency_ms"]
+        self.log(
+            f"HTTP: {report['http_success']} success | {report['http_cooldown']} cooldown | "
+            f"{report['http_errors']} errors",
+            "RESULT"
+        )
+        self.log(
+            f"Latency: p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms  "
+            f"max {latency['max']}ms | {report['throughput_rps']} req/s",
+            "RESULT"
+        )
+        self.log(
+            f"DB: {report['db_spins']} spins | {report['db_coupons']} coupons | "
+            f"{report['duplicate_spins_in_cooldown']} duplicate spins | "
+            f"{report['orphan_coupons']} orphan coupons | {report['unaudited_spins']} unaudited spins",
+            "RESULT"
+        )
+        if report["duplicate_spins_in_cooldown"] or report["users_with_multiple_successes"]:
+            self.log("❌ Race condition detected: multiple spins inside the cooldown window", "ERROR")
+        else:
+            self.log("✅ No duplicate spins", "RESULT")
+
+    def run(self, levels, report_path=None):
+        """Run every concurrency level and return the combined report"""
+        self.log("🎡 Starting Wheel Spin Stress Test")
+        self.log(f"Base URL: {BASE_URL}")
+        self.log(f"Database: {self.db_path}")
+
+        if not self.prepare_users():
+            self.log("Failed to prepare stress users", "ERROR")
+            return None
+
+        # The test targets the database cooldown: the limiter would turn most of each
+        # level's concurrent spins away, and keeps counting spins reset_cooldowns deletes
+        with rate_limits.bypassed(list(self.user_ids.values()), source="wheel_stress"):
+            reports = [self.run_level(level) for level in levels]
+
+        self.log("\n" + "="*60, "RESULT")
+        self.log("🎯 STRESS TEST SUMMARY", "RESULT")
+        self.log("="*60, "RESULT")
+        self.log(f"{'spins':>6} {'ok':>5} {'dup':>5} {'orphan':>7} {'p50':>9} {'p99':>9} {'req/s':>9}", "RESULT")
+        for report in reports:
+            latency = report["latency_ms"]
+            self.log(
+                f"{report['requests']:>6} {report['http_success']:>5} "
+                f"{report['duplicate_spins_in_cooldown']:>5} {str(report['orphan_coupons']):>7} "
+                f"{latency['p50']:>7}ms {latency['p99']:>7}ms {report['throughput_rps']:>9}",
+                "RESULT"
+            )
+
+        if report_path:
+            with open(report_path, "w") as f:
+                json.dump({"base_url": BASE_URL, "levels": reports}, f, indent=2)
+            self.log(f"Report written to {report_path}")
+        return reports
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Wheel of Fortune v2.1 API tests")
+    parser.add_argument("--race-requests", type=int, default=2, help="Simultaneous spins in the race condition test")
+    parser.add_argument("--stress", action="store_true", help="Run the concurrent spin stress test")
+    parser.add_argument("--levels", default="100,250,500,1000", help="Comma-separated concurrent spin counts")
+    parser.add_argument("--users", type=int, default=50, help="Number of stress users sharing the spins")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database used by the app")
+    parser.add_argument("--report", help="Write the stress report as JSON to this path")
+    parser.add_argument("--summary", action="store_true", help="Print only aggregates instead of every log line")
+    parser.add_argument("--events", help="Also write every log event as NDJSON to this path")
+    return parser.parse_args()
+
 def main():
     """Main test execution"""
-    tester = WheelTester()
+    args = parse_args()
+    configure(mode="summary" if args.summary else None, path=args.events)
+
+    if args.stress:
+        stress_tester = WheelStressTester(users=args.users, processes=args.processes, db_path=args.db)
+        levels = [int(level) for level in args.levels.split(",") if level]
+        try:
+            reports = stress_tester.run(levels, report_path=args.report)
+        except KeyboardInterrupt:
+            print("\n⚠️ Stress test interrupted by user")
+            sys.exit(1)
+        clean = reports and all(
+            not r["duplicate_spins_in_cooldown"] and not r["users_with_multiple_successes"] and not r["orphan_coupons"]
+            for r in reports
+        )
+        sys.exit(0 if clean else 1)
+
+    tester = WheelTester(race_requests=args.race_requests)
     
     try:
         success = tester.run_comprehensive_tests()